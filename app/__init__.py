@@ -26,6 +26,40 @@ def _ensure_unit_weight_column(app):
             app.logger.warning(f"unit_weight kolonu kontrol/eklenemedi: {e}")
 
 
+def _ensure_catalog_version_column(app):
+    """products tablosunda catalog_version kolonu/indeksi yoksa ekler (delta senkronizasyon için).
+    Migration çalıştırılmamış ortamlarda Product sorgularının kırılmamasını garanti eder."""
+    from sqlalchemy import inspect, text
+    with app.app_context():
+        try:
+            inspector = inspect(db.engine)
+            cols = [c['name'] for c in inspector.get_columns('products')]
+            if 'catalog_version' not in cols:
+                with db.engine.begin() as conn:
+                    conn.execute(text('ALTER TABLE products ADD COLUMN catalog_version BIGINT'))
+                    conn.execute(text(
+                        'CREATE INDEX IF NOT EXISTS ix_products_catalog_version ON products (catalog_version)'))
+                app.logger.info("products.catalog_version kolonu eklendi.")
+        except Exception as e:
+            app.logger.warning(f"catalog_version kolonu kontrol/eklenemedi: {e}")
+
+
+def _ensure_search_text_column(app):
+    """products tablosunda search_text kolonu yoksa ekler (ürün arama indeksi için).
+    Migration çalıştırılmamış ortamlarda Product sorgularının kırılmamasını garanti eder."""
+    from sqlalchemy import inspect, text
+    with app.app_context():
+        try:
+            inspector = inspect(db.engine)
+            cols = [c['name'] for c in inspector.get_columns('products')]
+            if 'search_text' not in cols:
+                with db.engine.begin() as conn:
+                    conn.execute(text('ALTER TABLE products ADD COLUMN search_text TEXT'))
+                app.logger.info("products.search_text kolonu eklendi.")
+        except Exception as e:
+            app.logger.warning(f"search_text kolonu kontrol/eklenemedi: {e}")
+
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
@@ -69,6 +103,36 @@ def create_app(config_class=Config):
     # unit_weight kolonu yoksa güvenle ekle (adet->kg/metre çevrimi için).
     # Böylece `flask db upgrade` çalıştırılmasa bile alan hazır olur.
     _ensure_unit_weight_column(app)
+    _ensure_catalog_version_column(app)
+    _ensure_search_text_column(app)
+
+    # Süreç içi önbelleklerin (derlenmiş BOM'lar vb.) işçiler arası geçersizleme damgaları
+    from app.utils.versioning import init_version_tracking
+    init_version_tracking(app, db)
+
+    # Depo ekranlarının kategori/lokasyon stok özetleri (artımlı güncellenir)
+    from app.utils.stock_summary import init_stock_summaries
+    init_stock_summaries(app, db)
+
+    # Dashboard hareket sayaçları (günlük toplamlar, artımlı + periyodik mutabakat)
+    from app.utils.dashboard_stats import init_dashboard_stats
+    init_dashboard_stats(app, db)
+
+    # Ürün ağacı maliyet özeti (maliyet raporu bu tablodan okunur)
+    from app.utils.bom_cost_snapshot import init_bom_cost_snapshots
+    init_bom_cost_snapshots(app, db)
+
+    # BOM düğümlerinin ata/torun indeksi (BOM düzenleyicideki alt ağaç sorguları)
+    from app.utils.bom_closure import init_bom_closure
+    init_bom_closure(app, db)
+
+    # Ürün arama indeksi (katlanmış search_text + pg_trgm / FTS5)
+    from app.utils.product_search import init_product_search
+    init_product_search(app, db)
+
+    # Katalog sayacı commit'te, diğer before_commit işlerinden sonra alınır (en son bağlanır)
+    from app.utils.versioning import init_catalog_commit
+    init_catalog_commit(db)
 
     # Eski sohbet geçmişini session'dan temizle (cookie overflow fix)
     from flask import session as flask_session
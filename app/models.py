@@ -77,9 +77,11 @@ class LocationStock(db.Model):
     __tablename__ = 'location_stocks'
     
     id = db.Column(db.Integer, primary_key=True)
-    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
+    # active_history: eski değer her zaman bilinsin (stok özeti farkları, bkz. app/utils/flush_tracking.py)
+    location_id = db.column_property(db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False),
+                                     active_history=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
-    quantity = db.Column(db.Float, default=0.0)
+    quantity = db.column_property(db.Column(db.Float, default=0.0), active_history=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     location = db.relationship('Location', backref=db.backref('stocks', lazy='dynamic'))
@@ -95,7 +97,9 @@ class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(50), unique=True, nullable=False)  # Ürün kodu
     name = db.Column(db.String(200), nullable=False)  # Malzeme adı
-    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
+    # active_history'li alanlar: eski değer her zaman bilinsin (stok özeti farkları,
+    # bkz. app/utils/flush_tracking.py)
+    category_id = db.column_property(db.Column(db.Integer, db.ForeignKey('categories.id')), active_history=True)
     
     # MRP Tipleri
     type = db.Column(db.String(50), default='hammadde', nullable=False) # hammadde, yarimamul, mamul
@@ -107,23 +111,29 @@ class Product(db.Model):
     unit_weight = db.Column(db.Float, nullable=True)
     
     # Stok bilgileri (Sadece miktar)
-    current_stock = db.Column(db.Float, default=0)  # Aktif stok miktarı
-    minimum_stock = db.Column(db.Float, default=0)  # Minimum stok seviyesi
+    current_stock = db.column_property(db.Column(db.Float, default=0), active_history=True)  # Aktif stok miktarı
+    minimum_stock = db.column_property(db.Column(db.Float, default=0), active_history=True)  # Minimum stok seviyesi
     
     # Satın alma & Fiyatlandırma (Gizli alanlar - Dış API'den beslenir)
-    unit_cost = db.Column(db.Float, default=0.0)    # Birim maliyet/fiyat
+    unit_cost = db.column_property(db.Column(db.Float, default=0.0), active_history=True)  # Birim maliyet/fiyat
     currency = db.Column(db.String(10), default='TRY') # Para birimi (TRY, USD, EUR vb.)
     vat_rate = db.Column(db.Float, default=0.0)    # KDV oranı (%)
     
     # Ek bilgiler
-    barcode = db.Column(db.String(100))  # Barkod
+    barcode = db.Column(db.String(100), index=True)  # Barkod
     notes = db.Column(db.Text)  # Notlar
     material = db.Column(db.Text)  # Malzeme özelliği / cinsi (BOM'dan aktarılır)
     image = db.Column(db.String(255))  # Ürün resmi dosya yolu
     
-    is_active = db.Column(db.Boolean, default=True)
+    is_active = db.column_property(db.Column(db.Boolean, default=True), active_history=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Katalog sürüm sayacının bu ürünü son değiştiren değeri (delta senkronizasyon,
+    # bkz. app/utils/versioning.py). Uygulama yazar; elle set edilmez.
+    catalog_version = db.Column(db.BigInteger, nullable=True, index=True)
+    # Arama için katlanmış metin (kod, ad, barkod, malzeme, not, kategori; bkz.
+    # app/utils/product_search.py). Flush sırasında hesaplanır; listelerde yüklenmez.
+    search_text = db.deferred(db.Column(db.Text, nullable=True))
     
     # İlişkiler
     stock_movements = db.relationship('StockMovement', backref='product', lazy='dynamic')
@@ -203,15 +213,23 @@ class StockCurrent(db.Model):
 # Stok Hareketi modeli (Diyagrama uygun)
 class StockMovement(db.Model):
     __tablename__ = 'stock_movements'
+    # Ürün bazlı tüketim toplamları (product_id, tip, tarih aralığı), tarih aralıklı
+    # raporlar/dashboard ve kullanıcı aktivitesi sorguları için
+    __table_args__ = (
+        db.Index('idx_stockmov_product_type_date', 'product_id', 'movement_type', 'date'),
+        db.Index('idx_stockmov_date_type', 'date', 'movement_type'),
+        db.Index('idx_stockmov_user_date', 'user_id', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     
     # Hareket tipi: giris, cikis, sayim, transfer, fire
-    movement_type = db.Column(db.String(20), nullable=False)
+    # (date / movement_type / quantity active_history'li: günlük toplam farkları, bkz. dashboard_stats)
+    movement_type = db.column_property(db.Column(db.String(20), nullable=False), active_history=True)
     
     # Miktar
-    quantity = db.Column(db.Float, nullable=False)
+    quantity = db.column_property(db.Column(db.Float, nullable=False), active_history=True)
     
     # Kaynak ve Hedef (nereden nereye)
     source = db.Column(db.String(100))  # Eski kaynak (tedarikçi, depo, hat adı)
@@ -226,7 +244,7 @@ class StockMovement(db.Model):
     
     # Kullanıcı ve tarih
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    date = db.Column(db.DateTime, default=datetime.utcnow)
+    date = db.column_property(db.Column(db.DateTime, default=datetime.utcnow), active_history=True)
     note = db.Column(db.Text)
     
     # Relationships
@@ -354,7 +372,7 @@ class BomNode(db.Model):
     __tablename__ = 'bom_nodes'
 
     id = db.Column(db.Integer, primary_key=True)
-    bom_id = db.Column(db.Integer, nullable=False)           # Hangi BOM'a ait
+    bom_id = db.Column(db.Integer, nullable=False, index=True)  # Hangi BOM'a ait
     num = db.Column(db.String(50), nullable=False)            # Örn: "1.1.2."
     level = db.Column(db.Integer, nullable=False)             # 1, 2, 3 …
     item_id = db.Column(db.Integer, db.ForeignKey('bom_items.id'))
@@ -392,13 +410,111 @@ class BomEdge(db.Model):
     __tablename__ = 'bom_edges'
 
     id = db.Column(db.Integer, primary_key=True)
-    bom_id = db.Column(db.Integer, nullable=False)
+    bom_id = db.Column(db.Integer, nullable=False, index=True)
     parent_node_id = db.Column(db.Integer, db.ForeignKey('bom_nodes.id'), nullable=True)
     child_node_id = db.Column(db.Integer, db.ForeignKey('bom_nodes.id'), nullable=False)
     quantity = db.Column(db.Numeric(12, 4), default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+class BomClosure(db.Model):
+    """
+    'bom_closure' tablosu - BOM düğümlerinin soy ağacı (closure table).
+    Her (ata, torun) çifti için bir satır; depth=0 düğümün kendisidir.
+    Alt ağaç / ata sorguları kenarları gezmeden tek SQL ile yapılır. Düğüm
+    ekleme/taşıma/silmede artımlı güncellenir; diğer yazmalardan sonra BOM'un
+    cache_versions damgası değiştiği için ilk sorguda yeniden kurulur
+    (bkz. app/utils/bom_closure.py). Düğümler toplu silinebildiği için
+    bom_nodes'a yabancı anahtar YOKTUR.
+    """
+    __tablename__ = 'bom_closure'
+
+    ancestor_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    descendant_id = db.Column(db.Integer, primary_key=True, autoincrement=False, index=True)
+    bom_id = db.Column(db.Integer, nullable=False, index=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+
+class CacheVersion(db.Model):
+    """
+    'cache_versions' tablosu - Süreç içi önbelleklerin geçersizleme damgaları.
+    Her kapsam (ör. 'bom:12', 'bom_products') için yazma olduğunda yeni bir
+    rastgele token yazılır; gunicorn işçileri kendi önbelleklerini bu token'la
+    karşılaştırarak bayat veriyi fark eder (bkz. app/utils/versioning.py).
+    'catalog' kapsamında token rastgele değil, artan katalog sürüm sayacıdır.
+    """
+    __tablename__ = 'cache_versions'
+
+    scope = db.Column(db.String(64), primary_key=True)
+    token = db.Column(db.String(32), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class StockCategorySummary(db.Model):
+    """
+    'stock_category_summaries' tablosu - Kategori bazlı stok özeti (yalnızca aktif ürünler).
+    Product yazmalarında artımlı güncellenir (bkz. app/utils/stock_summary.py);
+    depo ekranları kategori başına ürün sorgusu yerine bu tabloyu okur.
+    """
+    __tablename__ = 'stock_category_summaries'
+
+    category_id = db.Column(db.Integer, primary_key=True)
+    total_items = db.Column(db.Integer, nullable=False, default=0)
+    critical_items = db.Column(db.Integer, nullable=False, default=0)
+    empty_items = db.Column(db.Integer, nullable=False, default=0)
+    total_stock = db.Column(db.Float, nullable=False, default=0.0)
+    total_value = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class StockLocationSummary(db.Model):
+    """
+    'stock_location_summaries' tablosu - Lokasyon bazlı stok özeti.
+    LocationStock yazmalarında artımlı güncellenir (bkz. app/utils/stock_summary.py).
+    """
+    __tablename__ = 'stock_location_summaries'
+
+    location_id = db.Column(db.Integer, primary_key=True)
+    total_products = db.Column(db.Integer, nullable=False, default=0)   # tüm LocationStock satırları
+    product_count = db.Column(db.Integer, nullable=False, default=0)    # miktarı > 0 olanlar
+    total_quantity = db.Column(db.Float, nullable=False, default=0.0)   # tüm satırların toplamı
+    positive_quantity = db.Column(db.Float, nullable=False, default=0.0)  # yalnızca > 0 olanların toplamı
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class MovementDailyTotal(db.Model):
+    """
+    'movement_daily_totals' tablosu - Gün (UTC) ve hareket tipi bazında hareket
+    sayısı / toplam miktar. StockMovement yazmalarında artımlı güncellenir ve
+    periyodik olarak defterle mutabakat yapılır (bkz. app/utils/dashboard_stats.py).
+    """
+    __tablename__ = 'movement_daily_totals'
+
+    day = db.Column(db.Date, primary_key=True)
+    movement_type = db.Column(db.String(20), primary_key=True)
+    movement_count = db.Column(db.Integer, nullable=False, default=0)
+    total_quantity = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class BomCostSnapshot(db.Model):
+    """
+    'bom_cost_snapshot' tablosu - BOM başına önceden hesaplanmış maliyet özeti
+    (kök roll-up maliyeti, maliyeti eksik yaprak sayısı, düğüm sayısı).
+    Maliyet raporu bu tablodan okunur; arka plan işi ve `python run.py
+    refresh-bom-costs` ile yenilenir (bkz. app/utils/bom_cost_snapshot.py).
+    """
+    __tablename__ = 'bom_cost_snapshot'
+
+    bom_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(255))
+    total_cost = db.Column(db.Float, nullable=False, default=0.0)
+    currency = db.Column(db.String(10), default='TRY')
+    node_count = db.Column(db.Integer, nullable=False, default=0)
+    missing_cost_count = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
 # ===== YARDIMCI FONKSİYONLAR =====
 
 def generate_category_code(name):
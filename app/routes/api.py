@@ -1,11 +1,14 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from flask_login import login_required, current_user
 from app.models import Product, Category, StockMovement, CountSession, CountItem
 from app import db
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from functools import wraps
+import hashlib
 from datetime import datetime, timedelta
 from app.utils.decorators import roles_required
+from app.utils import versioning
 
 api_bp = Blueprint('api', __name__)
 
@@ -112,14 +115,9 @@ def search_products():
     if len(q) < 2:
         return jsonify([])
     
-    products = Product.query.filter(
-        Product.is_active == True,
-        db.or_(
-            Product.name.ilike(f'%{q}%'),
-            Product.code.ilike(f'%{q}%'),
-            Product.barcode.ilike(f'%{q}%')
-        )
-    ).limit(20).all()
+    from app.utils import product_search
+    products = product_search.search_products(Product.query.filter(Product.is_active == True), q) \
+        .order_by(Product.name).limit(20).all()
     
     return jsonify([{
         'id': p.id,
@@ -129,33 +127,70 @@ def search_products():
         'current_stock': p.current_stock
     } for p in products])
 
-@api_bp.route('/products/by-qr/<code>')
+def _scan_payload(product):
+    return {
+        'id': product.id,
+        'code': product.code,
+        'name': product.name,
+        'unit_type': product.unit_type,
+        'current_stock': product.current_stock,
+        'minimum_stock': product.minimum_stock
+    }
+
+@api_bp.route('/products/by-qr/<path:code>')
 @login_required
 @roles_required('Genel', 'Yönetici', 'Personel')
 def get_product_by_qr(code):
-    """QR koddan ürün bul"""
-    product = None
-    
-    if code.startswith('CELMAK-'):
-        parts = code.split('-')
-        if len(parts) > 1:
-            product_id = parts[1].split('|')[0]
-            product = Product.query.get(int(product_id))
-    else:
-        product = Product.query.filter_by(code=code).first()
-        if not product:
-            product = Product.query.filter_by(barcode=code).first()
+    """QR koddan ürün bul (etiket, ürün kodu ya da barkod)"""
+    from app.utils import product_lookup
+
+    product_id = product_lookup.resolve(code)
+    product = db.session.get(Product, product_id) if product_id is not None else None
     
     if not product:
         return jsonify({'error': 'Ürün bulunamadı'}), 404
     
+    return jsonify(_scan_payload(product))
+
+SCAN_BATCH_LIMIT = 500
+
+@api_bp.route('/products/scan-batch', methods=['POST'])
+@login_required
+@roles_required('Genel', 'Yönetici', 'Personel')
+def scan_batch():
+    """Toplu okutma çözümleme (çevrimdışı biriktiren el terminalleri için)
+
+    Gövde: {"codes": ["CELMAK-12|...", "165-ALT-TAMBUR", "8690000000001", ...]}
+    Sonuçlar gönderilen sırayla döner; tekrar eden okutmalar ayrı ayrı yer alır.
+    """
+    from app.utils import product_lookup
+
+    data = request.get_json(silent=True) or {}
+    codes = data.get('codes') if isinstance(data, dict) else None
+    if not isinstance(codes, list):
+        return jsonify({'error': 'codes listesi gerekli'}), 400
+    if len(codes) > SCAN_BATCH_LIMIT:
+        return jsonify({'error': f'En fazla {SCAN_BATCH_LIMIT} kod gönderilebilir'}), 400
+
+    codes = [product_lookup.normalize(c) for c in codes]
+    ids = product_lookup.resolve_many(codes)
+    wanted = {i for i in ids if i is not None}
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(wanted))} if wanted else {}
+
+    results = []
+    for code, product_id in zip(codes, ids):
+        product = products.get(product_id)
+        results.append({
+            'code': code,
+            'found': product is not None,
+            'product': _scan_payload(product) if product is not None else None,
+        })
+    found = sum(1 for r in results if r['found'])
     return jsonify({
-        'id': product.id,
-        'code': product.code,
-        'name': product.name,
-        'unit_type': product.unit_type,
-        'current_stock': product.current_stock,
-        'minimum_stock': product.minimum_stock
+        'results': results,
+        'found': found,
+        'missing': len(results) - found,
+        'catalog_version': versioning.catalog_version(),
     })
 
 @api_bp.route('/stock/quick', methods=['POST'])
@@ -238,37 +273,16 @@ def get_production_lines():
 @roles_required('Genel', 'Yönetici', 'Personel')
 def dashboard_stats():
     """Dashboard istatistikleri API"""
-    
-    total_products = Product.query.filter_by(is_active=True).count()
-    
-    critical_count = Product.query.filter(
-        Product.is_active == True,
-        Product.current_stock < Product.minimum_stock,
-        Product.minimum_stock > 0
-    ).count()
-    
-    today = datetime.utcnow().date()
-    today_movements = StockMovement.query.filter(
-        func.date(StockMovement.date) == today
-    ).count()
-    
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    week_in = db.session.query(func.sum(StockMovement.quantity)).filter(
-        StockMovement.date >= week_ago,
-        StockMovement.movement_type == 'giris'
-    ).scalar() or 0
-    
-    week_out = db.session.query(func.sum(StockMovement.quantity)).filter(
-        StockMovement.date >= week_ago,
-        StockMovement.movement_type == 'cikis'
-    ).scalar() or 0
+    from app.utils.dashboard_stats import get_dashboard_stats
+
+    stats = get_dashboard_stats()
     
     return jsonify({
-        'total_products': total_products,
-        'critical_count': critical_count,
-        'today_movements': today_movements,
-        'week_in': week_in,
-        'week_out': week_out
+        'total_products': stats['total_products'],
+        'critical_count': stats['critical_count'],
+        'today_movements': stats['today_movements'],
+        'week_in': stats['week_in'],
+        'week_out': stats['week_out']
     })
 
 @api_bp.route('/counting/<int:session_id>/item/<int:item_id>', methods=['POST'])
@@ -301,6 +315,36 @@ def api_count_item(session_id, item_id):
         'difference': item.difference
     })
 
+# ================== KOŞULLU İSTEK (ETag) YARDIMCILARI ==================
+
+def _catalog_etag(version, *parts):
+    """Katalog sürümü + istek yolu/parametreleri (+ ek parçalar) için ETag.
+    Sürüm izleme kapalıysa None (koşullu yanıt verilmez). Gövdeler üretim
+    zamanı (generated_at / timestamp) taşıdığından aynı sürüm bayt bayt aynı
+    gövde demek değildir; ETag zayıf (W/) gönderilir."""
+    if version is None:
+        return None
+    args = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+    raw = '|'.join([request.path, args, str(version), *(str(p) for p in parts)])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _client_has_current(etag):
+    # If-None-Match zayıf karşılaştırma kullanır (RFC 9110 §13.1.2)
+    return etag is not None and request.if_none_match.contains_weak(etag)
+
+
+def _with_catalog_headers(response, etag, version):
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers['X-Catalog-Version'] = str(version)
+    return response
+
+
+def _not_modified(etag, version):
+    return _with_catalog_headers(Response(status=304), etag, version)
+
+
 # ================== ÜRÜN AĞACI API'LERİ ==================
 
 @api_bp.route('/v1/products/full', methods=['GET'])
@@ -325,30 +369,113 @@ def api_products_full():
         type: string
         required: false
         description: Pasif ürünleri de dahil et ('true' veya 'false')
+      - name: format
+        in: query
+        type: string
+        required: false
+        description: "'ndjson' verilirse her satırda bir ürün olacak şekilde akış (application/x-ndjson) döner"
+      - name: after_code
+        in: query
+        type: string
+        required: false
+        description: Keyset sayfalama — bu koddan SONRAKİ ürünleri getir (koda göre sıralı)
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: En fazla kaç ürün döneceği (verilmezse hepsi)
+      - name: changed_since
+        in: query
+        type: integer
+        required: false
+        description: >
+          Delta modu — yalnızca bu katalog sürümünden sonra değişen ürünleri getir
+          (pasife alınanlar dahil; is_active alanına bakın). Sürüm, önceki yanıtın
+          X-Catalog-Version başlığından alınır.
     responses:
       200:
-        description: Başarılı ürün listesi
+        description: Başarılı ürün listesi (ETag ve X-Catalog-Version başlıklarıyla)
+      304:
+        description: If-None-Match ile gönderilen ETag hâlâ geçerli, katalog değişmedi
     """
     category_id = request.args.get('category_id', type=int)
     include_inactive = request.args.get('include_inactive', 'false').lower() == 'true'
-
-    query = Product.query
-
-    if not include_inactive:
+    output_format = request.args.get('format', 'json').lower()
+    after_code = request.args.get('after_code')
+    limit = request.args.get('limit', type=int)
+    changed_since = request.args.get('changed_since')
+
+    if limit is not None and limit <= 0:
+        return jsonify({'success': False, 'error': 'limit pozitif bir tam sayı olmalıdır'}), 400
+    if changed_since is not None:
+        if not changed_since.isdigit():
+            return jsonify({'success': False, 'error': 'changed_since bir katalog sürümü (tam sayı) olmalıdır'}), 400
+        changed_since = int(changed_since)
+
+    version = versioning.catalog_version()
+    etag = _catalog_etag(version)
+    if _client_has_current(etag):
+        return _not_modified(etag, version)
+
+    query = Product.query.options(joinedload(Product.category))
+
+    if changed_since is not None:
+        # Delta: pasife alınan ürünler de dönmeli ki istemci kendi kopyasından düşebilsin
+        query = query.filter(Product.catalog_version > changed_since)
+    elif not include_inactive:
         query = query.filter_by(is_active=True)
 
     if category_id:
         query = query.filter_by(category_id=category_id)
 
-    products = query.order_by(Product.code).all()
+    # Keyset sayfalama: code benzersiz ve sıralama anahtarı (OFFSET taraması yok)
+    if after_code:
+        query = query.filter(Product.code > after_code)
+
+    query = query.order_by(Product.code)
+    if limit:
+        query = query.limit(limit)
+
+    if output_format == 'ndjson':
+        response = Response(
+            stream_with_context(_stream_products_ndjson(query)),
+            mimetype='application/x-ndjson'
+        )
+        return _with_catalog_headers(response, etag, version)
+
+    products = query.all()
 
     result = [_product_payload(p) for p in products]
 
-    return jsonify({
+    payload = {
         'success': True,
         'count': len(result),
         'data': result
-    })
+    }
+    if limit:
+        # Sonraki sayfa için after_code; son sayfada None
+        payload['next_after_code'] = result[-1]['code'] if len(result) == limit else None
+    if changed_since is not None:
+        payload['catalog_version'] = version
+    return _with_catalog_headers(jsonify(payload), etag, version)
+
+
+# NDJSON akışında sunucu tarafı imleçten kaçar satır birlikte çekilip yazılacağı
+PRODUCTS_STREAM_BATCH = 500
+
+
+def _stream_products_ndjson(query):
+    """Ürünleri sunucu tarafı imleçle (yield_per) okuyup satır satır JSON üretir.
+    Tüm katalog bellekte tutulmaz; her parti yazıldıktan sonra serbest kalır."""
+    dumps = current_app.json.dumps
+    lines = []
+    for p in query.yield_per(PRODUCTS_STREAM_BATCH):
+        lines.append(dumps(_product_payload(p)))
+        if len(lines) >= PRODUCTS_STREAM_BATCH:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
 
 
 
@@ -364,6 +491,56 @@ def api_health():
 
 # ================== SATIN ALMA BİRİMİ API'LERİ ==================
 
+def _consumption_by_product(since, product_ids=None):
+    """product_id -> `since` tarihinden bu yana toplam çıkış miktarı.
+    Ürün başına ayrı SUM yerine tek gruplu sorgu (idx_stockmov_date_type)."""
+    query = db.session.query(
+        StockMovement.product_id, func.sum(StockMovement.quantity)
+    ).filter(
+        StockMovement.movement_type == 'cikis',
+        StockMovement.date >= since
+    )
+    if product_ids is not None:
+        query = query.filter(StockMovement.product_id.in_(product_ids))
+    return {pid: total or 0 for pid, total in query.group_by(StockMovement.product_id)}
+
+
+def _purchasing_etag(since):
+    """Satın alma listeleri için (sürüm, ETag). Tüketim penceresi zamanla kaydığından
+    ETag'e penceredeki en eski çıkışın tarihi de girer: bir hareket pencereden
+    düştüğünde bu tarih değişir ve liste yeniden üretilir."""
+    version = versioning.catalog_version()
+    if version is None:
+        return None, None
+    oldest_in_window = db.session.query(func.min(StockMovement.date)).filter(
+        StockMovement.movement_type == 'cikis',
+        StockMovement.date >= since
+    ).scalar()
+    return version, _catalog_etag(version, oldest_in_window)
+
+
+def _locations_by_product():
+    """product_id -> stoklu lokasyon listesi (miktarı > 0 olan LocationStock satırları).
+    Ürün başına dinamik `p.location_stocks` + `ls.location` sorguları yerine tek JOIN."""
+    from app.models import Location, LocationStock
+
+    rows = db.session.query(
+        LocationStock.product_id, Location.id, Location.name, LocationStock.quantity
+    ).join(
+        Location, LocationStock.location_id == Location.id
+    ).filter(
+        LocationStock.quantity > 0
+    ).order_by(LocationStock.id)
+
+    locations = {}
+    for product_id, location_id, location_name, quantity in rows:
+        locations.setdefault(product_id, []).append({
+            'location_id': location_id,
+            'location_name': location_name,
+            'quantity': float(quantity)
+        })
+    return locations
+
 @api_bp.route('/v1/purchasing/critical-stock', methods=['GET'])
 @require_api_key
 def api_critical_stock_for_purchasing():
@@ -371,34 +548,29 @@ def api_critical_stock_for_purchasing():
     Satın alma birimi için kritik stok listesi
     Minimum stok seviyesinin altındaki veya biten ürünler
     """
+    # Son hareketleri al (son çıkış hızını analiz için) — tüm ürünler tek sorguda
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    version, etag = _purchasing_etag(week_ago)
+    if _client_has_current(etag):
+        return _not_modified(etag, version)
+
     # Tüm aktif ürünleri getir (Artık sadece kritik değil, hepsi isteniyor)
-    all_products = Product.query.filter(
+    all_products = Product.query.options(joinedload(Product.category)).filter(
         Product.is_active == True
     ).order_by(Product.name).all()
 
+    consumption = _consumption_by_product(week_ago)
+    locations_by_product = _locations_by_product()
+
     result = []
     for p in all_products:
         # Eksik miktar hesapla (0'ın altına düşürme)
         shortage = max(0, p.minimum_stock - p.current_stock)
         
         # Lokasyon bilgisi
-        locations = []
-        for ls in p.location_stocks:
-            if ls.quantity > 0 and getattr(ls, 'location', None):
-                locations.append({
-                    'location_id': ls.location.id,
-                    'location_name': ls.location.name,
-                    'quantity': float(ls.quantity)
-                })
-
-        # Son hareketleri al (son çıkış hızını analiz için)
-        week_ago = datetime.utcnow() - timedelta(days=7)
-
-        weekly_consumption = db.session.query(func.sum(StockMovement.quantity)).filter(
-            StockMovement.product_id == p.id,
-            StockMovement.movement_type == 'cikis',
-            StockMovement.date >= week_ago
-        ).scalar() or 0
+        locations = locations_by_product.get(p.id, [])
+
+        weekly_consumption = consumption.get(p.id, 0)
 
         # Günlük ortalama tüketim
         daily_avg = weekly_consumption / 7 if weekly_consumption > 0 else 0
@@ -425,12 +597,12 @@ def api_critical_stock_for_purchasing():
             'locations': locations
         })
 
-    return jsonify({
+    return _with_catalog_headers(jsonify({
         'success': True,
         'count': len(result),
         'data': result,
         'generated_at': datetime.utcnow().isoformat()
-    })
+    }), etag, version)
 
 
 @api_bp.route('/v1/purchasing/critical-products', methods=['GET'])
@@ -442,34 +614,29 @@ def api_critical_products():
     /v1/purchasing/critical-stock ile aynı veriyi döndürür.
     Fiyat yönetimi bu payload ile tüm aktif ürünleri alır.
     """
+    # Son 30 gün tüketim — tüm ürünler tek sorguda
+    month_ago = datetime.utcnow() - timedelta(days=30)
+    version, etag = _purchasing_etag(month_ago)
+    if _client_has_current(etag):
+        return _not_modified(etag, version)
+
     # Tüm aktif ürünleri al
-    all_products = Product.query.filter(
+    all_products = Product.query.options(joinedload(Product.category)).filter(
         Product.is_active == True
     ).order_by(Product.name).all()
 
+    consumption = _consumption_by_product(month_ago)
+    locations_by_product = _locations_by_product()
+
     result = []
     for p in all_products:
         # Eksik miktar
         shortage = max(0, p.minimum_stock - p.current_stock)
         
         # Lokasyon bilgisi
-        locations = []
-        for ls in p.location_stocks:
-            if ls.quantity > 0 and getattr(ls, 'location', None):
-                locations.append({
-                    'location_id': ls.location.id,
-                    'location_name': ls.location.name,
-                    'quantity': float(ls.quantity)
-                })
-        
-        # Son 30 gün tüketim
-        month_ago = datetime.utcnow() - timedelta(days=30)
+        locations = locations_by_product.get(p.id, [])
         
-        monthly_consumption = db.session.query(func.sum(StockMovement.quantity)).filter(
-            StockMovement.product_id == p.id,
-            StockMovement.movement_type == 'cikis',
-            StockMovement.date >= month_ago
-        ).scalar() or 0
+        monthly_consumption = consumption.get(p.id, 0)
         
         # Önerilen sipariş = Eksik + 1 aylık tüketim
         suggested_order = shortage + monthly_consumption
@@ -497,12 +664,12 @@ def api_critical_products():
             'locations': locations
         })
 
-    return jsonify({
+    return _with_catalog_headers(jsonify({
         'success': True,
         'count': len(result),
         'products': result,
         'timestamp': datetime.utcnow().isoformat()
-    })
+    }), etag, version)
 
 
 @api_bp.route('/v1/purchasing/reorder-suggestions', methods=['GET'])
@@ -513,23 +680,24 @@ def api_reorder_suggestions():
     Minimum stok + güvenlik stoğu hesaplaması
     """
 
+    month_ago = datetime.utcnow() - timedelta(days=30)
+    version, etag = _purchasing_etag(month_ago)
+    if _client_has_current(etag):
+        return _not_modified(etag, version)
+
     # Kritik ürünleri al
-    critical_products = Product.query.filter(
+    critical_products = Product.query.options(joinedload(Product.category)).filter(
         Product.is_active == True,
         Product.minimum_stock > 0,
         Product.current_stock < Product.minimum_stock
     ).order_by(Product.current_stock).all()
 
-    month_ago = datetime.utcnow() - timedelta(days=30)
+    consumption = _consumption_by_product(month_ago, [p.id for p in critical_products])
 
     result = []
     for p in critical_products:
         # Aylık ortalama tüketim
-        monthly_consumption = db.session.query(func.sum(StockMovement.quantity)).filter(
-            StockMovement.product_id == p.id,
-            StockMovement.movement_type == 'cikis',
-            StockMovement.date >= month_ago
-        ).scalar() or 0
+        monthly_consumption = consumption.get(p.id, 0)
 
         # Önerilen sipariş miktarı
         # = (Minimum Stok - Mevcut Stok) + Güvenlik Stoğu (1 aylık tüketim)
@@ -557,12 +725,12 @@ def api_reorder_suggestions():
             'priority': 'high' if p.current_stock <= 0 else 'medium' if p.current_stock < p.minimum_stock * 0.5 else 'low'
         })
 
-    return jsonify({
+    return _with_catalog_headers(jsonify({
         'success': True,
         'count': len(result),
         'data': result,
         'generated_at': datetime.utcnow().isoformat()
-    })
+    }), etag, version)
 
 
 @api_bp.route('/v1/purchasing/product/<int:product_id>/details', methods=['GET'])
@@ -730,6 +898,7 @@ def api_stock_sync():
     """
     Toplu Stok Senkronizasyonu
     Dış sistemlerden gelen verilerle stok adetlerini günceller (Sayım/Düzeltme hareketi oluşturarak)
+    Büyük yükler STOCK_SYNC_CHUNK_SIZE kalemlik parçalar halinde işlenip commit edilir.
     ---
     tags:
       - Stok (Entegrasyon)
@@ -763,74 +932,129 @@ def api_stock_sync():
 
     items = data.get('items', [])
     results = []
-    
+
+    # Büyük yükler parça parça işlenip her parçada commit edilir
+    for start in range(0, len(items), STOCK_SYNC_CHUNK_SIZE):
+        results.extend(_sync_stock_chunk(items[start:start + STOCK_SYNC_CHUNK_SIZE]))
+        db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'processed_count': len(items),
+        'results': results
+    })
+
+
+# /v1/stock/sync: tek transaction'da işlenecek en fazla kalem sayısı
+STOCK_SYNC_CHUNK_SIZE = 2000
+
+
+def _sync_stock_chunk(items):
+    """Bir parça senkronizasyon kalemini küme bazlı işler:
+    kodlar tek IN sorgusuyla çekilir, eksik ürünler tek flush'ta (toplu INSERT)
+    eklenir, hareketler executemany ile yazılır. Aynı kod parça içinde birden
+    fazla geçerse kalemler sırayla uygulanır (eski tek tek işleme ile aynı sonuç)."""
+    from sqlalchemy import insert
+    from app.utils.product_search import build_search_text
+
+    codes = {item.get('product_code') for item in items if item.get('product_code')}
+    products = {}
+    inactive_codes = set()
+    if codes:
+        for product in Product.query.filter(Product.code.in_(codes)):
+            if product.is_active:
+                products[product.code] = product
+            else:
+                inactive_codes.add(product.code)
+
+    # Kayıtlı olmayan ama adı verilen kodlar için yeni ürün kartları (ilk geçen kalemden)
+    new_products = {}
+    for item in items:
+        code = item.get('product_code')
+        if not code or item.get('stock_quantity') is None:
+            continue
+        if code in products or code in inactive_codes or code in new_products:
+            continue
+        name = item.get('name') or item.get('product_name')
+        if not name:
+            continue
+        now = datetime.utcnow()
+        material = item.get('material') or name
+        new_products[code] = {
+            'code': code,
+            'name': name,
+            'type': item.get('type') or 'hammadde',
+            'unit_type': item.get('unit_type') or 'kg',
+            'material': material,
+            # Toplu INSERT flush'tan geçmez; arama metni burada doldurulur
+            'search_text': build_search_text(code, name, None, material, None, None),
+            'current_stock': 0,
+            'minimum_stock': 0,
+            'is_active': True,
+            'created_at': now,
+            'updated_at': now,
+        }
+    if new_products:
+        # Toplu INSERT (executemany) + id'ler için tek IN sorgusu
+        db.session.execute(insert(Product), list(new_products.values()))
+        for product in Product.query.filter(Product.code.in_(list(new_products))):
+            products[product.code] = product
+
+    results = []
+    movements = []
     for item in items:
         code = item.get('product_code')
         new_quantity = item.get('stock_quantity')
         note = item.get('note', 'API Senkronizasyonu')
-        
+
         if not code or new_quantity is None:
             results.append({'code': code, 'status': 'error', 'message': 'Eksik veri'})
             continue
-            
-        product = Product.query.filter_by(code=code, is_active=True).first()
-        if not product:
-            name = item.get('name') or item.get('product_name')
-            unit_type = item.get('unit_type') or 'kg'
-            if name:
-                product = Product(
-                    code=code,
-                    name=name,
-                    type=item.get('type') or 'hammadde',
-                    unit_type=unit_type,
-                    material=item.get('material') or name,
-                    current_stock=0,
-                    minimum_stock=0,
-                    is_active=True,
-                )
-                db.session.add(product)
-                db.session.flush()
+        if isinstance(new_quantity, bool) or not isinstance(new_quantity, (int, float)):
+            # Parçalı commit'te bir kalemin hatası diğer parçaları yarıda bırakmasın
+            results.append({'code': code, 'status': 'error', 'message': 'Geçersiz miktar'})
+            continue
+
+        product = products.get(code)
         if not product:
             results.append({'code': code, 'status': 'error', 'message': 'Ürün bulunamadı'})
             continue
-            
+
         old_quantity = product.current_stock
         difference = new_quantity - old_quantity
-        
+
         if difference == 0:
             results.append({'code': code, 'status': 'skipped', 'message': 'Stok zaten güncel'})
             continue
-            
+
         movement_type = 'giris' if difference > 0 else 'cikis'
-        
-        movement = StockMovement(
-            product_id=product.id,
-            movement_type=movement_type,
-            quantity=abs(difference),
-            source='Sistem Senkronizasyonu' if difference > 0 else 'Depo',
-            destination='Depo' if difference > 0 else 'Sistem Senkronizasyonu',
-            note=note,
-            # Sistem kullanıcısı id'si yok, o yüzden user_id null kalabilir. 
-            # API ile eklendiğini kaynak/notlardan anlayacağız.
-        )
-        
+
+        # Sistem kullanıcısı id'si yok, o yüzden user_id null kalır.
+        # API ile eklendiğini kaynak/notlardan anlayacağız.
+        movements.append({
+            'product_id': product.id,
+            'movement_type': movement_type,
+            'quantity': abs(difference),
+            'source': 'Sistem Senkronizasyonu' if difference > 0 else 'Depo',
+            'destination': 'Depo' if difference > 0 else 'Sistem Senkronizasyonu',
+            'note': note,
+            'date': datetime.utcnow(),
+        })
+
         product.current_stock = new_quantity
-        db.session.add(movement)
-        
+
         results.append({
-            'code': code, 
-            'status': 'success', 
-            'old_stock': float(old_quantity), 
+            'code': code,
+            'status': 'success',
+            'old_stock': float(old_quantity),
             'new_stock': float(new_quantity)
         })
-        
-    db.session.commit()
-    
-    return jsonify({
-        'success': True,
-        'processed_count': len(items),
-        'results': results
-    })
+
+    # Stok güncellemeleri flush'ta toplu UPDATE (executemany) olarak gider
+    db.session.flush()
+    if movements:
+        db.session.execute(insert(StockMovement), movements)
+    return results
 
 @api_bp.route('/v1/products/price-sync', methods=['POST'])
 @require_api_key
@@ -861,6 +1085,9 @@ def api_product_price_sync():
                     type: number
                   currency:
                     type: string
+            impact:
+              type: boolean
+              description: true ise fiyatı değişen kartların BOM toplamlarına etkisi (bom_impact) döner
     responses:
       200:
         description: Fiyat senkronizasyonu sonucu
@@ -871,6 +1098,7 @@ def api_product_price_sync():
 
     items = data.get('items', [])
     results = []
+    updates = []
     
     for item in items:
         code = item.get('code')
@@ -901,23 +1129,34 @@ def api_product_price_sync():
             results.append({'code': code, 'status': 'error', 'message': 'Ürün bulunamadı'})
             continue
             
-        product.unit_cost = float(cost)
-        product.currency = currency
-        
+        updates.append((product, float(cost), currency))
         results.append({
             'code': code, 
             'status': 'success', 
             'new_cost': float(cost), 
             'currency': currency
         })
+
+    bom_impact = None
+    if data.get('impact'):
+        # Etki, fiyatlar yazılmadan ÖNCEKİ maliyet indeksi üzerinde hesaplanır.
+        from app.utils import cost_index
+        bom_impact = cost_index.what_if({product.id: cost for product, cost, _ in updates})
+
+    for product, cost, currency in updates:
+        product.unit_cost = cost
+        product.currency = currency
         
     db.session.commit()
     
-    return jsonify({
+    response = {
         'success': True,
         'processed_count': len(items),
         'results': results
-    })
+    }
+    if bom_impact is not None:
+        response['bom_impact'] = bom_impact
+    return jsonify(response)
 
 
 @api_bp.route('/v1/products/sync-cost', methods=['POST'])
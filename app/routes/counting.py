@@ -102,14 +102,11 @@ def count(id):
     product_code = request.args.get('code', '')
     
     if product_code:
-        # QR koddan ürün bul
-        if product_code.startswith('CELMAK-'):
-            parts = product_code.split('-')
-            if len(parts) > 1:
-                product_id = parts[1].split('|')[0]
-                product = Product.query.get(int(product_id))
-        else:
-            product = Product.query.filter_by(code=product_code).first()
+        # QR koddan ürün bul (etiket, ürün kodu ya da barkod)
+        from app.utils import product_lookup
+        product_id = product_lookup.resolve(product_code)
+        if product_id is not None:
+            product = db.session.get(Product, product_id)
         
         if product:
             item = CountItem.query.filter_by(session_id=id, product_id=product.id).first()
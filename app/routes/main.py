@@ -1,10 +1,8 @@
 from flask import Blueprint, render_template, redirect, url_for
 from flask_login import login_required, current_user
 from app.models import Product, Category, StockMovement, CountSession, User
-from app import db
-from sqlalchemy import func
-from datetime import datetime, timedelta
 from app.utils.decorators import roles_required
+from app.utils.dashboard_stats import get_dashboard_stats
 
 main_bp = Blueprint('main', __name__)
 
@@ -19,33 +17,19 @@ def index():
 @roles_required('Genel', 'Yönetici', 'Personel')
 def dashboard():
     try:
-        # Özet istatistikler
-        total_products = Product.query.filter_by(is_active=True).count()
+        # Özet istatistikler (paylaşılan sayaçlardan; defter boyutundan bağımsız)
+        stats = get_dashboard_stats()
+        total_products = stats['total_products']
 
-        # Kritik stok ürünleri
-        critical_products = Product.query.filter(
-            Product.is_active == True,
-            Product.current_stock < Product.minimum_stock,
-            Product.minimum_stock > 0
-        ).all()
+        # Kritik stok ürünleri (ilk birkaçı; toplam sayı sayaçtan)
+        preview_ids = stats['critical_preview_ids']
+        critical_products = Product.query.filter(Product.id.in_(preview_ids)).order_by(Product.id).all() \
+            if preview_ids else []
 
-        # Bugünkü hareketler
-        today = datetime.utcnow().date()
-        today_movements = StockMovement.query.filter(
-            func.date(StockMovement.date) == today
-        ).count()
-
-        # Son 7 gün giriş/çıkış
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        week_in = db.session.query(func.sum(StockMovement.quantity)).filter(
-            StockMovement.date >= week_ago,
-            StockMovement.movement_type == 'giris'
-        ).scalar() or 0
-
-        week_out = db.session.query(func.sum(StockMovement.quantity)).filter(
-            StockMovement.date >= week_ago,
-            StockMovement.movement_type == 'cikis'
-        ).scalar() or 0
+        # Bugünkü hareketler, son 7 gün giriş/çıkış
+        today_movements = stats['today_movements']
+        week_in = stats['week_in']
+        week_out = stats['week_out']
 
         # Üretim hatları (Kategoriler)
         production_lines = Category.query.filter_by(is_active=True).all()
@@ -66,7 +50,7 @@ def dashboard():
         return render_template('dashboard.html',
             total_products=total_products,
             critical_products=critical_products,
-            critical_count=len(critical_products),
+            critical_count=stats['critical_count'],
             today_movements=today_movements,
             week_in=week_in,
             week_out=week_out,
@@ -7,11 +7,13 @@ from datetime import datetime, timedelta
 from app.utils.decorators import roles_required
 from app.utils import sanitize_part_code
 from app.utils.excel_utils import parse_bom_excel, create_bom_tree_excel
+from app.utils import mrp, bom_closure
 from app.utils.bom_utils import (
     parse_bom_excel_v2,
     import_bom_to_db,
     get_bom_tree,
     get_bom_subtree,
+    get_bom_node_page,
     list_boms,
     next_bom_id,
     analyze_bom_for_import,
@@ -20,6 +22,8 @@ from app.utils.bom_utils import (
     analyze_bom_delete,
     audit_bom_costs,
     explode_bom_materials,
+    explode_production_plan,
+    collect_leaf_issues,
     preview_standardize_name,
     standardize_bom_item_name,
     add_bom_node,
@@ -716,11 +720,13 @@ def bom_update_excel(bom_id):
 @login_required
 @roles_required('Genel', 'Yönetici')
 def bom_tree(bom_id):
-    """BOM ağacını görüntüle."""
-    tree = get_bom_tree(bom_id, db)
-    if not tree['roots']:
+    """BOM ağacını görüntüle. Sayfaya yalnızca kökler gömülür; alt seviyeler
+    düğüm açıldıkça `api_bom_tree_children` ile sayfa sayfa yüklenir."""
+    page = get_bom_node_page(bom_id)
+    if page.get('error') or not page['children']:
         flash(f'BOM #{bom_id} bulunamadı veya boş.', 'error')
         return redirect(url_for('production.bom_list'))
+    tree = {'bom_id': bom_id, 'roots': page['children'], 'next_cursor': page['next_cursor']}
     return render_template('production/bom_tree.html', tree=tree, bom_id=bom_id)
 
 
@@ -824,6 +830,50 @@ def api_bom_tree(bom_id):
     return jsonify(tree)
 
 
+@production_bp.route('/api/bom_tree/<int:bom_id>/children')
+@production_bp.route('/api/bom_tree/<int:bom_id>/children/<int:node_id>')
+@login_required
+def api_bom_tree_children(bom_id, node_id=None):
+    """Tembel ağaç: düğüm ve doğrudan çocuklarından bir sayfa (node_id yoksa kökler).
+
+    Sorgu: ?cursor=<önceki yanıtın next_cursor değeri>&limit=<en fazla 1000>
+    Her satır çocuk/torun sayısı ve alt ağaç toplam maliyetiyle döner; büyük
+    ağaçlar tüm ağacı tek JSON'da göndermeden, açıldıkça yüklenir."""
+    cursor = request.args.get('cursor', type=int)
+    limit = request.args.get('limit', 200, type=int)
+    if limit < 1:
+        return jsonify({'success': False, 'error': 'limit pozitif olmalı'}), 400
+    try:
+        page = get_bom_node_page(bom_id, node_id, cursor=cursor, limit=min(limit, 1000))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if page.get('error'):
+        return jsonify(dict(page, success=False)), 404
+    return jsonify(dict(page, success=True))
+
+
+@production_bp.route('/api/where-used/<int:product_id>')
+@login_required
+def api_where_used(product_id):
+    """Ürün hangi BOM'larda, hangi düğümde, hangi seviyede ve kaç adet kullanılıyor?
+    Sonuç süreç içi indeksten gelir (bkz. app/utils/where_used.py)."""
+    from app.utils import where_used
+
+    product = db.session.get(Product, product_id)
+    if product is None:
+        return jsonify({'success': False, 'error': 'Ürün bulunamadı'}), 404
+    usages = where_used.where_used(product_id)
+    return jsonify({
+        'success': True,
+        'product_id': product.id,
+        'code': product.code,
+        'name': product.name,
+        'bom_ids': sorted({u['bom_id'] for u in usages}),
+        'root_of': sorted(u['bom_id'] for u in usages if u['level'] == 0),
+        'usages': usages,
+    })
+
+
 @production_bp.route('/bom/<int:bom_id>/material-audit', methods=['GET', 'POST'])
 @login_required
 @roles_required('YÃ¶netici', 'Genel')
@@ -885,23 +935,19 @@ def weight_audit():
     from app.models import BomNode
 
     roots = BomNode.query.filter_by(level=0).all()
+    labels = {root.bom_id: root.display_name or f'BOM #{root.bom_id}' for root in roots}
+    plan = collect_leaf_issues(labels)
+    bom_count = plan['bom_count']
+
     unlinked_map, missing_map = {}, {}
-    bom_count = 0
-    for root in roots:
-        try:
-            exp = explode_bom_materials(root.bom_id, root.id, 1, db)
-        except Exception:
-            continue
-        bom_count += 1
-        bom_label = root.display_name or f'BOM #{root.bom_id}'
-        for u in exp.get('unlinked', []):
-            key = (u.get('name') or '').strip().lower()
-            e = unlinked_map.setdefault(key, {'name': u.get('name'), 'boms': set()})
-            e['boms'].add(bom_label)
-        for m in exp.get('missing_weight', []):
-            key = (m.get('product_code') or (m.get('name') or '')).strip().lower()
-            e = missing_map.setdefault(key, {'name': m.get('name'), 'code': m.get('product_code'), 'boms': set()})
-            e['boms'].add(bom_label)
+    for u in plan['unlinked']:
+        key = (u.get('name') or '').strip().lower()
+        e = unlinked_map.setdefault(key, {'name': u.get('name'), 'boms': set()})
+        e['boms'].add(labels[u['bom_id']])
+    for m in plan['missing_weight']:
+        key = (m.get('product_code') or (m.get('name') or '')).strip().lower()
+        e = missing_map.setdefault(key, {'name': m.get('name'), 'code': m.get('product_code'), 'boms': set()})
+        e['boms'].add(labels[m['bom_id']])
 
     def _finish(d):
         rows = list(d.values())
@@ -916,6 +962,133 @@ def weight_audit():
                            unlinked=unlinked, missing=missing, bom_count=bom_count)
 
 
+@production_bp.route('/plan', methods=['POST'])
+@login_required
+@roles_required('Yönetici', 'Genel')
+def production_plan():
+    """Üretim planı (birden çok BOM × miktar) için toplam malzeme ihtiyacı.
+
+    Gövde: {"items": [{"bom_id": 12, "node_id": 340 (opsiyonel), "quantity": 5}, ...]}
+    Plan, üretim ekranıyla aynı çok seviyeli netleştirmeden geçer (bkz.
+    app/utils/mrp.py): rafta bekleyen yarı mamuller önce düşülür. Kart başına
+    (ara kartlar dahil) brüt ihtiyaç, eldeki stok, stoktan karşılanan, net eksik
+    ve tür ile kartsız / ağırlığı eksik yapraklar döner. Salt-okunurdur.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'items listesi gerekli'}), 400
+
+    plan = []
+    for i, raw in enumerate(items):
+        try:
+            line = {
+                'bom_id': int(raw['bom_id']),
+                'node_id': int(raw['node_id']) if raw.get('node_id') else None,
+                'quantity': float(raw.get('quantity', 1)),
+            }
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return jsonify({'success': False, 'error': f'{i + 1}. satır geçersiz'}), 400
+        if line['quantity'] <= 0:
+            return jsonify({'success': False, 'error': f'{i + 1}. satır: miktar pozitif olmalı'}), 400
+        plan.append(line)
+
+    try:
+        result = explode_production_plan(plan, db)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    materials = [{
+        'product_id': m['product'].id,
+        'code': m['product'].code,
+        'name': m['product'].name,
+        'unit': m['product'].unit_type,
+        'kind': m['kind'],
+        'gross': round(m['gross'], 4),
+        'on_hand': round(m['on_hand'], 4),
+        'from_stock': round(m['from_stock'], 4),
+        'net': round(m['net'], 4),
+        'unit_cost': float(m['product'].unit_cost or 0),
+        'boms': m['boms'],
+    } for m in result['materials']]
+    return jsonify({
+        'success': True,
+        'lines': result['lines'],
+        'materials': materials,
+        'shortage_count': sum(1 for m in materials if m['net'] > 0),
+        'unlinked': result['unlinked'],
+        'missing_weight': result['missing_weight'],
+    })
+
+
+def _resolve_price_changes(changes):
+    """what-if gövdesindeki değişiklikleri kart id -> yeni birim fiyat sözlüğüne
+    çevirir. Kart `product_id`, `code` ya da `material` (malzeme/ad içinde geçen
+    metin, ör. "ST37") ile seçilir; `price` mutlak fiyat, `percent` yüzde değişimdir."""
+    new_prices = {}
+    for i, raw in enumerate(changes):
+        if not isinstance(raw, dict):
+            raise ValueError(f'{i + 1}. satır geçersiz')
+        query = Product.query.filter(Product.is_active == True)
+        if raw.get('product_id'):
+            query = query.filter(Product.id == int(raw['product_id']))
+        elif raw.get('code'):
+            query = query.filter(Product.code == str(raw['code']))
+        elif raw.get('material'):
+            pattern = f"%{str(raw['material']).strip()}%"
+            query = query.filter(db.or_(Product.material.ilike(pattern), Product.name.ilike(pattern)))
+        else:
+            raise ValueError(f'{i + 1}. satır: product_id, code ya da material gerekli')
+        if raw.get('price') is not None:
+            price, percent = float(raw['price']), None
+        elif raw.get('percent') is not None:
+            price, percent = None, float(raw['percent'])
+        else:
+            raise ValueError(f'{i + 1}. satır: price ya da percent gerekli')
+        if (price is not None and price < 0) or (percent is not None and percent <= -100):
+            raise ValueError(f'{i + 1}. satır: fiyat negatif olamaz')
+        for product_id, unit_cost in query.with_entities(Product.id, Product.unit_cost).all():
+            current = new_prices.get(product_id, float(unit_cost or 0))
+            new_prices[product_id] = price if price is not None else current * (1 + percent / 100)
+    return new_prices
+
+
+@production_bp.route('/api/what-if', methods=['POST'])
+@login_required
+@roles_required('Yönetici', 'Genel')
+def cost_what_if():
+    """Varsayımsal fiyat değişikliklerinin tüm BOM toplamlarına etkisi.
+
+    Gövde: {"changes": [{"material": "ST37", "percent": 12},
+                        {"code": "HM-001", "price": 48.5}, ...]}
+    Yalnızca toplamı değişen BOM'lar, önceki/sonraki toplam ve farkla döner.
+    Salt-okunurdur; hiçbir fiyat yazılmaz.
+    """
+    from time import perf_counter
+    from app.utils import cost_index
+
+    data = request.get_json(silent=True)
+    changes = data.get('changes') if isinstance(data, dict) else data
+    if not isinstance(changes, list) or not changes:
+        return jsonify({'success': False, 'error': 'changes listesi gerekli'}), 400
+    try:
+        new_prices = _resolve_price_changes(changes)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    started = perf_counter()
+    boms = cost_index.what_if(new_prices)
+    return jsonify({
+        'success': True,
+        'product_count': len(new_prices),
+        'affected_count': len(boms),
+        'boms': [dict(b, before=round(b['before'], 2), after=round(b['after'], 2),
+                      delta=round(b['delta'], 2),
+                      delta_pct=round(b['delta_pct'], 2) if b['delta_pct'] is not None else None)
+                 for b in boms],
+        'elapsed_ms': round((perf_counter() - started) * 1000, 1),
+    })
+
+
 @production_bp.route('/link-audit', methods=['GET', 'POST'])
 @login_required
 @roles_required('Genel', 'Yönetici')
@@ -937,12 +1110,12 @@ def link_audit():
     from app.utils.bom_utils import (
         _strict_material_signature, _strict_signatures_match,
         _find_matching_raw_material, _costing_unit_family)
+    from app.utils.material_index import product_material_profile
     from sqlalchemy.orm import joinedload
 
     def _sig(product):
-        return _strict_material_signature(' '.join([
-            product.name or '', getattr(product, 'material', '') or '',
-            product.code or '', getattr(product, 'notes', '') or '']))
+        # Kart imzası (ad + malzeme + kod + not) — metni değişmeyen kartlarda hafızadan gelir
+        return product_material_profile(product)['sig']
 
     def _gen_code(name):
         tr = str.maketrans('çğıöşüÇĞİÖŞÜ', 'cgiosuCGIOSU')
@@ -952,10 +1125,9 @@ def link_audit():
     def _default_unit(item):
         return _costing_unit_family(item.name or '') or (item.unit_type or 'adet')
 
-    # Aktif ürünler + hammadde adayları (öneri, korumalı eşleştiriciyle bulunur)
+    # Aktif ürünler; hammadde önerileri paylaşılan malzeme indeksinden (korumalı eşleştirici) gelir
     products = Product.query.filter(Product.is_active == True).all()
     prod_sig = {p.id: _sig(p) for p in products}
-    hammadde_candidates = [p for p in products if p.type == 'hammadde']
 
     def _suggest(item, exclude_id):
         """Yalnızca GERÇEK ham malzeme kartı önerir: 3TB- (mamul/parça) kodları
@@ -963,8 +1135,7 @@ def link_audit():
         Böylece 'Boğaz İç Sacı' gibi alakasız kartlar asla önerilmez."""
         s = _find_matching_raw_material(
             {'is_auto_hammadde': True, 'name': item.name or '',
-             'unit_type': item.unit_type or '', 'weight_per_unit': 0},
-            candidates=hammadde_candidates)
+             'unit_type': item.unit_type or '', 'weight_per_unit': 0})
         if s and s.id != exclude_id:
             return s
         return None
@@ -1530,9 +1701,6 @@ def substitution_audit():
     from app.utils.bom_utils import _find_costing_raw_material
     from sqlalchemy.orm import joinedload
 
-    candidates = Product.query.filter(Product.is_active == True,
-                                      Product.type == 'hammadde').all()
-
     if request.method == 'POST':
         updated = 0
         for raw in request.form.getlist('product_id'):
@@ -1576,7 +1744,7 @@ def substitution_audit():
         fallback = _find_costing_raw_material({
             'name': it.name, 'unit_type': it.unit_type, 'weight_per_unit': 0,
             'material': (product.material or it.name or ''), 'is_auto_hammadde': True,
-        }, exclude_product_id=product.id, candidates=candidates)
+        }, exclude_product_id=product.id)
         if not (fallback and fallback.unit_cost and fallback.unit_cost > 0):
             continue  # ikame edilmiyorsa listeye alma
         g = groups.get(product.id)
@@ -1668,7 +1836,7 @@ def unlinked_fix():
 def weight_fill():
     """FAZ 2B (elle): Ağırlığı eksik BOM düğümlerine elle parça-başı ağırlık girilir.
     Girilen değer node.weight_per_unit'e yazılır; üretim bunu kg/metre çevriminde kullanır."""
-    from app.models import BomNode
+    from app.models import BomItem, BomNode
 
     if request.method == 'POST':
         mode = request.form.get('mode', 'piece')  # piece = parça başı, total = satır toplamı ÷ adet
@@ -1695,26 +1863,28 @@ def weight_fill():
         flash(f'{saved} parçanın ağırlığı kaydedildi.', 'success')
         return redirect(url_for('production.weight_fill'))
 
-    # GET: eksik ağırlıklı düğümleri BOM'a göre grupla
+    # GET: eksik ağırlıklı düğümleri BOM'a göre grupla (derlenmiş ağaçlardan, stoktan bağımsız)
     roots = BomNode.query.filter_by(level=0).all()
-    groups, seen = [], set()
+    plan = collect_leaf_issues(root.bom_id for root in roots)
+    by_bom = {}
+    for m in plan['missing_weight']:
+        by_bom.setdefault(m['bom_id'], []).append(m)
+    nodes = {}
+    if plan['missing_weight']:
+        from sqlalchemy.orm import joinedload
+        nodes = {n.id: n for n in BomNode.query
+                 .options(joinedload(BomNode.item).joinedload(BomItem.product))
+                 .filter(BomNode.id.in_([m['node_id'] for m in plan['missing_weight']]))}
+    groups = []
     for root in roots:
-        try:
-            exp = explode_bom_materials(root.bom_id, root.id, 1, db)
-        except Exception:
-            continue
         rows = []
-        for m in exp.get('missing_weight', []):
-            nid = m.get('node_id')
-            if not nid or nid in seen:
-                continue
-            seen.add(nid)
-            node = BomNode.query.get(nid)
+        for m in by_bom.get(root.bom_id, []):
+            node = nodes.get(m['node_id'])
             if not node:
                 continue
             prod = node.item.product if node.item else None
             rows.append({
-                'node_id': nid, 'num': node.num,
+                'node_id': node.id, 'num': node.num,
                 'name': m.get('name') or node.display_name,
                 'code': m.get('product_code') or '',
                 'unit': (prod.unit_type if prod else '') or '',
@@ -1761,7 +1931,7 @@ def bom_sync_prices(bom_id):
             current_app.logger.warning("Bulk purchasing price fetch failed: %s", exc)
             flash(f'Toplu fiyat listesi alinamadi, urunler tek tek kontrol ediliyor: {exc}', 'warning')
 
-        updated = 0
+        updates = []
         failed = []
         skipped = 0
         for product in products:
@@ -1779,11 +1949,24 @@ def bom_sync_prices(bom_id):
                 failed.append(f'{product.code}: {exc}')
                 continue
 
+            updates.append((product, price))
+
+        impact = []
+        if updates:
+            # Fiyatlar yazılmadan önce: hangi BOM toplamları değişecek?
+            from app.utils import cost_index
+            try:
+                impact = cost_index.what_if({product.id: float(price['unit_cost'] or 0)
+                                             for product, price in updates})
+            except Exception as exc:
+                current_app.logger.warning("BOM cost impact failed: %s", exc)
+
+        for product, price in updates:
             product.unit_cost = price['unit_cost']
             product.currency = price.get('currency') or product.currency or 'TRY'
             if price.get('vat_rate') is not None:
                 product.vat_rate = float(price['vat_rate'])
-            updated += 1
+        updated = len(updates)
 
         if updated:
             db.session.commit()
@@ -1792,6 +1975,10 @@ def bom_sync_prices(bom_id):
 
         if updated:
             flash(f'{updated} urunun fiyati satinalma API uzerinden guncellendi.', 'success')
+        if impact:
+            sample = '; '.join(f"{b['name']}: {b['delta']:+,.2f} {b['currency']}" for b in impact[:5])
+            more = f' (+{len(impact) - 5} BOM)' if len(impact) > 5 else ''
+            flash(f'{len(impact)} BOM toplami degisti: {sample}{more}', 'info')
         if skipped:
             flash(f'{skipped} urun kodu olmadigi icin atlandi.', 'warning')
         if failed:
@@ -1885,6 +2072,7 @@ def bom_delete(bom_id):
 
         BomEdge.query.filter_by(bom_id=bom_id).delete()
         BomNode.query.filter_by(bom_id=bom_id).delete()
+        bom_closure.drop(bom_id)
         db.session.commit()
 
         flash(
@@ -1921,23 +2109,25 @@ def bom_produce(bom_id, node_id):
         return redirect(url_for('production.bom_tree', bom_id=bom_id))
 
     # Kullanıcı sadece "Üret" dediğinde doğrudan üretim formu açılacak.
-    # GET: Gerekli malzemeleri göster
+    # GET: Düşülecek malzemeleri göster — POST ile aynı netleştirme (rafta hazır
+    # yarı mamul önce kullanılır), girilen miktar için.
     if request.method == 'GET':
-        explosion = explode_bom_materials(bom_id, node_id, 1, db)
-        materials = []
-        for item in explosion['materials']:
-            child = item['node']
-            c_product = item['product']
-            materials.append({
-                'child_node': child,
-                'product': c_product,
-                'req_qty_per_unit': item['quantity'],
-                'stock': (c_product.current_stock or 0) if c_product else 0
-            })
+        quantity = request.args.get('quantity', type=float, default=1.0)
+        if quantity <= 0:
+            quantity = 1.0
+        try:
+            explosion = mrp.net_requirements([{'bom_id': bom_id, 'node_id': node_id, 'quantity': quantity}])
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('production.bom_tree', bom_id=bom_id))
+        materials = [req for req in explosion['requirements'] if req['product'] is not None]
         return render_template('production/bom_produce.html',
                                bom_node=bom_node,
                                target_product=target_product,
+                               quantity=quantity,
                                materials=materials,
+                               has_shortfall=any(req['shortfall'] > 1e-9 for req in materials),
+                               kind_production=mrp.KIND_PRODUCTION,
                                unlinked=explosion['unlinked'],
                                missing_weight=explosion['missing_weight'])
 
@@ -1949,20 +2139,24 @@ def bom_produce(bom_id, node_id):
         flash('Üretim miktarı sıfırdan büyük olmalıdır.', 'error')
         return redirect(url_for('production.bom_produce', bom_id=bom_id, node_id=node_id))
 
-    explosion = explode_bom_materials(bom_id, node_id, quantity, db)
+    # Rafta hazır yarı mamul varsa önce o tüketilir; yalnızca eksik kalan kısım
+    # alt bileşenlerine patlatılır (bkz. app/utils/mrp.py).
+    try:
+        explosion = mrp.net_requirements([{'bom_id': bom_id, 'node_id': node_id, 'quantity': quantity}])
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('production.bom_produce', bom_id=bom_id, node_id=node_id))
 
     # 1. Stok yetiyor mu kontrolü
     insufficient = []
-    required_consumptions = [] # [(product, total_req_qty, child_node)]
-    for item in explosion['materials']:
-        child = item['node']
-        c_product = item['product']
-        total_req = float(item['quantity'])
-        c_stock = float(c_product.current_stock or 0)
-        if c_stock < total_req:
-            insufficient.append(f"{c_product.name} (Gereken: {total_req:.2f}, Mevcut: {c_stock})")
-        else:
-            required_consumptions.append((c_product, total_req, child))
+    required_consumptions = [] # [(product, total_req_qty)]
+    for req in explosion['requirements']:
+        c_product = req['product']
+        if req['shortfall'] > 1e-9:
+            insufficient.append(f"{c_product.name} (Gereken: {req['gross']:.2f}, Mevcut: {req['from_stock']}, "
+                                f"Eksik: {req['shortfall']:.2f})")
+        elif req['from_stock'] > 0:
+            required_consumptions.append((c_product, req['from_stock']))
 
     if insufficient:
         _limited_flash_list('Yetersiz stok:', insufficient)
@@ -1997,7 +2191,7 @@ def bom_produce(bom_id, node_id):
         db.session.flush()
 
     # 3. Stoğu Düş ve Tüketim Kaydı oluştur (Kullanılan Alt Bileşenler İçin)
-    for c_product, total_req, child_node in required_consumptions:
+    for c_product, total_req in required_consumptions:
         # Stoğu düş
         c_product.current_stock = float(c_product.current_stock or 0) - total_req
         
@@ -2079,18 +2273,20 @@ def work_order():
         flash('Bu BOM ağacının hiç alt bileşeni (malzemesi) yok, üretim yapılamaz. Önce BOM detayını içe aktarın.', 'error')
         return redirect(url_for('production.work_order'))
 
-    explosion = explode_bom_materials(bom_id, root_node.id, quantity, db)
+    try:
+        explosion = mrp.net_requirements([{'bom_id': bom_id, 'node_id': root_node.id, 'quantity': quantity}])
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('production.work_order'))
 
     insufficient = []
     consume_list = []
-    for item in explosion['materials']:
-        p = item['product']
-        req = float(item['quantity'])
-        p_stock = float(p.current_stock or 0)
-        if p_stock < req:
-            insufficient.append(f"{p.name} (Eksik: {req - p_stock:.2f})")
-        else:
-            consume_list.append((p, req))
+    for req in explosion['requirements']:
+        p = req['product']
+        if req['shortfall'] > 1e-9:
+            insufficient.append(f"{p.name} (Eksik: {req['shortfall']:.2f})")
+        elif req['from_stock'] > 0:
+            consume_list.append((p, req['from_stock']))
 
     if insufficient:
         _limited_flash_list('Yetersiz stoklar:', insufficient)
@@ -1,8 +1,9 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, current_app, Response
 from flask_login import login_required, current_user
 from app.models import Product, Category, StockMovement
 from app import db
-from app.utils.qr_generator import generate_qr_code, generate_celmak_label, generate_celmak_label_with_size
+from app.utils.qr_generator import generate_qr_code
+from app.utils import label_batch
 from app.utils.excel_utils import create_product_template_simple, parse_product_excel_simple
 from app.utils.excel_utils import (
     create_product_template,
@@ -15,7 +16,6 @@ from datetime import datetime
 from werkzeug.utils import secure_filename
 import io
 import os
-import zipfile
 import re
 
 products_bp = Blueprint('products', __name__)
@@ -109,7 +109,7 @@ def _uw_estimate(name, unit):
 def unit_weight_import():
     """Excel'deki KG/METRE kolonlarindan Product.unit_weight (1 adet = kac kg/metre) doldurur.
     Onizleme (rapor) + uygula akisi. scp'ye gerek yok, dosya tarayicidan yuklenir."""
-    import openpyxl
+    from app.utils.excel_utils import load_workbook_streaming
 
     def _norm(s):
         return re.sub(r'\s+', ' ', (s or '').strip().lower())
@@ -121,11 +121,12 @@ def unit_weight_import():
             flash('Lütfen bir Excel dosyası seçin.', 'error')
             return redirect(url_for('products.unit_weight_import'))
         try:
-            wb = openpyxl.load_workbook(file, data_only=True)
+            wb = load_workbook_streaming(file)
         except Exception as e:
             flash(f'Excel okunamadı: {e}', 'error')
             return redirect(url_for('products.unit_weight_import'))
         if 'Hammaddeler' not in wb.sheetnames:
+            wb.close()
             flash("Dosyada 'Hammaddeler' sayfası bulunamadı.", 'error')
             return redirect(url_for('products.unit_weight_import'))
 
@@ -137,10 +138,11 @@ def unit_weight_import():
         prof_idx = {}    # (aile, olcu) -> boy_metre
         sac_groups = {}  # (sac_ailesi, kalinlik) -> [(olcu, kg), ...]
         excel_samples = []
-        for r in range(4, ws.max_row + 1):
-            name = ws.cell(r, 1).value
-            g = ws.cell(r, 7).value   # G = KG (kg/adet)
-            h = ws.cell(r, 8).value   # H = METRE (metre/adet)
+        # Salt okunur modda satirlar akitilir; yalnizca A..H kolonlari okunur.
+        for row in ws.iter_rows(min_row=4, max_col=8, values_only=True):
+            name = row[0]
+            g = row[6]   # G = KG (kg/adet)
+            h = row[7]   # H = METRE (metre/adet)
             if not name:
                 continue
             if len(excel_samples) < 8:
@@ -156,6 +158,7 @@ def unit_weight_import():
                 kg = float(g) if isinstance(g, (int, float)) else 0.0
                 if th and kg > 0:
                     sac_groups.setdefault((fam, th), []).append((_uw_dim(name) or '', kg))
+        wb.close()
 
         def _pick_standard(cands):
             # tercih: 1500x3000; yoksa en buyuk kg (en buyuk levha)
@@ -264,12 +267,9 @@ def index():
         query = query.filter_by(type=selected_type)
     
     if search:
-        query = query.filter(
-            db.or_(
-                Product.name.ilike(f'%{search}%'),
-                Product.code.ilike(f'%{search}%')
-            )
-        )
+        # Katlanmış arama indeksi: sıralama kullanıcının seçtiği sütundan gelir
+        from app.utils.product_search import apply_search, split_terms
+        query = apply_search(query, split_terms(search), rank=False)
     
     if status == 'critical':
         query = query.filter(Product.current_stock < Product.minimum_stock)
@@ -556,13 +556,8 @@ def qr_code(id):
 
     # ÇELMAK etiket formatında QR kod oluştur
     base_url = current_app.config.get('BASE_URL', 'http://localhost:5000')
-    qr_data = f"{base_url}/products/{product.id}"
-
-    img_io = generate_celmak_label(
-        qr_data=qr_data,
-        part_no=product.code,
-        part_name=product.name
-    )
+    job = label_batch.product_label_job(product, base_url, logo_fallback=True)
+    img_io = io.BytesIO(label_batch.render_one(job, label_batch.cache_dir()))
 
     return send_file(
         img_io,
@@ -579,13 +574,8 @@ def download_qr(id):
 
     # ÇELMAK etiket formatında QR kod oluştur
     base_url = current_app.config.get('BASE_URL', 'http://localhost:5000')
-    qr_data = f"{base_url}/products/{product.id}"
-
-    img_io = generate_celmak_label(
-        qr_data=qr_data,
-        part_no=product.code,
-        part_name=product.name
-    )
+    job = label_batch.product_label_job(product, base_url, logo_fallback=True)
+    img_io = io.BytesIO(label_batch.render_one(job, label_batch.cache_dir()))
 
     return send_file(
         img_io,
@@ -594,6 +584,21 @@ def download_qr(id):
         download_name=f'etiket_{product.code}.png'
     )
 
+def _label_zip_response(jobs, download_name):
+    """Etiketleri üretildikçe ZIP olarak akıtır; indirme ilk etiketle başlar.
+    Toplam boyut önceden bilinmez, X-Label-Count ilerleme için etiket sayısını verir."""
+    stream = label_batch.stream_label_zip(jobs, label_batch.cache_dir(), label_batch.worker_count())
+    return Response(
+        stream,
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename="{download_name}"',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no',      # ters vekil sunucu yanıtı tamponlamasın
+            'X-Label-Count': str(len(jobs)),
+        }
+    )
+
 @products_bp.route('/qr/bulk-download', methods=['POST'])
 @login_required
 @roles_required('Genel', 'Yönetici', 'Personel')
@@ -605,44 +610,14 @@ def bulk_download_qr():
         flash('Lütfen en az bir ürün seçin.', 'error')
         return redirect(url_for('products.index'))
 
-    # ZIP dosyası oluştur
-    zip_buffer = io.BytesIO()
-
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        base_url = current_app.config.get('BASE_URL', 'http://localhost:5000')
-
-        for product_id in product_ids:
-            try:
-                product = Product.query.get(int(product_id))
-                if not product:
-                    continue
-
-                # QR etiket oluştur
-                qr_data = f"{base_url}/products/{product.id}"
-                img_io = generate_celmak_label(
-                    qr_data=qr_data,
-                    part_no=product.code,
-                    part_name=product.name
-                )
-
-                # ZIP'e ekle
-                filename = f'etiket_{product.code}.png'
-                zip_file.writestr(filename, img_io.getvalue())
-
-            except Exception as e:
-                print(f"Hata (Ürün {product_id}): {e}")
-                continue
-
-    zip_buffer.seek(0)
+    ids = [int(pid) for pid in product_ids if str(pid).isdigit()]
+    base_url = current_app.config.get('BASE_URL', 'http://localhost:5000')
+    products = Product.query.filter(Product.id.in_(ids)).all() if ids else []
+    jobs = [label_batch.product_label_job(p, base_url, logo_fallback=True) for p in products]
 
-    # ZIP dosyasını indir
+    # ZIP dosyasını akış olarak indir
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    return send_file(
-        zip_buffer,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=f'qr_etiketleri_{timestamp}.zip'
-    )
+    return _label_zip_response(jobs, f'qr_etiketleri_{timestamp}.zip')
 
 @products_bp.route('/qr/download-all')
 @login_required
@@ -666,50 +641,23 @@ def download_all_qr():
             )
         )
 
-    products = query.order_by(Product.name).all()
+    # Etiket için yalnızca id/kod/ad yeterli; binlerce tam ürün nesnesi yüklenmez
+    products = query.with_entities(Product.id, Product.code, Product.name).order_by(Product.name).all()
 
     if not products:
         flash('İndirilecek ürün bulunamadı.', 'warning')
         return redirect(url_for('products.index'))
 
-    # ZIP dosyası oluştur
-    zip_buffer = io.BytesIO()
-
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        base_url = current_app.config.get('BASE_URL', 'http://localhost:5000')
-
-        for product in products:
-            try:
-                # QR etiket oluştur
-                qr_data = f"{base_url}/products/{product.id}"
-                img_io = generate_celmak_label(
-                    qr_data=qr_data,
-                    part_no=product.code,
-                    part_name=product.name
-                )
-
-                # ZIP'e ekle
-                filename = f'etiket_{product.code}.png'
-                zip_file.writestr(filename, img_io.getvalue())
-
-            except Exception as e:
-                print(f"Hata (Ürün {product.code}): {e}")
-                continue
-
-    zip_buffer.seek(0)
+    base_url = current_app.config.get('BASE_URL', 'http://localhost:5000')
+    jobs = [label_batch.product_label_job(p, base_url, logo_fallback=True) for p in products]
 
-    # ZIP dosyasını indir
+    # ZIP dosyasını akış olarak indir
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f'tum_qr_etiketleri_{timestamp}.zip'
 
     flash(f'{len(products)} ürünün QR etiketi indirildi.', 'success')
 
-    return send_file(
-        zip_buffer,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=filename
-    )
+    return _label_zip_response(jobs, filename)
 
 @products_bp.route('/categories')
 @login_required
@@ -896,12 +844,13 @@ def export_products():
             )
         )
     
-    products = query.order_by(Product.name).all()
-    
-    if not products:
+    if query.first() is None:
         flash('Dışa aktarılacak ürün bulunamadı.', 'warning')
         return redirect(url_for('products.index'))
     
+    # Ürünler sayfa sayfa akıtılır; kitap salt yazma modunda geçici dosyaya yazılır
+    from sqlalchemy.orm import joinedload
+    products = query.options(joinedload(Product.category)).order_by(Product.name).yield_per(500)
     excel_file = export_products_to_excel(products)
     
     filename = f'urunler_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
@@ -939,11 +888,14 @@ def bulk_qr():
     products = query.order_by(Product.name).paginate(page=page, per_page=50)
     categories = Category.query.all()
 
+    from app.utils.label_pdf import LABEL_SHEETS, DEFAULT_SHEET
     return render_template('products/bulk_qr.html',
         products=products,
         categories=categories,
         selected_category=category_id,
-        search=search
+        search=search,
+        label_sheets=LABEL_SHEETS,
+        default_sheet=DEFAULT_SHEET
     )
 
 
@@ -951,9 +903,10 @@ def bulk_qr():
 @login_required
 @roles_required('Genel', 'Yönetici', 'Personel')
 def generate_bulk_qr():
-    """Seçili ürünler için toplu QR kod oluştur ve ZIP olarak indir"""
+    """Seçili ürünler için toplu QR kod oluştur; ZIP (PNG) ya da PDF etiket sayfası olarak indir"""
     product_ids = request.form.getlist('product_ids[]')
     label_size = request.form.get('label_size', 'medium')  # small, medium, large
+    output_format = request.form.get('format', 'zip')      # zip, pdf
 
     if not product_ids:
         flash('Lütfen en az bir ürün seçin.', 'warning')
@@ -966,40 +919,33 @@ def generate_bulk_qr():
         flash('Seçili ürünler bulunamadı.', 'error')
         return redirect(url_for('products.bulk_qr'))
 
-    # ZIP dosyası oluştur
-    zip_buffer = io.BytesIO()
-
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for product in products:
-            # QR kod verisi
-            qr_data = f"{current_app.config.get('BASE_URL', 'http://localhost:5000')}/products/{product.id}"
-
-            # Etiket oluştur
-            label_image = generate_celmak_label_with_size(
-                qr_data=qr_data,
-                part_no=product.code,
-                part_name=product.name,
-                size=label_size
-            )
-
-            # Dosya adı
-            filename = f"{product.code}_{product.name[:30]}.png".replace('/', '_').replace('\\', '_')
-
-            # ZIP'e ekle
-            zip_file.writestr(filename, label_image.getvalue())
+    base_url = current_app.config.get('BASE_URL', 'http://localhost:5000')
+    jobs = [
+        label_batch.product_label_job(
+            product, base_url, size=label_size,
+            filename=f"{product.code}_{product.name[:30]}.png".replace('/', '_').replace('\\', '_'))
+        for product in products
+    ]
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-    zip_buffer.seek(0)
+    if output_format == 'pdf':
+        # Tek PDF: etiketler sayfaya dizilir, logo/şablon bir kez gömülür
+        from app.utils.label_pdf import LABEL_SHEETS, SHEET_FOR_SIZE, DEFAULT_SHEET, render_label_pdf
+        sheet = request.form.get('sheet') or SHEET_FOR_SIZE.get(label_size, DEFAULT_SHEET)
+        if sheet not in LABEL_SHEETS:
+            flash('Geçersiz etiket sayfası seçimi.', 'error')
+            return redirect(url_for('products.bulk_qr'))
+        return send_file(
+            render_label_pdf(jobs, sheet),
+            as_attachment=True,
+            download_name=f'qr_etiketleri_{sheet}_{timestamp}.pdf',
+            mimetype='application/pdf'
+        )
 
-    # ZIP dosyasını indir
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    # ZIP dosyasını akış olarak indir
     zip_filename = f'qr_etiketleri_{label_size}_{timestamp}.zip'
 
-    return send_file(
-        zip_buffer,
-        as_attachment=True,
-        download_name=zip_filename,
-        mimetype='application/zip'
-    )
+    return _label_zip_response(jobs, zip_filename)
 
 
 @products_bp.route('/preview-qr/<int:product_id>')
@@ -1010,14 +956,9 @@ def preview_qr(product_id):
     product = Product.query.get_or_404(product_id)
     label_size = request.args.get('size', 'medium')
 
-    qr_data = f"{current_app.config.get('BASE_URL', 'http://localhost:5000')}/products/{product.id}"
-
-    label_image = generate_celmak_label_with_size(
-        qr_data=qr_data,
-        part_no=product.code,
-        part_name=product.name,
-        size=label_size
-    )
+    base_url = current_app.config.get('BASE_URL', 'http://localhost:5000')
+    job = label_batch.product_label_job(product, base_url, size=label_size)
+    label_image = io.BytesIO(label_batch.render_one(job, label_batch.cache_dir()))
 
     return send_file(
         label_image,
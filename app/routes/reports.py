@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, Response, current_app, jsonify, session, redirect, url_for, g, send_file
+from flask import Blueprint, render_template, request, Response, current_app, jsonify, session, redirect, url_for, g, send_file, flash, stream_with_context
 from flask_login import login_required, current_user
 from app.models import Product, Category, StockMovement, CountSession, CountItem, ProductionRecord
 from app import db
@@ -8,6 +8,11 @@ import csv
 import io
 import google.generativeai as genai
 from app.utils.decorators import roles_required
+from app.utils.product_search import (
+    fold_search_text as _fold_search_text,
+    turkish_stem as _turkish_stem,
+    turkish_stem_aggressive as _turkish_stem_aggressive,
+)
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -43,71 +48,11 @@ def _normalize_search_keyword(keyword):
     return cleaned or ([raw] if raw else [])
 
 
-def _fold_search_text(value):
-    import unicodedata
-
-    text = str(value or '').lower()
-    text = (
-        text.replace('ı', 'i')
-        .replace('İ'.lower(), 'i')
-        .replace('ğ', 'g')
-        .replace('ü', 'u')
-        .replace('ş', 's')
-        .replace('ö', 'o')
-        .replace('ç', 'c')
-    )
-    text = text.translate(str.maketrans('ıİğĞüÜşŞöÖçÇ', 'iIgGuUsSoOcC')).lower()
-    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
-
-
 def _search_haystack(*values):
     raw = " ".join(str(value or '') for value in values).lower()
     return f"{raw} {_fold_search_text(raw)}"
 
 
-# Türkçe çekim eklerini kırpan basit stemmer.
-# Amaç: "tamburlunun" → "tamburlu", "makinesinin" → "makine", "tamburunun" → "tambur"
-# gibi sorgu kelimelerini ürün/BOM adlarıyla eşleşecek köke indirgemek.
-# Substring eşleşmesi yapıldığı için hafif fazla kırpma zarar vermez; az kırpmak sorundur.
-# NOT: 'unun/ünün/inin/ının' bilerek listede YOK — kök sesliyle bitiyorsa fazla kırparlar
-# (örn. "tamburlunun" → yanlışlıkla "tamburl"). Onun yerine 'nun/nin' ile "tamburlu" elde edilir.
-# "tamburunun" gibi durumlar için ilike tarafında ayrıca agresif (son sesli düşmüş) varyant OR'lanır.
-_TR_STEM_SUFFIXES = sorted([
-    # iyelik + ilgi/belirtme bileşik ekleri (en uzunlar)
-    'larinin', 'lerinin', 'larindan', 'lerinden', 'larinda', 'lerinde',
-    'sinin', 'sının', 'sunun', 'sünün', 'nunun', 'nünün',
-    'ndan', 'nden', 'nda', 'nde',
-    # ayrılma / bulunma / yönelme
-    'dan', 'den', 'tan', 'ten', 'da', 'de', 'ta', 'te',
-    # çokluk
-    'lar', 'ler',
-    # iyelik / belirtme
-    'sini', 'sını', 'lari', 'leri', 'nin', 'nın', 'nun', 'nün',
-    'si', 'sı', 'su', 'sü', 'yi', 'yı', 'yu', 'yü',
-    'in', 'ın', 'un', 'ün', 'ya', 'ye', 'na', 'ne',
-], key=len, reverse=True)
-
-_TR_VOWELS = set('aeıioöuüâî')
-
-
-def _turkish_stem(term):
-    t = str(term or '').lower()
-    if t.isdigit() or len(t) <= 4:
-        return t
-    for suf in _TR_STEM_SUFFIXES:
-        if t.endswith(suf) and len(t) - len(suf) >= 4:
-            return t[:-len(suf)]
-    return t
-
-
-def _turkish_stem_aggressive(term):
-    """Konservatif kökten sonra bir sondaki sesliyi de düşürür ('tamburu' → 'tambur')."""
-    s = _turkish_stem(term)
-    if len(s) > 4 and s[-1] in _TR_VOWELS:
-        return s[:-1]
-    return s
-
-
 def _search_terms(terms):
     # Folded + stemlenmiş varyant (1:1 — terim sayısı korunur ki match_score/len mantığı bozulmasın)
     expanded = []
@@ -138,6 +83,8 @@ def _name_extra_token_count(name, lowered_terms):
 
 
 def _product_search_query(keyword):
+    from app.utils import product_search
+
     terms = _normalize_search_keyword(keyword)
     # Miktar belirten sayıyı arama terimlerinden eliyoruz ki aramayı kısıtlamasın
     qty = _extract_quantity(keyword)
@@ -149,66 +96,12 @@ def _product_search_query(keyword):
     if not terms:
         return query, terms
 
-    filters = []
-    for term in terms:
-        # Türkçe ekleri kırp ("tamburlunun" → "tamburlu"). Hem konservatif hem agresif
-        # kökü OR'la ki "tamburunun" → "tambur" gibi alt parça aramaları da yakalansın.
-        stems = {term, _turkish_stem(term), _turkish_stem_aggressive(term)}
-        like_filters = []
-        for st in stems:
-            if not st:
-                continue
-            like = f'%{st}%'
-            like_filters.extend([
-                Product.name.ilike(like),
-                Product.code.ilike(like),
-                Product.barcode.ilike(like),
-                Product.material.ilike(like),
-                Product.notes.ilike(like),
-                Product.category.has(Category.name.ilike(like)),
-            ])
-        filters.append(db.or_(*like_filters))
-
-    # Prefer products matching all meaningful words; fall back to any word.
-    strict_query = query.filter(*filters)
-    if strict_query.first():
-        return strict_query, terms
-
-    # EĞER BİRDEN FAZLA KELİME VARSA VE STRICT EŞLEŞME BULUNAMADIYSA:
-    # Sayısal olmayan anlamlı kelimeleri tercih et (örn: "tamburlu 200" sorgusunda sadece "tamburlu"yu ara).
-    non_numeric_filters = [f for f, term in zip(filters, terms) if not term.isdigit()]
-    if non_numeric_filters:
-        loose_query = query.filter(db.or_(*non_numeric_filters))
-    else:
-        loose_query = query.filter(db.or_(*filters))
-
-    if loose_query.first():
-        return loose_query, terms
-
-    folded_terms = _search_terms(terms)
-    meaningful_folded_terms = [t for t in folded_terms if not t.isdigit()]
-    if not meaningful_folded_terms:
-        meaningful_folded_terms = folded_terms
-
-    scored = []
-    for product in query.limit(2000).all():
-        haystack = _search_haystack(
-            product.name,
-            product.code,
-            product.barcode,
-            product.material,
-            product.notes,
-            product.category.name if product.category else '',
-        )
-        score = sum(1 for term in meaningful_folded_terms if term and term in haystack)
-        if score:
-            scored.append((score, product.id))
-
-    if scored:
-        ids = [product_id for _, product_id in sorted(scored, reverse=True)[:100]]
-        return query.filter(Product.id.in_(ids)), terms
-
-    return loose_query, terms
+    # Tüm anlamlı kelimeleri içeren ürünler tercih edilir; yoksa herhangi biri.
+    # Birden fazla kelimede sayısal olmayanlar tercih edilir
+    # (örn: "tamburlu 200" sorgusunda sadece "tamburlu"yu ara).
+    # Türkçe ekler indekste kırpılır ("tamburlunun" → "tamburlu" / "tambur").
+    non_numeric_terms = [term for term in terms if not term.isdigit()]
+    return product_search.ranked_search(query, terms, non_numeric_terms), terms
 
 
 # ===========================================================================
@@ -534,8 +427,8 @@ def get_product_costs(keyword: str = "") -> dict:
 
     # BOM kökü olan ürünleri öne al (mamul tipinde ve BOM'da kök olarak yer alanlar)
     try:
-        from app.utils.bom_utils import list_boms
-        bom_map = {b.get('product_id'): b.get('bom_id') for b in list_boms(db) if b.get('product_id')}
+        from app.utils.where_used import bom_roots
+        bom_map = {pid: b['bom_id'] for pid, b in bom_roots().items()}
     except Exception:
         bom_map = {}
     bom_product_ids = set(bom_map.keys())
@@ -865,8 +758,8 @@ def calculate_cost_for_quantity(keyword: str, quantity: int) -> dict:
     if not snapshot:
         pq, _ = _product_search_query(keyword)
         try:
-            from app.utils.bom_utils import list_boms
-            bom_ids = {b.get('product_id') for b in list_boms(db) if b.get('product_id')}
+            from app.utils.where_used import bom_roots
+            bom_ids = set(bom_roots())
         except Exception:
             bom_ids = set()
         type_order = {'mamul': 0, 'yarimamul': 1, 'hazir_parca': 2, 'hammadde': 3}
@@ -1019,8 +912,8 @@ def get_stock_recommendation(keyword: str) -> dict:
 
     # BOM kökü / mamul öncelikli
     try:
-        from app.utils.bom_utils import list_boms
-        bom_ids = {b.get('product_id') for b in list_boms(db) if b.get('product_id')}
+        from app.utils.where_used import bom_roots
+        bom_ids = set(bom_roots())
     except Exception:
         bom_ids = set()
 
@@ -2144,8 +2037,8 @@ def find_products(query: str, limit: int = 8) -> dict:
     limit = max(1, min(int(limit or 8), 20))
 
     try:
-        from app.utils.bom_utils import list_boms
-        bom_map = {b["product_id"]: b for b in list_boms(db) if b.get("product_id")}
+        from app.utils.where_used import bom_roots
+        bom_map = bom_roots()
     except Exception:
         bom_map = {}
 
@@ -2590,7 +2483,7 @@ def _cost_report_analysis(stats):
 @roles_required('Genel')
 def cost_report():
     """Maliyet raporu ve analizleri"""
-    from app.utils.bom_utils import get_bom_tree, list_boms
+    from app.utils import bom_cost_snapshot
 
     products = Product.query.filter_by(is_active=True).all()
     priced_products = [p for p in products if p.unit_cost and p.unit_cost > 0]
@@ -2653,30 +2546,13 @@ def cost_report():
         reverse=True
     )[:10]
 
-    bom_costs = []
-    bom_missing_cost_count = 0
-    for bom in list_boms(db):
-        tree = get_bom_tree(bom['bom_id'], db)
-        roots = tree.get('roots') or []
-        if not roots:
-            continue
-        nodes = list(_iter_bom_nodes(roots))
-        leaf_nodes = [node for node in nodes if not node.get('children')]
-        missing = sum(
-            1 for node in leaf_nodes
-            if not (node.get('unit_cost') and node.get('unit_cost') > 0)
-            and not (node.get('total_cost') and node.get('total_cost') > 0)
-        )
-        bom_missing_cost_count += missing
-        root = roots[0]
-        bom_costs.append({
-            'bom_id': bom['bom_id'],
-            'name': bom.get('root_name') or f"BOM #{bom['bom_id']}",
-            'total_cost': float(root.get('total_cost') or 0),
-            'currency': root.get('currency') or 'TRY',
-            'node_count': bom.get('node_count') or len(nodes),
-            'missing_cost_count': missing,
-        })
+    # BOM maliyetleri önceden hesaplanmış özetten okunur (bkz. app/utils/bom_cost_snapshot.py);
+    # özet eskiyse ya da hiç yoksa arka planda yenilenir, sayfa beklemez.
+    snapshot = bom_cost_snapshot.snapshot_state()
+    if bom_cost_snapshot.refresh_if_due(current_app._get_current_object(), snapshot):
+        snapshot['refreshing'] = True
+    bom_costs = snapshot['rows']
+    bom_missing_cost_count = sum(row['missing_cost_count'] for row in bom_costs)
 
     bom_costs = sorted(bom_costs, key=lambda row: row['total_cost'], reverse=True)[:10]
 
@@ -2695,6 +2571,8 @@ def cost_report():
         'bom_costs': bom_costs,
         'bom_count': len(bom_costs),
         'bom_missing_cost_count': bom_missing_cost_count,
+        'bom_costs_computed_at': snapshot['computed_at'],
+        'bom_costs_refreshing': snapshot['refreshing'],
         'analysis': [],
     }
     stats['analysis'] = _cost_report_analysis(stats)
@@ -2702,6 +2580,20 @@ def cost_report():
     return render_template('reports/costs.html', stats=stats)
 
 
+@reports_bp.route('/costs/refresh', methods=['POST'])
+@login_required
+@roles_required('Genel')
+def cost_report_refresh():
+    """Ürün ağacı maliyet özetini arka planda yeniden hesaplat."""
+    from app.utils import bom_cost_snapshot
+
+    if bom_cost_snapshot.start_background_refresh(current_app._get_current_object()):
+        flash('Ürün ağacı maliyetleri arka planda yeniden hesaplanıyor. Birkaç dakika sonra sayfayı yenileyin.', 'info')
+    else:
+        flash('Maliyet hesaplaması zaten çalışıyor.', 'warning')
+    return redirect(url_for('reports.cost_report'))
+
+
 # ================== STOK RAPORLARI ==================
 
 @reports_bp.route('/stock')
@@ -3142,24 +3034,10 @@ def counting_detail(id):
 @roles_required('Genel')
 def warehouse_report():
     """Depo durumu raporu"""
-    categories = Category.query.all()
-    
-    # Kategori bazlı stok durumu
-    category_stats = []
-    for cat in categories:
-        products = Product.query.filter_by(category_id=cat.id, is_active=True).all()
-        total_items = len(products)
-        total_stock = sum(p.current_stock for p in products)
-        critical_items = sum(1 for p in products if p.minimum_stock > 0 and p.current_stock < p.minimum_stock)
-        empty_items = sum(1 for p in products if p.current_stock <= 0)
-        
-        category_stats.append({
-            'category': cat,
-            'total_items': total_items,
-            'total_stock': total_stock,
-            'critical_items': critical_items,
-            'empty_items': empty_items
-        })
+    from app.utils.stock_summary import category_stats as summary_category_stats
+
+    # Kategori bazlı stok durumu (özet tablosundan, tek sorgu)
+    category_stats = summary_category_stats(active_only=False)
     
     # Genel özet
     total_products = Product.query.filter_by(is_active=True).count()
@@ -3224,28 +3102,48 @@ def export_products():
 @login_required
 @roles_required('Genel')
 def export_movements():
-    """Stok hareketlerini CSV olarak dışa aktar"""
-    movements = StockMovement.query.order_by(StockMovement.date.desc()).limit(1000).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow(['Tarih', 'Ürün', 'Hareket Tipi', 'Miktar', 'Kaynak', 'Hedef', 'Not'])
-    
-    for m in movements:
-        writer.writerow([
-            m.date.strftime('%Y-%m-%d %H:%M') if m.date else '',
-            m.product.name if m.product else '',
-            m.movement_type,
-            m.quantity,
-            m.source or '',
-            m.destination or '',
-            m.note or ''
-        ])
-    
-    output.seek(0)
+    """Stok hareketlerinin tamamını dışa aktar (varsayılan CSV, ?format=xlsx ile Excel).
+    Hareketler sayfa sayfa okunur ve yanıt akıtılır; bellek kullanımı geçmişin
+    uzunluğundan bağımsızdır."""
+    from sqlalchemy.orm import joinedload
+
+    movements = (StockMovement.query
+                 .options(joinedload(StockMovement.product).joinedload(Product.category),
+                          joinedload(StockMovement.user))
+                 .order_by(StockMovement.date.desc(), StockMovement.id.desc())
+                 .yield_per(1000))
+
+    if request.args.get('format') == 'xlsx':
+        from app.utils.excel_utils import export_stock_movements_to_excel
+        return send_file(
+            export_stock_movements_to_excel(movements),
+            as_attachment=True,
+            download_name=f'hareketler_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+
+    def generate():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['Tarih', 'Ürün', 'Hareket Tipi', 'Miktar', 'Kaynak', 'Hedef', 'Not'])
+        for i, m in enumerate(movements, 1):
+            writer.writerow([
+                m.date.strftime('%Y-%m-%d %H:%M') if m.date else '',
+                m.product.name if m.product else '',
+                m.movement_type,
+                m.quantity,
+                m.source or '',
+                m.destination or '',
+                m.note or ''
+            ])
+            if i % 1000 == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+        yield output.getvalue()
+
     return Response(
-        output.getvalue(),
+        stream_with_context(generate()),
         mimetype='text/csv',
         headers={'Content-Disposition': 'attachment;filename=hareketler.csv'}
     )
@@ -2,7 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app.models import Product, StockMovement, Category, Location, LocationStock, ProductionRecord
 from app import db
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import json
 from sqlalchemy import inspect
 from app.utils.decorators import roles_required
@@ -329,9 +329,10 @@ def quick_movement():
     } for p in products], ensure_ascii=False)
     
     # Bugünkü son hareketler
-    today = date.today()
+    today_start = datetime.combine(date.today(), datetime.min.time())
     recent_movements = StockMovement.query.filter(
-        db.func.date(StockMovement.date) == today
+        StockMovement.date >= today_start,
+        StockMovement.date < today_start + timedelta(days=1)
     ).order_by(StockMovement.date.desc()).limit(10).all()
     
     return render_template('stock/quick.html', products=products, products_json=products_json, recent_movements=recent_movements)
@@ -524,10 +525,9 @@ def search_products():
     if len(query) < 2:
         return jsonify([])
     
-    products = Product.query.filter(
-        Product.is_active == True,
-        Product.name.ilike(f'%{query}%')
-    ).order_by(Product.name).limit(20).all()
+    from app.utils import product_search
+    products = product_search.search_products(Product.query.filter(Product.is_active == True), query) \
+        .options(db.joinedload(Product.category)).order_by(Product.name).limit(20).all()
     
     result = []
     for p in products:
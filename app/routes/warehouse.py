@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from app.models import Product, Category, Location, LocationStock, StockMovement
 from app import db
 from app.utils.decorators import roles_required
+from app.utils import stock_summary
 from sqlalchemy import func
 
 warehouse_bp = Blueprint('warehouse', __name__)
@@ -24,35 +25,13 @@ def index():
         Product.current_stock <= 0
     ).all()
     
-    # Kategori bazlı stok özeti
-    categories = Category.query.filter_by(is_active=True).all()
-    category_stats = []
-    for cat in categories:
-        products = Product.query.filter_by(category_id=cat.id, is_active=True).all()
-        total_items = len(products)
-        critical_items = sum(1 for p in products if p.minimum_stock > 0 and p.current_stock < p.minimum_stock)
-        empty_items = sum(1 for p in products if p.current_stock <= 0)
-        total_stock_value = sum(p.current_stock * (p.unit_cost or 0) for p in products)
-        category_stats.append({
-            'category': cat,
-            'total_items': total_items,
-            'critical_items': critical_items,
-            'empty_items': empty_items,
-            'total_value': total_stock_value
-        })
-    
-    # Lokasyon özeti
-    locations = Location.query.filter_by(is_active=True).all()
-    location_stats = []
-    for loc in locations:
-        stocks = LocationStock.query.filter_by(location_id=loc.id).all()
-        total_products = len(stocks)
-        total_quantity = sum(s.quantity for s in stocks)
-        location_stats.append({
-            'location': loc,
-            'total_products': total_products,
-            'total_quantity': total_quantity
-        })
+    # Kategori / lokasyon bazlı stok özeti (özet tablolarından, tek sorgu)
+    category_stats = stock_summary.category_stats()
+    location_stats = [{
+        'location': stat['location'],
+        'total_products': stat['total_products'],
+        'total_quantity': stat['total_quantity']
+    } for stat in stock_summary.location_stats()]
     
     # Genel istatistikler
     total_products = Product.query.filter_by(is_active=True).count()
@@ -92,20 +71,13 @@ def locations():
     active_locations = Location.query.filter_by(is_active=True).order_by(Location.name).all()
     inactive_locations = Location.query.filter_by(is_active=False).order_by(Location.name).all()
     
-    # Her lokasyon için stok bilgileri
-    location_data = []
-    for loc in active_locations:
-        stocks = LocationStock.query.filter_by(location_id=loc.id).all()
-        total_products = len(stocks)
-        total_quantity = sum(s.quantity for s in stocks if s.quantity > 0)
-        product_count = sum(1 for s in stocks if s.quantity > 0)
-        
-        location_data.append({
-            'location': loc,
-            'total_products': total_products,
-            'product_count': product_count,
-            'total_quantity': total_quantity
-        })
+    # Her lokasyon için stok bilgileri (özet tablosundan)
+    location_data = [{
+        'location': stat['location'],
+        'total_products': stat['total_products'],
+        'product_count': stat['product_count'],
+        'total_quantity': stat['positive_quantity']
+    } for stat in stock_summary.location_stats(order_by=Location.name)]
     
     return render_template('warehouse/locations.html',
         location_data=location_data,
@@ -0,0 +1,240 @@
+"""
+BOM Soy Ağacı İndeksi (bom_closure)
+===================================
+`_descendant_ids`, `_renumber_subtree`, `move_bom_node` ve `delete_bom_node`
+her çağrıda BOM'un TÜM kenarlarını yükleyip Python'da BFS yapıyordu;
+`_renumber_subtree` ayrıca her seviye için ayrı sorgu atıyordu.
+
+`bom_closure` tablosu her (ata, torun, derinlik) çiftini tutar; alt ağaç ve
+ata sorguları tek SQL'dir, taşıma ve silme de indeks üzerinde küme tabanlı
+birer ifadeyle güncellenir.
+
+Güncellik: indeks, kurulduğu andaki (bom:<id>, bom_items) damgalarından
+türetilen bir token ile `bom_closure:<id>` kapsamında işaretlenir. Düğüm
+ekleme/taşıma/silme indeksi aynı transaction içinde artımlı günceller ve
+token'ı yeniler. İçe aktarma, BOM güncelleme, toplu silme gibi diğer
+yazmalar damgayı değiştirir; o BOM'un indeksi ilk sorguda kenarlardan baştan
+kurulur. İzleme kapalıysa (bkz. versioning) indeks kullanılmaz ve eski kenar
+taraması yapılır.
+"""
+import hashlib
+
+from sqlalchemy import delete, insert, literal, select, true
+from sqlalchemy.exc import IntegrityError
+
+from app.utils import versioning
+
+_enabled = False
+
+
+def closure_scope(bom_id: int) -> str:
+    return f'bom_closure:{bom_id}'
+
+
+def _scopes(bom_id: int) -> tuple:
+    return (versioning.bom_scope(bom_id), versioning.SCOPE_BOM_ITEMS, closure_scope(bom_id))
+
+
+def _token_for(signature) -> str:
+    return hashlib.sha1(repr(tuple(signature[:2])).encode('utf-8')).hexdigest()[:32]
+
+
+def _table():
+    from app.models import BomClosure
+    return BomClosure.__table__
+
+
+def is_fresh(bom_id: int) -> bool:
+    """İndeks BOM'un şu anki hâliyle uyumlu mu? (İzleme kapalıysa False.)"""
+    if not _enabled:
+        return False
+    signature = versioning.read_signature(_scopes(bom_id))
+    return signature is not None and signature[2] == _token_for(signature)
+
+
+def _stamp(bom_id: int) -> None:
+    """İndeksi BOM'un güncel damgalarıyla işaretler. Bekleyen düğüm/kenar
+    değişiklikleri önce flush edilir (damgaları yenilensin diye)."""
+    from app import db
+
+    signature = versioning.read_signature(_scopes(bom_id))
+    if signature is not None:
+        versioning.bump(db.session.connection(), [closure_scope(bom_id)], token=_token_for(signature))
+
+
+def _children_of(bom_id: int) -> dict:
+    from app import db
+    from app.models import BomEdge
+
+    children_of: dict = {}
+    rows = db.session.query(BomEdge.parent_node_id, BomEdge.child_node_id).filter(BomEdge.bom_id == bom_id)
+    for parent_id, child_id in rows:
+        children_of.setdefault(parent_id, []).append(child_id)
+    return children_of
+
+
+def _scan_descendants(children_of: dict, node_id: int) -> set[int]:
+    descendants = set()
+    queue = [node_id]
+    while queue:
+        cur = queue.pop()
+        for child_id in children_of.get(cur, []):
+            if child_id not in descendants:
+                descendants.add(child_id)
+                queue.append(child_id)
+    return descendants
+
+
+def rebuild(bom_id: int) -> bool:
+    """BOM'un indeksini kenarlardan baştan kurar. Başka bir işçi aynı anda
+    kuruyorsa (anahtar çakışması) False döner; çağıran kenar taramasına düşer."""
+    from app import db
+
+    children_of = _children_of(bom_id)
+    child_ids = {c for kids in children_of.values() for c in kids}
+    starts = list(children_of.get(None, [])) + [p for p in children_of if p is not None and p not in child_ids]
+
+    rows = []
+    seen = set()
+    # Özyinelemesiz DFS: yığında (düğüm, kökten düğüme ata zinciri)
+    stack = [(node_id, ()) for node_id in reversed(starts)]
+    while stack:
+        node_id, ancestors = stack.pop()
+        if node_id in seen:
+            continue
+        seen.add(node_id)
+        rows.append({'ancestor_id': node_id, 'descendant_id': node_id, 'bom_id': bom_id, 'depth': 0})
+        for depth, ancestor_id in enumerate(reversed(ancestors), start=1):
+            rows.append({'ancestor_id': ancestor_id, 'descendant_id': node_id, 'bom_id': bom_id, 'depth': depth})
+        chain = ancestors + (node_id,)
+        for child_id in reversed(children_of.get(node_id, [])):
+            stack.append((child_id, chain))
+
+    table = _table()
+    try:
+        with db.session.begin_nested():
+            db.session.execute(delete(table).where(table.c.bom_id == bom_id))
+            if rows:
+                db.session.execute(insert(table), rows)
+    except IntegrityError:
+        return False
+    _stamp(bom_id)
+    return True
+
+
+def ensure(bom_id: int) -> bool:
+    """İndeks güncel değilse kurar. Kullanılabilir indeks varsa True."""
+    if not _enabled:
+        return False
+    signature = versioning.read_signature(_scopes(bom_id))
+    if signature is None:
+        return False
+    if signature[2] == _token_for(signature):
+        return True
+    return rebuild(bom_id)
+
+
+def descendant_ids(bom_id: int, node_id: int) -> set[int]:
+    """node_id'nin tüm alt ağacındaki düğüm id'leri (node_id hariç)."""
+    from app import db
+
+    if not ensure(bom_id):
+        return _scan_descendants(_children_of(bom_id), node_id)
+    table = _table()
+    rows = db.session.execute(
+        select(table.c.descendant_id).where(table.c.ancestor_id == node_id, table.c.depth > 0)
+    )
+    return {descendant_id for (descendant_id,) in rows}
+
+
+def ancestor_ids(bom_id: int, node_id: int) -> list[int]:
+    """node_id'nin ataları, en yakından köke doğru (node_id hariç)."""
+    from app import db
+
+    if not ensure(bom_id):
+        parent_of = {c: p for p, kids in _children_of(bom_id).items() for c in kids}
+        chain = []
+        cur = parent_of.get(node_id)
+        while cur is not None and cur not in chain:
+            chain.append(cur)
+            cur = parent_of.get(cur)
+        return chain
+    table = _table()
+    rows = db.session.execute(
+        select(table.c.ancestor_id)
+        .where(table.c.descendant_id == node_id, table.c.depth > 0)
+        .order_by(table.c.depth)
+    )
+    return [ancestor_id for (ancestor_id,) in rows]
+
+
+# ---------------------------------------------------------------------------
+# Artımlı bakım — yalnızca düzenlemeden ÖNCE indeks güncelse çağrılmalı;
+# her biri sonunda indeksi yeni damgalarla işaretler.
+# ---------------------------------------------------------------------------
+
+def add_leaf(bom_id: int, parent_id: int, node_id: int) -> None:
+    """Yeni yaprak: ebeveynin tüm ataları (ve ebeveyn) + kendisi."""
+    from app import db
+
+    table = _table()
+    db.session.execute(insert(table).from_select(
+        ['ancestor_id', 'descendant_id', 'bom_id', 'depth'],
+        select(table.c.ancestor_id, literal(node_id), literal(bom_id), table.c.depth + 1)
+        .where(table.c.descendant_id == parent_id),
+    ))
+    db.session.execute(insert(table).values(ancestor_id=node_id, descendant_id=node_id, bom_id=bom_id, depth=0))
+    _stamp(bom_id)
+
+
+def move_subtree(bom_id: int, node_id: int, new_parent_id: int) -> None:
+    """Alt ağacı eski atalarından koparıp yeni ebeveynin atalarına bağlar."""
+    from app import db
+
+    table = _table()
+    subtree = select(table.c.descendant_id).where(table.c.ancestor_id == node_id).scalar_subquery()
+    db.session.execute(
+        delete(table).where(table.c.descendant_id.in_(subtree), table.c.ancestor_id.not_in(subtree))
+    )
+    sup = table.alias('sup')
+    sub = table.alias('sub')
+    db.session.execute(insert(table).from_select(
+        ['ancestor_id', 'descendant_id', 'bom_id', 'depth'],
+        select(sup.c.ancestor_id, sub.c.descendant_id, literal(bom_id), sup.c.depth + sub.c.depth + 1)
+        .select_from(sup.join(sub, true()))
+        .where(sup.c.descendant_id == new_parent_id, sub.c.ancestor_id == node_id),
+    ))
+    _stamp(bom_id)
+
+
+def remove_nodes(bom_id: int, node_ids) -> None:
+    """Silinen düğümlerin (alt ağaç bütünüyle) tüm satırlarını kaldırır."""
+    from app import db
+
+    table = _table()
+    db.session.execute(delete(table).where(table.c.descendant_id.in_(list(node_ids))))
+    _stamp(bom_id)
+
+
+def drop(bom_id: int) -> None:
+    """BOM tamamen silindiğinde indeks satırlarını kaldırır."""
+    from app import db
+
+    table = _table()
+    db.session.execute(delete(table).where(table.c.bom_id == bom_id))
+
+
+def init_bom_closure(app, db) -> bool:
+    """İndeks tablosunu (yoksa) oluşturur. Satırlar BOM başına ilk
+    kullanımda kurulur. Tablo oluşturulamazsa indeks kapalı kalır."""
+    global _enabled
+    from app.models import BomClosure
+
+    with app.app_context():
+        try:
+            BomClosure.__table__.create(bind=db.engine, checkfirst=True)
+        except Exception as e:
+            app.logger.warning(f"bom_closure tablosu oluşturulamadı: {e}")
+            return False
+    _enabled = True
+    return True
@@ -0,0 +1,212 @@
+"""
+BOM Maliyet Özeti (bom_cost_snapshot)
+=====================================
+Maliyet raporu (`reports.cost_report`) her istekte TÜM BOM'ları derleyip roll-up
+yapıyordu; büyük veride sayfa gunicorn'un 120 sn zaman aşımına takılıyordu.
+
+Artık BOM başına kök maliyeti, maliyeti eksik yaprak sayısı ve düğüm sayısı
+`bom_cost_snapshot` tablosunda tutulur ve sayfa yalnızca bu tablodan okunur.
+Tablo şu yollarla yenilenir:
+  - `python run.py refresh-bom-costs` (cron / systemd timer ile periyodik,
+    bkz. celmakstok-bom-costs.timer),
+  - rapor sayfası açıldığında özet REFRESH_INTERVAL'dan eskiyse arka planda,
+  - sayfadaki "Yenile" düğmesiyle arka planda.
+
+Arka plan işi istek iş parçacığını bekletmez. Aynı anda yalnızca bir işin
+(işçi ya da CLI) çalışması için `cache_versions` tablosundaki bir satır kira
+(lease) olarak kullanılır: token son başlama zamanıdır, RUN_LEASE süresince
+başka iş başlamaz. Hesap, derlenmiş BOM motorunu LRU önbelleğini doldurmadan kullanır;
+ortak alt montajlar alt ağaç özetiyle bir kez hesaplanır.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.utils import versioning
+
+SCOPE_RUNNING = 'bom_cost_snapshot:running'
+
+# Rapor açıldığında özet bu süreden eskiyse arka planda yenilenir.
+REFRESH_INTERVAL = timedelta(hours=6)
+# Bir yenileme bu süreden uzun sürerse (ör. işçi öldüyse) kira düşer.
+RUN_LEASE = timedelta(minutes=30)
+
+_TOKEN_FORMAT = '%Y%m%d%H%M%S'
+
+
+def compute_bom_costs() -> list[dict]:
+    """Tüm BOM'ların maliyet özetini hesaplar (veritabanına yazmaz)."""
+    from app import db
+    from app.utils.bom_utils import list_boms
+    from app.utils import bom_engine
+
+    signature = versioning.read_signature((versioning.SCOPE_BOM_ITEMS, versioning.SCOPE_BOM_PRODUCTS))
+    rows = []
+    for bom in list_boms(db):
+        # Süreç önbelleğini (LRU) bu toplu iş için doldurmamak adına doğrudan derlenir.
+        compiled = bom_engine.compile_bom(bom['bom_id'], signature)
+        if compiled is None or not compiled.roots:
+            continue
+        summary = bom_engine.bom_cost_summary(compiled, *bom_engine.rollup(compiled))
+        rows.append({
+            'bom_id': bom['bom_id'],
+            'name': bom.get('root_name') or f"BOM #{bom['bom_id']}",
+            'total_cost': summary['total_cost'],
+            'currency': summary['currency'] or 'TRY',
+            'node_count': bom.get('node_count') or summary['node_count'],
+            'missing_cost_count': summary['missing_cost_count'],
+        })
+        # Düğüm nesneleri artık gerekmiyor; binlerce BOM'da kimlik haritası büyümesin.
+        db.session.expunge_all()
+    return rows
+
+
+def refresh_bom_cost_snapshots() -> int:
+    """Özet tablosunu tek transaction'da baştan yazar; yazılan BOM sayısını döndürür."""
+    from app import db
+    from app.models import BomCostSnapshot
+
+    rows = compute_bom_costs()
+    now = datetime.utcnow()
+    for row in rows:
+        row['computed_at'] = now
+    BomCostSnapshot.query.delete(synchronize_session=False)
+    if rows:
+        db.session.execute(BomCostSnapshot.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def snapshot_state() -> dict:
+    """Rapor için özet satırları, hesaplanma zamanı ve yenileme durumu."""
+    from app import db
+    from app.models import BomCostSnapshot
+
+    rows = BomCostSnapshot.query.all()
+    computed_at = max((r.computed_at for r in rows if r.computed_at), default=None)
+    return {
+        'rows': [{
+            'bom_id': r.bom_id,
+            'name': r.name or f'BOM #{r.bom_id}',
+            'total_cost': float(r.total_cost or 0),
+            'currency': r.currency or 'TRY',
+            'node_count': r.node_count or 0,
+            'missing_cost_count': r.missing_cost_count or 0,
+        } for r in rows],
+        'computed_at': computed_at,
+        'refreshing': _lease_active(datetime.utcnow()),
+    }
+
+
+def _lease_token():
+    token = versioning.read_signature((SCOPE_RUNNING,))
+    return token[0] if token is not None else None
+
+
+def _lease_active(now: datetime) -> bool:
+    token = _lease_token()
+    return bool(token) and token >= (now - RUN_LEASE).strftime(_TOKEN_FORMAT)
+
+
+def _claim_lease(now: datetime) -> bool:
+    """Kirayı atomik olarak alır: süresi dolmuş satırı koşullu UPDATE ile
+    devralır, satır yoksa ekler. Başka işçi kazanırsa False döner."""
+    from app import db
+    from app.models import CacheVersion
+    from sqlalchemy.exc import IntegrityError
+
+    table = CacheVersion.__table__
+    stamp = now.strftime(_TOKEN_FORMAT)
+    cutoff = (now - RUN_LEASE).strftime(_TOKEN_FORMAT)
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                table.update()
+                .where(table.c.scope == SCOPE_RUNNING, table.c.token < cutoff)
+                .values(token=stamp, updated_at=now)
+            )
+            if result.rowcount:
+                return True
+            if conn.execute(select(table.c.scope).where(table.c.scope == SCOPE_RUNNING)).first():
+                return False
+            conn.execute(table.insert().values(scope=SCOPE_RUNNING, token=stamp, updated_at=now))
+    except IntegrityError:
+        return False
+    return True
+
+
+def _release_lease() -> None:
+    from app import db
+    from app.models import CacheVersion
+
+    table = CacheVersion.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.update().where(table.c.scope == SCOPE_RUNNING)
+                     .values(token='', updated_at=datetime.utcnow()))
+
+
+def _run_refresh(app, leased: bool) -> None:
+    from app import db
+
+    with app.app_context():
+        try:
+            count = refresh_bom_cost_snapshots()
+            app.logger.info(f"BOM maliyet özeti yenilendi: {count} BOM")
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("BOM maliyet özeti yenilenemedi")
+        finally:
+            if leased:
+                _release_lease()
+
+
+def start_background_refresh(app) -> bool:
+    """Yenilemeyi arka plan iş parçacığında başlatır. Başka bir işçide iş
+    zaten çalışıyorsa başlatmaz ve False döner."""
+    now = datetime.utcnow()
+    tracking = versioning.read_signature((SCOPE_RUNNING,)) is not None
+    if tracking and not _claim_lease(now):
+        return False
+    thread = threading.Thread(target=_run_refresh, args=(app, tracking),
+                              name='bom-cost-snapshot', daemon=True)
+    thread.start()
+    return True
+
+
+def refresh_with_lease():
+    """CLI / zamanlayıcı yolu: arka plan işiyle aynı kirayı alarak yeniler.
+    Kira başka bir işçideyse (yenileme sürüyor) hiçbir şey yapmaz ve None döner;
+    aksi halde yenilenen BOM sayısını döndürür."""
+    tracking = versioning.read_signature((SCOPE_RUNNING,)) is not None
+    if tracking and not _claim_lease(datetime.utcnow()):
+        return None
+    try:
+        return refresh_bom_cost_snapshots()
+    finally:
+        if tracking:
+            _release_lease()
+
+
+def refresh_if_due(app, state: dict) -> bool:
+    """Özet hiç yoksa ya da REFRESH_INTERVAL'dan eskiyse arka planda yeniler."""
+    computed_at = state.get('computed_at')
+    if state.get('refreshing'):
+        return False
+    if computed_at is not None and datetime.utcnow() - computed_at < REFRESH_INTERVAL:
+        return False
+    return start_background_refresh(app)
+
+
+def init_bom_cost_snapshots(app, db) -> bool:
+    """Özet tablosunu (yoksa) oluşturur. İlk doldurma raporun ilk açılışında
+    ya da CLI ile yapılır — uygulama başlangıcını bekletmemek için."""
+    from app.models import BomCostSnapshot
+
+    with app.app_context():
+        try:
+            BomCostSnapshot.__table__.create(bind=db.engine, checkfirst=True)
+        except Exception as e:
+            app.logger.warning(f"bom_cost_snapshot tablosu oluşturulamadı: {e}")
+            return False
+    return True
@@ -0,0 +1,614 @@
+"""
+Derlenmiş BOM Maliyet Motoru
+============================
+`get_bom_tree` eskiden her çağrıda tüm düğüm/kenarları yeniden yükleyip, fiyatsız
+her yaprak için `_find_costing_raw_material` eşleştirmesini baştan çalıştırıyordu.
+
+Bu modül her BOM'u BİR KEZ düz dizilere derler:
+  node_ids / parents / children  — ön-sıra (pre-order) DFS düzeninde yapı
+  quantities / rollup_mult       — fireli adet ve ara düğüm çarpanı
+  product_ids / costing_ids      — bağlı kart ve maliyetin alındığı kart
+  cost_qty                       — yaprak maliyet miktarı (birim dönüşümü uygulanmış)
+  explode_qty / consume_factors  — üretim patlatması: çocuk çarpanı ve yaprak
+                                   başına stok kartı birimindeki sarf katsayısı
+  subtree_hashes                 — alt ağacın içerik özeti (kalem, miktarlar, birim,
+                                   çocuk özetleri); numaradan ve BOM'dan bağımsızdır
+Derlenen sonuç süreç genelindeki bir önbellekte tutulur ve `cache_versions`
+damgalarıyla (bkz. app/utils/versioning.py) geçersizlenir. Roll-up dizilerin
+üzerinden tek geçişlik bir döngüdür (büyük ağaçlarda aynı dizilerin NumPy
+karşılığıyla, bkz. app/utils/bom_vector.py); stok miktarı önbelleğe ALINMAZ,
+her çağrıda tek sorguyla canlı okunur.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from app.utils import versioning
+
+# Aynı anda bellekte tutulacak en fazla derlenmiş BOM sayısı (LRU).
+CACHE_MAX_ENTRIES = 256
+
+# Alt ağaç özetine göre paylaşılan düğüm kararları için en fazla kayıt sayısı.
+SUBTREE_MEMO_MAX_ENTRIES = 50000
+
+# BOM_ROLLUP_BACKEND='auto' iken NumPy motorunun devreye girdiği en az düğüm sayısı;
+# küçük ağaçlarda dizi kurma maliyeti Python döngüsünden pahalıdır.
+VECTOR_ROLLUP_MIN_NODES = 2000
+
+_cache: 'OrderedDict[int, CompiledBom]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class SubtreeMemo:
+    """Alt ağaç içerik özetine göre anahtarlanan, BOM'lar arası paylaşılan LRU
+    önbellek. Değerler kalem/kart verisine bağlı olduğundan kayıtlar
+    (bom_items, bom_products) damgasıyla saklanır; damga değişince önbellek
+    topluca boşaltılır. Damga None ise (izleme kapalı) hiçbir şey saklanmaz."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._signature = None
+        self._entries: 'OrderedDict[str, object]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, signature, key):
+        if signature is None:
+            return None
+        with self._lock:
+            if signature != self._signature:
+                return None
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, signature, key, value) -> None:
+        if signature is None:
+            return
+        with self._lock:
+            if signature != self._signature:
+                self._entries.clear()
+                self._signature = signature
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._signature = None
+
+
+_node_memo = SubtreeMemo(SUBTREE_MEMO_MAX_ENTRIES)
+
+
+class CompiledBom:
+    """Bir BOM'un düz dizi gösterimi. Tüm diziler aynı indeks uzayını kullanır;
+    her düğüm kendi çocuklarından ÖNCE gelir, kardeşler numaraya göre sıralıdır.
+    Bu yüzden dizi sondan başa gezildiğinde her çocuk ebeveyninden önce işlenir."""
+
+    __slots__ = (
+        'bom_id', 'node_ids', 'parents', 'children', 'roots', 'sibling_rank', 'subtree_end', 'positions',
+        'quantities', 'rollup_mult', 'rolls_up', 'cost_qty',
+        'product_ids', 'costing_ids', 'prices', 'rows', 'signature',
+        'explode_qty', 'consume_factors', 'leaf_issues', 'subtree_hashes', 'vector', 'costs',
+    )
+
+    def __init__(self, bom_id: int):
+        self.bom_id = bom_id
+        self.node_ids: list[int] = []
+        self.parents: list[int] = []          # ebeveyn indeksi, kökte -1
+        self.children: list[tuple] = []       # çocuk indeksleri (numara sırasında)
+        self.roots: tuple = ()
+        self.sibling_rank: list[int] = []     # düğümün ebeveyninin çocukları (ya da kökler) içindeki sırası
+        self.subtree_end: list[int] = []      # i'nin alt ağacı [i, subtree_end[i]) aralığıdır
+        self.positions: dict = {}             # node_id -> indeks
+        self.quantities: list[float] = []     # fireli adet (gösterim için)
+        self.rollup_mult: list[float] = []    # ara düğüm: birim maliyet × bu çarpan
+        self.rolls_up: list[bool] = []        # maliyet çocuklardan mı toplanıyor?
+        self.cost_qty: list[float] = []       # yaprak: birim fiyat × bu miktar
+        self.product_ids: list = []           # bağlı stok kartı (yoksa None)
+        self.costing_ids: list = []           # maliyetin alındığı kart (yoksa None)
+        self.prices: dict = {}                # costing id -> birim fiyat
+        self.rows: list[dict] = []            # ağaçta gösterilen sabit alanlar
+        self.signature = None
+        self.explode_qty: list[float] = []    # patlatmada ebeveyn başına adet (explode_bom_materials ile aynı)
+        self.consume_factors: list = []       # yaprak: 1 adet için kart biriminde sarf; değilse None
+        self.leaf_issues: dict = {}           # sarf edilemeyen yaprak indeksi -> tanı kaydı
+        self.subtree_hashes: list[str] = []   # alt ağaç içerik özeti (kalem, miktar, birim, çocuk özetleri)
+        self.vector = None                    # NumPy roll-up dizileri (bkz. bom_vector), ilk kullanımda kurulur
+        self.costs = None                     # derleme fiyatlarıyla roll-up sonucu (bkz. cached_rollup)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def index_of(self, node_id: int):
+        return self.positions.get(node_id)
+
+
+def bom_cache_scopes(bom_id: int) -> tuple:
+    return (versioning.bom_scope(bom_id), versioning.SCOPE_BOM_ITEMS, versioning.SCOPE_BOM_PRODUCTS)
+
+
+def memo_signature(compiled):
+    """Alt ağaç önbelleklerinin geçerlilik damgası: derlenmiş BOM'un
+    (bom_items, bom_products) token'ları. İzleme kapalıysa None."""
+    return compiled.signature[1:] if compiled.signature is not None else None
+
+
+def _subtree_digest(n, edge_quantity, child_hashes) -> str:
+    """Düğümün kendi içeriği ve çocuk özetlerinden alt ağaç özeti. Numara,
+    düğüm id'si ve bom_id dahil DEĞİLDİR; seviyeden yalnızca kök olup olmadığı
+    (gösterilen tür kararına girer) alınır."""
+    payload = repr((
+        n.item_id, n.display_name, n.quantity, n.quantity_net, n.piece_count,
+        n.unit_type, n.weight_per_unit, n.weight_unit, edge_quantity, n.level > 0,
+        tuple(child_hashes),
+    ))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _num_key(num_str: str) -> tuple:
+    """'1.2.3.' → (1, 2, 3) — sayısal sıralama için."""
+    try:
+        return tuple(int(p) for p in num_str.rstrip('.').split('.') if p)
+    except ValueError:
+        return (0,)
+
+
+def compile_bom(bom_id: int, memo_signature=None):
+    """BOM'u veritabanından okuyup CompiledBom üretir. BOM yoksa None döner.
+
+    `memo_signature` (bom_items, bom_products damgaları) verilirse düğüm kararları
+    alt ağaç özetine göre BOM'lar arası paylaşılan önbellekten alınır; aynı alt
+    montaj kaç BOM'da geçerse geçsin bir kez hesaplanır."""
+    from app.models import BomNode, BomEdge, BomItem
+    from sqlalchemy.orm import joinedload
+
+    nodes = (BomNode.query
+             .filter_by(bom_id=bom_id)
+             .options(joinedload(BomNode.item).joinedload(BomItem.product))
+             .order_by(BomNode.num)
+             .all())
+    if not nodes:
+        return None
+    edges = BomEdge.query.filter_by(bom_id=bom_id).all()
+
+    child_to_parent: dict = {}
+    child_qty: dict = {}
+    edge_qty: dict = {}
+    for e in edges:
+        child_to_parent[e.child_node_id] = e.parent_node_id
+        edge_qty[e.child_node_id] = e.quantity
+        try:    child_qty[e.child_node_id] = float(e.quantity)
+        except: child_qty[e.child_node_id] = 1.0
+
+    parent_to_children: dict = {}
+    for n in nodes:
+        parent_to_children.setdefault(child_to_parent.get(n.id), []).append(n.id)
+    node_map = {n.id: n for n in nodes}
+
+    def _sorted_children(pid):
+        return sorted(parent_to_children.get(pid, []), key=lambda i: _num_key(node_map[i].num))
+
+    # Ön-sıra DFS (özyinelemesiz — derin ağaçlarda recursion limitine takılmaz)
+    compiled = CompiledBom(bom_id)
+    order: list[int] = []
+    parent_index: list[int] = []
+    stack = [(nid, -1) for nid in reversed(_sorted_children(None))]
+    while stack:
+        nid, pidx = stack.pop()
+        idx = len(order)
+        order.append(nid)
+        parent_index.append(pidx)
+        for cid in reversed(_sorted_children(nid)):
+            stack.append((cid, idx))
+
+    children = [[] for _ in order]
+    for idx, pidx in enumerate(parent_index):
+        if pidx >= 0:
+            children[pidx].append(idx)
+
+    # Alt ağaç içerik özetleri (çocuklar önce): aynı kalem/miktar/birim ve aynı
+    # çocuk özetlerine sahip alt ağaçlar hangi BOM'da olursa olsun aynı özeti alır.
+    hashes = [None] * len(order)
+    for idx in range(len(order) - 1, -1, -1):
+        n = node_map[order[idx]]
+        hashes[idx] = _subtree_digest(n, edge_qty.get(n.id), [hashes[c] for c in children[idx]])
+
+    for idx, nid in enumerate(order):
+        n = node_map[nid]
+        facts = _node_memo.get(memo_signature, hashes[idx])
+        if facts is None:
+            facts = _compile_node(n, bool(children[idx]), child_qty, edge_qty)
+            _node_memo.put(memo_signature, hashes[idx], facts)
+
+        if facts['price'] is not None:
+            compiled.prices[facts['price'][0]] = facts['price'][1]
+        if facts['issue'] is not None:
+            compiled.leaf_issues[idx] = dict(facts['issue'], node_id=n.id, num=n.num)
+        compiled.node_ids.append(nid)
+        compiled.parents.append(parent_index[idx])
+        compiled.children.append(tuple(children[idx]))
+        compiled.quantities.append(facts['quantity'])
+        compiled.rollup_mult.append(facts['rollup_mult'])
+        compiled.rolls_up.append(facts['rolls_up'])
+        compiled.cost_qty.append(facts['cost_qty'])
+        compiled.explode_qty.append(facts['explode_qty'])
+        compiled.consume_factors.append(facts['consume_factor'])
+        compiled.product_ids.append(facts['product_id'])
+        compiled.costing_ids.append(facts['costing_id'])
+        compiled.subtree_hashes.append(hashes[idx])
+        compiled.rows.append(dict(facts['row'], id=n.id, num=n.num, level=n.level))
+
+    compiled.roots = tuple(i for i, p in enumerate(compiled.parents) if p < 0)
+    compiled.sibling_rank = [0] * len(order)
+    for kids in (compiled.roots, *compiled.children):
+        for rank, idx in enumerate(kids):
+            compiled.sibling_rank[idx] = rank
+    compiled.positions = {nid: i for i, nid in enumerate(compiled.node_ids)}
+    subtree_end = list(range(1, len(order) + 1))
+    for i in range(len(order) - 1, -1, -1):
+        if compiled.children[i]:
+            subtree_end[i] = subtree_end[compiled.children[i][-1]]
+    compiled.subtree_end = subtree_end
+    return compiled
+
+
+def _compile_node(n, has_children: bool, child_qty: dict, edge_qty: dict) -> dict:
+    """Tek bir düğümün maliyet/patlatma kararları. Sonuç yalnızca düğümün kendi
+    içeriğine, kalemine/kartına ve çocuğu olup olmadığına bağlıdır; bu yüzden
+    alt ağaç özetiyle (bkz. `subtree_hashes`) anahtarlanıp BOM'lar arasında
+    paylaşılabilir. Karar mantığı eski `get_bom_tree.build()` ile birebir aynıdır."""
+    from app.utils.bom_utils import (
+        STANDARD_PREFIXES, _c, _find_costing_raw_material, _is_ready_purchase_text,
+        _should_cost_by_weight, _force_cost_by_length, _strict_material_signature,
+        _cost_basis_quantity, _weight_cost_quantity, _cost_quantity_for_unit,
+        _leaf_consume_quantity,
+    )
+
+    item = n.item
+    product = item.product if item else None
+    costing_product = product
+    if item and item.type == 'hammadde' and (not costing_product or not (costing_product.unit_cost and costing_product.unit_cost > 0)):
+        fallback_product = _find_costing_raw_material({
+            'name': n.display_name or item.name,
+            'unit_type': n.unit_type,
+            'weight_per_unit': float(n.weight_per_unit or 0) if n.weight_per_unit else 0,
+            'material': (product.material if product else None) or item.name or n.display_name or '',
+            'is_auto_hammadde': True,
+        }, exclude_product_id=product.id if product else None)
+        if fallback_product and (not costing_product or fallback_product.unit_cost and fallback_product.unit_cost > 0):
+            costing_product = fallback_product
+    # NOT: Kartın KENDİ geçerli fiyatı (unit_cost > 0) varsa İKAME YAPILMAZ
+    # (bkz. get_bom_tree geçmişi — Hazır Parçaların gerçek alış fiyatı korunur).
+
+    try:
+        q_fireli  = float(n.quantity)     if n.quantity     else child_qty.get(n.id, 1.0)
+        q_firesiz = float(n.quantity_net) if n.quantity_net else None
+        w_per_unit= float(n.weight_per_unit) if n.weight_per_unit else None
+    except Exception:
+        q_fireli = child_qty.get(n.id, 1.0)
+        q_firesiz = w_per_unit = None
+
+    if q_firesiz and q_fireli and q_firesiz > 0:
+        waste_ratio = round((q_fireli - q_firesiz) / q_firesiz * 100, 1)
+    else:
+        waste_ratio = None
+
+    raw_type = product.type if product and product.type else (item.type if item else 'hammadde')
+    ready_purchase = _is_ready_purchase_text(
+        ' '.join(
+            _c(value)
+            for value in [
+                n.display_name,
+                item.name if item else '',
+                product.material if product else '',
+                product.name if product else '',
+            ]
+        )
+    )
+
+    code_str = str(item.code) if (item and item.code) else (str(product.code) if product else '')
+    code_prefix = code_str[:3]
+
+    if code_prefix in STANDARD_PREFIXES:
+        display_type = 'standart_parca'
+    elif ready_purchase and n.level > 0:
+        display_type = 'hazir_parca'
+    elif has_children and n.level > 0:
+        display_type = 'yarimamul'
+    else:
+        display_type = raw_type
+
+    is_hazir = (
+        raw_type in ['hazir_parca', 'standart_parca']
+        or display_type in ['hazir_parca', 'standart_parca']
+        or ready_purchase
+    )
+    material_text = ' '.join(_c(value) for value in [
+        product.material if product else '',
+        product.name if product else '',
+        n.display_name or '',
+    ])
+    costing_unit = costing_product.unit_type if costing_product else None
+    # Ağırlıkla maliyetlendirmeye YALNIZCA gerçek ölçülü hammadde (malzeme imzası olan) girer.
+    if (_should_cost_by_weight(material_text, n.unit_type, w_per_unit or 0, costing_unit)
+            and _strict_material_signature(material_text)):
+        is_hazir = False
+
+    p_count = float(n.piece_count) if getattr(n, 'piece_count', None) else 1.0
+    rolls_up = has_children and not is_hazir
+    mult = 1.0
+    cost_qty = 0.0
+    if rolls_up:
+        # Ara düğüm: birim maliyet = çocuk toplamı, katkı = birim × KENDİ adedi (per-parent semantik)
+        cost_basis_qty = _cost_basis_quantity(q_fireli or 0, q_firesiz)
+        mult = cost_basis_qty if (cost_basis_qty and cost_basis_qty > 0) else 1.0
+    elif is_hazir:
+        unit_l = (n.unit_type or '').lower()
+        if unit_l == 'adet':
+            cost_qty = _cost_basis_quantity(q_fireli or p_count, q_firesiz)
+        elif _force_cost_by_length(material_text, costing_unit):
+            cost_qty = _cost_basis_quantity(q_fireli or p_count, q_firesiz)
+        else:
+            # kg/ağırlık birimli hazır-sarf: satın alma ADEDİ kadar maliyetlenir
+            cost_qty = p_count
+    else:
+        cost_basis_qty = _cost_basis_quantity(q_fireli or 0, q_firesiz)
+        if _force_cost_by_length(material_text, costing_unit):
+            cost_qty = cost_basis_qty
+        elif _should_cost_by_weight(material_text, n.unit_type, w_per_unit or 0, costing_unit):
+            cost_qty = _weight_cost_quantity(cost_basis_qty, w_per_unit or 0)
+        else:
+            cost_qty = _cost_quantity_for_unit(
+                costing_product.unit_type if costing_product else n.unit_type,
+                n.unit_type,
+                cost_basis_qty,
+                p_count,
+                w_per_unit or 0
+            )
+
+    # Üretim patlatması (explode_bom_materials) miktar kaynağı: önce düğüm, yoksa kenar.
+    try:
+        explode_qty = float(n.quantity) if n.quantity else float(edge_qty.get(n.id) or 1)
+    except (TypeError, ValueError):
+        explode_qty = 1.0
+    consume_factor = None
+    issue = None
+    if not has_children:
+        name = n.display_name or (item.name if item else '')
+        if product is None:
+            issue = {'kind': 'unlinked', 'node_id': n.id, 'num': n.num, 'name': name}
+        else:
+            consume_factor = _leaf_consume_quantity(n, item, product, 1.0)
+            if consume_factor is None:
+                issue = {'kind': 'missing_weight', 'node_id': n.id, 'num': n.num,
+                         'name': name, 'product_code': product.code}
+
+    substituted = bool(costing_product and (not product or costing_product.id != product.id))
+    price = None
+    if costing_product is not None:
+        price = (costing_product.id, costing_product.unit_cost if costing_product.unit_cost else 0.0)
+
+    # Anahtar sırası eski get_bom_tree çıktısıyla aynıdır; None olanlar render'da doldurulur.
+    row = {
+        'id': n.id, 'num': n.num, 'level': n.level,
+        'name': n.display_name,
+        # Gösterilen kod bağlı Product'ın gerçek koduyla aynı olmalı (Stok Kaydı linki ona gider).
+        'code': (product.code if product else None) or (item.code if item else None),
+        'quantity':   q_fireli,
+        'quantity_net': q_firesiz,
+        'piece_count': float(n.piece_count) if getattr(n, 'piece_count', None) else 1,
+        'waste_ratio':  waste_ratio,
+        'weight_per_unit': w_per_unit,
+        'weight_unit': n.weight_unit or '',
+        'unit': n.unit_type, 'item_id': n.item_id,
+        'product_id': item.product_id if item else None,
+        'material': product.material if product else (costing_product.material if costing_product else None),
+        'item_type': display_type,
+        'stock_qty': None,
+        'unit_cost': None,
+        'currency': costing_product.currency if costing_product and costing_product.currency else 'TRY',
+        'total_cost': None,
+        'cost_substituted': substituted,
+        'cost_source_code': costing_product.code if substituted else None,
+        'children': None,
+    }
+    return {
+        'quantity': q_fireli, 'rollup_mult': mult, 'rolls_up': rolls_up, 'cost_qty': cost_qty,
+        'explode_qty': explode_qty, 'consume_factor': consume_factor, 'issue': issue,
+        'product_id': product.id if product else None,
+        'costing_id': costing_product.id if costing_product else None,
+        'price': price, 'row': row,
+    }
+
+
+def get_compiled_bom(bom_id: int):
+    """Önbellekteki derlenmiş BOM'u döndürür; damga değiştiyse yeniden derler."""
+    signature = versioning.read_signature(bom_cache_scopes(bom_id))
+    if signature is not None:
+        with _cache_lock:
+            entry = _cache.get(bom_id)
+            if entry is not None and entry.signature == signature:
+                _cache.move_to_end(bom_id)
+                return entry
+
+    compiled = compile_bom(bom_id, signature[1:] if signature is not None else None)
+    if compiled is not None and signature is not None:
+        compiled.signature = signature
+        with _cache_lock:
+            _cache[bom_id] = compiled
+            _cache.move_to_end(bom_id)
+            while len(_cache) > CACHE_MAX_ENTRIES:
+                _cache.popitem(last=False)
+    return compiled
+
+
+def invalidate(bom_id: int = None) -> None:
+    """Bu süreçteki önbelleği temizler (bom_id verilmezse alt ağaç önbelleğiyle
+    birlikte tamamını)."""
+    with _cache_lock:
+        if bom_id is None:
+            _cache.clear()
+            _node_memo.clear()
+        else:
+            _cache.pop(bom_id, None)
+
+
+def _rollup_backend() -> str:
+    from flask import current_app, has_app_context
+
+    if has_app_context():
+        return current_app.config.get('BOM_ROLLUP_BACKEND') or 'auto'
+    return 'auto'
+
+
+def rollup(compiled: CompiledBom, prices: dict = None, backend: str = None) -> tuple[list, list]:
+    """Tek geçişte (sondan başa) birim ve toplam maliyetleri hesaplar.
+    `prices` verilirse derleme anındaki fiyatların yerine kullanılır.
+
+    `backend`: 'python', 'numpy' ya da 'auto' (varsayılan: BOM_ROLLUP_BACKEND
+    ayarı; 'auto' büyük ağaçlarda NumPy motorunu seçer). İki motorun sonucu aynıdır."""
+    backend = backend or _rollup_backend()
+    if backend == 'numpy' or (backend == 'auto' and len(compiled.node_ids) >= VECTOR_ROLLUP_MIN_NODES):
+        from app.utils import bom_vector
+        if bom_vector.available():
+            return bom_vector.rollup(compiled, prices)
+
+    prices = compiled.prices if prices is None else prices
+    size = len(compiled.node_ids)
+    unit_costs = [0.0] * size
+    total_costs = [0.0] * size
+    children = compiled.children
+    for i in range(size - 1, -1, -1):
+        if compiled.rolls_up[i]:
+            child_sum = sum((total_costs[c] or 0.0) for c in children[i])
+            unit_costs[i] = child_sum
+            total_costs[i] = child_sum * compiled.rollup_mult[i]
+        else:
+            cid = compiled.costing_ids[i]
+            unit_cost = prices.get(cid, 0.0) if cid is not None else 0.0
+            unit_costs[i] = unit_cost
+            total_costs[i] = unit_cost * compiled.cost_qty[i]
+    return unit_costs, total_costs
+
+
+def incremental_rollup(compiled: CompiledBom, unit_costs: list, total_costs: list,
+                       changed, prices: dict, costing: dict = None) -> tuple[dict, dict]:
+    """Yalnızca `changed` (fiyatı değişen maliyet düğümleri) ve onların
+    atalarını yeniden hesaplar; diğer düğümler `rollup` sonucundan okunur.
+    `costing` verilirse (indeks -> kart id) o düğümlerin maliyet kartı
+    değiştirilir. Dönüş: yalnızca yeniden hesaplanan düğümlerin birim ve
+    toplam maliyetleri ({indeks: değer})."""
+    parents = compiled.parents
+    dirty = set()
+    for i in changed:
+        while i != -1 and i not in dirty:
+            dirty.add(i)
+            i = parents[i]
+    costing = costing or {}
+    new_units: dict = {}
+    new_totals: dict = {}
+    # Ön-sıra düzeninde çocuk her zaman ebeveynden sonra gelir: büyükten küçüğe.
+    for i in sorted(dirty, reverse=True):
+        if compiled.rolls_up[i]:
+            child_sum = sum(
+                (new_totals[c] if c in new_totals else total_costs[c]) or 0.0
+                for c in compiled.children[i]
+            )
+            new_units[i] = child_sum
+            new_totals[i] = child_sum * compiled.rollup_mult[i]
+        else:
+            cid = costing.get(i, compiled.costing_ids[i])
+            unit_cost = prices.get(cid, 0.0) if cid is not None else 0.0
+            new_units[i] = unit_cost
+            new_totals[i] = unit_cost * compiled.cost_qty[i]
+    return new_units, new_totals
+
+
+def cached_rollup(compiled: CompiledBom) -> tuple[list, list]:
+    """Derleme anındaki fiyatlarla roll-up; sonuç derlenmiş BOM üzerinde bir kez
+    hesaplanıp saklanır (fiyat değişikliği bom_products damgası üzerinden yeni
+    derleme demektir). Dönen listeler paylaşılır, DEĞİŞTİRİLMEMELİDİR."""
+    costs = compiled.costs
+    if costs is None:
+        costs = compiled.costs = rollup(compiled)
+    return costs
+
+
+def live_stock(product_ids) -> dict:
+    """Kartların güncel stok miktarlarını tek sorguda okur."""
+    from app import db
+    from app.models import Product
+
+    ids = {pid for pid in product_ids if pid is not None}
+    if not ids:
+        return {}
+    rows = db.session.query(Product.id, Product.current_stock).filter(Product.id.in_(ids)).all()
+    return {pid: stock for pid, stock in rows}
+
+
+def render_tree(compiled: CompiledBom, unit_costs: list, total_costs: list,
+                stock: dict = None, root: int = None) -> list[dict]:
+    """Dizilerden get_bom_tree'nin iç içe sözlük ağacını üretir (özyinelemesiz).
+    `root` (indeks) verilirse yalnızca o düğümün alt ağacı üretilir."""
+    if root is None:
+        start, end, roots = 0, len(compiled.node_ids), compiled.roots
+    else:
+        start, end, roots = root, compiled.subtree_end[root], (root,)
+    if stock is None:
+        stock = live_stock(compiled.product_ids[start:end])
+    built: dict[int, dict] = {}
+    for i in range(end - 1, start - 1, -1):
+        row = render_row(compiled, i, unit_costs, total_costs, stock)
+        row['children'] = [built.pop(c) for c in compiled.children[i]]
+        built[i] = row
+    return [built[r] for r in roots]
+
+
+def render_row(compiled: CompiledBom, index: int, unit_costs: list, total_costs: list,
+               stock: dict) -> dict:
+    """Tek düğümün ağaç satırı (çocuklar hariç; 'children' None kalır)."""
+    row = dict(compiled.rows[index])
+    pid = compiled.product_ids[index]
+    row['stock_qty'] = stock.get(pid) if pid is not None else 0
+    row['unit_cost'] = unit_costs[index]
+    row['total_cost'] = total_costs[index]
+    return row
+
+
+def child_page(compiled: CompiledBom, index: int = None, cursor: int = None,
+               limit: int = 200) -> tuple[tuple, int]:
+    """`index` düğümünün (None ise köklerin) çocuklarından bir sayfa.
+    `cursor` bir önceki sayfanın son çocuğunun node id'sidir; sayfa onun
+    ardından başlar. Dönüş: (çocuk indeksleri, sonraki cursor ya da None).
+    Cursor bu düğümün çocuğu değilse ValueError."""
+    kids = compiled.roots if index is None else compiled.children[index]
+    start = 0
+    if cursor is not None:
+        position = compiled.positions.get(cursor)
+        if position is None or compiled.parents[position] != (-1 if index is None else index):
+            raise ValueError('Geçersiz cursor: düğüm bu seviyede değil')
+        start = compiled.sibling_rank[position] + 1
+    page = kids[start:start + limit]
+    next_cursor = compiled.node_ids[page[-1]] if page and start + limit < len(kids) else None
+    return page, next_cursor
+
+
+def bom_cost_summary(compiled: CompiledBom, unit_costs: list, total_costs: list) -> dict:
+    """Maliyet raporları için ağaç sözlüğü üretmeden özet: kök toplamı,
+    para birimi, düğüm sayısı ve maliyeti eksik yaprak sayısı."""
+    missing = 0
+    for i, kids in enumerate(compiled.children):
+        if kids:
+            continue
+        if not (unit_costs[i] and unit_costs[i] > 0) and not (total_costs[i] and total_costs[i] > 0):
+            missing += 1
+    root = compiled.roots[0] if compiled.roots else None
+    return {
+        'total_cost': float(total_costs[root] or 0) if root is not None else 0.0,
+        'currency': compiled.rows[root]['currency'] if root is not None else 'TRY',
+        'node_count': len(compiled.node_ids),
+        'missing_cost_count': missing,
+    }
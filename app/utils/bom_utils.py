@@ -18,7 +18,6 @@ FORMAT B — Kolon Girintisi  (urun_agaci_sablon.xlsx şablonu):
 """
 
 import re
-import openpyxl
 from decimal import Decimal
 import unicodedata
 from collections import Counter
@@ -240,33 +239,53 @@ def _strict_signatures_match(source_sig, candidate_sig) -> bool:
     return True
 
 
-def _material_match_score(source: str, product, require_name_match: bool = True) -> int:
-    candidate_text = ' '.join([
-        product.name or '',
-        product.material or '',
-        product.code or '',
-        product.notes or '',
-    ])
-    source_sig = _strict_material_signature(source)
-    candidate_sig = _strict_material_signature(candidate_text)
-    if not _strict_signatures_match(source_sig, candidate_sig):
+def _source_material_profile(source: str) -> dict:
+    """Aranan malzeme metninin (BOM satırı) karşılaştırma profili — eşleştirme
+    başına BİR KEZ hesaplanır, her aday kart için tekrar tokenize edilmez."""
+    source_tokens = _material_tokens(source)
+    dimension_tokens = {t for t in source_tokens if any(ch.isdigit() for ch in t)}
+    return {
+        'sig': _strict_material_signature(source),
+        'tokens': source_tokens,
+        'dimension_tokens': dimension_tokens,
+        'material_tokens': source_tokens - dimension_tokens,
+    }
+
+
+def _candidate_material_profile(name, material, code, notes) -> dict:
+    """Aday stok kartının karşılaştırma profili (imza + token kümeleri).
+    Kart metni değişmedikçe aynı kalır; bkz. material_index."""
+    candidate_text = ' '.join([name or '', material or '', code or '', notes or ''])
+    name_tokens = _material_tokens(name or '')
+    detail_tokens = _material_tokens(candidate_text)
+    return {
+        'sig': _strict_material_signature(candidate_text),
+        'name_tokens': name_tokens,
+        'detail_tokens': detail_tokens,
+        'tokens': name_tokens | detail_tokens,
+        'is_3tb': (code or '').upper().startswith('3TB-'),
+    }
+
+
+def _profile_match_score(source: dict, candidate: dict, require_name_match: bool = True) -> int:
+    if not _strict_signatures_match(source['sig'], candidate['sig']):
         return 0
 
-    source_tokens = _material_tokens(source)
+    source_tokens = source['tokens']
     if not source_tokens:
         return 0
 
-    name_tokens = _material_tokens(product.name or '')
-    detail_tokens = _material_tokens(candidate_text)
+    name_tokens = candidate['name_tokens']
+    detail_tokens = candidate['detail_tokens']
     if require_name_match and not (source_tokens & name_tokens):
         return 0
-    candidate_tokens = name_tokens | detail_tokens
+    candidate_tokens = candidate['tokens']
     common = source_tokens & candidate_tokens
     if not common:
         return 0
 
-    dimension_tokens = {t for t in source_tokens if any(ch.isdigit() for ch in t)}
-    material_tokens = source_tokens - dimension_tokens
+    dimension_tokens = source['dimension_tokens']
+    material_tokens = source['material_tokens']
     if dimension_tokens and not dimension_tokens.issubset(candidate_tokens):
         return 0
     if material_tokens and not material_tokens.intersection(candidate_tokens):
@@ -275,50 +294,59 @@ def _material_match_score(source: str, product, require_name_match: bool = True)
     score = (len(source_tokens & name_tokens) * 14) + (len(source_tokens & detail_tokens) * 8)
     score += len(dimension_tokens & candidate_tokens) * 8
 
-    code = (product.code or '').upper()
-    if code.startswith('3TB-'):
+    if candidate['is_3tb']:
         score -= 25
     return score
 
 
+def _material_match_score(source: str, product, require_name_match: bool = True) -> int:
+    from app.utils.material_index import product_material_profile
+    return _profile_match_score(_source_material_profile(source), product_material_profile(product),
+                                require_name_match)
+
+
 def _find_matching_raw_material(row: dict, candidates=None):
-    """Find an existing raw material card for auto-generated material rows."""
-    from app.models import Product
+    """Find an existing raw material card for auto-generated material rows.
+
+    Adaylar tek tek taranmaz: `material_index` token/ölçü/imza ters indeksinden
+    yalnızca puan alabilecek kartlar gelir (puanlama birebir aynıdır).
+    `candidates` verilmezse aktif hammadde kataloğunun paylaşılan indeksi kullanılır."""
+    from app.utils.material_index import material_index_for
 
     if not row.get('is_auto_hammadde'):
         return None
 
     wanted_name = row.get('name') or ''
     wanted_unit = row.get('unit_type') or ''
-    if candidates is None:
-        candidates = Product.query.filter(Product.is_active == True, Product.type == 'hammadde').all()
+    index = material_index_for(candidates)
+    source = _source_material_profile(wanted_name)
 
     scored = []
-    for product in candidates:
-        if (product.code or '').upper().startswith('3TB-'):
+    for entry in index.lookup(source, require_name_match=True):
+        if entry.profile['is_3tb']:
             continue
-        score = _material_match_score(wanted_name, product)
+        score = _profile_match_score(source, entry.profile)
         if score <= 0:
             continue
-        if wanted_unit and product.unit_type == wanted_unit:
+        if wanted_unit and entry.unit_type == wanted_unit:
             score += 20
-        elif wanted_unit and _units_compatible(product.unit_type, wanted_unit, row.get('weight_per_unit') or 0):
+        elif wanted_unit and _units_compatible(entry.unit_type, wanted_unit, row.get('weight_per_unit') or 0):
             score += 8
-        elif wanted_unit and product.unit_type != wanted_unit:
+        elif wanted_unit and entry.unit_type != wanted_unit:
             score -= 15
-        scored.append((score, product))
+        scored.append((score, entry))
 
     if not scored:
         return None
 
     scored.sort(key=lambda item: item[0], reverse=True)
-    best_score, best_product = scored[0]
-    return best_product if best_score >= 20 else None
+    best_score, best_entry = scored[0]
+    return index.product(best_entry) if best_score >= 20 else None
 
 
 def _find_costing_raw_material(row: dict, exclude_product_id: int = None, candidates=None):
     """Cost-only material match; allows legacy part-coded hammadde cards as a fallback."""
-    from app.models import Product
+    from app.utils.material_index import material_index_for
 
     material_text = row.get('material') or ''
     name_text = row.get('name') or ''
@@ -326,34 +354,34 @@ def _find_costing_raw_material(row: dict, exclude_product_id: int = None, candid
     if name_text and material_text and material_text.lower() not in {'hammadde', 'hazır', 'hazir'}:
         wanted_name = f'{wanted_name} {name_text}'
     wanted_unit = row.get('unit_type') or ''
-    if candidates is None:
-        candidates = Product.query.filter(Product.is_active == True, Product.type == 'hammadde').all()
+    index = material_index_for(candidates)
+    source = _source_material_profile(wanted_name)
 
     scored = []
-    for product in candidates:
-        if exclude_product_id and product.id == exclude_product_id:
+    for entry in index.lookup(source, require_name_match=False):
+        if exclude_product_id and entry.id == exclude_product_id:
             continue
-        score = _material_match_score(wanted_name, product, require_name_match=False)
+        score = _profile_match_score(source, entry.profile, require_name_match=False)
         if score <= 0:
             continue
-        if wanted_unit and product.unit_type == wanted_unit:
+        if wanted_unit and entry.unit_type == wanted_unit:
             score += 25
-        elif wanted_unit and _units_compatible(product.unit_type, wanted_unit, row.get('weight_per_unit') or 0):
+        elif wanted_unit and _units_compatible(entry.unit_type, wanted_unit, row.get('weight_per_unit') or 0):
             score += 12
-        elif wanted_unit and product.unit_type != wanted_unit:
+        elif wanted_unit and entry.unit_type != wanted_unit:
             score -= 20
-        if product.unit_cost and product.unit_cost > 0:
+        if entry.unit_cost and entry.unit_cost > 0:
             score += 30
-        if not (product.code or '').upper().startswith('3TB-'):
+        if not entry.profile['is_3tb']:
             score += 10
-        scored.append((score, product))
+        scored.append((score, entry))
 
     if not scored:
         return None
 
     scored.sort(key=lambda item: item[0], reverse=True)
-    best_score, best_product = scored[0]
-    return best_product if best_score >= 20 else None
+    best_score, best_entry = scored[0]
+    return index.product(best_entry) if best_score >= 20 else None
 
 
 def _raw_source_text_for_node(node) -> str:
@@ -405,8 +433,8 @@ def audit_bom_material_links(bom_id: int, db, apply: bool = False) -> dict:
         .all()
     )
 
-    # N+1 sorguları engellemek için tüm aday ham maddeleri ve aktif ürünleri tek seferde çekip önbelleğe alıyoruz.
-    candidates = Product.query.filter(Product.is_active == True, Product.type == 'hammadde').all()
+    # N+1 sorguları engellemek için aktif ürünleri tek seferde çekiyoruz; hammadde adayları
+    # paylaşılan malzeme indeksinden gelir (bkz. material_index).
     all_active_products = Product.query.filter(Product.is_active == True).all()
     code_to_product = {p.code.upper(): p for p in all_active_products if p.code}
 
@@ -446,7 +474,7 @@ def audit_bom_material_links(bom_id: int, db, apply: bool = False) -> dict:
             'name': source,
             'unit_type': node.unit_type,
             'weight_per_unit': float(node.weight_per_unit or 0),
-        }, candidates=candidates)
+        })
         if not suggested and not current_valid and code_product and code_product.id != (product.id if product else None):
             code_sig = _strict_material_signature(' '.join(_c(v) for v in [
                 code_product.name,
@@ -774,15 +802,32 @@ def _weight_cost_quantity(quantity: float, weight_per_unit: float = 0.0) -> floa
 # FORMAT TESPİTİ
 # ---------------------------------------------------------------------------
 
-def _detect_format(ws) -> str:
+# Format tespiti ve FORMAT C başlık araması yalnızca bu kadar satıra bakar;
+# salt okunur modda dosyanın geri kalanı bu aşamada okunmaz.
+_DETECT_WINDOW = 30
+
+
+def _head_rows(ws) -> list[tuple]:
+    """Sayfanın ilk _DETECT_WINDOW satırının değerleri."""
+    return list(ws.iter_rows(max_row=_DETECT_WINDOW, values_only=True))
+
+
+def _first_row(ws) -> tuple:
+    return next(ws.iter_rows(max_row=1, values_only=True), ())
+
+
+def _detect_format(ws, head=None) -> str:
     """
     İlk 15 dolu satırı inceleyerek formatı belirle.
     ÖNCELİK 1: Eğer noktalı BOM numaraları (1.1.) varsa -> FORMAT A ('numbered')
     ÖNCELİK 2: Fireli/Firesiz başlıkları varsa -> FORMAT C ('formatted_bom')
     ÖNCELİK 3: Aksi halde Format B ('indented')
+    `head` verilirse (bkz. _head_rows) sayfa yeniden okunmaz.
     """
+    if head is None:
+        head = _head_rows(ws)
     num_hits = 0
-    for row in ws.iter_rows(max_row=20, values_only=True):
+    for row in head[:20]:
         vals = [_c(v) for v in row]
         if not any(vals):
             continue
@@ -797,7 +842,7 @@ def _detect_format(ws) -> str:
 
     # FORMAT C tespiti: aynı satırda hem "fireli" hem "firesiz".
     # Bazı Excel'lerde başlık ilk 3 satırdan sonra geldiği için daha geniş tarıyoruz.
-    for row in ws.iter_rows(max_row=min(ws.max_row, 30), values_only=True):
+    for row in head:
         vals = [_tr_lower(_c(v)) for v in row if v]
         if len(vals) < 5:
             continue
@@ -820,7 +865,7 @@ def _parse_numbered(ws, override_root_name=None) -> tuple[list[dict], list[dict]
     stack  = {}  # level → current num
 
     # ROW 1'İ root olarak kaydet (Ana ürün adı ilk dolu hücrede)
-    first = list(ws.iter_rows(max_row=1, values_only=True))[0]
+    first = _first_row(ws)
     root_name = ''
     for v in first:
         s = _c(v)
@@ -1070,7 +1115,7 @@ def _parse_indented(ws, override_root_name=None) -> tuple[list[dict], list[dict]
     cnt    = {1: 0, 2: 0, 3: 0}
 
     # İlk satırdan ana ürün adını al (Col A)
-    first = list(ws.iter_rows(max_row=1, values_only=True))[0]
+    first = _first_row(ws)
     root_name = _c(first[0]) if first else 'ANA ÜRÜN'
     if not root_name:
         root_name = 'ANA ÜRÜN'
@@ -1228,7 +1273,7 @@ def _is_format_c_header(sv: list[str]) -> bool:
     return has_fireli and has_firesiz and has_metre_or_parca
 
 
-def _parse_format_c(ws, override_root_name=None) -> tuple[list[dict], list[dict]]:
+def _parse_format_c(ws, override_root_name=None, head=None) -> tuple[list[dict], list[dict]]:
     rows   = []
     errors = []
 
@@ -1236,7 +1281,9 @@ def _parse_format_c(ws, override_root_name=None) -> tuple[list[dict], list[dict]
     # Bazı şablonlarda başlık 3. satırdan sonra geldiği için daha geniş bakıyoruz.
     header_row_idx = None
     root_name      = 'ANA ÜRÜN'
-    for i, row_vals in enumerate(ws.iter_rows(max_row=min(ws.max_row, 30), values_only=True), start=1):
+    if head is None:
+        head = _head_rows(ws)
+    for i, row_vals in enumerate(head, start=1):
         sv = [_c(v) for v in row_vals]
         if _is_format_c_header(sv):
             header_row_idx = i
@@ -1259,7 +1306,10 @@ def _parse_format_c(ws, override_root_name=None) -> tuple[list[dict], list[dict]
     l2_cnt = 0
     current_l1_num = None
 
-    for row_idx, row in enumerate(ws.iter_rows(min_row=1), start=1):
+    # Hücre nesneleri (değer + dolgu) salt okunur modda da satır satır akar;
+    # başlık biliniyorsa öncesi hiç okunmaz.
+    start_row = header_row_idx + 1 if header_row_idx is not None else 1
+    for row_idx, row in enumerate(ws.iter_rows(min_row=start_row), start=start_row):
         rv   = [cell.value for cell in row]
         sv   = [_c(v) for v in rv]
 
@@ -1382,20 +1432,26 @@ def parse_bom_excel_v2(file_stream, override_root_name=None) -> tuple[list[dict]
     ÇELMAK ürün ağacı Excel dosyasını parse eder.
     Format otomatik tespit edilir (numara kolonlu veya kolon girintili).
     """
+    from app.utils.excel_utils import load_workbook_streaming
+
     try:
-        wb = openpyxl.load_workbook(file_stream, data_only=True)
+        wb = load_workbook_streaming(file_stream)
         ws = wb.active
     except Exception as exc:
         return [], [{'row': 0, 'error': f'Dosya okuma hatası: {exc}'}]
 
-    fmt = _detect_format(ws)
+    try:
+        head = _head_rows(ws)
+        fmt = _detect_format(ws, head)
 
-    if fmt == 'formatted_bom':
-        rows, errors = _parse_format_c(ws, override_root_name)
-    elif fmt == 'numbered':
-        rows, errors = _parse_numbered(ws, override_root_name)
-    else:
-        rows, errors = _parse_indented(ws, override_root_name)
+        if fmt == 'formatted_bom':
+            rows, errors = _parse_format_c(ws, override_root_name, head)
+        elif fmt == 'numbered':
+            rows, errors = _parse_numbered(ws, override_root_name)
+        else:
+            rows, errors = _parse_indented(ws, override_root_name)
+    finally:
+        wb.close()
 
     if len(rows) <= 1:
         return [], [{'row': 0, 'error':
@@ -2060,244 +2116,49 @@ def import_bom_to_db(parsed_rows: list[dict], bom_id: int, db, category_id: int
 # ---------------------------------------------------------------------------
 
 def get_bom_tree(bom_id: int, db) -> dict:
-    from app.models import BomNode, BomEdge, Product, BomItem
-    from sqlalchemy.orm import joinedload
+    """BOM ağacını maliyet ve stok bilgisiyle iç içe sözlük olarak döndürür.
 
-    nodes = (BomNode.query
-             .filter_by(bom_id=bom_id)
-             .options(joinedload(BomNode.item).joinedload(BomItem.product))
-             .order_by(BomNode.num)
-             .all())
-    edges = BomEdge.query.filter_by(bom_id=bom_id).all()
+    Ağır iş (düğüm/kenar yükleme, ikame kart eşleştirme, birim dönüşümü)
+    `bom_engine` içinde BİR KEZ derlenip önbelleğe alınır; burada yalnızca
+    (derlenmiş BOM başına bir kez yapılan) roll-up ve canlı stok okuması yapılır."""
+    from app.utils.bom_engine import get_compiled_bom, cached_rollup, render_tree
 
-    if not nodes:
+    compiled = get_compiled_bom(bom_id)
+    if compiled is None:
         return {'bom_id': bom_id, 'roots': [],
                 'error': 'Bu bom_id için kayıt bulunamadı.'}
 
-    # N+1 sorgularını engellemek için aday ham maddeleri önceden tek seferde yüklüyoruz.
-    candidates = Product.query.filter(Product.is_active == True, Product.type == 'hammadde').all()
-
-    child_to_parent: dict = {}
-    child_qty: dict = {}
-    for e in edges:
-        child_to_parent[e.child_node_id] = e.parent_node_id
-        try:    child_qty[e.child_node_id] = float(e.quantity)
-        except: child_qty[e.child_node_id] = 1.0
-
-    parent_to_children: dict = {}
-    for n in nodes:
-        parent_to_children.setdefault(child_to_parent.get(n.id), []).append(n.id)
-
-    node_map = {n.id: n for n in nodes}
-
-    def _num_key(num_str: str) -> tuple:
-        """'1.2.3.' → (1, 2, 3) — sayısal sıralama için."""
-        try:
-            return tuple(int(p) for p in num_str.rstrip('.').split('.') if p)
-        except ValueError:
-            return (0,)
-
-    def build(nid: int) -> dict:
-        n = node_map[nid]
-        item    = n.item
-        product = item.product if item else None
-        costing_product = product
-        if item and item.type == 'hammadde' and (not costing_product or not (costing_product.unit_cost and costing_product.unit_cost > 0)):
-            fallback_product = _find_costing_raw_material({
-                'name': n.display_name or item.name,
-                'unit_type': n.unit_type,
-                'weight_per_unit': float(n.weight_per_unit or 0) if n.weight_per_unit else 0,
-                'material': (product.material if product else None) or item.name or n.display_name or '',
-                'is_auto_hammadde': True,
-            }, exclude_product_id=product.id if product else None, candidates=candidates)
-            if fallback_product and (not costing_product or fallback_product.unit_cost and fallback_product.unit_cost > 0):
-                costing_product = fallback_product
-        # NOT: Kartın KENDİ geçerli fiyatı (unit_cost > 0) varsa artık İKAME YAPILMAZ.
-        # Eskiden 3TB- kodlu kalemlerde fiyat olsa bile ham-malzeme kartına ikame
-        # ediliyordu; bu, gerçek alış fiyatı olan Hazır Parçaların maliyetini yanlış
-        # gösteriyordu (ör. 1220 yerine 35 TRY). Fiyatı OLMAYAN kartlar için ikame,
-        # yukarıdaki dalda (unit_cost yok/<=0) yapılmaya devam eder.
-        children_ids = sorted(parent_to_children.get(nid, []),
-                              key=lambda i: _num_key(node_map[i].num))
-        # fireli / firesiz
-        try:
-            q_fireli  = float(n.quantity)     if n.quantity     else child_qty.get(n.id, 1.0)
-            q_firesiz = float(n.quantity_net) if n.quantity_net else None
-            w_per_unit= float(n.weight_per_unit) if n.weight_per_unit else None
-        except Exception:
-            q_fireli = child_qty.get(n.id, 1.0)
-            q_firesiz = w_per_unit = None
-
-        # Fire oranı (%)
-        if q_firesiz and q_fireli and q_firesiz > 0:
-            waste_ratio = round((q_fireli - q_firesiz) / q_firesiz * 100, 1)
-        else:
-            waste_ratio = None
-
-        # item_type: eğer altında çocuk varsa 'yarimamul', yoksa item kaydından al
-        has_children = bool(children_ids)
-        raw_type = product.type if product and product.type else (item.type if item else 'hammadde')
-        ready_purchase = _is_ready_purchase_text(
-            ' '.join(
-                _c(value)
-                for value in [
-                    n.display_name,
-                    item.name if item else '',
-                    product.material if product else '',
-                    product.name if product else '',
-                ]
-            )
-        )
-        
-        code_str = str(item.code) if (item and item.code) else (str(product.code) if product else '')
-        code_prefix = code_str[:3]
-        
-        if code_prefix in STANDARD_PREFIXES:
-            display_type = 'standart_parca'
-        elif ready_purchase and n.level > 0:
-            display_type = 'hazir_parca'
-        elif has_children and n.level > 0:
-            display_type = 'yarimamul'
-        else:
-            display_type = raw_type
-
-        built_children = [build(cid) for cid in children_ids]
-        is_hazir = (
-            raw_type in ['hazir_parca', 'standart_parca']
-            or display_type in ['hazir_parca', 'standart_parca']
-            or ready_purchase
-        )
-        material_text = ' '.join(_c(value) for value in [
-            product.material if product else '',
-            product.name if product else '',
-            n.display_name or '',
-        ])
-        # Ağırlıkla maliyetlendirmeye YALNIZCA gerçek ölçülü hammadde (sac/lama/
-        # profil/boru/mil — malzeme imzası olan) için izin ver. Dişli yağı gibi
-        # Hazır/Sarf sarf malzemeleri (ölçü imzası yok) ağırlıkla ŞİŞİRİLMEMELİ;
-        # adet bazlı maliyetlenir.
-        if (_should_cost_by_weight(material_text, n.unit_type, w_per_unit or 0,
-                                   costing_product.unit_type if costing_product else None)
-                and _strict_material_signature(material_text)):
-            is_hazir = False
-
-        if built_children and not is_hazir:
-            # Çocukların toplamı = bu düğümün BİR adedinin maliyeti (çocuk miktarları bu düğüme görelidir).
-            # child_sum can fail if total_cost is None
-            child_sum = sum((c.get('total_cost') or 0.0) for c in built_children)
-
-            # ÖNEMLİ (çok seviyeli roll-up): miktar semantiği PER-PARENT olduğundan, bu ara
-            # düğümün ÜST parçaya katkısı = birim maliyeti × KENDİ adedi. Eski kod kendi adedini
-            # uygulamıyordu (yalnızca yapraklar uyguluyordu) → çok seviyeli ağaçta eksik sayım.
-            cost_basis_qty = _cost_basis_quantity(q_fireli or 0, q_firesiz)
-            mult = cost_basis_qty if (cost_basis_qty and cost_basis_qty > 0) else 1.0
-            calc_unit_cost = child_sum                 # bir adet bu düğümün maliyeti
-            calc_total_cost = child_sum * mult         # kendi adedi kadarının maliyeti
-            calc_currency = costing_product.currency if costing_product and costing_product.currency else 'TRY'
-        else:
-            calc_unit_cost = costing_product.unit_cost if costing_product and costing_product.unit_cost else 0.0
-            
-            if is_hazir:
-                p_count = float(n.piece_count) if getattr(n, 'piece_count', None) else 1.0
-                unit_l = (n.unit_type or '').lower()
-                if unit_l == 'adet':
-                    # Adet birimli hazır/standart: fireli adet kadar
-                    cost_qty = _cost_basis_quantity(q_fireli or p_count, q_firesiz)
-                elif _force_cost_by_length(material_text, costing_product.unit_type if costing_product else None):
-                    # Metre bazlı hazır kalem (profil/boru): uzunluk kadar
-                    cost_qty = _cost_basis_quantity(q_fireli or p_count, q_firesiz)
-                else:
-                    # kg/ağırlık birimli hazır-sarf (ör. dişli yağı): satın alma ADEDİ
-                    # kadar maliyetlenir; ağırlık (kg) maliyete KATILMAZ → şişme biter.
-                    cost_qty = p_count
-                calc_total_cost = calc_unit_cost * cost_qty
-            else:
-                cost_basis_qty = _cost_basis_quantity(q_fireli or 0, q_firesiz)
-                if _force_cost_by_length(material_text, costing_product.unit_type if costing_product else None):
-                    cost_qty = cost_basis_qty
-                elif _should_cost_by_weight(material_text, n.unit_type, w_per_unit or 0,
-                                             costing_product.unit_type if costing_product else None):
-                    cost_qty = _weight_cost_quantity(cost_basis_qty, w_per_unit or 0)
-                else:
-                    cost_qty = _cost_quantity_for_unit(
-                        costing_product.unit_type if costing_product else n.unit_type,
-                        n.unit_type,
-                        cost_basis_qty,
-                        float(n.piece_count) if getattr(n, 'piece_count', None) else 1.0,
-                        w_per_unit or 0
-                    )
-                calc_total_cost = calc_unit_cost * cost_qty
-            
-            calc_currency = costing_product.currency if costing_product and costing_product.currency else 'TRY'
-
-        return {
-            'id': n.id, 'num': n.num, 'level': n.level,
-            'name': n.display_name,
-            # ÖNEMLİ: item.code, birleştirme/standartlaştırma sonrası bağlı Product'ın
-            # gerçek kodundan sapmış olabilir (ürünün kendi kodu değişmez, sadece
-            # bağlantı taşınır). "Stok Kaydı" linki ve üretim akışı hep Product'a
-            # gittiğinden, burada gösterilen kod da ONUNLA aynı olmalı — aksi halde
-            # ağaçta bir kod görünüp tıklayınca başka bir kod açılıyor gibi kafa
-            # karıştırıcı bir tutarsızlık oluşuyordu.
-            'code': (product.code if product else None) or (item.code if item else None),
-            'quantity':   q_fireli,
-            'quantity_net': q_firesiz,
-            'piece_count': float(n.piece_count) if getattr(n, 'piece_count', None) else 1,
-            'waste_ratio':  waste_ratio,
-            'weight_per_unit': w_per_unit,
-            'weight_unit': n.weight_unit or '',
-            'unit': n.unit_type, 'item_id': n.item_id,
-            'product_id': item.product_id if item else None,
-            'material': product.material if product else (costing_product.material if costing_product else None),
-            'item_type': display_type,
-            'stock_qty': product.current_stock if product else 0,
-            'unit_cost': calc_unit_cost,
-            'currency': calc_currency,
-            'total_cost': calc_total_cost,
-            'cost_substituted': bool(costing_product and (not product or costing_product.id != product.id)),
-            'cost_source_code': costing_product.code if (costing_product and (not product or costing_product.id != product.id)) else None,
-            'children': built_children
-        }
-
-    root_ids = parent_to_children.get(None, [])
-    roots = [build(r) for r in sorted(root_ids, key=lambda i: _num_key(node_map[i].num))]
-    return {'bom_id': bom_id, 'roots': roots}
+    unit_costs, total_costs = cached_rollup(compiled)
+    return {'bom_id': bom_id, 'roots': render_tree(compiled, unit_costs, total_costs)}
 
 
 def get_bom_subtree(bom_id: int, node_id: int, db) -> dict:
     """
     Belirli bir düğümden başlayan alt ağacı döndür.
-    
+
+    Yalnızca düğümün torunları sözlüğe çevrilir ve yalnızca onların stoğu
+    okunur; maliyetler derlenmiş BOM'un roll-up sonucundan gelir.
+
     Args:
         bom_id: BOM ID
         node_id: Başlangıç düğüm ID'si
         db: Database session
-    
+
     Returns:
         dict: Tek bir node içeren ağaç yapısı
     """
-    # Önce tüm ağacı al
-    full_tree = get_bom_tree(bom_id, db)
-    
-    if not full_tree.get('roots'):
+    from app.utils.bom_engine import get_compiled_bom, cached_rollup, render_tree
+
+    compiled = get_compiled_bom(bom_id)
+    if compiled is None or not compiled.roots:
         return {'bom_id': bom_id, 'node': None, 'error': 'BOM bulunamadı'}
-    
-    # Belirli node'u bul (recursive arama)
-    def find_node(nodes, target_id):
-        for node in nodes:
-            if node['id'] == target_id:
-                return node
-            if node.get('children'):
-                result = find_node(node['children'], target_id)
-                if result:
-                    return result
-        return None
-    
-    target_node = find_node(full_tree['roots'], node_id)
-    
-    if not target_node:
+
+    index = compiled.index_of(node_id)
+    if index is None:
         return {'bom_id': bom_id, 'node': None, 'error': 'Düğüm bulunamadı'}
-    
+
+    unit_costs, total_costs = cached_rollup(compiled)
+    target_node = render_tree(compiled, unit_costs, total_costs, root=index)[0]
     return {
         'bom_id': bom_id,
         'node': target_node,
@@ -2305,6 +2166,46 @@ def get_bom_subtree(bom_id: int, node_id: int, db) -> dict:
     }
 
 
+def get_bom_node_page(bom_id: int, node_id: int = None, cursor: int = None, limit: int = 200) -> dict:
+    """Tembel (lazy) ağaç için tek seviye: düğüm ve doğrudan çocuklarından bir
+    sayfa. `node_id` verilmezse kökler döner. Her satırda çocuk/torun sayısı ve
+    alt ağaç toplam maliyeti bulunur; çocuklar 'children' yerine açıldıkça
+    ayrı istekle alınır. Stok yalnızca dönen satırlar için okunur."""
+    from app.utils.bom_engine import (
+        get_compiled_bom, cached_rollup, render_row, child_page, live_stock,
+    )
+
+    compiled = get_compiled_bom(bom_id)
+    if compiled is None or not compiled.roots:
+        return {'bom_id': bom_id, 'error': 'BOM bulunamadı'}
+    index = None
+    if node_id is not None:
+        index = compiled.index_of(node_id)
+        if index is None:
+            return {'bom_id': bom_id, 'error': 'Düğüm bulunamadı'}
+
+    page, next_cursor = child_page(compiled, index, cursor, limit)
+    unit_costs, total_costs = cached_rollup(compiled)
+    shown = list(page) if index is None else [index, *page]
+    stock = live_stock(compiled.product_ids[i] for i in shown)
+
+    def _lazy_row(i):
+        row = render_row(compiled, i, unit_costs, total_costs, stock)
+        del row['children']
+        row['child_count'] = len(compiled.children[i])
+        row['descendant_count'] = compiled.subtree_end[i] - i - 1
+        return row
+
+    kids = compiled.roots if index is None else compiled.children[index]
+    return {
+        'bom_id': bom_id,
+        'node': _lazy_row(index) if index is not None else None,
+        'children': [_lazy_row(i) for i in page],
+        'total_children': len(kids),
+        'next_cursor': next_cursor,
+    }
+
+
 # ---------------------------------------------------------------------------
 # Yardımcı Sorgular
 # ---------------------------------------------------------------------------
@@ -2363,39 +2264,27 @@ def next_bom_id(db) -> int:
 def analyze_bom_delete(bom_id: int, db) -> dict:
     """Bir BOM silinmeden önce, ağaçtaki hangi ürünlerin güvenle pasifleştirilebileceğini
     (başka ağaçta kullanılmıyor, stok hareketi yok, standart/hazır parça değil) analiz eder."""
-    from app.models import BomNode, BomItem, Product, StockMovement
-    from sqlalchemy.orm import joinedload
-
-    nodes = (
-        BomNode.query
-        .options(joinedload(BomNode.item).joinedload(BomItem.product))
-        .filter(BomNode.bom_id == bom_id)
-        .all()
-    )
+    from app.models import Product, StockMovement
+    from app.utils import where_used
 
+    # Ürün → BOM kullanımları indeksten; stok hareketi tek sorguda.
+    other_boms = where_used.other_boms_using(bom_id)
     products_by_id = {}
-    for node in nodes:
-        item = node.item
-        product = item.product if item else None
-        if product and product.id not in products_by_id:
-            products_by_id[product.id] = product
+    moved = set()
+    if other_boms:
+        products_by_id = {p.id: p for p in Product.query.filter(Product.id.in_(list(other_boms))).all()}
+        moved = {pid for (pid,) in db.session.query(StockMovement.product_id)
+                 .filter(StockMovement.product_id.in_(list(products_by_id))).distinct()}
 
     deactivate = []
     keep = []
     for product in products_by_id.values():
         reasons = []
 
-        other_usage = (
-            db.session.query(BomNode.id)
-            .join(BomItem, BomNode.item_id == BomItem.id)
-            .filter(BomItem.product_id == product.id, BomNode.bom_id != bom_id)
-            .first()
-        )
-        if other_usage:
+        if other_boms[product.id]:
             reasons.append('Başka bir BOM ağacında da kullanılıyor')
 
-        has_movement = StockMovement.query.filter_by(product_id=product.id).first() is not None
-        if has_movement:
+        if product.id in moved:
             reasons.append('Stok hareketi geçmişi var')
 
         if product.type in ('standart_parca', 'hazir_parca'):
@@ -2456,8 +2345,6 @@ def audit_bom_costs(bom_id: int, db) -> dict:
     for e in edges:
         children_of.setdefault(e.parent_node_id, []).append(e.child_node_id)
 
-    candidates = Product.query.filter(Product.is_active == True, Product.type == 'hammadde').all()
-
     rows = []
     for n in nodes:
         if children_of.get(n.id):
@@ -2490,7 +2377,7 @@ def audit_bom_costs(bom_id: int, db) -> dict:
                 'weight_per_unit': float(n.weight_per_unit or 0) if n.weight_per_unit else 0,
                 'material': (product.material if product else None) or item.name or n.display_name or '',
                 'is_auto_hammadde': True,
-            }, exclude_product_id=product.id if product else None, candidates=candidates)
+            }, exclude_product_id=product.id if product else None)
             if not costing_product or not (costing_product.unit_cost and costing_product.unit_cost > 0):
                 if fallback_product and fallback_product.unit_cost and fallback_product.unit_cost > 0:
                     costing_product = fallback_product
@@ -2574,9 +2461,51 @@ def audit_bom_costs(bom_id: int, db) -> dict:
 
 
 # ---------------------------------------------------------------------------
-# Üretim Sarfiyatı — Ortak Patlatma (bom_produce ve work_order tarafından kullanılır)
+# Üretim Sarfiyatı — Patlatma ve Plan (derlenmiş BOM üzerinden)
 # ---------------------------------------------------------------------------
 
+def _leaf_consume_quantity(node, item, product, current_qty: float):
+    """Bir yaprak düğümün `current_qty` adet/miktar ihtiyacını bağlı stok kartının
+    BİRİMİNE çevirir. Dönüşüm miktarla doğrusaldır (MRP netleştirmesi birim
+    başına katsayıyı buradan alır). Ağırlık verisi eksik olduğu için dönüşüm
+    yapılamıyorsa None döner."""
+    material_text = ' '.join(_c(v) for v in [
+        product.material or '', product.name or '', node.display_name or ''
+    ])
+    w_per_unit = float(node.weight_per_unit) if node.weight_per_unit else 0.0
+    product_unit = product.unit_type
+
+    # FAZ 2A: Hazır/standart (dışarıdan alınan, sayılan) parçalar ya da kartı
+    # 'adet' olanlar HER ZAMAN adet tüketilir — malzeme adına ("Çelik Dövme")
+    # takılıp kg'a çevrilmeye çalışılmaz, fireli ağırlık aranmaz.
+    def _nt(s):
+        return (s or '').lower().replace('ı', 'i').replace('İ', 'i')
+    _leaf_type = _nt(getattr(item, 'type', '')) + ' ' + _nt(getattr(product, 'type', ''))
+    if (product_unit or '').lower() == 'adet' or 'hazir' in _leaf_type or 'standart' in _leaf_type:
+        return current_qty
+
+    if _force_cost_by_length(material_text, product_unit):
+        consume_qty = current_qty
+    elif _should_cost_by_weight(material_text, node.unit_type, w_per_unit, product_unit):
+        consume_qty = _weight_cost_quantity(current_qty, w_per_unit)
+    else:
+        # current_qty, hem 'quantity' hem (adet/hazır satırlarda) 'piece_count'
+        # yerine geçer — bkz. parse_bom_excel_v2: bu iki alan adet bazlı
+        # satırlarda zaten birbirine eşit üretiliyor.
+        consume_qty = _cost_quantity_for_unit(
+            product_unit, node.unit_type, current_qty, current_qty, w_per_unit
+        )
+
+    if (
+        consume_qty == 0 and current_qty > 0
+        and (product_unit or '').lower() != (node.unit_type or '').lower()
+    ):
+        # Ağırlık verisi eksik olduğu için birim dönüşümü yapılamadı — bu
+        # malzeme sessizce 0 tüketilmesin, kullanıcıya ayrıca gösterilsin.
+        return None
+    return consume_qty
+
+
 def explode_bom_materials(bom_id: int, node_id: int, build_qty: float, db) -> dict:
     """Bir BOM düğümünü build_qty kadar üretmek için gereken en alt seviye
     malzeme ihtiyaçlarını, stok kartı BİRİMİNE göre doğru dönüştürülmüş
@@ -2584,137 +2513,156 @@ def explode_bom_materials(bom_id: int, node_id: int, build_qty: float, db) -> di
     dönüşüm mantığını kullanır — böylece "5 metre boru" gibi bir satır, kg
     bazlı bir stok kartından yanlış miktarda düşülmez.
 
+    Birim başına ihtiyaç derlenmiş BOM'dan, alt ağaç özetiyle paylaşılan
+    kayıttan gelir (bkz. mrp.subtree_requirements); aynı alt montaj her
+    geçtiği yerde yeniden gezilmez. Yalnızca satır satır döküm ('breakdown')
+    düz dizi üzerinde tek geçişle çıkarılır.
+
     Bağlı stok kartı olmayan yaprak malzemeler ayrıca 'unlinked' listesinde
     döner (sessizce atlanmaz, çağıran taraf kullanıcıyı uyarabilir).
     """
-    from app.models import BomNode, BomEdge, BomItem
-    from sqlalchemy.orm import joinedload
+    from app.models import Product
+    from app.utils.bom_engine import get_compiled_bom
+    from app.utils.mrp import subtree_requirements
+
+    empty = {'materials': [], 'unlinked': [], 'missing_weight': [], 'breakdown': []}
+    compiled = get_compiled_bom(bom_id)
+    index = compiled.index_of(node_id) if compiled is not None else None
+    if index is None:
+        return empty
+
+    build_qty = float(build_qty or 0)
+    children = compiled.children
+    if children[index]:
+        gross, issue_offsets, assemblies = subtree_requirements(compiled, index)
+        per_unit = {pid: qty - assemblies.get(pid, 0.0) for pid, qty in gross.items()}
+        issue_indexes = [index + offset for offset in issue_offsets]
+    elif index in compiled.leaf_issues:
+        per_unit, issue_indexes = {}, [index]
+    else:
+        per_unit, issue_indexes = {compiled.product_ids[index]: compiled.consume_factors[index]}, []
+
+    leaves = [i for i in range(index, compiled.subtree_end[index]) if not children[i]]
+    product_ids = set(per_unit) | {compiled.product_ids[i] for i in leaves}
+    product_ids.discard(None)
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids))} if product_ids else {}
+
+    issues = {'unlinked': [], 'missing_weight': []}
+    for i in issue_indexes:
+        entry = compiled.leaf_issues[i]
+        issues[entry['kind']].append({k: v for k, v in entry.items() if k != 'kind'})
+
+    # Satır dökümü: her yaprağın üst-adet çarpanı ve 1'den farklı adetli ara düğümler
+    breakdown = []
+    scale = {index: build_qty}
+    factors = {index: []}
+    for i in range(index, compiled.subtree_end[index]):
+        if i != index:
+            parent = compiled.parents[i]
+            scale[i] = scale[parent] * compiled.explode_qty[i]
+            factors[i] = factors[parent]
+            if children[i] and abs(compiled.explode_qty[i] - 1.0) > 1e-9:
+                factors[i] = factors[parent] + [{'num': compiled.rows[i]['num'],
+                                                 'name': compiled.rows[i]['name'] or '',
+                                                 'qty': compiled.explode_qty[i]}]
+        if children[i] or i in compiled.leaf_issues:
+            continue
+        product = products.get(compiled.product_ids[i])
+        leaf_qty = compiled.explode_qty[i] if i != index else build_qty
+        breakdown.append({
+            'num': compiled.rows[i]['num'], 'name': compiled.rows[i]['name'] or '',
+            'code': (product.code if product else '') or '',
+            'unit': (product.unit_type if product else '') or '',
+            'leaf_qty': leaf_qty, 'mult': scale[i] / leaf_qty if leaf_qty else 1.0,
+            'contrib': scale[i] * compiled.consume_factors[i], 'factors': list(factors[i])})
+
+    materials = [{'product': products[pid], 'quantity': build_qty * qty}
+                 for pid, qty in per_unit.items() if qty > 0 and pid in products]
+    return dict(materials=materials, breakdown=breakdown, **issues)
+
+
+def explode_production_plan(plan: list[dict], db) -> dict:
+    """Bir üretim planını (her satır: bom_id, isteğe bağlı node_id, quantity)
+    üretim ekranı ve iş emirleriyle AYNI motorla, `mrp.net_requirements` ile
+    çok seviyeli netleştirir: rafta bekleyen yarı mamuller seviye seviye düşülür,
+    altları yalnızca eksik kadar patlatılır.
+
+    Dönüş:
+      materials      — kart başına (ara kartlar dahil) brüt ihtiyaç (gross), eldeki
+                       stok (on_hand), stoktan karşılanan (from_stock), net eksik
+                       (net), tür ('uretim' / 'satinalma') ve 'boms': kartı talep
+                       edilen alt ağacında içeren BOM'lar
+      unlinked / missing_weight — patlatılan alt ağaçlardaki sarf edilemeyen yapraklar
+      lines          — her plan satırının çözümlenmiş hâli; geçersiz satırda 'error'
+    """
+    from app.utils import mrp
+    from app.utils.bom_engine import get_compiled_bom
+
+    lines = []
+    demands = []
+    boms_of: dict[int, set] = {}
+    compiled_of: dict = {}
+    for line in plan:
+        bom_id = line.get('bom_id')
+        quantity = float(line.get('quantity') or 0)
+        if bom_id not in compiled_of:
+            compiled_of[bom_id] = get_compiled_bom(bom_id) if bom_id is not None else None
+        compiled = compiled_of[bom_id]
+        index = None
+        if compiled is not None and compiled.roots:
+            index = compiled.index_of(line['node_id']) if line.get('node_id') else compiled.roots[0]
+        entry = {'bom_id': bom_id, 'node_id': line.get('node_id'), 'name': None, 'quantity': quantity}
+        lines.append(entry)
+        if index is None:
+            entry['error'] = 'BOM veya düğüm bulunamadı'
+            continue
+        entry['node_id'] = compiled.node_ids[index]
+        entry['name'] = compiled.rows[index]['name']
+        demands.append({'bom_id': bom_id, 'node_id': entry['node_id'], 'quantity': quantity})
+        for i in range(index + 1, compiled.subtree_end[index]):
+            pid = compiled.product_ids[i]
+            if pid is not None:
+                boms_of.setdefault(pid, set()).add(bom_id)
+
+    result = mrp.net_requirements(demands) if demands else {
+        'requirements': [], 'unlinked': [], 'missing_weight': []}
+    materials = []
+    for req in result['requirements']:
+        materials.append({
+            'product': req['product'],
+            'gross': req['gross'],
+            'on_hand': float(req['product'].current_stock or 0),
+            'from_stock': req['from_stock'],
+            'net': req['net'],
+            'kind': req['kind'],
+            'boms': sorted(boms_of.get(req['product_id'], ())),
+        })
+    materials.sort(key=lambda m: (m['product'].code or '', m['product'].id))
+    return {
+        'materials': materials,
+        'unlinked': result['unlinked'],
+        'missing_weight': result['missing_weight'],
+        'lines': lines,
+    }
 
-    edges = BomEdge.query.filter_by(bom_id=bom_id).all()
-    children_of = {}
-    for e in edges:
-        children_of.setdefault(e.parent_node_id, []).append(e)
 
-    nodes = (
-        BomNode.query
-        .options(joinedload(BomNode.item).joinedload(BomItem.product))
-        .filter(BomNode.bom_id == bom_id)
-        .all()
-    )
-    node_map = {n.id: n for n in nodes}
-
-    required: dict[int, dict] = {}
-    unlinked = []
-    missing_weight = []
-    breakdown = []   # her yaprak katkısı: {num,name,code,unit,leaf_qty,mult,contrib}
-
-    def walk(current_node_id, current_qty, factors):
-        node = node_map.get(current_node_id)
-        if not node:
-            return
-        children = children_of.get(current_node_id, [])
-        if not children:
-            item = node.item
-            product = item.product if item else None
-            if not product:
-                unlinked.append({
-                    'node_id': node.id,
-                    'num': node.num,
-                    'name': node.display_name or (item.name if item else ''),
-                })
-                return
-
-            material_text = ' '.join(_c(v) for v in [
-                product.material or '', product.name or '', node.display_name or ''
-            ])
-            w_per_unit = float(node.weight_per_unit) if node.weight_per_unit else 0.0
-            product_unit = product.unit_type
-
-            # FAZ 2A: Hazır/standart (dışarıdan alınan, sayılan) parçalar ya da kartı
-            # 'adet' olanlar HER ZAMAN adet tüketilir — malzeme adına ("Çelik Dövme")
-            # takılıp kg'a çevrilmeye çalışılmaz, fireli ağırlık aranmaz.
-            def _nt(s):
-                return (s or '').lower().replace('ı', 'i').replace('İ', 'i')
-            _leaf_type = _nt(getattr(item, 'type', '')) + ' ' + _nt(getattr(product, 'type', ''))
-            if (product_unit or '').lower() == 'adet' or 'hazir' in _leaf_type or 'standart' in _leaf_type:
-                key = product.id
-                if key not in required:
-                    required[key] = {'product': product, 'quantity': 0.0, 'node': node}
-                required[key]['quantity'] += current_qty
-                _lq = float(node.quantity or 0)
-                breakdown.append({
-                    'num': node.num, 'name': node.display_name or (item.name if item else ''),
-                    'code': product.code or '', 'unit': product_unit or '',
-                    'leaf_qty': _lq, 'mult': (current_qty / _lq) if _lq else 1.0,
-                    'contrib': current_qty, 'factors': list(factors)})
-                return
+def collect_leaf_issues(bom_ids) -> dict:
+    """Ağaçlardaki sarf edilemeyen yapraklar, stoktan bağımsız (derlenmiş
+    BOM'lardan; ağaç yürüyüşü yok): {'unlinked', 'missing_weight', 'bom_count'}.
+    Her kayıt bom_id ile döner."""
+    from app.utils.bom_engine import get_compiled_bom
 
-            if _force_cost_by_length(material_text, product_unit):
-                consume_qty = current_qty
-            elif _should_cost_by_weight(material_text, node.unit_type, w_per_unit, product_unit):
-                consume_qty = _weight_cost_quantity(current_qty, w_per_unit)
-            else:
-                # current_qty, hem 'quantity' hem (adet/hazır satırlarda) 'piece_count'
-                # yerine geçer — bkz. parse_bom_excel_v2: bu iki alan adet bazlı
-                # satırlarda zaten birbirine eşit üretiliyor.
-                consume_qty = _cost_quantity_for_unit(
-                    product_unit, node.unit_type, current_qty, current_qty, w_per_unit
-                )
-
-            if (
-                consume_qty == 0 and current_qty > 0
-                and (product_unit or '').lower() != (node.unit_type or '').lower()
-            ):
-                # Ağırlık verisi eksik olduğu için birim dönüşümü yapılamadı — bu
-                # malzeme sessizce 0 tüketilmesin, kullanıcıya ayrıca gösterilsin.
-                missing_weight.append({
-                    'node_id': node.id,
-                    'num': node.num,
-                    'name': node.display_name or (item.name if item else ''),
-                    'product_code': product.code,
-                })
-                return
-
-            key = product.id
-            if key not in required:
-                required[key] = {'product': product, 'quantity': 0.0, 'node': node}
-            required[key]['quantity'] += consume_qty
-            _lq = float(node.quantity or 0)
-            breakdown.append({
-                'num': node.num, 'name': node.display_name or (item.name if item else ''),
-                'code': product.code or '', 'unit': product_unit or '',
-                'leaf_qty': _lq, 'mult': (current_qty / _lq) if _lq else 1.0,
-                'contrib': consume_qty, 'factors': list(factors)})
-            return
-
-        for child_edge in children:
-            child_node = node_map.get(child_edge.child_node_id)
-            try:
-                # Miktar kaynağı: DÜĞÜM (node.quantity) — maliyet/ağaç (get_bom_tree)
-                # ile AYNI kaynak. Kalem düzenlemeleri node'a işlendiğinden üretim
-                # sarfiyatı da güncel kalır. (Eski hâl edge.quantity kullanıyordu;
-                # düzenleme edge'e yansımadığı için üretim ağaçtan sapıyordu.)
-                cq = (float(child_node.quantity) if (child_node and child_node.quantity)
-                      else float(child_edge.quantity or 1))
-            except (TypeError, ValueError):
-                cq = 1.0
-            # Ara düğümün miktarı 1'den farklıysa, altındaki yapraklara bir "çarpan
-            # kaynağı" olarak eklenir — böylece '2 adeti nereden aldı' izlenebilir.
-            child_factors = factors
-            if children_of.get(child_edge.child_node_id) and abs(cq - 1.0) > 1e-9:
-                child_factors = factors + [{
-                    'num': child_node.num if child_node else '',
-                    'name': (child_node.display_name or (child_node.item.name if child_node and child_node.item else '')) if child_node else '',
-                    'qty': cq}]
-            walk(child_edge.child_node_id, float(current_qty or 0) * cq, child_factors)
-
-    walk(node_id, build_qty, [])
-    return {
-        'materials': list(required.values()),
-        'unlinked': unlinked,
-        'missing_weight': missing_weight,
-        'breakdown': breakdown,
-    }
+    issues = {'unlinked': [], 'missing_weight': []}
+    bom_count = 0
+    for bom_id in bom_ids:
+        compiled = get_compiled_bom(bom_id)
+        if compiled is None:
+            continue
+        bom_count += 1
+        for index in sorted(compiled.leaf_issues):
+            entry = compiled.leaf_issues[index]
+            issues[entry['kind']].append(dict(entry, bom_id=bom_id))
+    return dict(issues, bom_count=bom_count)
 
 
 # ---------------------------------------------------------------------------
@@ -3154,10 +3102,13 @@ def add_bom_node(bom_id: int, parent_node_id: int, data: dict, db) -> dict:
     """BOM ağacına, seçili düğümün altına yeni bir parça (düğüm) ekler.
     data: name, code, material, quantity, unit_type, item_type, weight_per_unit."""
     from app.models import BomNode, BomEdge, BomItem, Product
+    from app.utils import bom_closure
 
     parent_node = BomNode.query.filter_by(id=parent_node_id, bom_id=bom_id).first()
     if not parent_node:
         return {'error': 'Üst düğüm bulunamadı.'}
+    # Yazmalardan (kart/kalem oluşturma dahil) önce: indeks güncelse artımlı güncellenir.
+    indexed = bom_closure.is_fresh(bom_id)
 
     name = (data.get('name') or '').strip()
     if not name:
@@ -3206,35 +3157,26 @@ def add_bom_node(bom_id: int, parent_node_id: int, data: dict, db) -> dict:
 
     edge = BomEdge(bom_id=bom_id, parent_node_id=parent_node.id, child_node_id=node.id, quantity=Decimal(str(quantity)))
     db.session.add(edge)
+    if indexed:
+        bom_closure.add_leaf(bom_id, parent_node.id, node.id)
     db.session.commit()
 
     return {'node_id': node.id, 'num': num}
 
 
 def _descendant_ids(bom_id: int, node_id: int) -> set[int]:
-    """node_id'nin tüm alt ağacındaki düğüm id'lerini (node_id hariç) döndürür."""
-    from app.models import BomEdge
+    """node_id'nin tüm alt ağacındaki düğüm id'lerini (node_id hariç) döndürür
+    (bom_closure indeksinden tek sorguyla, bkz. app/utils/bom_closure.py)."""
+    from app.utils import bom_closure
 
-    edges = BomEdge.query.filter_by(bom_id=bom_id).all()
-    children_of: dict = {}
-    for e in edges:
-        children_of.setdefault(e.parent_node_id, []).append(e.child_node_id)
-
-    descendants = set()
-    queue = [node_id]
-    while queue:
-        cur = queue.pop()
-        for child_id in children_of.get(cur, []):
-            if child_id not in descendants:
-                descendants.add(child_id)
-                queue.append(child_id)
-    return descendants
+    return bom_closure.descendant_ids(bom_id, node_id)
 
 
 def delete_bom_node(bom_id: int, node_id: int, db) -> dict:
     """Bir BOM düğümünü (ve varsa tüm alt ağacını) siler. Kök düğüm (mamul,
     level=0) bu şekilde silinemez — tüm BOM'u silmek için ayrı bir akış var."""
     from app.models import BomNode, BomEdge
+    from app.utils import bom_closure
 
     node = BomNode.query.filter_by(id=node_id, bom_id=bom_id).first()
     if not node:
@@ -3242,6 +3184,7 @@ def delete_bom_node(bom_id: int, node_id: int, db) -> dict:
     if node.level == 0:
         return {'error': "Kök düğüm (mamul) bu şekilde silinemez — tüm BOM'u silmek için BOM Sil'i kullanın."}
 
+    indexed = bom_closure.ensure(bom_id)
     to_delete = {node_id} | _descendant_ids(bom_id, node_id)
 
     BomEdge.query.filter(
@@ -3249,38 +3192,47 @@ def delete_bom_node(bom_id: int, node_id: int, db) -> dict:
         (BomEdge.parent_node_id.in_(to_delete)) | (BomEdge.child_node_id.in_(to_delete))
     ).delete(synchronize_session=False)
     BomNode.query.filter(BomNode.id.in_(to_delete)).delete(synchronize_session=False)
+    if indexed:
+        bom_closure.remove_nodes(bom_id, to_delete)
     db.session.commit()
 
     return {'deleted_count': len(to_delete)}
 
 
-def _renumber_subtree(bom_id: int, node, new_parent_num: str, new_level: int, db):
-    """node'u (ve tüm alt ağacını) yeni konumuna göre yeniden numaralandırır."""
+def _renumber_subtree(bom_id: int, node, new_parent_num: str, new_level: int, db, descendants=None):
+    """node'u (ve tüm alt ağacını) yeni konumuna göre yeniden numaralandırır.
+    Alt ağacın düğümleri ve kenarları birer sorguyla yüklenir; numaralar
+    bellekte (özyinelemesiz) hesaplanıp tek flush'ta yazılır. `descendants`
+    verilmezse alt ağaç indeksten okunur."""
     from app.models import BomNode, BomEdge
 
-    edges = BomEdge.query.filter_by(bom_id=bom_id).all()
+    if descendants is None:
+        descendants = _descendant_ids(bom_id, node.id)
+    subtree = {node.id} | set(descendants)
+    nodes = {n.id: n for n in BomNode.query.filter(BomNode.id.in_(subtree)).all()}
+    nodes[node.id] = node
     children_of: dict = {}
-    for e in edges:
-        children_of.setdefault(e.parent_node_id, []).append(e.child_node_id)
-
-    def recurse(n, num, level):
+    edges = (db.session.query(BomEdge.parent_node_id, BomEdge.child_node_id)
+             .filter(BomEdge.bom_id == bom_id, BomEdge.child_node_id.in_(subtree)))
+    for parent_id, child_id in edges:
+        children_of.setdefault(parent_id, []).append(child_id)
+
+    stack = [(node, new_parent_num, new_level)]
+    while stack:
+        n, num, level = stack.pop()
         n.num = num
         n.level = level
-        child_ids = children_of.get(n.id, [])
-        if not child_ids:
-            return
-        child_nodes = BomNode.query.filter(BomNode.id.in_(child_ids)).all()
-        child_nodes.sort(key=lambda x: x.num)
+        child_nodes = sorted((nodes[c] for c in children_of.get(n.id, []) if c in nodes),
+                             key=lambda x: x.num)
         for i, child in enumerate(child_nodes, start=1):
-            recurse(child, f'{num}{i}.', level + 1)
-
-    recurse(node, new_parent_num, new_level)
+            stack.append((child, f'{num}{i}.', level + 1))
 
 
 def move_bom_node(bom_id: int, node_id: int, new_parent_node_id: int, db) -> dict:
     """Bir düğümü (ve alt ağacını) başka bir üst düğümün altına taşır,
     numaralandırmayı yeni konumuna göre yeniden hesaplar."""
     from app.models import BomNode, BomEdge
+    from app.utils import bom_closure
 
     node = BomNode.query.filter_by(id=node_id, bom_id=bom_id).first()
     new_parent = BomNode.query.filter_by(id=new_parent_node_id, bom_id=bom_id).first()
@@ -3289,6 +3241,7 @@ def move_bom_node(bom_id: int, node_id: int, new_parent_node_id: int, db) -> dic
     if node.level == 0:
         return {'error': 'Kök düğüm (mamul) taşınamaz.'}
 
+    indexed = bom_closure.ensure(bom_id)
     descendants = _descendant_ids(bom_id, node_id)
     if new_parent_node_id == node_id or new_parent_node_id in descendants:
         return {'error': 'Bir düğüm kendi alt ağacının altına taşınamaz.'}
@@ -3302,7 +3255,10 @@ def move_bom_node(bom_id: int, node_id: int, new_parent_node_id: int, db) -> dic
 
     new_num = _next_child_num(bom_id, new_parent)
     new_level = 1 if new_parent.num == '0.' else new_parent.level + 1
-    _renumber_subtree(bom_id, node, new_num, new_level, db)
+    # Alt ağaç kenar değişikliğinden önce okundu (taşıma alt ağacı değiştirmez).
+    _renumber_subtree(bom_id, node, new_num, new_level, db, descendants=descendants)
+    if indexed:
+        bom_closure.move_subtree(bom_id, node_id, new_parent.id)
 
     db.session.commit()
     return {'moved': True, 'new_num': new_num}
@@ -0,0 +1,103 @@
+"""
+Vektörel BOM Roll-up (NumPy)
+============================
+`bom_engine.rollup` her düğüm için bir Python döngü adımı çalıştırır; on
+binlerce düğümlü ağaçlarda roll-up süresi düğüm sayısıyla doğrusal ama yavaş
+büyür.
+
+Bu modül derlenmiş BOM'u (bkz. CompiledBom) NumPy dizilerine çevirir ve
+toplamları seviye seviye, alttan üste segment toplamlarıyla hesaplar:
+  parents    — ebeveyn indeksi (kökte -1)
+  depth      — ağaçtaki derinlik (kök 0); seviyeler en derinden köke işlenir
+  rolls_up   — maliyet çocuklardan mı toplanıyor?
+  rollup_mult / cost_qty — ara düğüm çarpanı ve yaprak maliyet miktarı
+  cost_pos   — maliyet kartının fiyat vektöründeki yeri (yoksa -1)
+Ağırlıkla/boyla maliyetlendirme, hazır parça ve birim dönüşümü kararları
+(`_should_cost_by_weight`, `_force_cost_by_length` …) derleme sırasında
+`_compile_node` ile bir kez verilir ve buraya yalnızca sonuç olarak
+(`rolls_up`, `rollup_mult`, `cost_qty`) gelir; iki motor aynı kararları paylaşır.
+
+Her ebeveynin çocukları ön-sıra düzeninde toplandığından toplama sırası
+Python motoruyla aynıdır; sonuçlar bit düzeyinde eşittir. NumPy kurulu
+değilse `available()` False döner ve Python motoru kullanılır.
+"""
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - pandas ile birlikte gelir
+    np = None
+
+
+def available() -> bool:
+    return np is not None
+
+
+class VectorBom:
+    """CompiledBom'un roll-up için gereken alanlarının NumPy gösterimi."""
+
+    __slots__ = ('size', 'rolls_up', 'rollup_mult', 'cost_qty', 'cost_pos', 'cost_keys', 'levels')
+
+    def __init__(self, compiled):
+        size = len(compiled.node_ids)
+        self.size = size
+        self.rolls_up = np.fromiter(compiled.rolls_up, dtype=bool, count=size)
+        self.rollup_mult = np.fromiter(compiled.rollup_mult, dtype=np.float64, count=size)
+        self.cost_qty = np.fromiter(compiled.cost_qty, dtype=np.float64, count=size)
+
+        keys: dict = {}
+        cost_pos = np.full(size, -1, dtype=np.intp)
+        for i, cid in enumerate(compiled.costing_ids):
+            if cid is not None and not compiled.rolls_up[i]:
+                cost_pos[i] = keys.setdefault(cid, len(keys))
+        self.cost_pos = cost_pos
+        self.cost_keys = list(keys)
+
+        # Ön-sıra düzeninde ebeveyn çocuktan önce gelir: derinlik tek geçişte bulunur.
+        parents = compiled.parents
+        depth = [0] * size
+        for i, p in enumerate(parents):
+            if p >= 0:
+                depth[i] = depth[p] + 1
+        depth = np.fromiter(depth, dtype=np.intp, count=size)
+        parent_arr = np.fromiter(parents, dtype=np.intp, count=size)
+
+        # Her seviye için: o seviyedeki düğümler (indeks sırasında), ebeveynlerine
+        # göre grup numaraları ve maliyeti çocuklardan toplanan ebeveynler.
+        levels = []
+        order = np.argsort(depth, kind='stable')
+        bounds = np.searchsorted(depth[order], np.arange(int(depth.max(initial=0)) + 2))
+        for d in range(len(bounds) - 2, 0, -1):
+            nodes = order[bounds[d]:bounds[d + 1]]
+            if not len(nodes):
+                continue
+            groups, inverse = np.unique(parent_arr[nodes], return_inverse=True)
+            mask = self.rolls_up[groups]
+            levels.append((nodes, inverse.ravel(), len(groups), mask, groups[mask]))
+        self.levels = levels
+
+
+def vector_bom(compiled) -> VectorBom:
+    """Derlenmiş BOM'un dizileri (CompiledBom üzerinde bir kez kurulur)."""
+    vector = compiled.vector
+    if vector is None:
+        vector = compiled.vector = VectorBom(compiled)
+    return vector
+
+
+def rollup(compiled, prices: dict = None) -> tuple[list, list]:
+    """`bom_engine.rollup` ile aynı sonuç; seviye sıralı vektörel toplama."""
+    prices = compiled.prices if prices is None else prices
+    vec = vector_bom(compiled)
+
+    price_vec = np.fromiter((prices.get(cid, 0.0) for cid in vec.cost_keys),
+                            dtype=np.float64, count=len(vec.cost_keys))
+    unit_costs = np.zeros(vec.size, dtype=np.float64)
+    priced = vec.cost_pos >= 0
+    unit_costs[priced] = price_vec[vec.cost_pos[priced]]
+    total_costs = unit_costs * vec.cost_qty
+
+    for nodes, inverse, group_count, mask, rolling in vec.levels:
+        sums = np.bincount(inverse, weights=total_costs[nodes], minlength=group_count)
+        child_sum = sums[mask]
+        unit_costs[rolling] = child_sum
+        total_costs[rolling] = child_sum * vec.rollup_mult[rolling]
+    return unit_costs.tolist(), total_costs.tolist()
@@ -0,0 +1,267 @@
+"""
+Maliyet Duyarlılık İndeksi (ne olursa / what-if)
+================================================
+Satın alma yeni fiyat gönderdiğinde (`/api/v1/products/price-sync`,
+`production.bom_sync_prices`) hangi BOM toplamlarının değiştiğini görmek için
+eskiden tüm ağaçları yeniden kurmak gerekiyordu.
+
+Bu modül tüm BOM'ların derlenmiş hâlini (bkz. app/utils/bom_engine.py) ve
+roll-up sonucunu süreç içinde tutar; üstüne kart → BOM düğümü ters indeksi kurar:
+  maliyet kartı  — düğümün maliyeti bu karttan alınıyor (doğrudan bağlı kart
+                   ya da `_find_costing_raw_material` ikamesi)
+  bağlı kart     — düğüm bu karta bağlı ama fiyatı olmadığı için maliyet ikame
+                   karttan alınıyor; kart fiyat kazanırsa maliyet ona döner
+Bir fiyat değişikliğinde yalnızca etkilenen BOM'lar ve onlarda da yalnızca
+değişen yaprakların ataları yeniden hesaplanır (`bom_engine.incremental_rollup`).
+
+Güncellik (bkz. shared_index):
+  - boms damgası değiştiyse bom:<id> damgası değişen BOM yeniden derlenir,
+    silinen BOM düşer.
+  - bom_items değişirse indeks baştan kurulur.
+  - bom_products değişirse kartların fiyat dışı alanları ve fiyatın sıfır/pozitif
+    durumu karşılaştırılır (ikame kararı yalnızca bunlara bağlıdır). Yalnızca
+    fiyat değiştiyse yeniden derleme yapılmaz; etkilenen BOM'lar artımlı
+    güncellenir. Aksi hâlde indeks baştan kurulur.
+
+Varsayımsal senaryoda fiyatı sıfıra düşürülen bir kart için yeni ikame kartı
+aranmaz (düğüm sıfır maliyetle kalır); gerçek yazmadan sonra derleme bunu düzeltir.
+İlk çağrı tüm BOM'ları derler; sonraki çağrılar milisaniyeler içinde döner.
+"""
+from app.utils import bom_engine, versioning
+from app.utils.shared_index import BomEntryIndex, SharedIndex
+
+# Kart parmak izine giren alanlar: ikame/maliyet kararını etkileyen fiyat dışı alanlar.
+_FINGERPRINT_FIELDS = tuple(f for f in versioning.BOM_PRODUCT_FIELDS if f != 'unit_cost')
+
+
+class _BomEntry:
+    __slots__ = ('compiled', 'root', 'unit_costs', 'total_costs', 'by_cost', 'by_link')
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.root = compiled.roots[0]
+        self.unit_costs, self.total_costs = bom_engine.rollup(compiled)
+        by_cost: dict = {}
+        by_link: dict = {}
+        for i, cid in enumerate(compiled.costing_ids):
+            if compiled.rolls_up[i]:
+                continue
+            if cid is not None:
+                by_cost.setdefault(cid, []).append(i)
+            pid = compiled.product_ids[i]
+            if pid is not None and pid != cid and compiled.rows[i]['cost_substituted']:
+                by_link.setdefault(pid, []).append(i)
+        self.by_cost = {pid: tuple(idx) for pid, idx in by_cost.items()}
+        self.by_link = {pid: tuple(idx) for pid, idx in by_link.items()}
+
+    @property
+    def total(self) -> float:
+        return float(self.total_costs[self.root] or 0)
+
+    def product_ids(self):
+        return self.by_cost.keys() | self.by_link.keys()
+
+    def apply(self, new_prices: dict) -> tuple[dict, dict, dict, dict]:
+        """Varsayımsal fiyatlarla artımlı roll-up. Dönüş: (birim, toplam,
+        birleşik fiyatlar, maliyet kartı değişen düğümler)."""
+        compiled = self.compiled
+        prices = dict(compiled.prices)
+        changed = []
+        costing = {}
+        for pid, price in new_prices.items():
+            nodes = self.by_cost.get(pid)
+            if nodes:
+                prices[pid] = price
+                changed.extend(nodes)
+            linked = self.by_link.get(pid)
+            if linked and price and price > 0:
+                # Kartın kendi geçerli fiyatı varsa ikame yapılmaz (bkz. _compile_node).
+                prices[pid] = price
+                changed.extend(linked)
+                costing.update((i, pid) for i in linked)
+        units, totals = bom_engine.incremental_rollup(
+            compiled, self.unit_costs, self.total_costs, changed, prices, costing)
+        return units, totals, prices, costing
+
+
+class CostIndex(BomEntryIndex):
+    """Tüm BOM'ların roll-up sonucu ve kart → BOM ters indeksi (entries: bom_id -> _BomEntry)."""
+
+    def __init__(self):
+        super().__init__()
+        self.boms_by_product: dict = {}   # kart id -> {bom_id}
+        self.fingerprints: dict = {}  # kart id -> (fiyat dışı alanlar, fiyat > 0)
+        self.prices: dict = {}        # kart id -> birim fiyat
+        self.shared_tokens = None     # (bom_items, bom_products)
+
+    def _index_entry(self, bom_id: int, entry) -> None:
+        for pid in entry.product_ids():
+            self.boms_by_product.setdefault(pid, set()).add(bom_id)
+
+    def _unindex_entry(self, bom_id: int, entry) -> None:
+        for pid in entry.product_ids():
+            boms = self.boms_by_product.get(pid)
+            if boms is not None:
+                boms.discard(bom_id)
+                if not boms:
+                    del self.boms_by_product[pid]
+
+    def nodes_for_product(self, product_id: int) -> list[dict]:
+        """Maliyeti bu karttan alınan ya da bu karta bağlı ikameli düğümler."""
+        result = []
+        for bom_id in sorted(self.boms_by_product.get(product_id, ())):
+            entry = self.entries[bom_id]
+            rows = entry.compiled.rows
+            for via, nodes in (('cost', entry.by_cost.get(product_id, ())),
+                               ('linked', entry.by_link.get(product_id, ()))):
+                for i in nodes:
+                    substituted = via == 'cost' and entry.compiled.product_ids[i] != product_id
+                    result.append({
+                        'bom_id': bom_id,
+                        'node_id': entry.compiled.node_ids[i],
+                        'num': rows[i]['num'],
+                        'name': rows[i]['name'],
+                        'via': 'substitute' if substituted else ('direct' if via == 'cost' else 'linked'),
+                    })
+        return result
+
+    def what_if(self, new_prices: dict) -> list[dict]:
+        """Varsayımsal fiyatlarla (kart id -> birim fiyat) toplamı değişen
+        BOM'lar, mutlak farka göre büyükten küçüğe."""
+        affected = set()
+        for pid in new_prices:
+            affected |= self.boms_by_product.get(pid, set())
+        result = []
+        for bom_id in affected:
+            entry = self.entries[bom_id]
+            relevant = {pid: new_prices[pid] for pid in entry.product_ids() if pid in new_prices}
+            _, totals, _, _ = entry.apply(relevant)
+            before = entry.total
+            after = float(totals.get(entry.root, before) or 0)
+            delta = after - before
+            if abs(delta) < 1e-9:
+                continue
+            row = entry.compiled.rows[entry.root]
+            result.append({
+                'bom_id': bom_id,
+                'name': row['name'] or f'BOM #{bom_id}',
+                'currency': row['currency'],
+                'before': before,
+                'after': after,
+                'delta': delta,
+                'delta_pct': (delta / before * 100) if before else None,
+            })
+        result.sort(key=lambda r: (-abs(r['delta']), r['bom_id']))
+        return result
+
+    def _apply_price_changes(self, new_prices: dict) -> list:
+        """Gerçek fiyat değişikliklerini etkilenen BOM'lara artımlı uygular.
+        Dönüş: yeniden derlenmesi gereken (indeksten düşürülen) BOM id'leri."""
+        recompile = []
+        affected = set()
+        for pid in new_prices:
+            affected |= self.boms_by_product.get(pid, set())
+        for bom_id in affected:
+            entry = self.entries[bom_id]
+            relevant = {pid: new_prices[pid] for pid in entry.product_ids() if pid in new_prices}
+            units, totals, prices, costing = entry.apply(relevant)
+            if costing:
+                # Maliyet kartı değişti: karar değişmiş demektir, yeniden derlenmeli.
+                self._drop(bom_id)
+                recompile.append(bom_id)
+                continue
+            compiled = entry.compiled
+            compiled.prices = prices
+            unit_costs = list(entry.unit_costs)
+            total_costs = list(entry.total_costs)
+            for i, value in units.items():
+                unit_costs[i] = value
+            for i, value in totals.items():
+                total_costs[i] = value
+            entry.unit_costs, entry.total_costs = unit_costs, total_costs
+        return recompile
+
+
+def _product_state() -> tuple[dict, dict]:
+    from app import db
+    from app.models import Product
+
+    columns = [getattr(Product, f) for f in _FINGERPRINT_FIELDS]
+    fingerprints, prices = {}, {}
+    for row in db.session.query(Product.id, Product.unit_cost, *columns).all():
+        pid, unit_cost = row[0], row[1] or 0.0
+        fingerprints[pid] = (tuple(row[2:]), unit_cost > 0)
+        prices[pid] = unit_cost
+    return fingerprints, prices
+
+
+def _compile_entry(bom_id: int, shared_tokens):
+    # Süreç önbelleği (LRU) bu toplu iş için doldurulmaz; indeks kendi kopyasını tutar.
+    compiled = bom_engine.compile_bom(bom_id, shared_tokens)
+    if compiled is None or not compiled.roots:
+        return None
+    return _BomEntry(compiled)
+
+
+def _compile_entries(bom_ids, shared_tokens) -> dict:
+    """BOM'ları derler (bom_ids None ise düğümü olan tüm BOM'lar)."""
+    if bom_ids is None:
+        from app import db
+        from app.models import BomNode
+        bom_ids = [b for (b,) in db.session.query(BomNode.bom_id).distinct().order_by(BomNode.bom_id)]
+    entries = {}
+    for bom_id in bom_ids:
+        entry = _compile_entry(bom_id, shared_tokens)
+        if entry is not None:
+            entries[bom_id] = entry
+    return entries
+
+
+def _signature():
+    return versioning.read_signature(
+        (versioning.SCOPE_BOMS, versioning.SCOPE_BOM_ITEMS, versioning.SCOPE_BOM_PRODUCTS))
+
+
+def _refresh(index, signature) -> CostIndex:
+    shared_tokens = tuple(signature[1:]) if signature is not None else None
+    rebuild = index is None or index.shared_tokens[0] != shared_tokens[0]
+    recompile = []
+
+    if not rebuild and index.shared_tokens[1] != shared_tokens[1]:
+        fingerprints, prices = _product_state()
+        if fingerprints != index.fingerprints:
+            rebuild = True
+        else:
+            changed = {pid: price for pid, price in prices.items() if index.prices.get(pid) != price}
+            recompile = index._apply_price_changes(changed)
+            index.prices = prices
+    if rebuild:
+        index = CostIndex()
+        index.fingerprints, index.prices = _product_state()
+
+    index.sync(signature[0] if signature is not None else None,
+               lambda bom_ids: _compile_entries(bom_ids, shared_tokens))
+    for bom_id in recompile:
+        if bom_id not in index.entries:
+            index._put(bom_id, _compile_entry(bom_id, shared_tokens))
+    index.shared_tokens = shared_tokens
+    return index
+
+
+_shared = SharedIndex(_signature, _refresh)
+
+
+def shared_cost_index() -> CostIndex:
+    """Güncel maliyet indeksi. İzleme kapalıysa her çağrıda baştan kurulur."""
+    return _shared.get()
+
+
+def what_if(new_prices: dict) -> list[dict]:
+    """Varsayımsal fiyatlarla (kart id -> birim fiyat) tüm BOM'lardaki farklar."""
+    index = shared_cost_index()
+    with _shared.lock:
+        return index.what_if(new_prices)
+
+
+def invalidate() -> None:
+    _shared.invalidate()
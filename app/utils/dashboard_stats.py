@@ -0,0 +1,324 @@
+"""
+Dashboard İstatistik Servisi
+============================
+`main.dashboard` ve `/api/dashboard/stats` her çağrıda aktif ürün sayısını,
+kritik listeyi, bugünkü hareket sayısını ve 7 günlük giriş/çıkış toplamlarını
+defter (stock_movements) üzerinden yeniden hesaplıyordu; API ön yüzde
+sürekli yoklanıyor.
+
+Hareket sayaçları `movement_daily_totals` tablosunda (gün × hareket tipi)
+tutulur; tablo tüm işçiler arasında paylaşılır:
+  - Her flush'ta yeni / silinen / değişen StockMovement satırlarının farkı
+    aynı transaction içinde eklenir; toplu insert'ler parametrelerinden
+    hesaplanır. Satır bilgisi olmayan toplu update/delete'lerde tablo commit
+    öncesinde, etkilenen satırların en eski gününden itibaren defterden
+    yeniden hesaplanır; tarih / tip / miktar yazmayan toplu update'ler
+    (ör. ürün birleştirmede product_id taşıma) toplamlara dokunmaz.
+  - Son RECONCILE_DAYS gün, RECONCILE_INTERVAL'da bir defterle mutabakata
+    alınır (okuma sırasında, kendi transaction'ında; tarih aralığıyla
+    sınırlı tek gruplu sorgu).
+
+7 günlük pencere günün ortasından başladığı için ilk (kısmi) gün defterden
+tarih aralığıyla okunur; diğer günler tablodan gelir. Böylece dashboard
+süresi defter boyutuna bağlı değildir.
+
+Ürün sayaçları (aktif ürün, kritik sayı ve ilk kritikler) işçi içinde katalog
+sürümüne (bkz. versioning.catalog_version) göre önbelleğe alınır.
+"""
+import threading
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_, delete, event, func, select
+
+from app.utils import versioning
+from app.utils.flush_tracking import (add_delta, bind_commit_rebuild, bulk_set_values, collect_deltas,
+                                      mark_stale, upsert_increments)
+
+SCOPE_RECONCILED = 'dashboard_reconciled'
+RECONCILE_INTERVAL = timedelta(hours=1)
+RECONCILE_DAYS = 8
+CRITICAL_PREVIEW = 5
+
+TOTAL_COLUMNS = ('movement_count', 'total_quantity')
+MOVEMENT_FIELDS = ('date', 'movement_type', 'quantity')
+
+_STALE_KEY = 'dashboard_totals_stale'
+_TOKEN_FORMAT = '%Y%m%d%H%M%S'
+
+_product_cache = None   # (katalog sürümü, sayaçlar)
+_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Artımlı güncelleme
+# ---------------------------------------------------------------------------
+
+def _contribution(moment, movement_type, quantity):
+    if movement_type is None:
+        return None
+    # date varsayılanı (utcnow) INSERT anında atanır; flush öncesi boşsa şimdiki an
+    moment = moment or datetime.utcnow()
+    return (moment.date(), movement_type), (1, quantity or 0)
+
+
+def _before_flush(session, flush_context, instances):
+    from app.models import MovementDailyTotal, StockMovement
+
+    deltas = collect_deltas(session, {StockMovement: (MOVEMENT_FIELDS, _contribution)})[StockMovement]
+    if deltas:
+        upsert_increments(session.connection(), MovementDailyTotal.__table__,
+                          ('day', 'movement_type'), TOTAL_COLUMNS, deltas)
+
+
+def _bulk_first_day(orm_execute_state):
+    """Toplu update/delete'in değiştirebileceği ilk gün: (etkiler mi, gün).
+    Gün None ise tüm defter yeniden hesaplanır."""
+    from app.models import StockMovement
+
+    values = {}
+    if orm_execute_state.is_update:
+        values = bulk_set_values(orm_execute_state)
+        if values is None:
+            return True, None
+        if not set(values) & set(MOVEMENT_FIELDS):
+            # ör. ürün birleştirmede product_id taşıma: günlük toplamlar değişmez
+            return False, None
+    new_date = values.get('date')
+    if new_date is not None and not isinstance(new_date, (datetime, date)):
+        return True, None   # SQL ifadesi: yeni tarih bilinmiyor
+
+    # Etkilenecek satırların en eski tarihi (ifade çalışmadan önce, aynı WHERE ile)
+    statement = orm_execute_state.statement
+    first = select(func.min(StockMovement.date))
+    if statement.whereclause is not None:
+        first = first.where(statement.whereclause)
+    first = orm_execute_state.session.execute(first).scalar()
+
+    days = [_as_date(d) for d in (first, new_date) if d is not None]
+    if not days:
+        return False, None
+    return True, min(days)
+
+
+def _do_orm_execute(orm_execute_state):
+    from app.models import MovementDailyTotal, StockMovement
+
+    if not any(mapper.class_ is StockMovement for mapper in orm_execute_state.all_mappers):
+        return
+    if orm_execute_state.is_insert:
+        # session.execute(insert(StockMovement), [...]): satırlar parametrelerde
+        params = orm_execute_state.parameters
+        rows = params if isinstance(params, (list, tuple)) else [params or {}]
+        deltas = {}
+        for row in rows:
+            add_delta(deltas, _contribution(row.get('date'), row.get('movement_type'), row.get('quantity')), 1)
+        if deltas:
+            upsert_increments(orm_execute_state.session.connection(), MovementDailyTotal.__table__,
+                              ('day', 'movement_type'), TOTAL_COLUMNS, deltas)
+    elif orm_execute_state.is_update or orm_execute_state.is_delete:
+        affected, since = _bulk_first_day(orm_execute_state)
+        if affected:
+            mark_stale(orm_execute_state.session, _STALE_KEY, since)
+
+
+def _rebuild_stale(connection, marks):
+    rebuild_daily_totals(connection, since=None if None in marks else min(marks))
+
+
+# ---------------------------------------------------------------------------
+# Defterden yeniden hesaplama / mutabakat
+# ---------------------------------------------------------------------------
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def rebuild_daily_totals(connection, since: date | None = None) -> None:
+    """`since` gününden (verilmezse tüm defter) itibaren günlük toplamları
+    defterden yeniden yazar. Mutlak değer upsert'i + artık satırların silinmesi;
+    eşzamanlı iki mutabakat birbirini bozmaz."""
+    from app.models import MovementDailyTotal, StockMovement
+
+    ledger = StockMovement.__table__
+    table = MovementDailyTotal.__table__
+    day_expr = func.date(ledger.c.date)
+    query = (
+        select(day_expr, ledger.c.movement_type, func.count(), func.sum(ledger.c.quantity))
+        .where(ledger.c.date.isnot(None))
+        .group_by(day_expr, ledger.c.movement_type)
+    )
+    if since is not None:
+        query = query.where(ledger.c.date >= datetime.combine(since, time.min))
+
+    now = datetime.utcnow()
+    rows = [
+        {'day': _as_date(day), 'movement_type': movement_type, 'movement_count': count,
+         'total_quantity': quantity or 0, 'updated_at': now}
+        for day, movement_type, count, quantity in connection.execute(query)
+    ]
+
+    # Defterde artık karşılığı olmayan satırlar
+    keep = {(row['day'], row['movement_type']) for row in rows}
+    existing = select(table.c.day, table.c.movement_type)
+    if since is not None:
+        existing = existing.where(table.c.day >= since)
+    for day, movement_type in connection.execute(existing).all():
+        if (_as_date(day), movement_type) not in keep:
+            connection.execute(delete(table).where(
+                and_(table.c.day == day, table.c.movement_type == movement_type)))
+
+    dialect = connection.dialect.name
+    for row in rows:
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table).values(**row)
+            connection.execute(stmt.on_conflict_do_update(
+                index_elements=['day', 'movement_type'],
+                set_={c: stmt.excluded[c] for c in (*TOTAL_COLUMNS, 'updated_at')},
+            ))
+            continue
+        result = connection.execute(
+            table.update().where(and_(table.c.day == row['day'], table.c.movement_type == row['movement_type']))
+            .values(movement_count=row['movement_count'], total_quantity=row['total_quantity'], updated_at=now)
+        )
+        if not result.rowcount:
+            connection.execute(table.insert().values(**row))
+
+    versioning.bump(connection, (SCOPE_RECONCILED,), token=now.strftime(_TOKEN_FORMAT))
+
+
+def _reconcile_if_due(now: datetime) -> None:
+    """Mutabakat zamanı geldiyse son RECONCILE_DAYS günü kendi transaction'ında
+    (istek oturumundan bağımsız) defterle eşitler."""
+    from flask import current_app
+    from app import db
+
+    token = versioning.read_signature((SCOPE_RECONCILED,))
+    if token is None:
+        return
+    last = datetime.strptime(token[0], _TOKEN_FORMAT) if token[0] else None
+    if last is not None and now - last < RECONCILE_INTERVAL:
+        return
+    try:
+        with db.engine.begin() as conn:
+            rebuild_daily_totals(conn, since=(now - timedelta(days=RECONCILE_DAYS)).date())
+    except Exception as e:
+        # Okuma yolunu bozmasın; sayaçlar artımlı güncel, sonraki okumada yeniden denenir
+        current_app.logger.warning(f"Günlük hareket toplamları mutabakatı yapılamadı: {e}")
+
+
+def init_dashboard_stats(app, db) -> bool:
+    """Günlük toplam tablosunu (yoksa) oluşturur, boşsa defterden doldurur ve
+    oturum olaylarını bağlar."""
+    from app.models import MovementDailyTotal
+
+    with app.app_context():
+        try:
+            MovementDailyTotal.__table__.create(bind=db.engine, checkfirst=True)
+        except Exception as e:
+            app.logger.warning(f"movement_daily_totals tablosu oluşturulamadı: {e}")
+            return False
+        try:
+            with db.engine.begin() as conn:
+                if conn.execute(select(func.count()).select_from(MovementDailyTotal.__table__)).scalar() == 0:
+                    rebuild_daily_totals(conn)
+        except Exception as e:
+            # İlk kurulumda (stock_movements henüz yokken) doldurma atlanır
+            app.logger.info(f"Günlük hareket toplamları başlangıçta doldurulamadı: {e}")
+
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'do_orm_execute', _do_orm_execute)
+        bind_commit_rebuild(db, _STALE_KEY, _rebuild_stale)
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Okuma
+# ---------------------------------------------------------------------------
+
+def _product_counters() -> dict:
+    global _product_cache
+    from app import db
+    from app.models import Product
+
+    version = versioning.catalog_version()
+    with _lock:
+        if version is not None and _product_cache is not None and _product_cache[0] == version:
+            return _product_cache[1]
+
+    critical_filter = (
+        Product.is_active == True,
+        Product.current_stock < Product.minimum_stock,
+        Product.minimum_stock > 0
+    )
+    counters = {
+        'total_products': Product.query.filter_by(is_active=True).count(),
+        'critical_count': Product.query.filter(*critical_filter).count(),
+        'critical_preview_ids': [pid for (pid,) in db.session.query(Product.id).filter(*critical_filter)
+                                 .order_by(Product.id).limit(CRITICAL_PREVIEW)],
+    }
+    if version is not None:
+        with _lock:
+            _product_cache = (version, counters)
+    return counters
+
+
+def _movement_counters(now: datetime) -> dict:
+    from app import db
+    from app.models import MovementDailyTotal, StockMovement
+
+    today = now.date()
+    week_ago = now - timedelta(days=7)
+    first_full_day = week_ago.date() + timedelta(days=1)
+
+    today_movements = db.session.query(func.sum(MovementDailyTotal.movement_count)).filter(
+        MovementDailyTotal.day == today
+    ).scalar() or 0
+
+    totals = dict(db.session.query(
+        MovementDailyTotal.movement_type, func.sum(MovementDailyTotal.total_quantity)
+    ).filter(
+        MovementDailyTotal.day >= first_full_day,
+        MovementDailyTotal.movement_type.in_(('giris', 'cikis'))
+    ).group_by(MovementDailyTotal.movement_type).all())
+
+    # Pencerenin başladığı (kısmi) gün: defterden, tek günlük tarih aralığıyla
+    partial = dict(db.session.query(
+        StockMovement.movement_type, func.sum(StockMovement.quantity)
+    ).filter(
+        StockMovement.date >= week_ago,
+        StockMovement.date < datetime.combine(first_full_day, time.min),
+        StockMovement.movement_type.in_(('giris', 'cikis'))
+    ).group_by(StockMovement.movement_type).all())
+
+    def window_total(movement_type):
+        return (totals.get(movement_type) or 0) + (partial.get(movement_type) or 0)
+
+    return {
+        'today_movements': today_movements,
+        'week_in': window_total('giris'),
+        'week_out': window_total('cikis'),
+    }
+
+
+def get_dashboard_stats() -> dict:
+    """total_products, critical_count, critical_preview_ids, today_movements, week_in, week_out."""
+    now = datetime.utcnow()
+    _reconcile_if_due(now)
+    stats = dict(_product_counters())
+    stats.update(_movement_counters(now))
+    return stats
+
+
+def reset_cache() -> None:
+    global _product_cache
+    with _lock:
+        _product_cache = None
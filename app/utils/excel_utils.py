@@ -5,14 +5,86 @@ Excel/CSV Import/Export Utility Fonksiyonları
 
 import pandas as pd
 from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 from datetime import datetime
 
 from app.utils import sanitize_part_code, tr_lower
 
 
+def load_workbook_streaming(file_stream):
+    """Excel'i salt okunur (read_only) modda açar: satırlar dosyadan akıtılarak
+    okunur, tüm hücre nesne grafiği belleğe alınmaz (30 bin satırlık BOM'lar
+    tam modda işçi başına 1 GB'ı aşıyordu).
+
+    Dosyayı üreten programa göre kayıtlı boyut (dimension) yanlış olabildiğinden
+    sıfırlanır; satırlar sonuna kadar okunur ama en uzun satıra göre
+    doldurulmaz — satır uzunlukları farklı olabilir. `ws.cell()` rastgele
+    erişimi her çağrıda dosyayı baştan taradığı için yalnızca `iter_rows`
+    kullanılmalı. İş bitince `wb.close()` çağrılmalı.
+    """
+    wb = load_workbook(file_stream, read_only=True, data_only=True)
+    for ws in wb.worksheets:
+        ws.reset_dimensions()
+    return wb
+
+
+# ---------------------------------------------------------------------------
+# Salt yazma (write_only) dışa aktarım
+# ---------------------------------------------------------------------------
+# Satırlar openpyxl'in geçici dosyasına akıtılır, hücre nesneleri bellekte
+# birikmez. Biçimler hücre başına yeni Font/Border/PatternFill yerine kitap
+# başına bir kez tanımlanan adlandırılmış stillerle (NamedStyle) verilir.
+# Çıktı belli bir boyuttan sonra diske taşan geçici dosyadır; send_file onu
+# parça parça gönderir. Salt yazma modunda kolon genişlikleri ilk satırdan
+# önce, birleştirmeler ise istenen anda verilebilir.
+
+_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+_THIN = Side(style='thin')
+_THIN_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+
+
+def _solid(color: str) -> PatternFill:
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+
+def _named_style(name, font=None, fill=None, alignment=None, border=None, number_format=None) -> NamedStyle:
+    style = NamedStyle(name=name)
+    if font is not None:
+        style.font = font
+    if fill is not None:
+        style.fill = fill
+    if alignment is not None:
+        style.alignment = alignment
+    if border is not None:
+        style.border = border
+    if number_format is not None:
+        style.number_format = number_format
+    return style
+
+
+def _add_named_styles(wb, styles) -> None:
+    for style in styles:
+        wb.add_named_style(style)
+
+
+def _styled(ws, value, style: str) -> WriteOnlyCell:
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def _save_streaming(wb):
+    """Kitabı geçici dosyaya yazar ve başa sarılmış dosya nesnesini döndürür."""
+    output = SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE)
+    wb.save(output)
+    output.seek(0)
+    return output
+
+
 def create_product_template_simple():
     """
     Basitleştirilmiş ürün import şablonu (Kategori ID yok, web'de seçilecek)
@@ -298,11 +370,23 @@ def parse_product_excel(file_stream):
 
 def export_products_to_excel(products):
     """
-    Ürünleri Excel'e dışa aktar
+    Ürünleri Excel'e dışa aktar (salt yazma modu, bkz. _save_streaming).
+    `products` liste ya da `yield_per` ile akıtılan bir sorgu olabilir.
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Ürünler"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Ürünler")
+    _add_named_styles(wb, (
+        _named_style('urun_baslik', font=Font(bold=True, color="FFFFFF"),
+                     fill=_solid("4472C4"), alignment=Alignment(horizontal="center", vertical="center")),
+        _named_style('durum_bos', font=Font(bold=True, color='FF0000')),
+        _named_style('durum_kritik', font=Font(bold=True, color='FFA500')),
+        _named_style('durum_normal', font=Font(bold=True, color='00FF00')),
+    ))
+
+    # Kolon genişlikleri (salt yazma modunda ilk satırdan önce verilmeli)
+    column_widths = [8, 15, 30, 20, 10, 12, 12, 10, 15, 30, 18]
+    for col_num, width in enumerate(column_widths, 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = width
 
     # Başlıklar
     headers = [
@@ -318,63 +402,51 @@ def export_products_to_excel(products):
         'Notlar',
         'Oluşturulma Tarihi'
     ]
-
-    # Başlık satırını yaz
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.value = header
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
+    ws.append([_styled(ws, header, 'urun_baslik') for header in headers])
 
     # Veri satırlarını yaz
-    for row_num, product in enumerate(products, 2):
-        ws.cell(row=row_num, column=1, value=product.id)
-        ws.cell(row=row_num, column=2, value=product.code)
-        ws.cell(row=row_num, column=3, value=product.name)
-        ws.cell(row=row_num, column=4, value=product.category.name if product.category else '')
-        ws.cell(row=row_num, column=5, value=product.unit_type)
-        ws.cell(row=row_num, column=6, value=product.current_stock)
-        ws.cell(row=row_num, column=7, value=product.minimum_stock)
-
+    for product in products:
         # Stok durumu
         if product.current_stock <= 0:
-            status = 'BOŞ'
-            status_color = 'FF0000'
+            status, style = 'BOŞ', 'durum_bos'
         elif product.minimum_stock > 0 and product.current_stock < product.minimum_stock:
-            status = 'KRİTİK'
-            status_color = 'FFA500'
+            status, style = 'KRİTİK', 'durum_kritik'
         else:
-            status = 'NORMAL'
-            status_color = '00FF00'
+            status, style = 'NORMAL', 'durum_normal'
 
-        cell = ws.cell(row=row_num, column=8, value=status)
-        cell.font = Font(bold=True, color=status_color)
+        ws.append([
+            product.id,
+            product.code,
+            product.name,
+            product.category.name if product.category else '',
+            product.unit_type,
+            product.current_stock,
+            product.minimum_stock,
+            _styled(ws, status, style),
+            product.barcode or '',
+            product.notes or '',
+            product.created_at.strftime('%Y-%m-%d %H:%M') if product.created_at else '',
+        ])
 
-        ws.cell(row=row_num, column=9, value=product.barcode or '')
-        ws.cell(row=row_num, column=10, value=product.notes or '')
-        ws.cell(row=row_num, column=11, value=product.created_at.strftime('%Y-%m-%d %H:%M') if product.created_at else '')
-
-    # Kolon genişliklerini ayarla
-    column_widths = [8, 15, 30, 20, 10, 12, 12, 10, 15, 30, 18]
-    for col_num, width in enumerate(column_widths, 1):
-        ws.column_dimensions[chr(64 + col_num)].width = width
-
-    # BytesIO'ya kaydet
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    return output
+    return _save_streaming(wb)
 
 
 def export_stock_movements_to_excel(movements):
     """
-    Stok hareketlerini Excel'e dışa aktar
+    Stok hareketlerini Excel'e dışa aktar (salt yazma modu, bkz. _save_streaming).
+    `movements` liste ya da `yield_per` ile akıtılan bir sorgu olabilir.
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Stok Hareketleri"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Stok Hareketleri")
+    _add_named_styles(wb, (
+        _named_style('hareket_baslik', font=Font(bold=True, color="FFFFFF"),
+                     fill=_solid("217346"), alignment=Alignment(horizontal="center", vertical="center")),
+    ))
+
+    # Kolon genişlikleri (salt yazma modunda ilk satırdan önce verilmeli)
+    column_widths = [8, 16, 15, 30, 20, 15, 10, 10, 20, 20, 15, 30]
+    for col_num, width in enumerate(column_widths, 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = width
 
     # Başlıklar
     headers = [
@@ -386,46 +458,33 @@ def export_stock_movements_to_excel(movements):
         'Hareket Tipi',
         'Miktar',
         'Birim',
-        'Önceki Stok',
-        'Yeni Stok',
+        'Kaynak',
+        'Hedef',
         'Kullanıcı',
         'Açıklama'
     ]
-
-    # Başlık satırını yaz
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.value = header
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="217346", end_color="217346", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
+    ws.append([_styled(ws, header, 'hareket_baslik') for header in headers])
 
     # Veri satırlarını yaz
-    for row_num, movement in enumerate(movements, 2):
-        ws.cell(row=row_num, column=1, value=movement.id)
-        ws.cell(row=row_num, column=2, value=movement.date.strftime('%Y-%m-%d %H:%M'))
-        ws.cell(row=row_num, column=3, value=movement.product.code if movement.product else '')
-        ws.cell(row=row_num, column=4, value=movement.product.name if movement.product else '')
-        ws.cell(row=row_num, column=5, value=movement.product.category.name if movement.product and movement.product.category else '')
-        ws.cell(row=row_num, column=6, value=movement.movement_type)
-        ws.cell(row=row_num, column=7, value=movement.quantity)
-        ws.cell(row=row_num, column=8, value=movement.product.unit_type if movement.product else '')
-        ws.cell(row=row_num, column=9, value=movement.previous_stock)
-        ws.cell(row=row_num, column=10, value=movement.new_stock)
-        ws.cell(row=row_num, column=11, value=movement.user.name if movement.user else '')
-        ws.cell(row=row_num, column=12, value=movement.description or '')
-
-    # Kolon genişliklerini ayarla
-    column_widths = [8, 16, 15, 30, 20, 15, 10, 10, 12, 12, 15, 30]
-    for col_num, width in enumerate(column_widths, 1):
-        ws.column_dimensions[chr(64 + col_num)].width = width
+    for movement in movements:
+        product = movement.product
+        ws.append([
+            movement.id,
+            movement.date.strftime('%Y-%m-%d %H:%M') if movement.date else '',
+            product.code if product else '',
+            product.name if product else '',
+            product.category.name if product and product.category else '',
+            movement.movement_type,
+            movement.quantity,
+            product.unit_type if product else '',
+            movement.source or '',
+            movement.destination or '',
+            movement.user.name if movement.user else '',
+            movement.note or '',
+        ])
+
+    return _save_streaming(wb)
 
-    # BytesIO'ya kaydet
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    return output
 
 def parse_bom_excel(file_stream, main_product_name):
     """
@@ -549,9 +608,93 @@ def parse_bom_excel(file_stream, main_product_name):
         return [], [{'row': 0, 'error': f'Beklenmeyen hata: {str(e)}'}]
 
 
-def create_bom_tree_excel(tree_data: dict, bom_id: int, node_info: dict = None) -> BytesIO:
+_BOM_TYPE_LABELS = {
+    'yarimamul': 'Yarı Mamul',
+    'hammadde': 'Hammadde',
+    'mamul': 'Mamul',
+    'standart_parca': 'Standart Parça'
+}
+
+
+def _bom_tree_styles():
+    right = Alignment(horizontal="right")
+    center = Alignment(horizontal="center")
+    qty = '0.####'
+
+    def cell(name, **kw):
+        return _named_style(name, border=_THIN_BORDER, **kw)
+
+    return (
+        _named_style('bom_title', font=Font(bold=True, size=14, color="FFFFFF"), fill=_solid("2563eb"),
+                     alignment=Alignment(horizontal="center", vertical="center")),
+        _named_style('bom_date', font=Font(size=10, italic=True), alignment=center),
+        cell('bom_header', font=Font(bold=True, color="FFFFFF"), fill=_solid("4472C4"),
+             alignment=Alignment(horizontal="center", vertical="center")),
+        cell('bom_num', font=Font(bold=True, color="2563eb"), alignment=center),
+        cell('bom_text'),
+        # Seviye bazlı renklendirme: ana ürün koyu sarı, 1. seviye açık mavi, 2. seviye açık yeşil
+        cell('bom_name_0', font=Font(bold=True), fill=_solid("fef08a")),
+        cell('bom_name_1', fill=_solid("dbeafe")),
+        cell('bom_name_2', fill=_solid("d1fae5")),
+        # Tür bazlı renklendirme
+        cell('bom_type_yarimamul', font=Font(color="f57f17"), fill=_solid("fff8e1")),
+        cell('bom_type_hammadde', font=Font(color="880e4f"), fill=_solid("fce4ec")),
+        cell('bom_type_standart_parca', font=Font(color="0d47a1"), fill=_solid("e3f2fd")),
+        cell('bom_qty_gross', alignment=right, fill=_solid("fff1f2"), number_format=qty),
+        cell('bom_qty_net', alignment=right, fill=_solid("f0fdf4"), number_format=qty),
+        cell('bom_waste', alignment=right, number_format='0.#"%"'),
+        cell('bom_unit', alignment=center),
+        cell('bom_len_gross', alignment=right, fill=_solid("fef3c7"), number_format=qty),
+        cell('bom_len_net', alignment=right, fill=_solid("fef9c3"), number_format=qty),
+        cell('bom_wt_gross', alignment=right, fill=_solid("dbeafe"), number_format=qty),
+        cell('bom_wt_net', alignment=right, fill=_solid("e0f2fe"), number_format=qty),
+        cell('bom_stock', alignment=right, number_format=qty),
+        _named_style('bom_footer', font=Font(size=9, italic=True, color="64748b"), alignment=center),
+        _named_style('bom_key', font=Font(bold=True)),
+    )
+
+
+def _float_or(value, fallback):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return fallback
+
+
+def _bom_row_values(node: dict) -> tuple:
+    """Düğümün miktar/uzunluk/ağırlık/stok kolon değerleri (boşsa None)."""
+    unit_type = node.get('unit', '')
+    qty_gross = node.get('quantity', '')
+    qty_net = node.get('quantity_net', '')
+    waste_ratio = node.get('waste_ratio', '')
+    weight_per_unit = node.get('weight_per_unit', 0)
+
+    gross = _float_or(qty_gross, qty_gross) if qty_gross else None
+    net = _float_or(qty_net, qty_net) if qty_net else None
+    waste = _float_or(waste_ratio, waste_ratio) if waste_ratio else None
+
+    # Uzunluk — sadece metre biriminde
+    len_gross = _float_or(qty_gross, None) if unit_type == 'metre' and qty_gross else None
+    len_net = _float_or(qty_net, None) if unit_type == 'metre' and qty_net else None
+
+    # Ağırlık — kg biriminde miktar, değilse birim ağırlık × miktar
+    def weight(qty):
+        if unit_type == 'kg' and qty:
+            return _float_or(qty, None)
+        if weight_per_unit and weight_per_unit > 0 and qty:
+            try:
+                return float(weight_per_unit) * float(qty)
+            except (TypeError, ValueError):
+                return None
+        return None
+
+    stock_qty = node.get('stock_qty', 0)
+    return gross, net, waste, len_gross, len_net, weight(qty_gross), weight(qty_net), _float_or(stock_qty, stock_qty)
+
+
+def create_bom_tree_excel(tree_data: dict, bom_id: int, node_info: dict = None):
     """
-    BOM ağaç yapısını Excel dosyası olarak oluşturur.
+    BOM ağaç yapısını Excel dosyası olarak oluşturur (salt yazma modu).
     
     Args:
         tree_data: get_bom_tree() fonksiyonundan dönen ağaç verisi veya tek bir node
@@ -559,29 +702,30 @@ def create_bom_tree_excel(tree_data: dict, bom_id: int, node_info: dict = None)
         node_info: Belirli bir düğüm seçilmişse {'id': node_id, 'num': num, 'name': name}
     
     Returns:
-        BytesIO: Excel dosyası içeren BytesIO nesnesi
+        Başa sarılmış geçici dosya (bkz. _save_streaming)
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"BOM #{bom_id}"
-    
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(f"BOM #{bom_id}")
+    _add_named_styles(wb, _bom_tree_styles())
+
+    # Kolon genişlikleri ve satır yükseklikleri
+    column_widths = [8, 35, 15, 20, 15, 15, 15, 10, 10, 16, 16, 16, 16, 12]
+    for col_num, width in enumerate(column_widths, 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = width
+    ws.row_dimensions[1].height = 25
+    ws.row_dimensions[4].height = 20
+
     # Başlık satırları
-    ws.merge_cells('A1:N1')
-    title_cell = ws['A1']
     if node_info:
-        title_cell.value = f'BOM #{bom_id} - {node_info.get("num", "")} {node_info.get("name", "Alt Ağaç")}'
+        title = f'BOM #{bom_id} - {node_info.get("num", "")} {node_info.get("name", "Alt Ağaç")}'
     else:
-        title_cell.value = f'BOM #{bom_id} - Ürün Ağacı'
-    title_cell.font = Font(bold=True, size=14, color="FFFFFF")
-    title_cell.fill = PatternFill(start_color="2563eb", end_color="2563eb", fill_type="solid")
-    title_cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    ws.merge_cells('A2:N2')
-    date_cell = ws['A2']
-    date_cell.value = f'Oluşturma Tarihi: {datetime.now().strftime("%d.%m.%Y %H:%M")}'
-    date_cell.font = Font(size=10, italic=True)
-    date_cell.alignment = Alignment(horizontal="center")
-    
+        title = f'BOM #{bom_id} - Ürün Ağacı'
+    ws.append([_styled(ws, title, 'bom_title')])
+    ws.merged_cells.add('A1:N1')
+    ws.append([_styled(ws, f'Oluşturma Tarihi: {datetime.now().strftime("%d.%m.%Y %H:%M")}', 'bom_date')])
+    ws.merged_cells.add('A2:N2')
+    ws.append([])
+
     # Kolon başlıkları
     headers = [
         'No',
@@ -599,257 +743,54 @@ def create_bom_tree_excel(tree_data: dict, bom_id: int, node_info: dict = None)
         'Ağırlık Firesiz (kg)',
         'Stok'
     ]
-    
-    header_row = 4
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=header_row, column=col_num)
-        cell.value = header
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Kenarlıklar
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        cell.border = thin_border
-    
-    # Kolon genişlikleri
-    column_widths = [8, 35, 15, 20, 15, 15, 15, 10, 10, 16, 16, 16, 16, 12]
-    for col_num, width in enumerate(column_widths, 1):
-        ws.column_dimensions[get_column_letter(col_num)].width = width
-    
-    # Satır yüksekliği
-    ws.row_dimensions[1].height = 25
-    ws.row_dimensions[4].height = 20
-    
-    # Ağaç verisini düzleştir ve Excel'e yaz
-    current_row = header_row + 1
-    
-    def flatten_and_write(node: dict, indent_level: int = 0):
-        """
-        Ağaç düğümünü düzleştirip Excel'e yaz (recursive)
-        """
-        nonlocal current_row
-        
-        # Hücre kenarlıkları
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # No (sıra numarası)
-        num_cell = ws.cell(row=current_row, column=1)
-        num_cell.value = node.get('num', '')
-        num_cell.alignment = Alignment(horizontal="center")
-        num_cell.border = thin_border
-        num_cell.font = Font(bold=True, color="2563eb")
-        
-        # Ürün Adı (girintili)
-        name_cell = ws.cell(row=current_row, column=2)
-        indent = "  " * indent_level  # Her seviye için 2 boşluk
-        name_cell.value = f"{indent}{node.get('name', '')}"
-        name_cell.border = thin_border
-        
-        # Seviye bazlı renklendirme
-        if indent_level == 0:
-            # Ana ürün - Koyu sarı
-            name_cell.fill = PatternFill(start_color="fef08a", end_color="fef08a", fill_type="solid")
-            name_cell.font = Font(bold=True)
-        elif indent_level == 1:
-            # 1. seviye - Açık mavi
-            name_cell.fill = PatternFill(start_color="dbeafe", end_color="dbeafe", fill_type="solid")
-        elif indent_level == 2:
-            # 2. seviye - Açık yeşil
-            name_cell.fill = PatternFill(start_color="d1fae5", end_color="d1fae5", fill_type="solid")
-        
-        # Ürün Kodu
-        code_cell = ws.cell(row=current_row, column=3)
-        code_cell.value = node.get('code', '')
-        code_cell.border = thin_border
-        
-        # Malzeme
-        material_cell = ws.cell(row=current_row, column=4)
-        material_cell.value = node.get('material', '')
-        material_cell.border = thin_border
-        
-        # Tür
-        type_cell = ws.cell(row=current_row, column=5)
+    ws.append([_styled(ws, header, 'bom_header') for header in headers])
+    current_row = 5
+
+    # Ağaç verisini ön-sıra düzeninde düzleştir (özyinelemesiz; derin ağaçlarda da güvenli)
+    roots = tree_data.get('roots', [])
+    stack = [(root, 0) for root in reversed(roots)]
+    while stack:
+        node, indent_level = stack.pop()
         item_type = node.get('item_type', '')
-        
-        # Türkçe karşılıklar
-        type_map = {
-            'yarimamul': 'Yarı Mamul',
-            'hammadde': 'Hammadde',
-            'mamul': 'Mamul',
-            'standart_parca': 'Standart Parça'
-        }
-        type_cell.value = type_map.get(item_type, item_type)
-        type_cell.border = thin_border
-        
-        # Tür bazlı renklendirme
-        if item_type == 'yarimamul':
-            type_cell.fill = PatternFill(start_color="fff8e1", end_color="fff8e1", fill_type="solid")
-            type_cell.font = Font(color="f57f17")
-        elif item_type == 'hammadde':
-            type_cell.fill = PatternFill(start_color="fce4ec", end_color="fce4ec", fill_type="solid")
-            type_cell.font = Font(color="880e4f")
-        elif item_type == 'standart_parca':
-            type_cell.fill = PatternFill(start_color="e3f2fd", end_color="e3f2fd", fill_type="solid")
-            type_cell.font = Font(color="0d47a1")
-        
-        # Miktar (Fireli)
-        qty_fireli_cell = ws.cell(row=current_row, column=6)
-        qty_fireli = node.get('quantity', '')
-        if qty_fireli and qty_fireli != '':
-            try:
-                qty_fireli_cell.value = float(qty_fireli)
-                qty_fireli_cell.number_format = '0.####'
-            except:
-                qty_fireli_cell.value = qty_fireli
-        qty_fireli_cell.alignment = Alignment(horizontal="right")
-        qty_fireli_cell.border = thin_border
-        qty_fireli_cell.fill = PatternFill(start_color="fff1f2", end_color="fff1f2", fill_type="solid")
-        
-        # Miktar (Firesiz)
-        qty_firesiz_cell = ws.cell(row=current_row, column=7)
-        qty_firesiz = node.get('quantity_net', '')
-        if qty_firesiz and qty_firesiz != '':
-            try:
-                qty_firesiz_cell.value = float(qty_firesiz)
-                qty_firesiz_cell.number_format = '0.####'
-            except:
-                qty_firesiz_cell.value = qty_firesiz
-        qty_firesiz_cell.alignment = Alignment(horizontal="right")
-        qty_firesiz_cell.border = thin_border
-        qty_firesiz_cell.fill = PatternFill(start_color="f0fdf4", end_color="f0fdf4", fill_type="solid")
-        
-        # Fire %
-        waste_cell = ws.cell(row=current_row, column=8)
-        waste_ratio = node.get('waste_ratio', '')
-        if waste_ratio and waste_ratio != '':
-            try:
-                waste_cell.value = float(waste_ratio)
-                waste_cell.number_format = '0.#"%"'
-            except:
-                waste_cell.value = waste_ratio
-        waste_cell.alignment = Alignment(horizontal="right")
-        waste_cell.border = thin_border
-        
-        # Birim
-        unit_cell = ws.cell(row=current_row, column=9)
-        unit_cell.value = node.get('unit', '')
-        unit_cell.alignment = Alignment(horizontal="center")
-        unit_cell.border = thin_border
-        
-        # Uzunluk ve Ağırlık hesaplamaları
-        unit_type = node.get('unit', '')
-        qty_fireli_val = node.get('quantity', 0)
-        qty_firesiz_val = node.get('quantity_net', 0)
-        weight_per_unit = node.get('weight_per_unit', 0)
-        
-        # Uzunluk (Fireli) - Sadece metre biriminde
-        length_fireli_cell = ws.cell(row=current_row, column=10)
-        if unit_type == 'metre' and qty_fireli_val:
-            try:
-                length_fireli_cell.value = float(qty_fireli_val)
-                length_fireli_cell.number_format = '0.####'
-            except:
-                pass
-        length_fireli_cell.alignment = Alignment(horizontal="right")
-        length_fireli_cell.border = thin_border
-        length_fireli_cell.fill = PatternFill(start_color="fef3c7", end_color="fef3c7", fill_type="solid")
-        
-        # Uzunluk (Firesiz) - Sadece metre biriminde
-        length_firesiz_cell = ws.cell(row=current_row, column=11)
-        if unit_type == 'metre' and qty_firesiz_val:
-            try:
-                length_firesiz_cell.value = float(qty_firesiz_val)
-                length_firesiz_cell.number_format = '0.####'
-            except:
-                pass
-        length_firesiz_cell.alignment = Alignment(horizontal="right")
-        length_firesiz_cell.border = thin_border
-        length_firesiz_cell.fill = PatternFill(start_color="fef9c3", end_color="fef9c3", fill_type="solid")
-        
-        # Ağırlık (Fireli) - kg biriminde veya hesaplanan
-        weight_fireli_cell = ws.cell(row=current_row, column=12)
-        if unit_type == 'kg' and qty_fireli_val:
-            try:
-                weight_fireli_cell.value = float(qty_fireli_val)
-                weight_fireli_cell.number_format = '0.####'
-            except:
-                pass
-        elif weight_per_unit and weight_per_unit > 0 and qty_fireli_val:
-            try:
-                total_weight = float(weight_per_unit) * float(qty_fireli_val)
-                weight_fireli_cell.value = total_weight
-                weight_fireli_cell.number_format = '0.####'
-            except:
-                pass
-        weight_fireli_cell.alignment = Alignment(horizontal="right")
-        weight_fireli_cell.border = thin_border
-        weight_fireli_cell.fill = PatternFill(start_color="dbeafe", end_color="dbeafe", fill_type="solid")
-        
-        # Ağırlık (Firesiz) - kg biriminde veya hesaplanan
-        weight_firesiz_cell = ws.cell(row=current_row, column=13)
-        if unit_type == 'kg' and qty_firesiz_val:
-            try:
-                weight_firesiz_cell.value = float(qty_firesiz_val)
-                weight_firesiz_cell.number_format = '0.####'
-            except:
-                pass
-        elif weight_per_unit and weight_per_unit > 0 and qty_firesiz_val:
-            try:
-                total_weight = float(weight_per_unit) * float(qty_firesiz_val)
-                weight_firesiz_cell.value = total_weight
-                weight_firesiz_cell.number_format = '0.####'
-            except:
-                pass
-        weight_firesiz_cell.alignment = Alignment(horizontal="right")
-        weight_firesiz_cell.border = thin_border
-        weight_firesiz_cell.fill = PatternFill(start_color="e0f2fe", end_color="e0f2fe", fill_type="solid")
-        
-        # Stok
-        stock_cell = ws.cell(row=current_row, column=14)
-        stock_qty = node.get('stock_qty', 0)
-        try:
-            stock_cell.value = float(stock_qty)
-            stock_cell.number_format = '0.####'
-        except:
-            stock_cell.value = stock_qty
-        stock_cell.alignment = Alignment(horizontal="right")
-        stock_cell.border = thin_border
-        
+        type_style = f'bom_type_{item_type}' if item_type in ('yarimamul', 'hammadde', 'standart_parca') else 'bom_text'
+        name_style = f'bom_name_{indent_level}' if indent_level <= 2 else 'bom_text'
+        gross, net, waste, len_gross, len_net, wt_gross, wt_net, stock = _bom_row_values(node)
+
+        ws.append([
+            _styled(ws, node.get('num', ''), 'bom_num'),
+            _styled(ws, f"{'  ' * indent_level}{node.get('name', '')}", name_style),  # her seviye 2 boşluk
+            _styled(ws, node.get('code', ''), 'bom_text'),
+            _styled(ws, node.get('material', ''), 'bom_text'),
+            _styled(ws, _BOM_TYPE_LABELS.get(item_type, item_type), type_style),
+            _styled(ws, gross, 'bom_qty_gross'),
+            _styled(ws, net, 'bom_qty_net'),
+            _styled(ws, waste, 'bom_waste'),
+            _styled(ws, node.get('unit', ''), 'bom_unit'),
+            _styled(ws, len_gross, 'bom_len_gross'),
+            _styled(ws, len_net, 'bom_len_net'),
+            _styled(ws, wt_gross, 'bom_wt_gross'),
+            _styled(ws, wt_net, 'bom_wt_net'),
+            _styled(ws, stock, 'bom_stock'),
+        ])
         current_row += 1
-        
-        # Alt düğümleri işle
-        for child in node.get('children', []):
-            flatten_and_write(child, indent_level + 1)
-    
-    # Tüm kök düğümleri işle
-    roots = tree_data.get('roots', [])
-    for root in roots:
-        flatten_and_write(root, 0)
-    
+
+        # Alt düğümler
+        for child in reversed(node.get('children', [])):
+            stack.append((child, indent_level + 1))
+
     # Alt bilgi
     info_row = current_row + 2
-    ws.merge_cells(f'A{info_row}:N{info_row}')
-    info_cell = ws[f'A{info_row}']
-    info_cell.value = '© ÇELMAK Stok Takip Sistemi - BOM Ağaç Raporu'
-    info_cell.font = Font(size=9, italic=True, color="64748b")
-    info_cell.alignment = Alignment(horizontal="center")
-    
+    ws.append([])
+    ws.append([])
+    ws.append([_styled(ws, '© ÇELMAK Stok Takip Sistemi - BOM Ağaç Raporu', 'bom_footer')])
+    ws.merged_cells.add(f'A{info_row}:N{info_row}')
+
     # Özet Sayfa Ekle
     ws_summary = wb.create_sheet("Özet")
     ws_summary.column_dimensions['A'].width = 25
     ws_summary.column_dimensions['B'].width = 50
-    
+    ws_summary.row_dimensions[1].height = 25
+
     summary_data = [
         ["BOM ÖZET BİLGİLERİ", ""],
         ["", ""],
@@ -872,28 +813,17 @@ def create_bom_tree_excel(tree_data: dict, bom_id: int, node_info: dict = None)
         ["Uzunluk Kolonları:", "Sarı tonlarda"],
         ["Ağırlık Kolonları:", "Mavi tonlarda"],
     ]
-    
+
     for row_num, (key, value) in enumerate(summary_data, 1):
-        key_cell = ws_summary.cell(row=row_num, column=1)
-        key_cell.value = key
-        value_cell = ws_summary.cell(row=row_num, column=2)
-        value_cell.value = value
-        
         if row_num == 1:
-            ws_summary.merge_cells(f'A{row_num}:B{row_num}')
-            key_cell.font = Font(bold=True, size=14, color="FFFFFF")
-            key_cell.fill = PatternFill(start_color="2563eb", end_color="2563eb", fill_type="solid")
-            key_cell.alignment = Alignment(horizontal="center", vertical="center")
-            ws_summary.row_dimensions[row_num].height = 25
+            ws_summary.append([_styled(ws_summary, key, 'bom_title'), value])
+            ws_summary.merged_cells.add('A1:B1')
         elif ":" in key:
-            key_cell.font = Font(bold=True)
-    
-    # BytesIO'ya kaydet
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
+            ws_summary.append([_styled(ws_summary, key, 'bom_key'), value])
+        else:
+            ws_summary.append([key, value])
 
-    return output
+    return _save_streaming(wb)
 
 
 # ---------------------------------------------------------------------------
@@ -907,7 +837,7 @@ def create_bom_tree_excel(tree_data: dict, bom_id: int, node_info: dict = None)
 def _price_list_header_row(ws):
     """KODU ve Birim Fiyat sütunlarını içeren başlık satırını ve kolon
     indekslerini bulur. Bulunamazsa (None, {}) döner."""
-    for row_idx, row in enumerate(ws.iter_rows(max_row=min(ws.max_row, 20), values_only=True), start=1):
+    for row_idx, row in enumerate(ws.iter_rows(max_row=20, values_only=True), start=1):
         vals = [tr_lower(v).strip() if v is not None else '' for v in row]
         col_map = {}
         for c, v in enumerate(vals):
@@ -933,11 +863,16 @@ def parse_price_list_excel(file_stream):
     geçiyorsa bu durum ayrıca bir hata olarak raporlanır (çakışma).
     """
     try:
-        wb = load_workbook(file_stream, data_only=True)
-        ws = wb.active
+        wb = load_workbook_streaming(file_stream)
     except Exception as exc:
         return [], [{'row': 0, 'error': f'Dosya okuma hatası: {exc}'}]
+    try:
+        return _parse_price_list_sheet(wb.active)
+    finally:
+        wb.close()
+
 
+def _parse_price_list_sheet(ws):
     header_row_idx, col_map = _price_list_header_row(ws)
     if header_row_idx is None:
         return [], [{'row': 0, 'error':
@@ -0,0 +1,167 @@
+"""
+Flush Farkı Takibi (özet tabloları için ortak yardımcılar)
+=========================================================
+stock_summary ve dashboard_stats aynı düzenle çalışır:
+  - before_flush'ta değişen satırların ESKİ katkısı çıkarılıp YENİ katkısı
+    eklenir (`collect_deltas`) ve özet satırlarına artım olarak yazılır
+    (`upsert_increments`).
+  - Satır bilgisi olmayan toplu yazmalarda özet "bayat" işaretlenir
+    (`mark_stale`); işaretler commit öncesinde tek seferde yeniden hesaplanır,
+    rollback'te unutulur (`bind_commit_rebuild`).
+
+Eski değerin her zaman bilinmesi için izlenen alanlar modelde
+`active_history=True` ile tanımlanır (yüklenmemiş alana doğrudan atama
+yapılsa bile önceki değer yüklenir).
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, event
+
+
+# ---------------------------------------------------------------------------
+# Satır farkları
+# ---------------------------------------------------------------------------
+
+def old_values(state, fields):
+    """Flush öncesi (veritabanındaki) değerler; değişmeyen alanlar yüklü değilse yüklenir."""
+    values = []
+    for field in fields:
+        history = state.attrs[field].history
+        if history.deleted:
+            values.append(history.deleted[0])
+        elif history.unchanged:
+            values.append(history.unchanged[0])
+        else:
+            values.append(getattr(state.obj(), field))
+    return values
+
+
+def new_values(obj, fields):
+    return [getattr(obj, field) for field in fields]
+
+
+def add_delta(deltas, contribution, sign):
+    """contribution: (anahtar, değerler) ya da None. Değerler anahtarın toplamına
+    `sign` ile eklenir."""
+    if contribution is None:
+        return
+    key, values = contribution
+    current = deltas.get(key)
+    if current is None:
+        current = [0] * len(values)
+        deltas[key] = current
+    for i, value in enumerate(values):
+        current[i] += sign * value
+
+
+def collect_deltas(session, tracked) -> dict:
+    """tracked: model -> (alanlar, katkı fonksiyonu). Oturumdaki yeni / silinen /
+    değişen nesnelerin katkı farkları: model -> {anahtar: [değerler]}."""
+    from sqlalchemy import inspect as sa_inspect
+
+    deltas = {model: {} for model in tracked}
+
+    def spec(obj):
+        for model, (fields, contribution) in tracked.items():
+            if isinstance(obj, model):
+                return fields, contribution, deltas[model]
+        return None
+
+    for obj in session.new:
+        found = spec(obj)
+        if found:
+            fields, contribution, target = found
+            add_delta(target, contribution(*new_values(obj, fields)), 1)
+    for obj in session.deleted:
+        found = spec(obj)
+        if found:
+            fields, contribution, target = found
+            add_delta(target, contribution(*old_values(sa_inspect(obj), fields)), -1)
+    for obj in session.dirty:
+        found = spec(obj)
+        if not found:
+            continue
+        fields, contribution, target = found
+        state = sa_inspect(obj)
+        if not any(state.attrs[field].history.has_changes() for field in fields):
+            continue
+        add_delta(target, contribution(*old_values(state, fields)), -1)
+        add_delta(target, contribution(*new_values(obj, fields)), 1)
+    return deltas
+
+
+def upsert_increments(connection, table, key_columns, columns, deltas) -> None:
+    """deltas: anahtar -> artış değerleri (columns sırasıyla). Satır varsa kolonlara
+    eklenir, yoksa oluşturulur. Tek kolonlu anahtar düz değer, çok kolonlu tuple."""
+    if isinstance(key_columns, str):
+        key_columns = (key_columns,)
+    now = datetime.utcnow()
+    rows = []
+    for key, values in sorted(deltas.items()):
+        if not any(values):
+            continue
+        key = key if isinstance(key, tuple) else (key,)
+        rows.append({**dict(zip(key_columns, key)), **dict(zip(columns, values)), 'updated_at': now})
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        for row in rows:
+            stmt = insert(table).values(**row)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={**{c: table.c[c] + stmt.excluded[c] for c in columns}, 'updated_at': now},
+            )
+            connection.execute(stmt)
+        return
+    for row in rows:
+        result = connection.execute(
+            table.update().where(and_(*(table.c[k] == row[k] for k in key_columns)))
+            .values(**{c: table.c[c] + row[c] for c in columns}, updated_at=now)
+        )
+        if not result.rowcount:
+            connection.execute(table.insert().values(**row))
+
+
+# ---------------------------------------------------------------------------
+# Toplu yazmalar
+# ---------------------------------------------------------------------------
+
+def bulk_set_values(orm_execute_state):
+    """Toplu UPDATE / INSERT'in yazdığı kolonlar: kolon adı -> değer (bağlı
+    parametreyse düz değer, değilse SQL ifadesi). Belirlenemezse None."""
+    values = {}
+    for column, value in (getattr(orm_execute_state.statement, '_values', None) or {}).items():
+        values[getattr(column, 'key', column)] = getattr(value, 'value', value)
+    params = orm_execute_state.parameters
+    rows = params if isinstance(params, (list, tuple)) else [params] if params else []
+    for row in rows:
+        for key, value in row.items():
+            values.setdefault(key, value)
+    return values or None
+
+
+def mark_stale(session, key, *marks) -> None:
+    """Özeti commit öncesinde yeniden hesaplanmak üzere işaretler; işaretler
+    (ör. etkilenen id'ler, başlangıç günü) küme olarak birikir."""
+    session.info.setdefault(key, set()).update(marks or (True,))
+
+
+def bind_commit_rebuild(db, key, rebuild) -> None:
+    """`mark_stale(session, key, ...)` işaretleri commit öncesinde
+    `rebuild(connection, işaretler)` ile aynı transaction içinde işlenir,
+    rollback'te unutulur."""
+    def before_commit(session):
+        marks = session.info.pop(key, None)
+        if marks:
+            rebuild(session.connection(), marks)
+
+    def after_rollback(session):
+        session.info.pop(key, None)
+
+    event.listen(db.session, 'before_commit', before_commit)
+    event.listen(db.session, 'after_rollback', after_rollback)
@@ -0,0 +1,224 @@
+"""
+Toplu Etiket Üretimi
+====================
+Toplu QR indirmeleri (`bulk_download_qr`, `download_all_qr`,
+`generate_bulk_qr`) her ürün için etiketi sırayla çiziyordu; katalog boyunca
+etiket basmak dakikalar sürüyor ve işçiyi kilitliyordu.
+
+  - Şablon: fontlar, logolar ve sabit çizimler süreç başına bir kez hazırlanır
+    (bkz. qr_generator.label_template).
+  - Disk önbelleği: üretilen PNG, (QR verisi — BASE_URL ve ürün id'sini içerir —,
+    parça kodu, adı, boyut, varyant, çizim sürümü) özetiyle saklanır; değişmeyen
+    etiket bir daha çizilmez. Dizin güvenle silinebilir.
+  - Havuz: önbellekte olmayan etiketler süreç boyunca açık kalan tek bir
+    ProcessPoolExecutor'da çizilir ve bitiş sırasıyla döndürülür; şablonlar
+    havuz süreçlerinde ilk işte ısınır ve istekler arasında korunur. Havuz
+    süreçleri çok iş parçacıklı, veritabanı bağlantısı tutan işçiden fork
+    edilmez; forkserver (yoksa spawn) ile temiz süreçten açılır. Bellekte
+    bekleyen iş sayısı sınırlıdır.
+  - Akış: stream_zip ZIP'i bellekte biriktirmeden parça parça üretir; PNG zaten
+    sıkıştırılmış olduğundan girdiler ZIP_STORED yazılır.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import NamedTuple
+
+from app.utils import qr_generator
+
+# Etiket çizimi değişirse artırılır; eski önbellek dosyaları kullanılmaz.
+RENDER_VERSION = 1
+
+# 'app' altındaki kaydedici: uygulama varsa Flask'ın app.logger işleyicilerine akar.
+logger = logging.getLogger(__name__)
+
+_pool = None            # (işçi sayısı, ProcessPoolExecutor)
+_pool_lock = threading.Lock()
+
+
+class LabelJob(NamedTuple):
+    filename: str
+    qr_data: str
+    part_no: str
+    part_name: str
+    size: str = 'medium'
+    logo_fallback: bool = False   # generate_celmak_label varyantı (logo yoksa yazı)
+
+
+def product_label_job(product, base_url, size='medium', filename=None, logo_fallback=False) -> LabelJob:
+    """Ürün satırından etiket işi (QR verisi ürün sayfasının adresidir)."""
+    return LabelJob(
+        filename=filename or f'etiket_{product.code}.png',
+        qr_data=f"{base_url}/products/{product.id}",
+        part_no=product.code,
+        part_name=product.name,
+        size=size,
+        logo_fallback=logo_fallback,
+    )
+
+
+def cache_key(job: LabelJob) -> str:
+    raw = repr((RENDER_VERSION, job.qr_data, job.part_no, job.part_name, job.size, job.logo_fallback))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _cache_path(cache_dir: str, job: LabelJob) -> str:
+    key = cache_key(job)
+    return os.path.join(cache_dir, key[:2], f'{key}.png')
+
+
+def _read_cached(cache_dir, job):
+    if not cache_dir:
+        return None
+    try:
+        with open(_cache_path(cache_dir, job), 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _render(job: LabelJob, cache_dir=None) -> bytes:
+    """Etiketi çizer ve (dizin verildiyse) önbelleğe yazar. Havuz süreçlerinde de çalışır."""
+    png = qr_generator.render_label_png(job.qr_data, job.part_no, job.part_name,
+                                        job.size, logo_fallback=job.logo_fallback)
+    if cache_dir:
+        path = _cache_path(cache_dir, job)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(png)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+    return png
+
+
+def cache_dir():
+    """Uygulamanın etiket önbellek dizini (LABEL_CACHE_DIR ya da instance/label_cache)."""
+    from flask import current_app
+    return current_app.config.get('LABEL_CACHE_DIR') or os.path.join(current_app.instance_path, 'label_cache')
+
+
+def worker_count() -> int:
+    from flask import current_app
+    workers = int(current_app.config.get('LABEL_RENDER_WORKERS') or 0)
+    return workers if workers > 0 else min(4, os.cpu_count() or 1)
+
+
+def _pool_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def render_pool(workers: int) -> ProcessPoolExecutor:
+    """Süreç boyunca paylaşılan çizim havuzu. İşçi sayısı değişirse ya da havuz
+    bozulduysa (süreci öldü) yenisi açılır."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and (_pool[0] != workers or _pool[1]._broken):
+            _pool[1].shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            _pool = (workers, ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()))
+        return _pool[1]
+
+
+def render_one(job: LabelJob, cache_dir=None) -> bytes:
+    """Tek etiket (önbellekten ya da çizerek)."""
+    png = _read_cached(cache_dir, job)
+    return png if png is not None else _render(job, cache_dir)
+
+
+def render_labels(jobs, cache_dir=None, workers=1):
+    """Etiketleri (job, png) olarak üretildikçe döndürür: önce önbellektekiler,
+    sonra çizilenler bitiş sırasıyla. workers <= 1 ise çizim bu süreçte yapılır.
+    Çizilemeyen etiket (eski toplu indirmelerdeki gibi) atlanır."""
+    pending = []
+    for job in jobs:
+        png = _read_cached(cache_dir, job)
+        if png is not None:
+            yield job, png
+        else:
+            pending.append(job)
+
+    if workers <= 1 or len(pending) < 2:
+        for job in pending:
+            try:
+                png = _render(job, cache_dir)
+            except Exception:
+                logger.exception("Etiket hatası (%s)", job.part_no)
+                continue
+            yield job, png
+        return
+
+    pool = render_pool(workers)
+    window = workers * 4
+    queue = iter(pending)
+    running = {}
+    try:
+        for job in queue:
+            running[pool.submit(_render, job, cache_dir)] = job
+            if len(running) >= window:
+                break
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                for next_job in queue:
+                    running[pool.submit(_render, next_job, cache_dir)] = next_job
+                    break
+                try:
+                    png = future.result()
+                except Exception:
+                    logger.exception("Etiket hatası (%s)", job.part_no)
+                    continue
+                yield job, png
+    finally:
+        # İstemci indirmeyi yarıda keserse kuyruktaki işler havuzu meşgul etmesin
+        for future in running:
+            future.cancel()
+
+
+class _ZipSink:
+    """zipfile'ın yazdığı baytları toplayan, konumlanamayan (seek'siz) hedef.
+    zipfile bu durumda her girdiden sonra veri tanımlayıcısı (data descriptor) yazar."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def stream_zip(entries, chunk_size=64 * 1024):
+    """(dosya_adı, bayt) girdilerinden ZIP'i parça parça üretir (ZIP_STORED).
+    Bellekte en fazla chunk_size + bir girdi kadar veri bekler."""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+            if sink.size >= chunk_size:
+                yield sink.drain()
+    yield sink.drain()
+
+
+def stream_label_zip(jobs, cache_dir=None, workers=1):
+    """Etiketleri üretildikçe ZIP akışına yazar."""
+    return stream_zip((job.filename, png) for job, png in render_labels(jobs, cache_dir, workers))
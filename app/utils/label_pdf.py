@@ -0,0 +1,260 @@
+"""
+PDF Etiket Sayfası
+==================
+Toplu QR etiketlerini tek bir PDF'e dizer: baskı odası yüzlerce PNG'yi
+birleştirmek zorunda kalmaz.
+
+  - Vektörel: QR modülleri dolu dikdörtgen yolları, yazılar PDF'in standart
+    Helvetica fontlarıdır (Türkçe harfler cp1254 + /Differences ile). Hiçbir
+    şey piksel olarak çizilmez; dosya küçük ve her ölçekte keskin kalır.
+  - Ortak şablon: kırmızı şerit, iki logo, başlıklar ve çizgiler tek bir Form
+    XObject'tir; logolar belgeye bir kez gömülür, her etiket yalnızca
+    `/Tpl Do` ile şablonu çağırır.
+  - Yerleşim, PNG etiketin 1000×1000 birimlik 'medium' düzeninin aynısıdır;
+    fiziksel boyut ve sayfa başına etiket sayısı LABEL_SHEETS'ten gelir.
+"""
+import io
+import os
+import zlib
+
+import qrcode
+from PIL import Image
+
+from app.utils.qr_generator import CELMAK_RED, LABEL_SIZES, _IMAGES_DIR
+
+_MM = 72 / 25.4
+_A4 = (210, 297)
+
+# Etiket stokları: kare etiket kenarı (mm), sütun × satır. page=None → sayfa etiket boyutundadır (rulo).
+LABEL_SHEETS = {
+    'a4_24': {'title': 'A4 - 24 etiket (4,5×4,5 cm)', 'page': _A4, 'label': 45, 'cols': 4, 'rows': 6, 'gap': 2},
+    'a4_12': {'title': 'A4 - 12 etiket (6×6 cm)', 'page': _A4, 'label': 60, 'cols': 3, 'rows': 4, 'gap': 4},
+    'a4_2': {'title': 'A4 - 2 etiket (10×10 cm)', 'page': _A4, 'label': 100, 'cols': 1, 'rows': 2, 'gap': 10},
+    'rulo_60': {'title': 'Rulo - 6×6 cm', 'page': None, 'label': 60, 'cols': 1, 'rows': 1, 'gap': 0},
+    'rulo_100': {'title': 'Rulo - 10×10 cm', 'page': None, 'label': 100, 'cols': 1, 'rows': 1, 'gap': 0},
+}
+DEFAULT_SHEET = 'a4_12'
+
+# PNG etiket boyutunun PDF'teki karşılığı (toplu QR formundaki label_size)
+SHEET_FOR_SIZE = {'small': 'a4_12', 'medium': 'a4_2', 'large': 'rulo_100'}
+
+# cp1254'te Türkçe harflerin kodları → standart glif adları
+_TURKISH_DIFFERENCES = b'[208 /Gbreve 221 /Idotaccent 222 /Scedilla 240 /gbreve 253 /dotlessi 254 /scedilla]'
+
+_UNITS = 1000            # etiket iç koordinatları (medium düzeni)
+_ASCENT = 0.8            # PIL metni üstten, PDF taban çizgisinden konumlar
+
+
+class _PdfWriter:
+    """Nesneleri sırayla yazan, xref'i sonda kuran en küçük PDF yazıcısı."""
+
+    def __init__(self, out):
+        self.out = out
+        self.offsets = {}
+        self.next_id = 1
+        out.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def reserve(self) -> int:
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def write(self, obj_id, body: bytes):
+        self.offsets[obj_id] = self.out.tell()
+        self.out.write(b'%d 0 obj\n' % obj_id + body + b'\nendobj\n')
+
+    def add(self, body: bytes) -> int:
+        obj_id = self.reserve()
+        self.write(obj_id, body)
+        return obj_id
+
+    def add_stream(self, data: bytes, extra: bytes = b'', obj_id=None) -> int:
+        packed = zlib.compress(data)
+        body = (b'<< /Length %d /Filter /FlateDecode ' % len(packed) + extra + b' >>\nstream\n'
+                + packed + b'\nendstream')
+        if obj_id is None:
+            return self.add(body)
+        self.write(obj_id, body)
+        return obj_id
+
+    def close(self, root_id):
+        xref = self.out.tell()
+        count = self.next_id
+        self.out.write(b'xref\n0 %d\n0000000000 65535 f \n' % count)
+        for obj_id in range(1, count):
+            self.out.write(b'%010d 00000 n \n' % self.offsets[obj_id])
+        self.out.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                       % (count, root_id, xref))
+
+
+def _pdf_text(text) -> bytes:
+    raw = str(text).encode('cp1254', errors='replace')
+    return b'(' + raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _add_image(writer, path):
+    """PNG'yi (saydamlık maskesiyle) görüntü XObject'i olarak bir kez gömer. (id, en/boy oranı)"""
+    img = Image.open(path).convert('RGBA')
+    alpha = img.getchannel('A')
+    smask = b''
+    if alpha.getextrema()[0] < 255:
+        mask_id = writer.add_stream(
+            alpha.tobytes(),
+            b'/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray /BitsPerComponent 8'
+            % img.size)
+        smask = b' /SMask %d 0 R' % mask_id
+    image_id = writer.add_stream(
+        img.convert('RGB').tobytes(),
+        b'/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB /BitsPerComponent 8'
+        % img.size + smask)
+    return image_id, img.width / img.height
+
+
+def _template_form(writer, fonts):
+    """Etiketin sabit kısmı (Form XObject). Koordinatlar üstten aşağı, 1000 birim."""
+    config = LABEL_SIZES['medium']
+    strip = config['red_strip']
+    content_x = strip + config['padding']
+    content_right = _UNITS - config['padding']
+    r, g, b = (c / 255 for c in CELMAK_RED)
+
+    ops = [b'%.4f %.4f %.4f rg 0 0 %d %d re f' % (r, g, b, strip, _UNITS)]
+    images = {}
+
+    main_logo = os.path.join(_IMAGES_DIR, 'celmak_logo.png')
+    if os.path.exists(main_logo):
+        images[b'Im1'], aspect = _add_image(writer, main_logo)
+        h = config['logo_height']
+        w = h * aspect
+        x = strip + (_UNITS - strip - w) / 2
+        ops.append(b'q %.2f 0 0 %.2f %.2f %.2f cm /Im1 Do Q' % (w, -h, x, 55 + h))
+    else:
+        ops.append(b'0 g BT /F1 48 Tf 1 0 0 -1 %d %.2f Tm %s Tj ET'
+                   % (strip + 100, 60 + 48 * _ASCENT, _pdf_text('ÇELMAK')))
+
+    white_logo = os.path.join(_IMAGES_DIR, 'celmak_logo_white.png')
+    if os.path.exists(white_logo):
+        images[b'Im2'], aspect = _add_image(writer, white_logo)
+        w = strip * 0.70
+        h = w / aspect
+        ops.append(b'q %.2f 0 0 %.2f %.2f %.2f cm /Im2 Do Q' % (w, -h, (strip - w) / 2, _UNITS - 60))
+
+    label_size = config['font_label_size']
+    for caption, y in (('PARÇA NUM / PART NO:', 200), ('PARÇA ADI / PART NAME:', 340)):
+        ops.append(b'0 g BT /F1 %d Tf 1 0 0 -1 %d %.2f Tm %s Tj ET'
+                   % (label_size, content_x, y + label_size * _ASCENT, _pdf_text(caption)))
+        ops.append(b'0.8 G 2 w %d %d m %d %d l S' % (content_x, y + 50, content_right, y + 50))
+
+    xobjects = b''.join(b'/%s %d 0 R ' % (name, obj_id) for name, obj_id in images.items())
+    return writer.add_stream(
+        b'\n'.join(ops),
+        b'/Type /XObject /Subtype /Form /BBox [0 0 %d %d] /Resources << /Font << %s >> /XObject << %s >> >>'
+        % (_UNITS, _UNITS, fonts, xobjects))
+
+
+def _qr_ops(qr_data, x, y, size) -> bytes:
+    """QR modüllerini satır satır birleştirilmiş dikdörtgenler olarak çizer."""
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_H, border=2)
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    module = size / len(matrix)
+    rects = []
+    # Satırlar 0.3 birim bindirilir: ekranda satır aralarında ince beyaz çizgi kalmasın
+    for row, cells in enumerate(matrix):
+        start = None
+        for col, dark in enumerate(cells + [False]):
+            if dark and start is None:
+                start = col
+            elif not dark and start is not None:
+                rects.append(b'%.2f %.2f %.2f %.2f re' % (x + start * module, y + row * module,
+                                                          (col - start) * module, module + 0.3))
+                start = None
+    return b'0 g ' + b' '.join(rects) + b' f'
+
+
+def _label_ops(job) -> bytes:
+    """Tek etiketin değişen kısmı (şablon koordinatlarında)."""
+    config = LABEL_SIZES['medium']
+    content_x = config['red_strip'] + config['padding']
+    value_size = config['font_value_size']
+    max_chars = config['max_chars']
+
+    part_name = str(job.part_name)
+    if len(part_name) > max_chars:
+        part_name = part_name[:max_chars - 3] + "..."
+
+    qr_size = config['qr_size']
+    qr_x = config['red_strip'] + (_UNITS - config['red_strip'] - qr_size) / 2
+    return b'\n'.join([
+        b'/Tpl Do',
+        b'0 g BT /F2 %d Tf 1 0 0 -1 %d %.2f Tm %s Tj ET'
+        % (value_size, content_x, 265 + value_size * _ASCENT, _pdf_text(job.part_no)),
+        b'BT /F2 %d Tf 1 0 0 -1 %d %.2f Tm %s Tj ET'
+        % (value_size, content_x, 405 + value_size * _ASCENT, _pdf_text(part_name)),
+        _qr_ops(job.qr_data, qr_x, 510, qr_size),
+    ])
+
+
+def _sheet_geometry(sheet):
+    """Sayfa boyutu (pt) ve etiketlerin sol-üst köşeleri (pt, PDF koordinatı)."""
+    label = sheet['label'] * _MM
+    gap = sheet['gap'] * _MM
+    cols, rows = sheet['cols'], sheet['rows']
+    if sheet['page']:
+        page_w, page_h = sheet['page'][0] * _MM, sheet['page'][1] * _MM
+    else:
+        page_w = page_h = label
+    margin_x = (page_w - cols * label - (cols - 1) * gap) / 2
+    margin_y = (page_h - rows * label - (rows - 1) * gap) / 2
+    slots = [(margin_x + c * (label + gap), page_h - margin_y - r * (label + gap))
+             for r in range(rows) for c in range(cols)]
+    return page_w, page_h, label, slots
+
+
+def render_label_pdf(jobs, sheet=DEFAULT_SHEET) -> io.BytesIO:
+    """Etiket işlerinden (label_batch.LabelJob ya da aynı alanlara sahip satırlar)
+    çok etiketli PDF üretir. Bilinmeyen stok DEFAULT_SHEET kabul edilir."""
+    sheet = LABEL_SHEETS.get(sheet) or LABEL_SHEETS[DEFAULT_SHEET]
+    page_w, page_h, label, slots = _sheet_geometry(sheet)
+    scale = label / _UNITS
+
+    out = io.BytesIO()
+    writer = _PdfWriter(out)
+    catalog_id = writer.reserve()
+    pages_id = writer.reserve()
+
+    encoding_id = writer.add(b'<< /Type /Encoding /BaseEncoding /WinAnsiEncoding /Differences '
+                             + _TURKISH_DIFFERENCES + b' >>')
+    bold_id = writer.add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding %d 0 R >>'
+                         % encoding_id)
+    regular_id = writer.add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding %d 0 R >>'
+                            % encoding_id)
+    fonts = b'/F1 %d 0 R /F2 %d 0 R' % (bold_id, regular_id)
+    template_id = _template_form(writer, fonts)
+    resources = b'<< /Font << %s >> /XObject << /Tpl %d 0 R >> >>' % (fonts, template_id)
+
+    page_ids = []
+
+    def flush_page(ops):
+        content_id = writer.add_stream(b'\n'.join(ops))
+        page_ids.append(writer.add(
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Resources %s /Contents %d 0 R >>'
+            % (pages_id, page_w, page_h, resources, content_id)))
+
+    ops = []
+    for job in jobs:
+        x, top = slots[len(ops)]
+        ops.append(b'q %.5f 0 0 %.5f %.2f %.2f cm\n' % (scale, -scale, x, top) + _label_ops(job) + b'\nQ')
+        if len(ops) == len(slots):
+            flush_page(ops)
+            ops = []
+    if ops or not page_ids:
+        flush_page(ops)
+
+    writer.write(pages_id, b'<< /Type /Pages /Kids [%s] /Count %d >>'
+                 % (b' '.join(b'%d 0 R' % pid for pid in page_ids), len(page_ids)))
+    writer.write(catalog_id, b'<< /Type /Catalog /Pages %d 0 R >>' % pages_id)
+    writer.close(catalog_id)
+    out.seek(0)
+    return out
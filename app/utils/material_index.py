@@ -0,0 +1,166 @@
+"""
+Hammadde Malzeme İmza İndeksi
+=============================
+`_find_matching_raw_material` / `_find_costing_raw_material` eskiden her çağrıda
+tüm hammadde adaylarını tek tek gezip, her kart için adı/malzemeyi/kodu/notu
+yeniden tokenize ediyor ve `_strict_material_signature` regex'lerini tekrar
+çalıştırıyordu (satır × katalog).
+
+Bu modül her kart için profili (imza, ad token'ları, detay token'ları) bir kez
+hesaplar ve üç ters indeks tutar:
+  token       → kartlar   (ad + detay token'ları)
+  ad token'ı  → kartlar   (require_name_match için)
+  (aile, ölçü) → kartlar  (katı malzeme imzası)
+Eşleştirme yalnızca puan alabilecek kartları getirir; puanlama (bkz.
+bom_utils._profile_match_score) birebir aynıdır.
+
+Aktif hammadde kataloğunun paylaşılan indeksi süreç içinde tutulur ve
+`bom_products` sürüm damgası değişince (Product yazmaları, bkz. versioning)
+yenilenir. Yenileme hafif kolonlarla tek sorgudur; metni değişmeyen kartların
+profili hafızadan gelir.
+"""
+import threading
+
+from app.utils import versioning
+
+# Profil hafızası bu boyutu aşarsa temizlenir (uzun süre çalışan süreçlerde sınır).
+PROFILE_MEMO_MAX = 50000
+
+_profile_memo: dict = {}
+_shared = None          # (damga, MaterialIndex)
+_lock = threading.Lock()
+
+
+def _profile_for(name, material, code, notes) -> dict:
+    from app.utils.bom_utils import _candidate_material_profile
+
+    key = (name or '', material or '', code or '', notes or '')
+    profile = _profile_memo.get(key)
+    if profile is None:
+        if len(_profile_memo) >= PROFILE_MEMO_MAX:
+            _profile_memo.clear()
+        profile = _candidate_material_profile(*key)
+        _profile_memo[key] = profile
+    return profile
+
+
+def product_material_profile(product) -> dict:
+    """Bir Product'ın karşılaştırma profili (hafızalı)."""
+    return _profile_for(product.name, product.material, product.code, product.notes)
+
+
+class MaterialEntry:
+    __slots__ = ('id', 'unit_type', 'unit_cost', 'profile', 'obj')
+
+    def __init__(self, id, unit_type, unit_cost, profile, obj=None):
+        self.id = id
+        self.unit_type = unit_type
+        self.unit_cost = unit_cost
+        self.profile = profile
+        self.obj = obj
+
+
+class MaterialIndex:
+    """Sıralı aday listesi üzerinde ters indeks. `lookup` adayları her zaman
+    listedeki sırayla döndürür (eşit puanlarda eski tarama ile aynı seçim)."""
+
+    def __init__(self, entries: list):
+        self.entries = entries
+        self._by_token: dict = {}
+        self._by_name_token: dict = {}
+        self._by_signature: dict = {}
+        for pos, entry in enumerate(entries):
+            profile = entry.profile
+            for token in profile['tokens']:
+                self._by_token.setdefault(token, set()).add(pos)
+            for token in profile['name_tokens']:
+                self._by_name_token.setdefault(token, set()).add(pos)
+            sig = profile['sig']
+            if sig:
+                self._by_signature.setdefault((sig['family'], sig['dimensions']), set()).add(pos)
+
+    @classmethod
+    def from_products(cls, products) -> 'MaterialIndex':
+        return cls([
+            MaterialEntry(p.id, p.unit_type, p.unit_cost, product_material_profile(p), p)
+            for p in products
+        ])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _union(self, postings, tokens) -> set:
+        result = set()
+        for token in tokens:
+            result |= postings.get(token, set())
+        return result
+
+    def lookup(self, source: dict, require_name_match: bool = True) -> list:
+        """Kaynak profille puan alma ihtimali olan adaylar (gerekli koşullar:
+        ortak token, tüm ölçü token'ları, eşleşen imza ailesi/ölçüsü)."""
+        tokens = source['tokens']
+        if not tokens:
+            return []
+
+        dimension_tokens = source['dimension_tokens']
+        if dimension_tokens:
+            postings = sorted((self._by_token.get(t, set()) for t in dimension_tokens), key=len)
+            positions = set(postings[0])
+            for other in postings[1:]:
+                positions &= other
+        else:
+            positions = self._union(self._by_token, tokens)
+
+        if positions and require_name_match:
+            positions &= self._union(self._by_name_token, tokens)
+
+        sig = source['sig']
+        if positions and sig:
+            positions &= self._by_signature.get((sig['family'], sig['dimensions']), set())
+
+        return [self.entries[pos] for pos in sorted(positions)]
+
+    def product(self, entry):
+        """Seçilen adayın Product nesnesi (paylaşılan indekste id ile yüklenir)."""
+        if entry.obj is not None:
+            return entry.obj
+        from app import db
+        from app.models import Product
+        return db.session.get(Product, entry.id)
+
+
+def _build_shared_index() -> MaterialIndex:
+    from app import db
+    from app.models import Product
+
+    rows = (db.session.query(Product.id, Product.name, Product.material, Product.code, Product.notes,
+                             Product.unit_type, Product.unit_cost)
+            .filter(Product.is_active == True, Product.type == 'hammadde')
+            .order_by(Product.id)
+            .all())
+    return MaterialIndex([
+        MaterialEntry(pid, unit_type, unit_cost, _profile_for(name, material, code, notes))
+        for pid, name, material, code, notes, unit_type, unit_cost in rows
+    ])
+
+
+def shared_material_index() -> MaterialIndex:
+    """Aktif hammadde kataloğunun indeksi; Product yazmalarında yenilenir."""
+    global _shared
+    signature = versioning.read_signature((versioning.SCOPE_BOM_PRODUCTS,))
+    with _lock:
+        if signature is not None and _shared is not None and _shared[0] == signature:
+            return _shared[1]
+        index = _build_shared_index()
+        if signature is not None:
+            _shared = (signature, index)
+        return index
+
+
+def material_index_for(candidates=None) -> MaterialIndex:
+    """candidates: None (paylaşılan katalog), hazır MaterialIndex ya da Product listesi."""
+    if candidates is None:
+        return shared_material_index()
+    if isinstance(candidates, MaterialIndex):
+        return candidates
+    return MaterialIndex.from_products(candidates)
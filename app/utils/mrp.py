@@ -0,0 +1,298 @@
+"""
+Çok Seviyeli MRP Netleştirme
+============================
+`explode_bom_materials` her zaman yapraklara kadar patlatır; rafta hazır bekleyen
+yarı mamuller hiç düşülmez, bu yüzden üretim emirleri hammadde ihtiyacını
+olduğundan fazla gösterir.
+
+Bu modül derlenmiş BOM'lar (bkz. app/utils/bom_engine.py) üzerinde seviye seviye
+ilerler:
+  1. Her kartın düşük seviye kodu (low-level code) bulunur: kartın talep
+     ağaçlarında göründüğü en derin seviye. Böylece bir kart, onu kullanan tüm
+     ebeveynler netleştirilmeden işlenmez.
+  2. Seviye sırasıyla her kartın brüt ihtiyacı toplanır ve eldeki stokla
+     (Product.current_stock ya da verilen lokasyonun LocationStock miktarı)
+     netleştirilir. Net ihtiyacı kalan ara düğümler çocuklarına patlatılır.
+  3. Yalnızca eksik kalan kartlar için planlı emir üretilir
+     (ara düğüm → 'uretim', yaprak → 'satinalma').
+
+Altında stoklu yarı mamul bulunmayan bir alt ağaçta netleştirme hiçbir şeyi
+değiştirmez; bu alt ağaçlar gezilmez, birim başına ihtiyaçları alt ağaç
+özetine göre (bkz. CompiledBom.subtree_hashes) bir kez hesaplanıp tüm
+BOM'larda yeniden kullanılır.
+Talep edilen düğümün kendisi netleştirilmez — istenen miktar üretilecektir.
+"""
+from app.utils import bom_engine
+
+KIND_PRODUCTION = 'uretim'
+KIND_PURCHASE = 'satinalma'
+
+# Alt ağaç özetine göre paylaşılan birim başına ihtiyaç kayıtları için üst sınır.
+REQUIREMENT_MEMO_MAX_ENTRIES = 20000
+
+_requirement_memo = bom_engine.SubtreeMemo(REQUIREMENT_MEMO_MAX_ENTRIES)
+
+
+def available_stock(product_ids, location_id: int = None) -> tuple[dict, dict]:
+    """Kartları ve kullanılabilir stoklarını tek sorguda okur.
+    `location_id` verilirse stok o lokasyondaki LocationStock miktarıdır."""
+    from app import db
+    from app.models import Product, LocationStock
+
+    ids = {pid for pid in product_ids if pid is not None}
+    if not ids:
+        return {}, {}
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(ids)).all()}
+    if location_id is None:
+        stock = {pid: float(p.current_stock or 0) for pid, p in products.items()}
+    else:
+        rows = (db.session.query(LocationStock.product_id, LocationStock.quantity)
+                .filter(LocationStock.location_id == location_id, LocationStock.product_id.in_(ids))
+                .all())
+        stock = {pid: float(qty or 0) for pid, qty in rows}
+    return products, stock
+
+
+def subtree_requirements(compiled, index: int) -> tuple[dict, tuple, frozenset]:
+    """`index` düğümünün 1 adedi için alt ağaçtaki tüm kartların brüt ihtiyacı
+    (ara düğümler adet, yapraklar kart biriminde), sarf edilemeyen yaprakların
+    `index`'e göre konumları ve ara düğüm kartlarının brütü (kart -> adet; brütün
+    geri kalanı yaprak olarak tüketilir). Stoktan bağımsızdır; alt
+    ağaç özetiyle anahtarlandığından aynı alt montaj tüm BOM'larda bir kez
+    hesaplanır (aynı özet aynı ön-sıra yerleşimi demektir, konumlar geçerlidir)."""
+    signature = bom_engine.memo_signature(compiled)
+    hashes = compiled.subtree_hashes
+    cached = _requirement_memo.get(signature, hashes[index])
+    if cached is not None:
+        return cached
+
+    children = compiled.children
+    local: dict = {}
+    for i in range(compiled.subtree_end[index] - 1, index - 1, -1):
+        if not children[i]:
+            continue
+        entry = _requirement_memo.get(signature, hashes[i]) if i != index else None
+        if entry is not None:
+            local[i] = entry
+            continue
+        gross: dict = {}
+        issues: list = []
+        assemblies: dict = {}
+        for j in children[i]:
+            qty = compiled.explode_qty[j]
+            pid = compiled.product_ids[j]
+            if children[j]:
+                if pid is not None:
+                    gross[pid] = gross.get(pid, 0.0) + qty
+                    assemblies[pid] = assemblies.get(pid, 0.0) + qty
+                child_gross, child_issues, child_assemblies = local[j]
+                for cpid, cqty in child_gross.items():
+                    gross[cpid] = gross.get(cpid, 0.0) + qty * cqty
+                issues.extend(j - i + offset for offset in child_issues)
+                for cpid, cqty in child_assemblies.items():
+                    assemblies[cpid] = assemblies.get(cpid, 0.0) + qty * cqty
+            elif j in compiled.leaf_issues:
+                issues.append(j - i)
+            else:
+                gross[pid] = gross.get(pid, 0.0) + qty * compiled.consume_factors[j]
+        local[i] = (gross, tuple(issues), assemblies)
+        _requirement_memo.put(signature, hashes[i], local[i])
+    return local[index]
+
+
+class _Plan:
+    """Tek bir netleştirme çalışmasının durumu."""
+
+    def __init__(self, stock: dict):
+        self.stock = stock
+        self.pools: dict = {}       # product id -> {'gross', 'leaf', 'instances', 'kind'}
+        self.node_gross: dict = {}  # (plan sırası, indeks) -> netleştirilmeyen düğüm brütü
+        self.issues: dict = {}      # node id -> tanı kaydı
+
+    def pool(self, pid: int) -> dict:
+        pool = self.pools.get(pid)
+        if pool is None:
+            # leaf: brütün yaprak olarak (patlatılmadan) tüketilecek kısmı; kart başka
+            # yerde ara düğüm olsa bile bu kısım ancak stoktan karşılanabilir
+            pool = self.pools[pid] = {'gross': 0.0, 'leaf': 0.0, 'instances': [], 'kind': KIND_PURCHASE}
+        return pool
+
+    def issue(self, compiled, index: int) -> None:
+        entry = compiled.leaf_issues[index]
+        self.issues.setdefault(entry['node_id'], dict(entry, bom_id=compiled.bom_id))
+
+
+def net_requirements(demands: list[dict], location_id: int = None) -> dict:
+    """Talepleri (her biri bom_id, node_id, quantity) çok seviyeli netleştirir.
+
+    Dönüş:
+      requirements    — kart başına brüt ihtiyaç, stoktan karşılanan, net eksik,
+                        tür ('uretim' / 'satinalma'), düşük seviye kodu ve
+                        shortfall: alt bileşenlere patlatılarak karşılanamayan
+                        eksik (satın alma kartında net eksiğin tamamı; hem yaprak
+                        hem ara düğüm olan kartta yaprak ihtiyacının eksiği)
+      planned_orders  — yalnızca net eksiği olan kartlar
+      unlinked / missing_weight — patlatılan alt ağaçlardaki sarf edilemeyen yapraklar
+    """
+    units = []        # (compiled, üye indeksleri, talep indeksleri)
+    by_bom: dict = {}
+    for demand in demands:
+        compiled = by_bom.get(demand['bom_id'])
+        if compiled is None:
+            compiled = bom_engine.get_compiled_bom(demand['bom_id'])
+            if compiled is None:
+                raise ValueError(f"BOM #{demand['bom_id']} bulunamadı")
+            by_bom[demand['bom_id']] = compiled
+            units.append((compiled, set(), {}))
+        index = compiled.index_of(demand['node_id'])
+        if index is None:
+            raise ValueError(f"Düğüm #{demand['node_id']} BOM #{demand['bom_id']} içinde değil")
+        unit = next(u for u in units if u[0] is compiled)
+        unit[1].update(range(index, compiled.subtree_end[index]))
+        unit[2][index] = unit[2].get(index, 0.0) + float(demand['quantity'])
+    units = [(compiled, sorted(members), roots) for compiled, members, roots in units]
+
+    product_ids = set()
+    for compiled, members, _ in units:
+        product_ids.update(compiled.product_ids[i] for i in members)
+    products, stock = available_stock(product_ids, location_id)
+
+    levels, llc = _low_level_codes(units, len(product_ids))
+    plan = _Plan(stock)
+
+    # Altında stoklu ara kart ya da başka bir talep düğümü bulunan düğümler
+    # "bloklu"dur: birim başına ihtiyaç kısa yolu kullanılamaz.
+    blocked = []
+    for compiled, members, roots in units:
+        flags = {}
+        children, pids = compiled.children, compiled.product_ids
+        for i in reversed(members):
+            flags[i] = any(
+                flags[j] or j in roots
+                or (children[j] and pids[j] is not None and stock.get(pids[j], 0) > 0)
+                for j in children[i]
+            )
+        blocked.append(flags)
+
+    buckets: dict = {}
+    for u, (compiled, members, roots) in enumerate(units):
+        for i in members:
+            pid = compiled.product_ids[i]
+            if i in roots or (pid is None and compiled.children[i]):
+                buckets.setdefault(levels[u][i], []).append((u, i))
+            if i in roots:
+                plan.node_gross[(u, i)] = plan.node_gross.get((u, i), 0.0) + roots[i]
+    for pid, level in llc.items():
+        buckets.setdefault(level, []).append(pid)
+
+    requirements = {}
+    for level in sorted(buckets):
+        for key in buckets[level]:
+            if isinstance(key, tuple):
+                gross = plan.node_gross.pop(key, 0.0)
+                if gross > 0:
+                    u, i = key
+                    _expand(plan, units[u][0], u, i, gross, blocked[u], units[u][2])
+                continue
+            pool = plan.pools.get(key)
+            if not pool or pool['gross'] <= 0:
+                continue
+            available = max(plan.stock.get(key, 0.0), 0.0)
+            used = min(pool['gross'], available)
+            plan.stock[key] = available - used
+            # Stok önce yaprak ihtiyacına: ara düğüm örnekleri eksikte patlatılabilir
+            leaf_used = min(pool['leaf'], available)
+            requirements[key] = {
+                'product_id': key,
+                'product': products.get(key),
+                'gross': pool['gross'],
+                'from_stock': used,
+                'net': pool['gross'] - used,
+                'kind': pool['kind'],
+                'level': level,
+                'shortfall': pool['leaf'] - leaf_used,
+            }
+            remaining = used - leaf_used
+            for u, i, gross in pool['instances']:
+                take = min(gross, remaining)
+                remaining -= take
+                if gross - take > 0:
+                    _expand(plan, units[u][0], u, i, gross - take, blocked[u], units[u][2])
+
+    ordered = sorted(requirements.values(), key=lambda r: (r['level'], r['product_id']))
+    issues = list(plan.issues.values())
+    return {
+        'requirements': ordered,
+        'planned_orders': [
+            {'product_id': r['product_id'], 'product': r['product'], 'quantity': r['net'],
+             'kind': r['kind'], 'level': r['level']}
+            for r in ordered if r['net'] > 1e-9
+        ],
+        'unlinked': [i for i in issues if i['kind'] == 'unlinked'],
+        'missing_weight': [i for i in issues if i['kind'] == 'missing_weight'],
+    }
+
+
+def _low_level_codes(units, product_count: int) -> tuple[list, dict]:
+    """Düğüm seviyelerini ve kart başına düşük seviye kodunu sabit noktaya kadar
+    gevşetir: her düğüm ebeveyninden derindir ve kartı, kartın en derin
+    geçtiği seviyede işlenir. Ürün ağaçları döngüsüzse geçiş sayısı kart
+    sayısını aşamaz."""
+    levels = [dict() for _ in units]
+    llc: dict = {}
+    for _ in range(product_count + 2):
+        changed = False
+        for u, (compiled, members, roots) in enumerate(units):
+            level_of = levels[u]
+            for i in members:
+                parent = compiled.parents[i]
+                level = level_of[parent] + 1 if parent in level_of else 0
+                pid = compiled.product_ids[i]
+                netted = pid is not None and i not in roots
+                if netted:
+                    level = max(level, llc.get(pid, 0))
+                if level_of.get(i) != level:
+                    level_of[i] = level
+                    changed = True
+                if netted and llc.get(pid, -1) < level:
+                    llc[pid] = level
+                    changed = True
+        if not changed:
+            return levels, llc
+    raise ValueError('Ürün ağacında döngü var: bir kart kendi alt bileşeni olarak kullanılıyor')
+
+
+def _expand(plan: _Plan, compiled, u: int, index: int, quantity: float, blocked: dict, roots: dict) -> None:
+    """Netleştirilmiş `quantity` adet düğümü çocuklarına dağıtır."""
+    children = compiled.children[index]
+    if not children:
+        return
+    if not blocked[index]:
+        gross, issues, assemblies = subtree_requirements(compiled, index)
+        for pid, per_unit in gross.items():
+            pool = plan.pool(pid)
+            pool['gross'] += quantity * per_unit
+            pool['leaf'] += quantity * (per_unit - assemblies.get(pid, 0.0))
+        for pid in assemblies:
+            plan.pool(pid)['kind'] = KIND_PRODUCTION
+        for offset in issues:
+            plan.issue(compiled, index + offset)
+        return
+
+    for j in children:
+        qty = quantity * compiled.explode_qty[j]
+        pid = compiled.product_ids[j]
+        if not compiled.children[j]:
+            if j in compiled.leaf_issues:
+                plan.issue(compiled, j)
+            else:
+                pool = plan.pool(pid)
+                pool['gross'] += qty * compiled.consume_factors[j]
+                pool['leaf'] += qty * compiled.consume_factors[j]
+        elif pid is None or j in roots:
+            plan.node_gross[(u, j)] = plan.node_gross.get((u, j), 0.0) + qty
+        else:
+            pool = plan.pool(pid)
+            pool['gross'] += qty
+            pool['kind'] = KIND_PRODUCTION
+            pool['instances'].append((u, j, qty))
@@ -0,0 +1,178 @@
+"""
+Okutma (QR / barkod) Ürün Arama Tablosu
+=======================================
+`/api/products/by-qr` ve sayım ekranı her okutmada ürün kodunu, bulamazsa
+barkodu ayrı sorgularla arıyordu; barcode kolonunda indeks de yoktu. El
+terminalleri çevrimdışı biriktirdiği okutmaları toplu gönderdiğinde bu, kod
+başına iki sorgu demekti.
+
+Bu modül süreç içinde küçük bir arama tablosu tutar:
+  by_code     — ürün kodu -> id (kod benzersiz)
+  by_barcode  — barkod -> {id, ...} (aynı barkodlu birden fazla kart olabilir;
+                eski `.first()` gibi en küçük id seçilir)
+  ids         — id -> (kod, barkod); değişen kartın eski anahtarlarını düşürmek için
+Okunan metin sırasıyla etiket biçimi (`CELMAK-<id>|...` ya da etiketteki
+`.../products/<id>` adresi), ürün kodu ve barkod olarak çözülür.
+
+Güncellik (bkz. versioning, katalog sayacı):
+  - Tablo kurulduğu katalog sürümünü saklar. Sürüm ilerlemişse yalnızca
+    `catalog_version` damgası daha büyük kartlar tek sorguda yeniden yüklenir
+    (stok hareketleri de sayacı artırır; her seferinde baştan kurmak gereksiz).
+  - Silinen kart satır bırakmaz; ürün sayısı tablodakiyle tutmazsa tablo
+    baştan kurulur.
+İzleme kapalıysa paylaşılan tablo kullanılmaz; yalnızca okunan kodlara ait
+kartlar tek sorguyla yüklenip aynı kurallarla çözülür.
+"""
+import re
+
+from app.utils import versioning
+from app.utils.shared_index import SharedIndex
+
+CELMAK_PREFIX = 'CELMAK-'
+_LABEL_URL = re.compile(r'/products/(\d+)/?$')
+
+
+def parse_label_id(code: str):
+    """Etiket biçimindeki okutmadan ürün id'si: `CELMAK-<id>|...` ya da
+    QR etiketlerine basılan `.../products/<id>` adresi. Değilse None."""
+    if code.startswith(CELMAK_PREFIX):
+        value = code[len(CELMAK_PREFIX):].split('|')[0].split('-')[0].strip()
+        return int(value) if value.isdigit() else None
+    if '://' in code:
+        match = _LABEL_URL.search(code.split('?')[0])
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def normalize(code) -> str:
+    """Okuyucuların eklediği boşluk / satır sonlarını atar."""
+    return str(code).strip() if code is not None else ''
+
+
+class ProductLookup:
+    """Okutulan metin → ürün id."""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.ids: dict = {}          # id -> (code, barcode)
+        self.by_code: dict = {}      # code -> id
+        self.by_barcode: dict = {}   # barcode -> {id, ...}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _put(self, product_id: int, code, barcode) -> None:
+        self._drop(product_id)
+        self.ids[product_id] = (code, barcode)
+        if code:
+            self.by_code[code] = product_id
+        if barcode:
+            self.by_barcode.setdefault(barcode, set()).add(product_id)
+
+    def _drop(self, product_id: int) -> None:
+        old = self.ids.pop(product_id, None)
+        if old is None:
+            return
+        code, barcode = old
+        if code and self.by_code.get(code) == product_id:
+            del self.by_code[code]
+        if barcode:
+            holders = self.by_barcode.get(barcode)
+            if holders is not None:
+                holders.discard(product_id)
+                if not holders:
+                    del self.by_barcode[barcode]
+
+    def resolve(self, code):
+        """Okutulan metnin ürün id'si; bulunamazsa None."""
+        code = normalize(code)
+        if not code:
+            return None
+        product_id = parse_label_id(code)
+        if product_id is not None and product_id in self.ids:
+            return product_id
+        product_id = self.by_code.get(code)
+        if product_id is not None:
+            return product_id
+        holders = self.by_barcode.get(code)
+        return min(holders) if holders else None
+
+
+def _rows(query):
+    from app.models import Product
+    return query.with_entities(Product.id, Product.code, Product.barcode)
+
+
+def _build(version) -> ProductLookup:
+    from app.models import Product
+
+    lookup = ProductLookup(version)
+    for product_id, code, barcode in _rows(Product.query).order_by(Product.id):
+        lookup._put(product_id, code, barcode)
+    return lookup
+
+
+def _refresh(lookup, version) -> ProductLookup:
+    from app import db
+    from app.models import Product
+
+    if version is None:
+        return None
+    if lookup is None or lookup.version is None or version < lookup.version:
+        return _build(version)
+    if version == lookup.version:
+        return lookup
+
+    for product_id, code, barcode in _rows(Product.query.filter(Product.catalog_version > lookup.version)):
+        lookup._put(product_id, code, barcode)
+    if db.session.query(db.func.count(Product.id)).scalar() != len(lookup):
+        return _build(version)
+    lookup.version = version
+    return lookup
+
+
+def _direct(codes) -> ProductLookup:
+    """İzleme kapalıyken: yalnızca okunan kodlara ait kartlardan kurulan tablo."""
+    from app import db
+    from app.models import Product
+
+    codes = {normalize(c) for c in codes} - {''}
+    ids = {i for i in map(parse_label_id, codes) if i is not None}
+    lookup = ProductLookup()
+    if not codes:
+        return lookup
+    conditions = [Product.code.in_(codes), Product.barcode.in_(codes)]
+    if ids:
+        conditions.append(Product.id.in_(ids))
+    for product_id, code, barcode in _rows(Product.query.filter(db.or_(*conditions))).order_by(Product.id):
+        lookup._put(product_id, code, barcode)
+    return lookup
+
+
+_shared = SharedIndex(versioning.catalog_version, _refresh)
+
+
+def shared_lookup():
+    """Güncel paylaşılan tablo. İzleme kapalıysa None."""
+    return _shared.get()
+
+
+def resolve(code):
+    """Okutulan tek metnin ürün id'si; bulunamazsa None."""
+    return resolve_many([code])[0]
+
+
+def resolve_many(codes) -> list:
+    """Okutulan metinlerin ürün id'leri, verilen sırayla (bulunamayan None)."""
+    codes = list(codes)
+    lookup = shared_lookup()
+    if lookup is None:
+        lookup = _direct(codes)
+        return [lookup.resolve(c) for c in codes]
+    with _shared.lock:
+        return [lookup.resolve(c) for c in codes]
+
+
+def invalidate() -> None:
+    _shared.invalidate()
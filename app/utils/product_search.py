@@ -0,0 +1,456 @@
+"""
+Ürün Arama İndeksi
+==================
+`_product_search_query` (reports.py) her kelime kökü için ad, kod, barkod,
+malzeme, not ve kategori üzerinde ILIKE '%..%' OR'luyordu; hiçbiri tutmazsa
+2000 ürünü Python'da puanlıyordu. `/api/products/search`,
+`/stock/api/search-products` ve ürün listesi araması da indekssiz ILIKE
+taramasıydı.
+
+Her ürünün aranan alanları `products.search_text` kolonunda katlanmış (küçük
+harf, Türkçe harfler ASCII: "Bıçak Tutucu" → "bicak tutucu") tek bir metin
+olarak tutulur. Sorgu kelimeleri de katlanır ve Türkçe eklerden kırpılır
+("tamburlunun" → "tamburl"); eşleşme alt dizgi (substring) olduğundan köke
+inen kelime metindeki tüm çekimli biçimleri yakalar.
+
+Arka uçlar (ilk aramada seçilir):
+  pg_trgm  — PostgreSQL: search_text üzerinde GIN trigram indeksi; LIKE
+             indeksten çalışır, eşit puanlılar similarity() ile sıralanır
+  fts5     — SQLite: trigram tokenizer'lı FTS5 tablosu (products_search_fts),
+             products üzerindeki tetikleyicilerle güncel tutulur
+  like     — diğerleri: aynı katlanmış kolonda LIKE (indekssiz ama tek kolon)
+
+Sonuçlar tek sorguda sıralanır: eşleşen kelime sayısı (çok olan önce), sonra
+benzerlik (PostgreSQL) ve ad.
+
+Güncellik: Product yazmalarında (ORM flush) aranan alanlardan biri değiştiyse
+kolon aynı flush'ta yeniden hesaplanır; kategori adı değişirse o kategorinin
+ürünleri güncellenir. Satır bilgisi olmayan toplu yazmalarda yalnızca aranan
+bir kolonu yazan ifadeler dikkate alınır: Query.update() / update() için
+etkilenen ürün (ya da kategori) id'leri ifade çalışmadan önce aynı WHERE ile
+toplanır, search_text vermeyen toplu insert'lerde boş kalan satırlar seçilir;
+commit öncesinde yalnızca bu satırlar yeniden hesaplanır. Toplu insert yapan
+kod (ör. stok senkronizasyonu) search_text'i `build_search_text` ile kendisi
+doldurursa hiç yeniden hesaplama gerekmez. Başlangıçta boş kalan satırlar
+doldurulur.
+"""
+import re
+import threading
+import unicodedata
+
+from sqlalchemy import and_, bindparam, case, column, event, func, inspect, or_, select, table
+from sqlalchemy import text as sql_text
+
+from app.utils.flush_tracking import bind_commit_rebuild, bulk_set_values, mark_stale
+
+SEARCH_FIELDS = ('code', 'name', 'barcode', 'material', 'notes', 'category_id', 'category')
+
+_FTS_TABLE = 'products_search_fts'
+_PG_INDEX = 'ix_products_search_text_trgm'
+_TRIGRAM = 3                    # FTS5 trigram, 3 karakterden kısa ifadeleri eşleştirmez
+_STALE_KEY = 'product_search_stale'
+_RENAMED_KEY = 'product_search_renamed'
+_ID_CHUNK = 500                 # IN listesi başına en fazla id
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Türkçe katlama ve kök bulma
+# ---------------------------------------------------------------------------
+
+def fold_search_text(value):
+    text = str(value or '').lower()
+    text = (
+        text.replace('ı', 'i')
+        .replace('İ'.lower(), 'i')
+        .replace('ğ', 'g')
+        .replace('ü', 'u')
+        .replace('ş', 's')
+        .replace('ö', 'o')
+        .replace('ç', 'c')
+    )
+    text = text.translate(str.maketrans('ıİğĞüÜşŞöÖçÇ', 'iIgGuUsSoOcC')).lower()
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+
+# Türkçe çekim eklerini kırpan basit stemmer.
+# Amaç: "tamburlunun" → "tamburlu", "makinesinin" → "makine", "tamburunun" → "tambur"
+# gibi sorgu kelimelerini ürün/BOM adlarıyla eşleşecek köke indirgemek.
+# Substring eşleşmesi yapıldığı için hafif fazla kırpma zarar vermez; az kırpmak sorundur.
+# NOT: 'unun/ünün/inin/ının' bilerek listede YOK — kök sesliyle bitiyorsa fazla kırparlar
+# (örn. "tamburlunun" → yanlışlıkla "tamburl"). Onun yerine 'nun/nin' ile "tamburlu" elde edilir.
+# "tamburunun" gibi durumlar için arama tarafında ayrıca agresif (son sesli düşmüş) varyant OR'lanır.
+_TR_STEM_SUFFIXES = sorted([
+    # iyelik + ilgi/belirtme bileşik ekleri (en uzunlar)
+    'larinin', 'lerinin', 'larindan', 'lerinden', 'larinda', 'lerinde',
+    'sinin', 'sının', 'sunun', 'sünün', 'nunun', 'nünün',
+    'ndan', 'nden', 'nda', 'nde',
+    # ayrılma / bulunma / yönelme
+    'dan', 'den', 'tan', 'ten', 'da', 'de', 'ta', 'te',
+    # çokluk
+    'lar', 'ler',
+    # iyelik / belirtme
+    'sini', 'sını', 'lari', 'leri', 'nin', 'nın', 'nun', 'nün',
+    'si', 'sı', 'su', 'sü', 'yi', 'yı', 'yu', 'yü',
+    'in', 'ın', 'un', 'ün', 'ya', 'ye', 'na', 'ne',
+], key=len, reverse=True)
+
+_TR_VOWELS = set('aeıioöuüâî')
+
+
+def turkish_stem(term):
+    t = str(term or '').lower()
+    if t.isdigit() or len(t) <= 4:
+        return t
+    for suf in _TR_STEM_SUFFIXES:
+        if t.endswith(suf) and len(t) - len(suf) >= 4:
+            return t[:-len(suf)]
+    return t
+
+
+def turkish_stem_aggressive(term):
+    """Konservatif kökten sonra bir sondaki sesliyi de düşürür ('tamburu' → 'tambur')."""
+    s = turkish_stem(term)
+    if len(s) > 4 and s[-1] in _TR_VOWELS:
+        return s[:-1]
+    return s
+
+
+def build_search_text(code, name, barcode, material, notes, category_name) -> str:
+    """Ürünün katlanmış arama metni (search_text kolonu)."""
+    raw = ' '.join(str(value) for value in (code, name, barcode, material, notes, category_name) if value)
+    return ' '.join(fold_search_text(raw).split())
+
+
+def term_variants(term) -> tuple:
+    """Bir sorgu kelimesinin katlanmış kök varyantları. Başka bir varyantı içeren
+    varyant atılır (alt dizgi eşleşmesinde kısası onu zaten kapsar)."""
+    raw = str(term or '').lower()
+    folded = fold_search_text(raw)
+    candidates = {fold_search_text(v) for v in (raw, turkish_stem(raw), turkish_stem_aggressive(raw))}
+    candidates.update({turkish_stem(folded), turkish_stem_aggressive(folded)})
+    candidates = {c.strip() for c in candidates if c and c.strip()}
+    return tuple(sorted(c for c in candidates if not any(o != c and o in c for o in candidates)))
+
+
+def split_terms(query) -> list:
+    """Serbest arama kutusu metnini kelimelere böler."""
+    return re.findall(r"[\w\-./]+", str(query or ''), flags=re.UNICODE)
+
+
+# ---------------------------------------------------------------------------
+# Arka uç
+# ---------------------------------------------------------------------------
+
+def _fts_table():
+    return table(_FTS_TABLE, column('rowid'), column('search_text'))
+
+
+def _ensure_fts(connection) -> None:
+    """SQLite FTS5 tablosunu ve products tetikleyicilerini (yoksa) kurar, doldurur."""
+    exists = connection.execute(
+        sql_text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': _FTS_TABLE}
+    ).first()
+    if exists:
+        return
+    connection.execute(sql_text(
+        f"CREATE VIRTUAL TABLE {_FTS_TABLE} USING fts5("
+        f"search_text, content='products', content_rowid='id', tokenize='trigram')"))
+    connection.execute(sql_text(
+        f"CREATE TRIGGER IF NOT EXISTS {_FTS_TABLE}_ai AFTER INSERT ON products BEGIN "
+        f"INSERT INTO {_FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END"))
+    connection.execute(sql_text(
+        f"CREATE TRIGGER IF NOT EXISTS {_FTS_TABLE}_ad AFTER DELETE ON products BEGIN "
+        f"INSERT INTO {_FTS_TABLE}({_FTS_TABLE}, rowid, search_text) "
+        f"VALUES ('delete', old.id, old.search_text); END"))
+    connection.execute(sql_text(
+        f"CREATE TRIGGER IF NOT EXISTS {_FTS_TABLE}_au AFTER UPDATE OF search_text ON products BEGIN "
+        f"INSERT INTO {_FTS_TABLE}({_FTS_TABLE}, rowid, search_text) "
+        f"VALUES ('delete', old.id, old.search_text); "
+        f"INSERT INTO {_FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END"))
+    connection.execute(sql_text(f"INSERT INTO {_FTS_TABLE}({_FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def _ensure_pg_trgm(engine) -> None:
+    """pg_trgm eklentisi ve GIN indeksi (yetki yoksa migration'a bırakılır)."""
+    with engine.begin() as conn:
+        conn.execute(sql_text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    with engine.begin() as conn:
+        conn.execute(sql_text(
+            f'CREATE INDEX IF NOT EXISTS {_PG_INDEX} ON products USING gin (search_text gin_trgm_ops)'))
+
+
+def _detect_backend() -> str:
+    from flask import current_app
+    from app import db
+
+    dialect = db.engine.dialect.name
+    try:
+        if dialect == 'postgresql':
+            with db.engine.connect() as conn:
+                has_trgm = conn.execute(sql_text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+            return 'pg_trgm' if has_trgm else 'like'
+        if dialect == 'sqlite':
+            with db.engine.begin() as conn:
+                _ensure_fts(conn)
+            return 'fts5'
+    except Exception as e:
+        current_app.logger.warning(f"Ürün arama indeksi kullanılamıyor, LIKE taramasına düşülüyor: {e}")
+    return 'like'
+
+
+def backend() -> str:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _detect_backend()
+    return _backend
+
+
+# ---------------------------------------------------------------------------
+# Sorgu
+# ---------------------------------------------------------------------------
+
+def _like_any(variants):
+    from app.models import Product
+
+    def pattern(v):
+        return '%' + v.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+    return or_(*(Product.search_text.like(pattern(v), escape='\\') for v in variants))
+
+
+def _fts_expression(groups, operator) -> str:
+    def phrase(v):
+        return '"' + v.replace('"', '""') + '"'
+    return f' {operator} '.join('(' + ' OR '.join(phrase(v) for v in variants) + ')' for variants in groups)
+
+
+def _match_filter(groups, require_all):
+    """Kelime gruplarının eşleşme koşulu (hepsi ya da herhangi biri)."""
+    from app.models import Product
+
+    combine = and_ if require_all else or_
+    if backend() != 'fts5':
+        return combine(*(_like_any(g) for g in groups))
+
+    indexed = [g for g in groups if min(len(v) for v in g) >= _TRIGRAM]
+    parts = [_like_any(g) for g in groups if g not in indexed]
+    if indexed:
+        fts = _fts_table()
+        match = _fts_expression(indexed, 'AND' if require_all else 'OR')
+        parts.insert(0, Product.id.in_(select(fts.c.rowid).where(fts.c.search_text.op('MATCH')(match))))
+    return combine(*parts)
+
+
+def _rank_order(groups):
+    from app.models import Product
+
+    score = sum(case((_like_any(g), 1), else_=0) for g in groups)
+    order = [score.desc()]
+    if backend() == 'pg_trgm':
+        order.append(func.similarity(Product.search_text, ' '.join(g[0] for g in groups)).desc())
+    return order
+
+
+def search_groups(terms) -> list:
+    groups = []
+    for term in terms or []:
+        variants = term_variants(term)
+        if variants and variants not in groups:
+            groups.append(variants)
+    return groups
+
+
+def apply_search(query, terms, require_all=True, rank=True):
+    """Product sorgusunu arama kelimeleriyle süzer ve (rank=True) puana göre sıralar.
+    Çağıranın sonradan eklediği order_by sıralamayı ikincil olarak tamamlar."""
+    groups = search_groups(terms)
+    if not groups:
+        return query
+    query = query.filter(_match_filter(groups, require_all))
+    if rank:
+        query = query.order_by(*_rank_order(groups))
+    return query
+
+
+def ranked_search(query, terms, loose_terms=None):
+    """Tüm kelimelerin geçtiği ürünler; hiç yoksa loose_terms'ten (verilmezse
+    terms) herhangi birinin geçtiği ürünler. Tek sorgudur: gevşek koşul yalnızca
+    katı eşleşme yokken (ilişkisiz EXISTS, bir kez hesaplanır) devreye girer;
+    sonuç eşleşen kelime grubu sayısına göre sıralanır."""
+    from app.models import Product
+
+    groups = search_groups(terms)
+    if not groups:
+        return query
+    loose = search_groups(loose_terms or terms)
+    strict = _match_filter(groups, require_all=True)
+    # Alt sorgu da products'a bakar; dış sorguyla ilişkilendirilmemeli (correlate(None))
+    any_strict = query.filter(strict).with_entities(Product.id).limit(1).statement.correlate(None).exists()
+    query = query.filter(or_(strict, and_(~any_strict, _match_filter(loose, require_all=False))))
+    return query.order_by(*_rank_order(groups + [g for g in loose if g not in groups]))
+
+
+def search_products(query, q):
+    """Arama kutusu metniyle (tüm kelimeler) sıralı ürün sorgusu."""
+    return apply_search(query, split_terms(q), require_all=True)
+
+
+# ---------------------------------------------------------------------------
+# Güncel tutma
+# ---------------------------------------------------------------------------
+
+def refresh_search_text(connection, category_ids=None, missing_only=False, product_ids=None) -> int:
+    """search_text'i tablolardan yeniden hesaplar; yalnızca farklı olan satırları yazar.
+    category_ids / product_ids verilirse yalnızca o kategorilerin / ürünlerin
+    satırları, missing_only ile yalnızca boş olanlar okunur."""
+    from app.models import Category, Product
+
+    p = Product.__table__
+    c = Category.__table__
+    base = select(p.c.id, p.c.code, p.c.name, p.c.barcode, p.c.material, p.c.notes, c.c.name,
+                  p.c.search_text).select_from(p.outerjoin(c, c.c.id == p.c.category_id))
+    if missing_only:
+        base = base.where(p.c.search_text.is_(None))
+    if category_ids is None and product_ids is None:
+        statements = [base]
+    else:
+        statements = []
+        for key, ids in ((p.c.category_id, category_ids), (p.c.id, product_ids)):
+            ids = sorted(ids or ())
+            statements.extend(base.where(key.in_(ids[i:i + _ID_CHUNK]))
+                              for i in range(0, len(ids), _ID_CHUNK))
+
+    rows = {}
+    for stmt in statements:
+        for product_id, code, name, barcode, material, notes, category_name, current in connection.execute(stmt):
+            value = build_search_text(code, name, barcode, material, notes, category_name)
+            if value != current:
+                rows[product_id] = value
+    if rows:
+        connection.execute(
+            p.update().where(p.c.id == bindparam('product_id')).values(search_text=bindparam('value')),
+            [{'product_id': product_id, 'value': value} for product_id, value in rows.items()])
+    return len(rows)
+
+
+def _category_name(session, product):
+    from app.models import Category
+
+    category = product.__dict__.get('category')
+    if category is None or (category.id is not None and category.id != product.category_id):
+        category = session.get(Category, product.category_id) if product.category_id else None
+    return category.name if category is not None else ''
+
+
+def _before_flush(session, flush_context, instances):
+    from app.models import Category, Product
+
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Product):
+            state = inspect(obj)
+            if obj in session.new or any(state.attrs[f].history.has_changes() for f in SEARCH_FIELDS):
+                obj.search_text = build_search_text(obj.code, obj.name, obj.barcode, obj.material,
+                                                    obj.notes, _category_name(session, obj))
+        elif isinstance(obj, Category) and obj not in session.new:
+            if inspect(obj).attrs.name.history.has_changes():
+                session.info.setdefault(_RENAMED_KEY, set()).add(obj.id)
+
+
+def _after_flush(session, flush_context):
+    renamed = session.info.pop(_RENAMED_KEY, None)
+    if renamed:
+        refresh_search_text(session.connection(), category_ids=renamed)
+
+
+def _bulk_rows(orm_execute_state) -> list:
+    params = orm_execute_state.parameters
+    return list(params) if isinstance(params, (list, tuple)) else [params] if params else []
+
+
+def _bulk_marks(orm_execute_state, model, touched) -> list:
+    """Toplu UPDATE'in etkileyeceği satırların işaretleri (ifade çalışmadan önce,
+    aynı WHERE ile). WHERE'siz ifade tüm tabloyu etkiler: [None]."""
+    rows = _bulk_rows(orm_execute_state)
+    if rows and all('id' in row for row in rows):
+        # update(Model) + [{'id': ..., ...}]: birincil anahtarla toplu güncelleme
+        return [(touched, row['id']) for row in rows]
+    whereclause = orm_execute_state.statement.whereclause
+    if whereclause is None:
+        return [None]
+    ids = orm_execute_state.session.execute(select(model.id).where(whereclause)).scalars()
+    return [(touched, i) for i in ids]
+
+
+def _do_orm_execute(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_insert):
+        return
+    from app.models import Category, Product
+
+    mappers = {mapper.class_ for mapper in orm_execute_state.all_mappers}
+    session = orm_execute_state.session
+    if Product in mappers:
+        if orm_execute_state.is_insert:
+            rows = _bulk_rows(orm_execute_state)
+            filled = (all(row.get('search_text') for row in rows) if rows
+                      else bool((bulk_set_values(orm_execute_state) or {}).get('search_text')))
+            if not filled:
+                mark_stale(session, _STALE_KEY, ('missing', None))
+            return
+        values = bulk_set_values(orm_execute_state)
+        if values is None or set(values) & set(SEARCH_FIELDS):
+            marks = _bulk_marks(orm_execute_state, Product, 'product')
+            if marks:
+                mark_stale(session, _STALE_KEY, *marks)
+    elif Category in mappers and orm_execute_state.is_update:
+        values = bulk_set_values(orm_execute_state)
+        if values is None or 'name' in values:
+            marks = _bulk_marks(orm_execute_state, Category, 'category')
+            if marks:
+                mark_stale(session, _STALE_KEY, *marks)
+
+
+def _rebuild_stale(connection, marks):
+    if None in marks:
+        refresh_search_text(connection)
+        return
+    product_ids = {i for kind, i in marks if kind == 'product'}
+    category_ids = {i for kind, i in marks if kind == 'category'}
+    if product_ids or category_ids:
+        refresh_search_text(connection, category_ids=category_ids, product_ids=product_ids)
+    if ('missing', None) in marks:
+        refresh_search_text(connection, missing_only=True)
+
+
+def _after_rollback(session):
+    session.info.pop(_RENAMED_KEY, None)
+
+
+def init_product_search(app, db) -> None:
+    """İndeksi (yoksa) kurar, boş search_text satırlarını doldurur ve oturum olaylarını bağlar."""
+    with app.app_context():
+        try:
+            if 'products' in inspect(db.engine).get_table_names():
+                with db.engine.begin() as conn:
+                    filled = refresh_search_text(conn, missing_only=True)
+                if filled:
+                    app.logger.info(f"{filled} ürünün arama metni dolduruldu.")
+                if db.engine.dialect.name == 'postgresql':
+                    _ensure_pg_trgm(db.engine)
+                elif db.engine.dialect.name == 'sqlite':
+                    with db.engine.begin() as conn:
+                        _ensure_fts(conn)
+        except Exception as e:
+            # İlk kurulumda tablo henüz yoksa ya da eklenti yetkisi yoksa; arama ilk kullanımda karar verir
+            app.logger.info(f"Ürün arama indeksi başlangıçta hazırlanamadı: {e}")
+
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'do_orm_execute', _do_orm_execute)
+        event.listen(db.session, 'after_rollback', _after_rollback)
+        bind_commit_rebuild(db, _STALE_KEY, _rebuild_stale)
@@ -0,0 +1,92 @@
+"""
+Süreç İçi Paylaşılan İndeksler
+==============================
+where_used, cost_index ve product_lookup aynı kalıbı kullanır: süreç içinde
+tek bir indeks tutulur, her çağrıda küçük bir damga okunur ve indeks bu
+damgaya göre kilit altında tazelenir. İzleme kapalıysa (damga None)
+paylaşılan indeks tutulmaz; `refresh` her çağrıda baştan kurar.
+
+BomEntryIndex, BOM başına kayıt tutan indekslerin ortak tarafıdır: kayıt
+ekleme/çıkarma (ters indeksler alt sınıfın kancalarıyla güncellenir) ve
+`boms` damgasına göre eşitleme. Damga değişmemişse veritabanına başka sorgu
+atılmaz; değişmişse bom:<id> token'ları tek sorguda okunur ve yalnızca
+token'ı değişen BOM'lar yeniden yüklenir (bkz. versioning.bom_tokens).
+"""
+import threading
+
+from app.utils import versioning
+
+
+class SharedIndex:
+    """Paylaşılan tek indeks. `read_stamp()` güncel damgayı (izleme kapalıysa
+    None), `refresh(index, stamp)` tazelenmiş indeksi döndürür; izleme
+    kapalıyken `index` None verilir."""
+
+    def __init__(self, read_stamp, refresh):
+        self.lock = threading.Lock()
+        self._read_stamp = read_stamp
+        self._refresh = refresh
+        self._index = None
+
+    def get(self):
+        stamp = self._read_stamp()
+        with self.lock:
+            index = self._refresh(self._index if stamp is not None else None, stamp)
+            if stamp is not None:
+                self._index = index
+            return index
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self._index = None
+
+
+class BomEntryIndex:
+    """bom_id -> kayıt; ters indeksler `_index_entry`/`_unindex_entry` ile tutulur."""
+
+    def __init__(self):
+        self.entries: dict = {}     # bom_id -> kayıt
+        self.tokens: dict = {}      # bom_id -> son eşitlemedeki bom:<id> token'ı
+        self.boms_token = None
+        self.synced = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _index_entry(self, bom_id: int, entry) -> None:
+        raise NotImplementedError
+
+    def _unindex_entry(self, bom_id: int, entry) -> None:
+        raise NotImplementedError
+
+    def _put(self, bom_id: int, entry) -> None:
+        self._drop(bom_id)
+        if entry is None:
+            return
+        self.entries[bom_id] = entry
+        self._index_entry(bom_id, entry)
+
+    def _drop(self, bom_id: int) -> None:
+        entry = self.entries.pop(bom_id, None)
+        if entry is not None:
+            self._unindex_entry(bom_id, entry)
+
+    def sync(self, boms_token, load) -> None:
+        """İndeksi `boms` damgasına getirir. `load(bom_ids)` -> {bom_id: kayıt};
+        bom_ids None ise tüm BOM'lar yüklenir, sonuçta olmayan BOM düşer."""
+        if self.synced and boms_token == self.boms_token:
+            return
+        # Token'lar veriden ÖNCE okunur: arada gelen yazma bir sonraki çağrıda yeniden yüklenir.
+        tokens = versioning.bom_tokens()
+        if not self.synced:
+            for bom_id, entry in load(None).items():
+                self._put(bom_id, entry)
+        else:
+            stale = sorted(b for b, token in tokens.items() if self.tokens.get(b) != token)
+            if stale:
+                loaded = load(stale)
+                for bom_id in stale:
+                    self._put(bom_id, loaded.get(bom_id))
+        self.tokens = tokens
+        self.boms_token = boms_token
+        self.synced = True
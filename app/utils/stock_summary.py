@@ -0,0 +1,305 @@
+"""
+Kategori / Lokasyon Stok Özet Tabloları
+=======================================
+Depo ekranları (warehouse.index, warehouse.locations, reports.warehouse_report)
+eskiden her kategori için `Product.query.filter_by(category_id=...)`, her
+lokasyon için `LocationStock.query.filter_by(location_id=...)` çalıştırıp
+Python'da topluyordu.
+
+Bu modül iki özet tabloyu güncel tutar:
+  stock_category_summaries  — aktif ürün sayısı, kritik/boş sayısı, toplam stok, stok değeri
+  stock_location_summaries  — satır sayısı, stoklu ürün sayısı, toplam / pozitif miktar
+
+Güncelleme artımlıdır: stok yazan tüm yollar (stock.py, production.py,
+counting.py, api.py ...) ORM üzerinden Product / LocationStock yazdığından,
+her flush'ta değişen satırların ESKİ ve YENİ katkısı farkı (delta) aynı
+transaction içinde özet satırına eklenir. Satır bazında bilgi olmayan toplu
+yazmalarda (Query.update(), toplu insert) etkilenen kategori/lokasyon id'leri
+ifade çalışmadan önce toplanır (eklenen satırların değerleri, güncellenen /
+silinen satırlar için aynı WHERE ile tek sorgu) ve commit öncesinde yalnızca
+o özet satırları gruplu sorguyla yeniden hesaplanır. Özet alanına dokunmayan
+toplu yazma (ör. kategorisiz kart ekleyen stok senkronizasyonu) özeti
+bayatlatmaz. `rebuild_stock_summaries` her zaman
+tablolardan yeniden hesaplar (başlangıçta boşsa ve `python run.py
+rebuild-summaries` ile).
+"""
+from datetime import datetime
+
+from sqlalchemy import DateTime, and_, case, delete, event, func, literal, select
+from sqlalchemy.sql import ClauseElement
+
+from app.utils.flush_tracking import (bind_commit_rebuild, bulk_set_values, collect_deltas, mark_stale,
+                                      upsert_increments)
+
+PRODUCT_FIELDS = ('category_id', 'is_active', 'current_stock', 'minimum_stock', 'unit_cost')
+LOCATION_FIELDS = ('location_id', 'quantity')
+
+CATEGORY_COLUMNS = ('total_items', 'critical_items', 'empty_items', 'total_stock', 'total_value')
+LOCATION_COLUMNS = ('total_products', 'product_count', 'total_quantity', 'positive_quantity')
+
+_STALE_KEY = 'stock_summary_stale'
+
+
+# ---------------------------------------------------------------------------
+# Satır katkıları
+# ---------------------------------------------------------------------------
+
+def _product_contribution(category_id, is_active, current_stock, minimum_stock, unit_cost):
+    """Bir ürünün kategori özetine katkısı: (category_id, değerler) ya da None."""
+    if category_id is None or is_active is False:
+        return None
+    current = current_stock or 0
+    minimum = minimum_stock or 0
+    return category_id, (
+        1,
+        1 if minimum > 0 and current < minimum else 0,
+        1 if current <= 0 else 0,
+        current,
+        current * (unit_cost or 0),
+    )
+
+
+def _location_contribution(location_id, quantity):
+    if location_id is None:
+        return None
+    quantity = quantity or 0
+    return location_id, (1, 1 if quantity > 0 else 0, quantity, quantity if quantity > 0 else 0)
+
+
+def _collect_deltas(session):
+    from app.models import Product, LocationStock
+
+    deltas = collect_deltas(session, {
+        Product: (PRODUCT_FIELDS, _product_contribution),
+        LocationStock: (LOCATION_FIELDS, _location_contribution),
+    })
+    return deltas[Product], deltas[LocationStock]
+
+
+# ---------------------------------------------------------------------------
+# Yazma
+# ---------------------------------------------------------------------------
+
+def rebuild_category_summaries(connection, category_ids=None) -> None:
+    """Kategori özetini yeniden hesaplar; `category_ids` verilirse yalnızca o satırları."""
+    from app.models import Product, StockCategorySummary
+
+    p = Product.__table__
+    table = StockCategorySummary.__table__
+    current = func.coalesce(p.c.current_stock, 0)
+    minimum = func.coalesce(p.c.minimum_stock, 0)
+    source = (
+        select(
+            p.c.category_id,
+            func.count(),
+            func.sum(case((and_(minimum > 0, current < minimum), 1), else_=0)),
+            func.sum(case((current <= 0, 1), else_=0)),
+            func.sum(current),
+            func.sum(current * func.coalesce(p.c.unit_cost, 0)),
+            literal(datetime.utcnow(), DateTime),
+        )
+        .where(p.c.category_id.isnot(None), func.coalesce(p.c.is_active, True) == True)
+        .group_by(p.c.category_id)
+    )
+    stale = delete(table)
+    if category_ids is not None:
+        category_ids = sorted(category_ids)
+        source = source.where(p.c.category_id.in_(category_ids))
+        stale = stale.where(table.c.category_id.in_(category_ids))
+    connection.execute(stale)
+    connection.execute(table.insert().from_select(['category_id', *CATEGORY_COLUMNS, 'updated_at'], source))
+
+
+def rebuild_location_summaries(connection, location_ids=None) -> None:
+    """Lokasyon özetini yeniden hesaplar; `location_ids` verilirse yalnızca o satırları."""
+    from app.models import LocationStock, StockLocationSummary
+
+    ls = LocationStock.__table__
+    table = StockLocationSummary.__table__
+    quantity = func.coalesce(ls.c.quantity, 0)
+    source = (
+        select(
+            ls.c.location_id,
+            func.count(),
+            func.sum(case((quantity > 0, 1), else_=0)),
+            func.sum(quantity),
+            func.sum(case((quantity > 0, quantity), else_=0)),
+            literal(datetime.utcnow(), DateTime),
+        )
+        .group_by(ls.c.location_id)
+    )
+    stale = delete(table)
+    if location_ids is not None:
+        location_ids = sorted(location_ids)
+        source = source.where(ls.c.location_id.in_(location_ids))
+        stale = stale.where(table.c.location_id.in_(location_ids))
+    connection.execute(stale)
+    connection.execute(table.insert().from_select(['location_id', *LOCATION_COLUMNS, 'updated_at'], source))
+
+
+def rebuild_stock_summaries(connection) -> None:
+    """İki özeti de tablolardan baştan hesaplar (mutabakat)."""
+    rebuild_category_summaries(connection)
+    rebuild_location_summaries(connection)
+
+
+# ---------------------------------------------------------------------------
+# Oturum olayları
+# ---------------------------------------------------------------------------
+
+def _before_flush(session, flush_context, instances):
+    from app.models import StockCategorySummary, StockLocationSummary
+
+    category_deltas, location_deltas = _collect_deltas(session)
+    if not (category_deltas or location_deltas):
+        return
+    connection = session.connection()
+    upsert_increments(connection, StockCategorySummary.__table__, 'category_id', CATEGORY_COLUMNS, category_deltas)
+    upsert_increments(connection, StockLocationSummary.__table__, 'location_id', LOCATION_COLUMNS, location_deltas)
+
+
+def _bulk_keys(orm_execute_state, model, key, fields):
+    """Toplu yazmanın özetini değiştirebileceği anahtarlar (ör. category_id'ler),
+    ifade çalışmadan önce. Boş küme: özet etkilenmez; None: belirlenemedi (tüm özet)."""
+    params = orm_execute_state.parameters
+    rows = list(params) if isinstance(params, (list, tuple)) else [params] if params else []
+    column = getattr(model, key)
+    keys = set()
+
+    if orm_execute_state.is_insert:
+        if not rows:
+            values = bulk_set_values(orm_execute_state)
+            if values is None:
+                return None
+            rows = [values]
+        for row in rows:
+            value = row.get(key)
+            if isinstance(value, ClauseElement):
+                return None
+            keys.add(value)
+        keys.discard(None)
+        return keys
+
+    if orm_execute_state.is_update:
+        values = bulk_set_values(orm_execute_state)
+        if values is None:
+            return None
+        if not set(values) & set(fields):
+            return keys
+        if rows and all('id' in row for row in rows):
+            # update(Model) + [{'id': ..., ...}]: birincil anahtarla toplu güncelleme
+            for row in rows:
+                if isinstance(row.get(key), ClauseElement):
+                    return None
+                keys.add(row.get(key))
+            old = select(column).where(model.id.in_([row['id'] for row in rows]))
+        else:
+            new_key = values.get(key)
+            whereclause = orm_execute_state.statement.whereclause
+            if isinstance(new_key, ClauseElement) or whereclause is None:
+                return None
+            keys.add(new_key)
+            old = select(column).where(whereclause)
+    else:
+        if orm_execute_state.statement.whereclause is None:
+            return None
+        old = select(column).where(orm_execute_state.statement.whereclause)
+
+    keys.update(orm_execute_state.session.execute(old.distinct()).scalars())
+    keys.discard(None)
+    return keys
+
+
+def _do_orm_execute(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    from app.models import Product, LocationStock
+
+    classes = {mapper.class_ for mapper in orm_execute_state.all_mappers}
+    marks = []
+    for kind, model, key, fields in (('category', Product, 'category_id', PRODUCT_FIELDS),
+                                     ('location', LocationStock, 'location_id', LOCATION_FIELDS)):
+        if model not in classes:
+            continue
+        keys = _bulk_keys(orm_execute_state, model, key, fields)
+        marks.extend([(kind, None)] if keys is None else ((kind, k) for k in keys))
+    if marks:
+        mark_stale(orm_execute_state.session, _STALE_KEY, *marks)
+
+
+def _rebuild_stale(connection, marks):
+    for kind, rebuild in (('category', rebuild_category_summaries),
+                          ('location', rebuild_location_summaries)):
+        keys = {k for m, k in marks if m == kind}
+        if keys:
+            rebuild(connection, None if None in keys else keys)
+
+
+def init_stock_summaries(app, db) -> bool:
+    """Özet tablolarını (yoksa) oluşturur, boşsa doldurur ve oturum olaylarını bağlar."""
+    from app.models import StockCategorySummary, StockLocationSummary
+
+    with app.app_context():
+        try:
+            StockCategorySummary.__table__.create(bind=db.engine, checkfirst=True)
+            StockLocationSummary.__table__.create(bind=db.engine, checkfirst=True)
+        except Exception as e:
+            app.logger.warning(f"Stok özet tabloları oluşturulamadı: {e}")
+            return False
+        try:
+            with db.engine.begin() as conn:
+                empty = conn.execute(select(func.count()).select_from(StockCategorySummary.__table__)).scalar() == 0 \
+                    and conn.execute(select(func.count()).select_from(StockLocationSummary.__table__)).scalar() == 0
+                if empty:
+                    rebuild_stock_summaries(conn)
+        except Exception as e:
+            # İlk kurulumda (tablolar henüz yokken) doldurma atlanır; yazmalar artımlı doldurur
+            app.logger.info(f"Stok özetleri başlangıçta doldurulamadı: {e}")
+
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'do_orm_execute', _do_orm_execute)
+        bind_commit_rebuild(db, _STALE_KEY, _rebuild_stale)
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Okuma
+# ---------------------------------------------------------------------------
+
+def category_stats(active_only: bool = True) -> list:
+    """Kategoriler (id sırasıyla) ve özet değerleri; tek sorgu."""
+    from app import db
+    from app.models import Category, StockCategorySummary
+
+    query = db.session.query(Category, StockCategorySummary).outerjoin(
+        StockCategorySummary, StockCategorySummary.category_id == Category.id
+    )
+    if active_only:
+        query = query.filter(Category.is_active == True)
+    stats = []
+    for category, summary in query.order_by(Category.id):
+        row = {'category': category}
+        for column in CATEGORY_COLUMNS:
+            row[column] = getattr(summary, column) if summary is not None else 0
+        stats.append(row)
+    return stats
+
+
+def location_stats(active_only: bool = True, order_by=None) -> list:
+    """Lokasyonlar (varsayılan id sırasıyla) ve özet değerleri; tek sorgu."""
+    from app import db
+    from app.models import Location, StockLocationSummary
+
+    query = db.session.query(Location, StockLocationSummary).outerjoin(
+        StockLocationSummary, StockLocationSummary.location_id == Location.id
+    )
+    if active_only:
+        query = query.filter(Location.is_active == True)
+    stats = []
+    for location, summary in query.order_by(order_by if order_by is not None else Location.id):
+        row = {'location': location}
+        for column in LOCATION_COLUMNS:
+            row[column] = getattr(summary, column) if summary is not None else 0
+        stats.append(row)
+    return stats
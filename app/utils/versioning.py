@@ -0,0 +1,377 @@
+"""
+Önbellek Sürüm Damgaları (cache_versions)
+=========================================
+Süreç içi önbellekler (derlenmiş BOM'lar vb.) gunicorn'un her işçisinde ayrı
+tutulur; bir işçide yapılan yazma diğerlerinin önbelleğini kendiliğinden
+bozmaz. Bu modül, ilgili tablolara her yazmada (flush) `cache_versions`
+tablosundaki kapsam satırına AYNI transaction içinde yeni bir rastgele token
+yazar. Okuyucular tek bir küçük sorguyla token'ları okuyup önbellek kaydının
+damgasıyla karşılaştırır.
+
+Token sayaç değil rastgele (uuid) seçilir: geri alınan (rollback) bir
+transaction'ın damgası hiçbir zaman başka bir yazmada tekrar ortaya çıkmaz.
+
+Kapsamlar:
+  bom:<id>       — o BOM'un BomNode/BomEdge satırları değişti
+  boms           — herhangi bir bom:<id> damgası değişti (tüm BOM'ları tutan
+                   indeksler her çağrıda yalnızca bunu okur; değişmişse
+                   `bom_tokens()` ile hangi BOM'ların değiştiğine bakar)
+  bom_items      — BomItem değişti ya da BOM tablolarında toplu (bulk) yazma
+  bom_products   — Product'ta BOM maliyetini etkileyen bir alan değişti
+                   (current_stock HARİÇ — stok her zaman canlı okunur)
+
+Katalog sürüm sayacı (catalog):
+  Diğer kapsamlardan farklı olarak token artan bir tam sayıdır. Product,
+  Category, Location, LocationStock ve StockMovement yazmalarında bir artırılır; satırı
+  değişen ürünlerin `products.catalog_version` kolonu aynı değerle damgalanır.
+  Entegrasyon uçları bu değerden ETag üretir ve `?changed_since=<sürüm>` ile
+  yalnızca o sürümden sonra değişen ürünleri döndürür.
+
+  Sayaç flush'ta değil commit'te bir kez alınır. Flush sırasında değişen ürün
+  satırları transaction'a özgü negatif bir geçici işaretle damgalanır (satır
+  kilitleri normal yazma sırasında alınır); `before_commit`'te sayaç satırı
+  kilitlenip (SELECT ... FOR UPDATE) artırılır ve işaretli satırlar bu sürüme
+  çevrilir. Kilit yalnızca commit'e kadar kısa süre tutulur ve tutulurken
+  transaction'ın zaten kilitlediği satırlardan başkasına dokunulmaz (kilitlenme
+  olmaz). Sürümler commit sırasıyla verildiği için bir okuyucunun gördüğü
+  sürümden küçük bir damga sonradan ortaya çıkmaz (product_lookup gibi
+  `catalog_version > sürüm` ile artımlı yükleyenler buna dayanır). Commit
+  edilmemiş yazmalar sayacı ilerletmez.
+"""
+import uuid
+from datetime import datetime
+
+from sqlalchemy import event, select
+
+SCOPE_BOMS = 'boms'
+SCOPE_BOM_ITEMS = 'bom_items'
+SCOPE_BOM_PRODUCTS = 'bom_products'
+SCOPE_CATALOG = 'catalog'
+
+# Product üzerinde maliyet/ikame kararını ya da ağaçta gösterilen bilgiyi etkileyen alanlar.
+BOM_PRODUCT_FIELDS = (
+    'code', 'name', 'type', 'unit_type', 'unit_cost', 'currency',
+    'material', 'notes', 'is_active',
+)
+
+_tracking_enabled = False
+
+_CATALOG_MARKER_KEY = 'catalog_marker'     # session.info: bu transaction'ın geçici damgası
+_CATALOG_VERSION_KEY = 'catalog_version'   # session.info: commit'te alınan sürüm
+
+
+_BOM_SCOPE_PREFIX = 'bom:'
+
+
+def bom_scope(bom_id: int) -> str:
+    return f'{_BOM_SCOPE_PREFIX}{bom_id}'
+
+
+def _attr_changed(state, fields) -> bool:
+    for field in fields:
+        if state.attrs[field].history.has_changes():
+            return True
+    return False
+
+
+def _scopes_for_object(session, obj, is_new_or_deleted: bool) -> set[str]:
+    """Flush edilen bir nesnenin hangi önbellek kapsamlarını bayatlattığını döndürür."""
+    from sqlalchemy import inspect as sa_inspect
+    from app.models import BomNode, BomEdge, BomItem, Product
+
+    if isinstance(obj, (BomNode, BomEdge)):
+        if not is_new_or_deleted and not session.is_modified(obj, include_collections=False):
+            return set()
+        scopes = {SCOPE_BOMS, bom_scope(obj.bom_id)}
+        history = sa_inspect(obj).attrs['bom_id'].history
+        for old_bom_id in history.deleted or ():
+            if old_bom_id is not None:
+                scopes.add(bom_scope(old_bom_id))
+        return scopes
+    if isinstance(obj, BomItem):
+        if is_new_or_deleted or session.is_modified(obj, include_collections=False):
+            return {SCOPE_BOM_ITEMS}
+        return set()
+    if isinstance(obj, Product):
+        if is_new_or_deleted or _attr_changed(sa_inspect(obj), BOM_PRODUCT_FIELDS):
+            return {SCOPE_BOM_PRODUCTS}
+        return set()
+    return set()
+
+
+def _bulk_scopes(mappers) -> set[str]:
+    """Query.update()/delete() ve toplu insert gibi yazmalarda satır bazında bilgi yoktur;
+    etkilenen tablonun tüm kapsamı bayatlatılır."""
+    from app.models import BomNode, BomEdge, BomItem, Product
+
+    scopes = set()
+    for mapper in mappers:
+        cls = mapper.class_
+        if cls in (BomNode, BomEdge):
+            scopes.update((SCOPE_BOMS, SCOPE_BOM_ITEMS))
+        elif cls is BomItem:
+            scopes.add(SCOPE_BOM_ITEMS)
+        elif cls is Product:
+            scopes.add(SCOPE_BOM_PRODUCTS)
+    return scopes
+
+
+def bump(connection, scopes, token: str | None = None) -> None:
+    """Verilen kapsamlara yeni token yazar (upsert, tek ifade). `token` verilirse
+    rastgele yerine o değer yazılır (ör. son mutabakat zamanı)."""
+    from app.models import CacheVersion
+
+    scopes = sorted(set(scopes))
+    if not scopes:
+        return
+    table = CacheVersion.__table__
+    now = datetime.utcnow()
+    rows = [{'scope': s, 'token': token or uuid.uuid4().hex, 'updated_at': now} for s in scopes]
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['scope'],
+            set_={'token': stmt.excluded.token, 'updated_at': stmt.excluded.updated_at},
+        )
+        connection.execute(stmt)
+        return
+    for row in rows:
+        result = connection.execute(
+            table.update().where(table.c.scope == row['scope'])
+            .values(token=row['token'], updated_at=row['updated_at'])
+        )
+        if not result.rowcount:
+            connection.execute(table.insert().values(**row))
+
+
+def next_catalog_version(connection) -> int:
+    """Katalog sayacını bir artırıp yeni değeri döndürür. Sayaç satırı
+    transaction sonuna kadar kilitli kalır (katalog yazmaları sıralanır)."""
+    from app.models import CacheVersion
+
+    table = CacheVersion.__table__
+    now = datetime.utcnow()
+    current = connection.execute(
+        select(table.c.token).where(table.c.scope == SCOPE_CATALOG).with_for_update()
+    ).scalar()
+    if current is None:
+        dialect = connection.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            connection.execute(
+                insert(table).values(scope=SCOPE_CATALOG, token='0', updated_at=now)
+                .on_conflict_do_nothing(index_elements=['scope'])
+            )
+        else:
+            connection.execute(table.insert().values(scope=SCOPE_CATALOG, token='0', updated_at=now))
+        current = connection.execute(
+            select(table.c.token).where(table.c.scope == SCOPE_CATALOG).with_for_update()
+        ).scalar()
+    version = int(current) + 1
+    connection.execute(
+        table.update().where(table.c.scope == SCOPE_CATALOG)
+        .values(token=str(version), updated_at=now)
+    )
+    return version
+
+
+def _catalog_changes(session):
+    """Flush'ta katalog sayacını artırması gereken değişiklikler:
+    (değişiklik var mı, damgalanacak ürün id'leri, adı değişen kategori id'leri)."""
+    from app.models import Product, Category, Location, LocationStock, StockMovement
+
+    tracked = (Product, Category, Location, LocationStock, StockMovement)
+    touched = False
+    product_ids = set()
+    category_ids = set()
+    for obj in session.new:
+        if isinstance(obj, Product):
+            product_ids.add(obj.id)
+        elif isinstance(obj, tracked):
+            touched = True
+    for obj in session.deleted:
+        if isinstance(obj, tracked):
+            touched = True
+    for obj in session.dirty:
+        if not isinstance(obj, tracked):
+            continue
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, Product):
+            product_ids.add(obj.id)
+        elif isinstance(obj, Category):
+            # Ürün yükünde kategori adı var: kategorideki ürünler de değişmiş sayılır
+            category_ids.add(obj.id)
+        else:
+            touched = True
+    return touched or bool(product_ids or category_ids), product_ids, category_ids
+
+
+def _catalog_stamp(session) -> int:
+    """Bu transaction'da değişen ürünlere yazılacak damga: commit'te sürüm
+    alınmışsa o, yoksa transaction'a özgü negatif geçici işaret."""
+    version = session.info.get(_CATALOG_VERSION_KEY)
+    if version is not None:
+        return version
+    marker = session.info.get(_CATALOG_MARKER_KEY)
+    if marker is None:
+        marker = session.info[_CATALOG_MARKER_KEY] = -(uuid.uuid4().int >> 65) - 1
+    return marker
+
+
+def _stamp_products(connection, condition, stamp) -> None:
+    from app.models import Product
+
+    table = Product.__table__
+    # updated_at kendi değerine eşitlenir: onupdate tetiklenmesin (damga içerik değişikliği değil)
+    connection.execute(
+        table.update().where(condition(table))
+        .values(catalog_version=stamp, updated_at=table.c.updated_at)
+    )
+
+
+def _stamp_catalog(session) -> None:
+    touched, product_ids, category_ids = _catalog_changes(session)
+    if not touched:
+        return
+    stamp = _catalog_stamp(session)
+    connection = session.connection()
+    if product_ids:
+        _stamp_products(connection, lambda t: t.c.id.in_(sorted(product_ids)), stamp)
+    if category_ids:
+        _stamp_products(connection, lambda t: t.c.category_id.in_(sorted(category_ids)), stamp)
+
+
+def _after_flush(session, flush_context):
+    scopes = set()
+    for obj in session.new:
+        scopes |= _scopes_for_object(session, obj, True)
+    for obj in session.deleted:
+        scopes |= _scopes_for_object(session, obj, True)
+    for obj in session.dirty:
+        scopes |= _scopes_for_object(session, obj, False)
+    if scopes:
+        bump(session.connection(), scopes)
+    _stamp_catalog(session)
+
+
+def _do_orm_execute(orm_execute_state):
+    # session.execute(insert(Model), [...]) gibi toplu eklemeler flush olaylarından geçmez
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    from app.models import Product, Category, Location, LocationStock, StockMovement
+
+    scopes = _bulk_scopes(orm_execute_state.all_mappers)
+    if scopes:
+        bump(orm_execute_state.session.connection(), scopes)
+
+    classes = {mapper.class_ for mapper in orm_execute_state.all_mappers}
+    if classes & {Product, Category, Location, LocationStock, StockMovement}:
+        stamp = _catalog_stamp(orm_execute_state.session)
+        statement = orm_execute_state.statement
+        if (orm_execute_state.is_update or orm_execute_state.is_insert) and Product in classes:
+            # Toplu ürün güncellemesi/eklemesi: etkilenen satırlar aynı ifadede damgalanır
+            orm_execute_state.statement = statement.values(catalog_version=stamp)
+        elif (orm_execute_state.is_update or orm_execute_state.is_delete) and Category in classes:
+            # Ürün yükünde kategori adı var: etkilenecek kategorilerin ürünleri (flush yolundaki gibi)
+            categories = select(Category.id)
+            if statement.whereclause is not None:
+                categories = categories.where(statement.whereclause)
+            _stamp_products(orm_execute_state.session.connection(),
+                            lambda t: t.c.category_id.in_(categories), stamp)
+
+
+def _before_commit(session):
+    # Bekleyen değişiklikler önce yazılsın; sayaç transaction'ın en son kilidi olsun
+    session.flush()
+    marker = session.info.get(_CATALOG_MARKER_KEY)
+    if marker is None or _CATALOG_VERSION_KEY in session.info:
+        return
+    connection = session.connection()
+    version = next_catalog_version(connection)
+    session.info[_CATALOG_VERSION_KEY] = version
+    _stamp_products(connection, lambda t: t.c.catalog_version == marker, version)
+
+
+def _after_transaction_end(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_CATALOG_MARKER_KEY, None)
+        session.info.pop(_CATALOG_VERSION_KEY, None)
+
+
+def init_version_tracking(app, db) -> bool:
+    """cache_versions tablosunu (yoksa) oluşturur ve oturum olaylarını bağlar.
+    Tablo oluşturulamazsa izleme kapalı kalır; önbellek kullanan yerler
+    her çağrıda taze hesaplamaya düşer (eski davranış)."""
+    global _tracking_enabled
+    from app.models import CacheVersion
+
+    with app.app_context():
+        try:
+            CacheVersion.__table__.create(bind=db.engine, checkfirst=True)
+        except Exception as e:
+            app.logger.warning(f"cache_versions tablosu oluşturulamadı, önbellek devre dışı: {e}")
+            return False
+
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'do_orm_execute', _do_orm_execute)
+    _tracking_enabled = True
+    return True
+
+
+def init_catalog_commit(db) -> None:
+    """Katalog sayacını commit'te alan olayı bağlar. Diğer modüllerin
+    `before_commit` işleri (özet yeniden hesapları vb.) sayaç kilidi
+    alınmadan bitsin diye en son çağrılır."""
+    if _tracking_enabled and not event.contains(db.session, 'before_commit', _before_commit):
+        event.listen(db.session, 'before_commit', _before_commit)
+        event.listen(db.session, 'after_transaction_end', _after_transaction_end)
+
+
+def read_signature(scopes) -> tuple | None:
+    """Kapsamların güncel token'larını verilen sırayla döndürür.
+    İzleme kapalıysa None döner (önbellek kullanılmamalı)."""
+    if not _tracking_enabled:
+        return None
+    from app import db
+    from app.models import CacheVersion
+
+    scopes = list(scopes)
+    # ORM sorgusu: bekleyen (flush edilmemiş) değişiklikler önce autoflush ile damgalanır.
+    rows = db.session.execute(
+        select(CacheVersion.scope, CacheVersion.token).where(CacheVersion.scope.in_(scopes))
+    ).all()
+    tokens = {scope: token for scope, token in rows}
+    return tuple(tokens.get(scope) for scope in scopes)
+
+
+def bom_tokens() -> dict:
+    """Tüm bom:<id> kapsamlarının token'ları (bom_id -> token), tek sorguda.
+    İzleme kapalıysa boş sözlük döner."""
+    if not _tracking_enabled:
+        return {}
+    from app import db
+    from app.models import CacheVersion
+
+    rows = db.session.execute(
+        select(CacheVersion.scope, CacheVersion.token)
+        .where(CacheVersion.scope.startswith(_BOM_SCOPE_PREFIX))
+    ).all()
+    return {int(scope[len(_BOM_SCOPE_PREFIX):]): token for scope, token in rows}
+
+
+def catalog_version() -> int | None:
+    """Güncel katalog sürümü (hiç yazma olmadıysa 0). İzleme kapalıysa None."""
+    if not _tracking_enabled:
+        return None
+    token = read_signature((SCOPE_CATALOG,))[0]
+    return int(token) if token is not None else 0
@@ -0,0 +1,178 @@
+"""
+Nerede Kullanılıyor İndeksi (where-used)
+========================================
+`analyze_bom_delete` her ürün için "başka BOM'da kullanılıyor mu?" sorgusu
+atıyordu; `reports` araçları (find_products, get_product_costs,
+get_stock_recommendation …) yalnızca hangi ürünlerin BOM kökü olduğunu
+öğrenmek için her çağrıda `list_boms` çalıştırıyordu.
+
+Bu modül tüm BOM düğümlerinden ürün → kullanım ters indeksini süreç içinde tutar:
+  uses   — kart id -> {bom_id: ((node_id, level, quantity), ...)}
+  roots  — kart id -> kökü olduğu BOM'un özeti (bom_id, root_name, node_count)
+Sorgular sözlük erişimidir; veritabanına yalnızca damgalar okunur.
+
+Güncellik (bkz. versioning, shared_index):
+  - Her çağrıda yalnızca boms ve bom_items damgaları okunur. boms değiştiyse
+    bom:<id> damgası değişen BOM'ların satırları tek sorguda yeniden
+    yüklenir, silinen BOM düşer.
+  - bom_items değişirse (kalemin kartı değişmiş olabilir, toplu güncelleme)
+    indeks baştan kurulur.
+İzleme kapalıysa indeks her çağrıda baştan kurulur ve paylaşılmaz.
+"""
+from app.utils import versioning
+from app.utils.shared_index import BomEntryIndex, SharedIndex
+
+
+class _BomUsage:
+    __slots__ = ('root', 'rows')
+
+    def __init__(self, root, rows):
+        self.root = root    # {'bom_id', 'root_name', 'product_id', 'node_count'} ya da None
+        self.rows = rows    # kart id -> ((node_id, level, quantity), ...)
+
+
+class WhereUsedIndex(BomEntryIndex):
+    """Ürün → BOM kullanımları ve BOM kökü ürünler (entries: bom_id -> _BomUsage)."""
+
+    def __init__(self):
+        super().__init__()
+        self.uses: dict = {}      # kart id -> {bom_id: ((node_id, level, quantity), ...)}
+        self.roots: dict = {}     # kart id -> kökü olduğu BOM'lar {bom_id: özet}
+        self.items_token = None
+
+    def _index_entry(self, bom_id: int, entry) -> None:
+        for pid, rows in entry.rows.items():
+            self.uses.setdefault(pid, {})[bom_id] = rows
+        root = entry.root
+        if root and root['product_id'] is not None:
+            self.roots.setdefault(root['product_id'], {})[bom_id] = root
+
+    def _unindex_entry(self, bom_id: int, entry) -> None:
+        for pid in entry.rows:
+            boms = self.uses.get(pid)
+            if boms is not None:
+                boms.pop(bom_id, None)
+                if not boms:
+                    del self.uses[pid]
+        root = entry.root
+        if root and root['product_id'] is not None:
+            boms = self.roots.get(root['product_id'])
+            if boms is not None:
+                boms.pop(bom_id, None)
+                if not boms:
+                    del self.roots[root['product_id']]
+
+    def boms_using(self, product_id: int) -> set:
+        """Kartın geçtiği BOM id'leri."""
+        return set(self.uses.get(product_id, ()))
+
+    def usages(self, product_id: int) -> list[tuple]:
+        """Kartın tüm kullanımları: (bom_id, node_id, level, quantity), BOM ve düğüm sırasında."""
+        boms = self.uses.get(product_id, {})
+        return [(bom_id, node_id, level, qty)
+                for bom_id in sorted(boms)
+                for node_id, level, qty in boms[bom_id]]
+
+    def products_in(self, bom_id: int) -> set:
+        """BOM'da geçen kart id'leri."""
+        entry = self.entries.get(bom_id)
+        return set(entry.rows) if entry else set()
+
+    def bom_roots(self) -> dict:
+        """Kart id -> kökü olduğu BOM özeti; birden fazlaysa en yüksek bom_id
+        (list_boms sırasıyla kurulan eski sözlüklerle aynı seçim)."""
+        return {pid: boms[max(boms)] for pid, boms in self.roots.items()}
+
+    def bom_root(self, bom_id: int):
+        entry = self.entries.get(bom_id)
+        return entry.root if entry else None
+
+
+def _load(bom_ids=None) -> dict:
+    """Düğüm satırlarını tek sorguda BOM'lara göre gruplar (bom_ids None ise tümü)."""
+    from app import db
+    from app.models import BomNode, BomItem
+
+    query = (db.session.query(BomNode.bom_id, BomNode.id, BomNode.level, BomNode.quantity,
+                              BomNode.display_name, BomItem.product_id)
+             .outerjoin(BomItem, BomNode.item_id == BomItem.id))
+    if bom_ids is not None:
+        query = query.filter(BomNode.bom_id.in_(list(bom_ids)))
+
+    loaded: dict = {}
+    for bom_id, node_id, level, quantity, display_name, product_id in query.order_by(BomNode.bom_id, BomNode.id):
+        data = loaded.setdefault(bom_id, {'rows': {}, 'root': None, 'count': 0})
+        data['count'] += 1
+        if level == 0 and data['root'] is None:
+            data['root'] = {'bom_id': bom_id, 'root_name': display_name, 'product_id': product_id}
+        if product_id is not None:
+            data['rows'].setdefault(product_id, []).append(
+                (node_id, level, float(quantity) if quantity is not None else 1.0))
+    return loaded
+
+
+def _entry(data: dict) -> _BomUsage:
+    root = data['root']
+    if root is not None:
+        root = dict(root, node_count=data['count'])
+    return _BomUsage(root, {pid: tuple(rows) for pid, rows in data['rows'].items()})
+
+
+def _load_entries(bom_ids) -> dict:
+    return {bom_id: _entry(data) for bom_id, data in _load(bom_ids).items()}
+
+
+def _signature():
+    return versioning.read_signature((versioning.SCOPE_BOMS, versioning.SCOPE_BOM_ITEMS))
+
+
+def _refresh(index, signature) -> WhereUsedIndex:
+    items_token = signature[1] if signature is not None else None
+    if index is None or index.items_token != items_token:
+        index = WhereUsedIndex()
+        index.items_token = items_token
+    index.sync(signature[0] if signature is not None else None, _load_entries)
+    return index
+
+
+_shared = SharedIndex(_signature, _refresh)
+
+
+def shared_index() -> WhereUsedIndex:
+    """Güncel indeks. İzleme kapalıysa her çağrıda baştan kurulur."""
+    return _shared.get()
+
+
+def where_used(product_id: int) -> list[dict]:
+    """Kartın BOM'lardaki kullanımları, BOM kök adıyla birlikte."""
+    index = shared_index()
+    with _shared.lock:
+        result = []
+        for bom_id, node_id, level, quantity in index.usages(product_id):
+            root = index.bom_root(bom_id)
+            result.append({
+                'bom_id': bom_id,
+                'bom_name': (root['root_name'] if root else None) or f'BOM #{bom_id}',
+                'node_id': node_id,
+                'level': level,
+                'quantity': quantity,
+            })
+        return result
+
+
+def bom_roots() -> dict:
+    """Kart id -> kökü olduğu BOM özeti ({'bom_id', 'root_name', 'node_count', ...})."""
+    index = shared_index()
+    with _shared.lock:
+        return index.bom_roots()
+
+
+def other_boms_using(bom_id: int) -> dict:
+    """BOM'daki her kart için, kartın geçtiği DİĞER BOM id'leri."""
+    index = shared_index()
+    with _shared.lock:
+        return {pid: index.boms_using(pid) - {bom_id} for pid in index.products_in(bom_id)}
+
+
+def invalidate() -> None:
+    _shared.invalidate()
@@ -50,6 +50,14 @@ class Config:
     # Optional comma-separated list of allowed IPs for AI internal endpoints
     AI_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('AI_ALLOWED_IPS', '').split(',') if ip.strip()]
 
+    # BOM maliyet roll-up motoru: 'auto' (büyük ağaçlarda NumPy), 'numpy' ya da 'python'
+    BOM_ROLLUP_BACKEND = os.environ.get('BOM_ROLLUP_BACKEND', 'auto')
+
+    # Toplu QR etiketleri: PNG önbellek dizini (boşsa instance/label_cache) ve
+    # çizim süreci sayısı (0 = min(4, CPU))
+    LABEL_CACHE_DIR = os.environ.get('LABEL_CACHE_DIR', '')
+    LABEL_RENDER_WORKERS = int(os.environ.get('LABEL_RENDER_WORKERS', 0))
+
     # Optional external purchasing app integration for pulling latest product prices
     PURCHASING_API_BASE_URL = os.environ.get('PURCHASING_API_BASE_URL', '').rstrip('/')
     PURCHASING_API_KEY = os.environ.get('PURCHASING_API_KEY') or os.environ.get('API_KEY')
@@ -0,0 +1,41 @@
+"""add cache_versions table (cross-worker cache invalidation stamps)
+
+Process-local caches such as the compiled BOM cost engine
+(app/utils/bom_engine.py) live separately in every gunicorn worker. Writers
+stamp a fresh random token per scope (e.g. 'bom:12', 'bom_products') into
+this table inside the same transaction; readers compare tokens with one
+small query to detect stale entries.
+
+The app also creates the table at startup if it is missing
+(init_version_tracking), so this migration is idempotent.
+
+Revision ID: k5e6f7g8h9i2
+Revises: j4d5e6f7g8h1
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'k5e6f7g8h9i2'
+down_revision = 'j4d5e6f7g8h1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    if 'cache_versions' not in sa.inspect(conn).get_table_names():
+        op.create_table(
+            'cache_versions',
+            sa.Column('scope', sa.String(length=64), nullable=False),
+            sa.Column('token', sa.String(length=32), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('scope'),
+        )
+
+
+def downgrade():
+    conn = op.get_bind()
+    if 'cache_versions' in sa.inspect(conn).get_table_names():
+        op.drop_table('cache_versions')
@@ -0,0 +1,54 @@
+"""add stock movement ledger indexes
+
+stock_movements had no usable index for the per-product consumption sums
+(product_id + movement_type + date range), the date-range dashboard/report
+queries or the per-user activity listing, so each of them scanned the whole
+ledger.
+
+  idx_stockmov_product_type_date  (product_id, movement_type, date)
+  idx_stockmov_date_type          (date, movement_type)
+  idx_stockmov_user_date          (user_id, date)
+
+idx_stockmov_user_date was already introduced by add_indexes_ai; it is only
+created here when missing (databases built with db.create_all()), so the
+migration is idempotent.
+
+Revision ID: l6f7g8h9i0j3
+Revises: k5e6f7g8h9i2
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'l6f7g8h9i0j3'
+down_revision = 'k5e6f7g8h9i2'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('idx_stockmov_product_type_date', ['product_id', 'movement_type', 'date']),
+    ('idx_stockmov_date_type', ['date', 'movement_type']),
+    ('idx_stockmov_user_date', ['user_id', 'date']),
+)
+
+# idx_stockmov_user_date belongs to add_indexes_ai and is left alone on downgrade
+OWNED = ('idx_stockmov_product_type_date', 'idx_stockmov_date_type')
+
+
+def _existing(conn):
+    return {ix['name'] for ix in sa.inspect(conn).get_indexes('stock_movements')}
+
+
+def upgrade():
+    existing = _existing(op.get_bind())
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'stock_movements', columns, unique=False)
+
+
+def downgrade():
+    existing = _existing(op.get_bind())
+    for name in OWNED:
+        if name in existing:
+            op.drop_index(name, table_name='stock_movements')
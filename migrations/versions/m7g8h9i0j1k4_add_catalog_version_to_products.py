@@ -0,0 +1,38 @@
+"""add catalog_version to products (delta sync for integration endpoints)
+
+Every write to products, categories, location_stocks or stock_movements
+increments the 'catalog' counter row in cache_versions; products whose row
+changed are stamped with the new value. /api/v1/products/full derives ETags
+from the counter and serves ?changed_since=<version> deltas from this column.
+
+The app also adds the column at startup if it is missing
+(_ensure_catalog_version_column), so this migration is idempotent.
+
+Revision ID: m7g8h9i0j1k4
+Revises: l6f7g8h9i0j3
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'm7g8h9i0j1k4'
+down_revision = 'l6f7g8h9i0j3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'catalog_version' not in [c['name'] for c in inspector.get_columns('products')]:
+        op.add_column('products', sa.Column('catalog_version', sa.BigInteger(), nullable=True))
+    if 'ix_products_catalog_version' not in [ix['name'] for ix in inspector.get_indexes('products')]:
+        op.create_index('ix_products_catalog_version', 'products', ['catalog_version'], unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'ix_products_catalog_version' in [ix['name'] for ix in inspector.get_indexes('products')]:
+        op.drop_index('ix_products_catalog_version', table_name='products')
+    if 'catalog_version' in [c['name'] for c in inspector.get_columns('products')]:
+        op.drop_column('products', 'catalog_version')
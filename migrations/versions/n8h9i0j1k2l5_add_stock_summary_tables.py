@@ -0,0 +1,84 @@
+"""add stock category/location summary tables
+
+Per-category and per-location stock totals for the warehouse screens,
+maintained incrementally from Product / LocationStock writes
+(app/utils/stock_summary.py). The tables are filled from the current data
+here; the app also creates and fills them at startup when missing or empty,
+so this migration is idempotent.
+
+Revision ID: n8h9i0j1k2l5
+Revises: m7g8h9i0j1k4
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'n8h9i0j1k2l5'
+down_revision = 'm7g8h9i0j1k4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    tables = sa.inspect(conn).get_table_names()
+    if 'stock_category_summaries' not in tables:
+        op.create_table(
+            'stock_category_summaries',
+            sa.Column('category_id', sa.Integer(), nullable=False),
+            sa.Column('total_items', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('critical_items', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('empty_items', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('total_stock', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('total_value', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('category_id'),
+        )
+        op.execute("""
+            INSERT INTO stock_category_summaries
+                (category_id, total_items, critical_items, empty_items, total_stock, total_value, updated_at)
+            SELECT category_id,
+                   COUNT(*),
+                   SUM(CASE WHEN COALESCE(minimum_stock, 0) > 0
+                             AND COALESCE(current_stock, 0) < COALESCE(minimum_stock, 0) THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN COALESCE(current_stock, 0) <= 0 THEN 1 ELSE 0 END),
+                   SUM(COALESCE(current_stock, 0)),
+                   SUM(COALESCE(current_stock, 0) * COALESCE(unit_cost, 0)),
+                   CURRENT_TIMESTAMP
+            FROM products
+            WHERE category_id IS NOT NULL AND COALESCE(is_active, TRUE) = TRUE
+            GROUP BY category_id
+        """)
+    if 'stock_location_summaries' not in tables:
+        op.create_table(
+            'stock_location_summaries',
+            sa.Column('location_id', sa.Integer(), nullable=False),
+            sa.Column('total_products', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('product_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('total_quantity', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('positive_quantity', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('location_id'),
+        )
+        op.execute("""
+            INSERT INTO stock_location_summaries
+                (location_id, total_products, product_count, total_quantity, positive_quantity, updated_at)
+            SELECT location_id,
+                   COUNT(*),
+                   SUM(CASE WHEN COALESCE(quantity, 0) > 0 THEN 1 ELSE 0 END),
+                   SUM(COALESCE(quantity, 0)),
+                   SUM(CASE WHEN COALESCE(quantity, 0) > 0 THEN quantity ELSE 0 END),
+                   CURRENT_TIMESTAMP
+            FROM location_stocks
+            GROUP BY location_id
+        """)
+
+
+def downgrade():
+    conn = op.get_bind()
+    tables = sa.inspect(conn).get_table_names()
+    if 'stock_location_summaries' in tables:
+        op.drop_table('stock_location_summaries')
+    if 'stock_category_summaries' in tables:
+        op.drop_table('stock_category_summaries')
@@ -0,0 +1,48 @@
+"""add movement_daily_totals (dashboard movement counters)
+
+Per UTC day and movement type: movement count and total quantity. Kept
+current from StockMovement writes and periodically reconciled against the
+ledger (app/utils/dashboard_stats.py), so the dashboard no longer scans
+stock_movements. Filled from the ledger here; the app also creates and fills
+the table at startup when missing or empty, so this migration is idempotent.
+
+Revision ID: o9i0j1k2l3m6
+Revises: n8h9i0j1k2l5
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'o9i0j1k2l3m6'
+down_revision = 'n8h9i0j1k2l5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    if 'movement_daily_totals' in sa.inspect(conn).get_table_names():
+        return
+    op.create_table(
+        'movement_daily_totals',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('movement_type', sa.String(length=20), nullable=False),
+        sa.Column('movement_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_quantity', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('day', 'movement_type'),
+    )
+    op.execute("""
+        INSERT INTO movement_daily_totals (day, movement_type, movement_count, total_quantity, updated_at)
+        SELECT DATE(date), movement_type, COUNT(*), SUM(quantity), CURRENT_TIMESTAMP
+        FROM stock_movements
+        WHERE date IS NOT NULL
+        GROUP BY DATE(date), movement_type
+    """)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if 'movement_daily_totals' in sa.inspect(conn).get_table_names():
+        op.drop_table('movement_daily_totals')
@@ -0,0 +1,45 @@
+"""add bom_cost_snapshot (precomputed per-BOM cost summary)
+
+One row per BOM with the root roll-up cost, missing-cost leaf count and node
+count. The cost report reads this table instead of rolling up every BOM per
+request; it is refreshed by a background job and by
+`python run.py refresh-bom-costs` (app/utils/bom_cost_snapshot.py). The app
+also creates the table at startup when missing, so this migration is
+idempotent. Rows are filled by the first refresh.
+
+Revision ID: p0j1k2l3m4n7
+Revises: o9i0j1k2l3m6
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'p0j1k2l3m4n7'
+down_revision = 'o9i0j1k2l3m6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    if 'bom_cost_snapshot' in sa.inspect(conn).get_table_names():
+        return
+    op.create_table(
+        'bom_cost_snapshot',
+        sa.Column('bom_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=True),
+        sa.Column('total_cost', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('currency', sa.String(length=10), nullable=True),
+        sa.Column('node_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('missing_cost_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('computed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('bom_id'),
+    )
+    op.create_index('ix_bom_cost_snapshot_computed_at', 'bom_cost_snapshot', ['computed_at'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    if 'bom_cost_snapshot' in sa.inspect(conn).get_table_names():
+        op.drop_table('bom_cost_snapshot')
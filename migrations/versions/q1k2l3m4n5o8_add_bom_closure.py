@@ -0,0 +1,44 @@
+"""add bom_closure (ancestor/descendant index for BOM nodes)
+
+One row per (ancestor, descendant) pair of BOM nodes, depth 0 being the node
+itself. Subtree and ancestor lookups in the BOM editor become single set-based
+queries instead of loading every edge of the BOM. Rows are maintained
+incrementally on node add/move/delete and rebuilt per BOM on first use after
+any other write (app/utils/bom_closure.py), so the table may start empty. The
+app also creates the table at startup when missing, so this migration is
+idempotent.
+
+Revision ID: q1k2l3m4n5o8
+Revises: p0j1k2l3m4n7
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'q1k2l3m4n5o8'
+down_revision = 'p0j1k2l3m4n7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    if 'bom_closure' in sa.inspect(conn).get_table_names():
+        return
+    op.create_table(
+        'bom_closure',
+        sa.Column('ancestor_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('descendant_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('bom_id', sa.Integer(), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id'),
+    )
+    op.create_index('ix_bom_closure_descendant_id', 'bom_closure', ['descendant_id'])
+    op.create_index('ix_bom_closure_bom_id', 'bom_closure', ['bom_id'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    if 'bom_closure' in sa.inspect(conn).get_table_names():
+        op.drop_table('bom_closure')
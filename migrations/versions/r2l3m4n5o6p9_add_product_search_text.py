@@ -0,0 +1,43 @@
+"""add products.search_text (folded product search haystack) and trigram index
+
+One folded text per product (code, name, barcode, material, notes and category
+name; lower case, Turkish letters folded to ASCII) that every product search
+matches against. On PostgreSQL the column gets a pg_trgm GIN index so
+LIKE '%term%' is served from the index. The column is filled by the app: rows
+left NULL are backfilled at startup and kept current on product writes
+(app/utils/product_search.py). SQLite uses an FTS5 table that the app creates
+itself. The app also adds the column at startup when missing, so this
+migration is idempotent.
+
+Revision ID: r2l3m4n5o6p9
+Revises: q1k2l3m4n5o8
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'r2l3m4n5o6p9'
+down_revision = 'q1k2l3m4n5o8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    columns = [c['name'] for c in sa.inspect(conn).get_columns('products')]
+    if 'search_text' not in columns:
+        op.add_column('products', sa.Column('search_text', sa.Text(), nullable=True))
+    if conn.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_products_search_text_trgm '
+                   'ON products USING gin (search_text gin_trgm_ops)')
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_products_search_text_trgm')
+    columns = [c['name'] for c in sa.inspect(conn).get_columns('products')]
+    if 'search_text' in columns:
+        op.drop_column('products', 'search_text')
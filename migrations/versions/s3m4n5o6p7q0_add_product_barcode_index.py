@@ -0,0 +1,36 @@
+"""add index on products.barcode
+
+Scans that are not label QR codes are resolved by product code and then by
+barcode. The app serves them from an in-process lookup table
+(app/utils/product_lookup.py); the index covers the table (re)build and the
+fallback queries when version tracking is off. Idempotent: the index is only
+created when missing.
+
+Revision ID: s3m4n5o6p7q0
+Revises: r2l3m4n5o6p9
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 's3m4n5o6p7q0'
+down_revision = 'r2l3m4n5o6p9'
+branch_labels = None
+depends_on = None
+
+
+def _index_names(conn):
+    return {i['name'] for i in sa.inspect(conn).get_indexes('products')}
+
+
+def upgrade():
+    conn = op.get_bind()
+    if 'ix_products_barcode' not in _index_names(conn):
+        op.create_index('ix_products_barcode', 'products', ['barcode'], unique=False)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if 'ix_products_barcode' in _index_names(conn):
+        op.drop_index('ix_products_barcode', table_name='products')
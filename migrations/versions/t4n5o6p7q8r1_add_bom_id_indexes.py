@@ -0,0 +1,42 @@
+"""add indexes on bom_nodes.bom_id and bom_edges.bom_id
+
+Every BOM read filters or groups nodes and edges by bom_id: compiling one
+BOM, reloading changed BOMs into the where-used and cost indexes, and listing
+the BOMs on a full index build. Without an index each of these scans the
+whole table. Idempotent: each index is only created when missing.
+
+Revision ID: t4n5o6p7q8r1
+Revises: s3m4n5o6p7q0
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 't4n5o6p7q8r1'
+down_revision = 's3m4n5o6p7q0'
+branch_labels = None
+depends_on = None
+
+_INDEXES = (
+    ('ix_bom_nodes_bom_id', 'bom_nodes'),
+    ('ix_bom_edges_bom_id', 'bom_edges'),
+)
+
+
+def _index_names(conn, table):
+    return {i['name'] for i in sa.inspect(conn).get_indexes(table)}
+
+
+def upgrade():
+    conn = op.get_bind()
+    for name, table in _INDEXES:
+        if name not in _index_names(conn, table):
+            op.create_index(name, table, ['bom_id'], unique=False)
+
+
+def downgrade():
+    conn = op.get_bind()
+    for name, table in _INDEXES:
+        if name in _index_names(conn, table):
+            op.drop_index(name, table_name=table)
@@ -38,6 +38,32 @@ def init_database():
         db.session.commit()
         print('\n✓ Veritabanı başarıyla başlatıldı!')
 
+def rebuild_summaries():
+    """Depo stok özetlerini (kategori/lokasyon), dashboard günlük hareket
+    toplamlarını ve ürün arama metinlerini tablolardan yeniden hesapla"""
+    from app.utils.stock_summary import rebuild_stock_summaries
+    from app.utils.dashboard_stats import rebuild_daily_totals
+    from app.utils.product_search import refresh_search_text
+    with app.app_context():
+        with db.engine.begin() as conn:
+            rebuild_stock_summaries(conn)
+            rebuild_daily_totals(conn)
+            refreshed = refresh_search_text(conn)
+        print('✓ Stok özetleri ve günlük hareket toplamları yeniden hesaplandı.')
+        print(f'✓ {refreshed} ürünün arama metni güncellendi.')
+
+def refresh_bom_costs():
+    """Maliyet raporunun okuduğu ürün ağacı maliyet özetini (bom_cost_snapshot)
+    yeniden hesapla. Periyodik çalıştırma için: celmakstok-bom-costs.timer
+    Arka plan yenilemesiyle aynı kirayı alır; iş zaten sürüyorsa atlar."""
+    from app.utils.bom_cost_snapshot import refresh_with_lease
+    with app.app_context():
+        count = refresh_with_lease()
+        if count is None:
+            print('• Maliyet özeti yenilemesi başka bir işlemde sürüyor, atlandı.')
+        else:
+            print(f'✓ {count} ürün ağacının maliyet özeti yeniden hesaplandı.')
+
 def wait_for_db():
     """Veritabanının hazır olmasını bekle (Docker için)"""
     import time
@@ -72,6 +98,12 @@ if __name__ == '__main__':
         if is_docker:
             wait_for_db()
         init_database()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'rebuild-summaries':
+        # Depo özetlerini mutabakat için baştan hesapla
+        rebuild_summaries()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'refresh-bom-costs':
+        # Maliyet raporu özetini yenile (cron / systemd timer)
+        refresh_bom_costs()
     else:
         # Başlangıç bilgisi
         print('='*60)
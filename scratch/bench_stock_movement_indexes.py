@@ -0,0 +1,132 @@
+"""
+stock_movements indeksleri için ÖNCE / SONRA sorgu planı ve süre karşılaştırması.
+
+Geçici bir SQLite dosyasında 1M satırlık sentetik hareket defteri kurar, uygulamanın
+sıcak sorgularını (ürün bazlı tüketim toplamları, dashboard "bugün" sayımı, aylık
+rapor, kullanıcı aktivitesi) indekssiz çalıştırır, ardından
+l6f7g8h9i0j3 migration'ındaki indeksleri ekleyip aynı sorguları tekrar çalıştırır.
+Her sorgu için EXPLAIN QUERY PLAN ve ortalama süre yazdırılır.
+
+Canlı veritabanına DOKUNMAZ; yalnızca standart kütüphane kullanır.
+
+Kullanım:
+    python scratch/bench_stock_movement_indexes.py            # 1.000.000 satır
+    python scratch/bench_stock_movement_indexes.py 200000     # daha küçük defter
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+PRODUCTS = 5000
+USERS = 25
+DAYS = 730
+REPEAT = 5
+
+INDEXES = (
+    "CREATE INDEX idx_stockmov_product_type_date ON stock_movements (product_id, movement_type, date)",
+    "CREATE INDEX idx_stockmov_date_type ON stock_movements (date, movement_type)",
+    "CREATE INDEX idx_stockmov_user_date ON stock_movements (user_id, date)",
+)
+
+NOW = datetime(2026, 10, 18, 12, 0, 0)
+TODAY = NOW.replace(hour=0, minute=0, second=0, microsecond=0)
+MONTH_START = datetime(2026, 9, 1)
+MONTH_END = datetime(2026, 10, 1)
+
+
+def _fmt(dt):
+    # SQLAlchemy'nin SQLite DateTime biçimi
+    return dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+QUERIES = (
+    ("Product.total_out (tek ürün)",
+     "SELECT sum(quantity) FROM stock_movements "
+     "WHERE product_id = ? AND movement_type IN ('cikis', 'transfer', 'fire')",
+     (1234,)),
+    ("Kritik stok: aylık tüketim (tek ürün)",
+     "SELECT sum(quantity) FROM stock_movements "
+     "WHERE product_id = ? AND movement_type = 'cikis' AND date >= ?",
+     (1234, _fmt(NOW - timedelta(days=30)))),
+    ("Dashboard bugün (ESKİ: date(...) = ?)",
+     "SELECT count(*) FROM stock_movements WHERE date(date) = ?",
+     (TODAY.strftime('%Y-%m-%d'),)),
+    ("Dashboard bugün (YENİ: aralık)",
+     "SELECT count(*) FROM stock_movements WHERE date >= ? AND date < ?",
+     (_fmt(TODAY), _fmt(TODAY + timedelta(days=1)))),
+    ("Dashboard haftalık giriş",
+     "SELECT sum(quantity) FROM stock_movements WHERE date >= ? AND movement_type = 'giris'",
+     (_fmt(NOW - timedelta(days=7)),)),
+    ("Aylık rapor günlük özet",
+     "SELECT date(date), movement_type, sum(quantity) FROM stock_movements "
+     "WHERE date >= ? AND date < ? GROUP BY date(date), movement_type",
+     (_fmt(MONTH_START), _fmt(MONTH_END))),
+    ("Kullanıcı aktivitesi (son 50)",
+     "SELECT id FROM stock_movements WHERE user_id = ? ORDER BY date DESC LIMIT 50",
+     (7,)),
+)
+
+
+def build(path):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE stock_movements ("
+        " id INTEGER PRIMARY KEY, product_id INTEGER NOT NULL,"
+        " movement_type VARCHAR(20) NOT NULL, quantity FLOAT NOT NULL,"
+        " user_id INTEGER, date DATETIME, note TEXT)"
+    )
+    rng = random.Random(42)
+    types = ('giris', 'cikis', 'cikis', 'transfer', 'fire', 'sayim')
+    span = DAYS * 86400
+
+    def rows():
+        for _ in range(ROWS):
+            dt = NOW - timedelta(seconds=rng.randrange(span))
+            yield (rng.randrange(1, PRODUCTS + 1), rng.choice(types), rng.randint(1, 50),
+                   rng.randrange(1, USERS + 1), _fmt(dt))
+
+    conn.executemany(
+        "INSERT INTO stock_movements (product_id, movement_type, quantity, user_id, date) "
+        "VALUES (?, ?, ?, ?, ?)", rows())
+    conn.commit()
+    return conn
+
+
+def run(conn, title):
+    print(f"\n===== {title} =====")
+    for label, sql, params in QUERIES:
+        plan = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        started = time.perf_counter()
+        for _ in range(REPEAT):
+            conn.execute(sql, params).fetchall()
+        elapsed = (time.perf_counter() - started) / REPEAT * 1000
+        print(f"- {label}: {elapsed:9.2f} ms")
+        for step in plan:
+            print(f"      {step}")
+
+
+def main():
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        print(f"{ROWS:,} satırlık defter oluşturuluyor: {path}")
+        conn = build(path)
+        run(conn, "ÖNCE (indekssiz)")
+        started = time.perf_counter()
+        for ddl in INDEXES:
+            conn.execute(ddl)
+        conn.execute("ANALYZE")
+        print(f"\nİndeksler {time.perf_counter() - started:.1f} sn'de oluşturuldu.")
+        run(conn, "SONRA (indeksli)")
+        conn.close()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
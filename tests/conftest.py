@@ -54,6 +54,19 @@ def app_ctx(app):
         yield app
 
 
+@pytest.fixture()
+def admin_client(app_ctx):
+    """testadmin olarak oturum açmış test istemcisi."""
+    from app.models import User
+
+    client = app_ctx.test_client()
+    user = User.query.filter_by(username="testadmin").one()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+        sess["_fresh"] = True
+    return client
+
+
 # ---------------------------------------------------------------------------
 # Sentetik veri — gerçek ÇELMAK yapısını minimal ama temsili biçimde taklit eder.
 # ---------------------------------------------------------------------------
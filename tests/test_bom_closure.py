@@ -0,0 +1,96 @@
+"""
+BOM soy ağacı indeksi (bom_closure) testleri.
+
+Ekleme/taşıma/silme indeksi artımlı güncellemeli (yeniden kurmadan) ve sonuç
+kenarlardan baştan kurulan indeksle birebir aynı olmalı; başka yollardan
+yapılan yazmalardan sonra indeks kendini yeniden kurmalı.
+"""
+import pytest
+
+from app import db
+from app.models import BomClosure, BomEdge, BomItem, BomNode, Product
+from app.utils import bom_closure
+from app.utils.bom_utils import add_bom_node, delete_bom_node, move_bom_node
+
+
+@pytest.fixture()
+def tree(app_ctx):
+    """BOM #61: kök → A(A1, A2), B(B1)."""
+    pik = BomItem.query.filter_by(code="135-PIK-GG25").first()
+    nodes = {}
+    for key, num, level, parent in (("root", "1.", 0, None), ("A", "1.1.", 1, "root"),
+                                    ("A1", "1.1.1.", 2, "A"), ("A2", "1.1.2.", 2, "A"),
+                                    ("B", "1.2.", 1, "root"), ("B1", "1.2.1.", 2, "B")):
+        node = BomNode(bom_id=61, num=num, level=level, item_id=pik.id, display_name=key,
+                       quantity=1, piece_count=1, unit_type="adet")
+        db.session.add(node)
+        db.session.flush()
+        db.session.add(BomEdge(bom_id=61, parent_node_id=nodes[parent].id if parent else None,
+                               child_node_id=node.id, quantity=1))
+        nodes[key] = node
+    db.session.commit()
+    yield nodes
+    BomEdge.query.filter_by(bom_id=61).delete()
+    BomNode.query.filter_by(bom_id=61).delete()
+    bom_closure.drop(61)
+    db.session.commit()
+
+
+def _rows():
+    return {(r.ancestor_id, r.descendant_id, r.depth) for r in BomClosure.query.filter_by(bom_id=61)}
+
+
+def _rebuilt_rows():
+    bom_closure.rebuild(61)
+    return _rows()
+
+
+def test_queries_use_closure(tree):
+    assert bom_closure.descendant_ids(61, tree["A"].id) == {tree["A1"].id, tree["A2"].id}
+    assert bom_closure.descendant_ids(61, tree["root"].id) == {n.id for k, n in tree.items() if k != "root"}
+    assert bom_closure.ancestor_ids(61, tree["B1"].id) == [tree["B"].id, tree["root"].id]
+    assert bom_closure.is_fresh(61)
+    assert len(_rows()) == 6 + 5 + 3  # kendisi + ebeveyn + dede
+
+
+def test_edits_maintain_closure_incrementally(tree, monkeypatch):
+    bom_closure.ensure(61)
+    rebuilds = []
+    original = bom_closure.rebuild
+    monkeypatch.setattr(bom_closure, "rebuild", lambda bom_id: rebuilds.append(bom_id) or original(bom_id))
+
+    assert move_bom_node(61, tree["A"].id, tree["B"].id, db) == {"moved": True, "new_num": "1.2.2."}
+    assert [tree[k].num for k in ("A", "A1", "A2")] == ["1.2.2.", "1.2.2.1.", "1.2.2.2."]
+    assert [tree[k].level for k in ("A", "A1", "A2")] == [2, 3, 3]
+    assert bom_closure.ancestor_ids(61, tree["A1"].id) == [tree["A"].id, tree["B"].id, tree["root"].id]
+
+    added = add_bom_node(61, tree["A2"].id, {"name": "KLOZUR DENEME PARCASI", "item_type": "yarimamul"}, db)
+    assert bom_closure.ancestor_ids(61, added["node_id"])[:2] == [tree["A2"].id, tree["A"].id]
+
+    assert delete_bom_node(61, tree["A"].id, db) == {"deleted_count": 4}
+    assert bom_closure.descendant_ids(61, tree["B"].id) == {tree["B1"].id}
+    assert rebuilds == []
+
+    incremental = _rows()
+    assert incremental == _rebuilt_rows()
+    item = BomItem.query.filter_by(name="KLOZUR DENEME PARCASI").first()
+    product = db.session.get(Product, item.product_id)
+    db.session.delete(item)
+    db.session.delete(product)
+    db.session.commit()
+
+
+def test_move_into_own_subtree_is_rejected(tree):
+    result = move_bom_node(61, tree["A"].id, tree["A1"].id, db)
+    assert "error" in result
+    db.session.rollback()
+
+
+def test_other_writes_trigger_rebuild(tree):
+    bom_closure.ensure(61)
+    edge = BomEdge.query.filter_by(bom_id=61, child_node_id=tree["B1"].id).one()
+    edge.parent_node_id = tree["A"].id
+    db.session.commit()
+    assert not bom_closure.is_fresh(61)
+    assert bom_closure.descendant_ids(61, tree["A"].id) == {tree["A1"].id, tree["A2"].id, tree["B1"].id}
+    assert bom_closure.is_fresh(61)
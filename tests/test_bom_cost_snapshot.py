@@ -0,0 +1,79 @@
+"""
+Ürün ağacı maliyet özeti (bom_cost_snapshot) testleri.
+
+Özet, derlenmiş BOM üzerinden canlı hesaplanan değerlerle aynı olmalı; maliyet
+raporu sayfası yalnızca özetten okumalı ve BOM derlememeli. CLI yenilemesi de
+arka plan işiyle aynı kirayı almalı.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import BomCostSnapshot
+from app.utils import bom_cost_snapshot, bom_engine
+
+
+@pytest.fixture()
+def snapshot(app_ctx):
+    bom_cost_snapshot.refresh_bom_cost_snapshots()
+    yield {row.bom_id: row for row in BomCostSnapshot.query.all()}
+
+
+def test_snapshot_matches_live_rollup(snapshot):
+    assert set(snapshot) == {5, 8, 9}
+    for bom_id, row in snapshot.items():
+        compiled = bom_engine.get_compiled_bom(bom_id)
+        live = bom_engine.bom_cost_summary(compiled, *bom_engine.rollup(compiled))
+        assert row.total_cost == live["total_cost"]
+        assert row.missing_cost_count == live["missing_cost_count"]
+        assert row.node_count == live["node_count"]
+        assert row.computed_at is not None
+    assert snapshot[5].total_cost == 4380.0
+
+
+def test_cost_report_reads_snapshot_only(snapshot, monkeypatch, admin_client):
+    compiles, starts = [], []
+    monkeypatch.setattr(bom_engine, "compile_bom", lambda *a: compiles.append(a))
+    monkeypatch.setattr(bom_cost_snapshot, "start_background_refresh", lambda app: starts.append(app) or True)
+    resp = admin_client.get("/reports/costs")
+    assert resp.status_code == 200
+    assert "4380" in resp.get_data(as_text=True)
+    assert compiles == [] and starts == []
+
+
+def test_stale_snapshot_refreshes_in_background(snapshot, monkeypatch):
+    starts = []
+    monkeypatch.setattr(bom_cost_snapshot, "start_background_refresh", lambda app: starts.append(app) or True)
+    state = bom_cost_snapshot.snapshot_state()
+    assert not bom_cost_snapshot.refresh_if_due(object(), state)
+    state["computed_at"] = datetime.utcnow() - bom_cost_snapshot.REFRESH_INTERVAL - timedelta(minutes=1)
+    assert bom_cost_snapshot.refresh_if_due(object(), state)
+    assert len(starts) == 1
+
+
+def test_only_one_worker_holds_the_lease(app_ctx):
+    now = datetime.utcnow()
+    try:
+        assert bom_cost_snapshot._claim_lease(now)
+        assert not bom_cost_snapshot._claim_lease(now)
+        assert bom_cost_snapshot.snapshot_state()["refreshing"]
+        # Süresi dolmuş kira devralınabilir
+        assert bom_cost_snapshot._claim_lease(now + bom_cost_snapshot.RUN_LEASE + timedelta(seconds=1))
+    finally:
+        bom_cost_snapshot._release_lease()
+    assert not bom_cost_snapshot.snapshot_state()["refreshing"]
+
+
+def test_cli_refresh_respects_the_lease(app_ctx, monkeypatch):
+    runs = []
+    monkeypatch.setattr(bom_cost_snapshot, "refresh_bom_cost_snapshots", lambda: runs.append(1) or 3)
+    try:
+        assert bom_cost_snapshot._claim_lease(datetime.utcnow())
+        assert bom_cost_snapshot.refresh_with_lease() is None
+        assert runs == []
+    finally:
+        bom_cost_snapshot._release_lease()
+
+    assert bom_cost_snapshot.refresh_with_lease() == 3
+    assert runs == [1]
+    assert not bom_cost_snapshot.snapshot_state()["refreshing"]
@@ -0,0 +1,92 @@
+"""
+Derlenmiş BOM önbelleği (bom_engine) testleri.
+
+- Aynı BOM ikinci kez istendiğinde yeniden DERLENMEMELİ.
+- Fiyat / düğüm miktarı değişince cache_versions damgası değişmeli ve ağaç
+  yeni değerlerle hesaplanmalı.
+- Yalnızca stok değişimi önbelleği bozmamalı ama ağaçta canlı görünmeli.
+"""
+from decimal import Decimal
+
+from app import db
+from app.models import BomNode, Product
+from app.utils import bom_engine
+from app.utils.bom_utils import get_bom_tree
+
+
+def _root_total(bom_id):
+    return round(float(get_bom_tree(bom_id, db)["roots"][0]["total_cost"]), 2)
+
+
+def _count_compiles(monkeypatch):
+    calls = []
+    original = bom_engine.compile_bom
+
+    def counting(bom_id, *args):
+        calls.append(bom_id)
+        return original(bom_id, *args)
+
+    monkeypatch.setattr(bom_engine, "compile_bom", counting)
+    return calls
+
+
+def test_second_call_is_served_from_cache(app_ctx, monkeypatch):
+    get_bom_tree(8, db)
+    calls = _count_compiles(monkeypatch)
+    assert _root_total(8) == 1085.0
+    assert calls == []
+
+
+def test_price_change_invalidates(app_ctx, monkeypatch):
+    assert _root_total(8) == 1085.0
+    bicak = Product.query.filter_by(code="165-BICAK-TUTUCU").one()
+    calls = _count_compiles(monkeypatch)
+    try:
+        bicak.unit_cost = 200.0
+        db.session.commit()
+        # 470*2 + 200*1
+        assert _root_total(8) == 1140.0
+        assert calls == [8]
+    finally:
+        bicak.unit_cost = 145.0
+        db.session.commit()
+    assert _root_total(8) == 1085.0
+
+
+def test_node_quantity_change_invalidates(app_ctx):
+    node = BomNode.query.filter_by(bom_id=5, num="1.1.1.").one()
+    try:
+        node.quantity = Decimal("4")
+        db.session.commit()
+        # 730 * 4 * 2
+        assert _root_total(5) == 5840.0
+    finally:
+        node.quantity = Decimal("3")
+        db.session.commit()
+    assert _root_total(5) == 4380.0
+
+
+def test_stock_change_keeps_cache_but_shows_live_stock(app_ctx, monkeypatch):
+    get_bom_tree(8, db)
+    alt = Product.query.filter_by(code="165-ALT-TAMBUR").one()
+    calls = _count_compiles(monkeypatch)
+    try:
+        alt.current_stock = 42
+        db.session.commit()
+        leaf = next(c for c in get_bom_tree(8, db)["roots"][0]["children"] if c["code"] == "165-ALT-TAMBUR")
+        assert leaf["stock_qty"] == 42
+        assert calls == []
+    finally:
+        alt.current_stock = 5
+        db.session.commit()
+
+
+def test_bulk_update_invalidates(app_ctx):
+    get_bom_tree(8, db)
+    Product.query.filter_by(code="165-ALT-TAMBUR").update({"unit_cost": 500.0}, synchronize_session=False)
+    db.session.commit()
+    try:
+        assert _root_total(8) == 1145.0
+    finally:
+        Product.query.filter_by(code="165-ALT-TAMBUR").update({"unit_cost": 470.0}, synchronize_session=False)
+        db.session.commit()
@@ -0,0 +1,113 @@
+"""
+Tembel (lazy) BOM ağacı testleri.
+
+Alt ağaç isteği tüm ağaçla aynı düğümü üretmeli ama yalnızca torunları
+işlemeli; çocuk sayfaları cursor ile eksiksiz ve sırasıyla gezilebilmeli.
+Ağaç sayfası yalnızca kökleri gömmeli, alt seviyeler uçtan yüklenmeli.
+"""
+import pytest
+
+from app import db
+from app.models import BomEdge, BomItem, BomNode
+from app.utils import bom_engine
+from app.utils.bom_utils import get_bom_node_page, get_bom_subtree, get_bom_tree
+
+
+@pytest.fixture()
+def wide_bom(app_ctx):
+    """BOM #51: kök altında 7 kardeş pik parçası."""
+    pik = BomItem.query.filter_by(code="135-PIK-GG25").first()
+    montaj = BomItem.query.filter_by(code="135-MONTAJ").first()
+    root = BomNode(bom_id=51, num="1.", level=0, item_id=montaj.id, display_name="GENİŞ",
+                   quantity=1, piece_count=1, unit_type="adet")
+    db.session.add(root)
+    db.session.flush()
+    kids = [BomNode(bom_id=51, num=f"1.{k}.", level=1, item_id=pik.id, display_name=f"PİK {k}",
+                    quantity=1, piece_count=1, unit_type="adet") for k in range(1, 8)]
+    db.session.add_all(kids)
+    db.session.flush()
+    db.session.add(BomEdge(bom_id=51, parent_node_id=None, child_node_id=root.id, quantity=1))
+    db.session.add_all(BomEdge(bom_id=51, parent_node_id=root.id, child_node_id=k.id, quantity=1)
+                       for k in kids)
+    db.session.commit()
+    yield root, kids
+    BomEdge.query.filter_by(bom_id=51).delete()
+    BomNode.query.filter_by(bom_id=51).delete()
+    db.session.commit()
+
+
+def _find(nodes, node_id):
+    for node in nodes:
+        if node["id"] == node_id:
+            return node
+        found = _find(node["children"], node_id)
+        if found:
+            return found
+    return None
+
+
+def test_subtree_matches_full_tree_and_reads_only_descendants(app_ctx, monkeypatch):
+    full = get_bom_tree(5, db)
+    montaj = full["roots"][0]["children"][0]
+    seen = []
+    original = bom_engine.live_stock
+
+    def recording_stock(product_ids):
+        seen.extend(product_ids)
+        return original(seen)
+
+    monkeypatch.setattr(bom_engine, "live_stock", recording_stock)
+
+    subtree = get_bom_subtree(5, montaj["id"], db)
+    assert subtree["node"] == _find(full["roots"], montaj["id"])
+    root_pid = full["roots"][0]["product_id"]
+    assert root_pid not in seen and montaj["product_id"] in seen
+    assert get_bom_subtree(5, 999999, db)["error"] == "Düğüm bulunamadı"
+
+
+def test_node_page_has_counts_and_totals(app_ctx):
+    roots = get_bom_node_page(5)
+    assert roots["node"] is None and roots["total_children"] == 1
+    root = roots["children"][0]
+    assert root["child_count"] == 1 and root["descendant_count"] == 2
+    assert root["total_cost"] == 4380.0 and "children" not in root
+
+    level = get_bom_node_page(5, root["id"])
+    assert level["node"]["id"] == root["id"]
+    assert [c["descendant_count"] for c in level["children"]] == [1]
+    assert level["next_cursor"] is None
+
+
+def test_cursor_paging_walks_wide_level(wide_bom):
+    root, kids = wide_bom
+    ids, cursor = [], None
+    while True:
+        page = get_bom_node_page(51, root.id, cursor=cursor, limit=3)
+        ids.extend(c["id"] for c in page["children"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == [k.id for k in kids]
+    assert page["total_children"] == 7
+    with pytest.raises(ValueError):
+        get_bom_node_page(51, root.id, cursor=root.id)
+
+
+def test_children_endpoint(wide_bom, admin_client):
+    root, kids = wide_bom
+
+    data = admin_client.get(f"/production/api/bom_tree/51/children/{root.id}?limit=5").get_json()
+    assert data["success"] and len(data["children"]) == 5 and data["next_cursor"] == kids[4].id
+    data = admin_client.get(f"/production/api/bom_tree/51/children/{root.id}?cursor={kids[4].id}").get_json()
+    assert [c["id"] for c in data["children"]] == [kids[5].id, kids[6].id]
+    assert admin_client.get("/production/api/bom_tree/51/children").get_json()["children"][0]["id"] == root.id
+    assert admin_client.get(f"/production/api/bom_tree/51/children/{root.id}?cursor=1").status_code == 400
+    assert admin_client.get("/production/api/bom_tree/51/children/999999").status_code == 404
+
+
+def test_tree_page_embeds_only_roots(wide_bom, admin_client):
+    root, kids = wide_bom
+    html = admin_client.get("/production/bom/51").get_data(as_text=True)
+    assert f'"id": {root.id},' in html and '"child_count": 7' in html
+    assert not any(f'"id": {k.id},' in html for k in kids)
+
@@ -0,0 +1,84 @@
+"""
+NumPy roll-up motoru (bom_vector) testleri.
+
+Vektörel motor, Python motoruyla BİREBİR aynı birim/toplam maliyetleri
+üretmeli — hem gerçek derlenmiş BOM'larda hem de derin/geniş sentetik ağaçlarda.
+"""
+import random
+
+import pytest
+
+from app import db
+from app.utils import bom_engine, bom_vector
+from app.utils.bom_utils import get_bom_tree
+
+pytestmark = pytest.mark.skipif(not bom_vector.available(), reason="NumPy kurulu değil")
+
+
+def _synthetic_bom(size, seed):
+    """Rastgele ağaç: kök(ler), derin zincirler ve geniş kardeşler karışık."""
+    rng = random.Random(seed)
+    compiled = bom_engine.CompiledBom(0)
+    children = [[] for _ in range(size)]
+    parents = [-1]
+    stack = [0]
+    for i in range(1, size):
+        # Ön-sıra: ebeveyn yığındaki bir ata olmalı
+        depth = rng.randint(1, len(stack)) if rng.random() < 0.3 else len(stack)
+        del stack[depth:]
+        parent = stack[-1]
+        parents.append(parent)
+        children[parent].append(i)
+        stack.append(i)
+    compiled.node_ids = list(range(size))
+    compiled.parents = parents
+    compiled.children = [tuple(c) for c in children]
+    compiled.roots = (0,)
+    compiled.rolls_up = [bool(c) and rng.random() < 0.9 for c in children]
+    compiled.rollup_mult = [rng.choice([1.0, 2.0, 0.5, 1.07]) if r else 1.0 for r in compiled.rolls_up]
+    compiled.cost_qty = [0.0 if r else rng.uniform(0, 12) for r in compiled.rolls_up]
+    compiled.costing_ids = [None if rng.random() < 0.1 else rng.randint(1, 200) for _ in range(size)]
+    compiled.prices = {cid: round(rng.uniform(0, 900), 2) for cid in range(1, 200) if rng.random() < 0.8}
+    return compiled
+
+
+@pytest.mark.parametrize("size,seed", [(1, 1), (50, 2), (5000, 3)])
+def test_synthetic_trees_match_python_engine(size, seed):
+    compiled = _synthetic_bom(size, seed)
+    expected = bom_engine.rollup(compiled, backend="python")
+    assert bom_vector.rollup(compiled) == expected
+    prices = {cid: price * 1.12 for cid, price in compiled.prices.items()}
+    assert bom_vector.rollup(compiled, prices) == bom_engine.rollup(compiled, prices, backend="python")
+
+
+def test_deep_chain_has_no_recursion_limit():
+    compiled = _synthetic_bom(1, 0)
+    size = 20000
+    compiled.node_ids = list(range(size))
+    compiled.parents = [-1] + list(range(size - 1))
+    compiled.children = [(i + 1,) for i in range(size - 1)] + [()]
+    compiled.rolls_up = [True] * (size - 1) + [False]
+    compiled.rollup_mult = [1.0] * size
+    compiled.cost_qty = [0.0] * (size - 1) + [2.0]
+    compiled.costing_ids = [None] * (size - 1) + [7]
+    compiled.prices = {7: 3.5}
+    units, totals = bom_vector.rollup(compiled)
+    assert totals[0] == 7.0
+    assert (units, totals) == bom_engine.rollup(compiled, backend="python")
+
+
+def test_compiled_boms_match_and_tree_is_identical(app_ctx):
+    for bom_id in (5, 8, 9):
+        compiled = bom_engine.get_compiled_bom(bom_id)
+        assert bom_engine.rollup(compiled, backend="numpy") == bom_engine.rollup(compiled, backend="python")
+
+    app_ctx.config["BOM_ROLLUP_BACKEND"] = "numpy"
+    try:
+        vector_tree = get_bom_tree(5, db)
+    finally:
+        app_ctx.config["BOM_ROLLUP_BACKEND"] = "python"
+    try:
+        assert get_bom_tree(5, db) == vector_tree
+        assert vector_tree["roots"][0]["total_cost"] == 4380.0
+    finally:
+        app_ctx.config["BOM_ROLLUP_BACKEND"] = "auto"
@@ -0,0 +1,139 @@
+"""
+Maliyet duyarlılık indeksi (cost_index) testleri.
+
+Varsayımsal fiyatlarla artımlı roll-up, tüm ağacın baştan hesabıyla aynı
+toplamı vermeli; gerçek fiyat yazmalarında indeks yeniden derleme yapmadan
+güncellenmeli ve ikame kartları ters indekste görünmeli.
+"""
+import pytest
+from flask import current_app
+
+from app import db
+from app.models import BomEdge, BomItem, BomNode, Product
+from app.utils import bom_engine, cost_index
+
+
+def _full_total(bom_id, new_prices):
+    compiled = bom_engine.get_compiled_bom(bom_id)
+    prices = dict(compiled.prices)
+    prices.update((pid, price) for pid, price in new_prices.items() if pid in prices)
+    _, totals = bom_engine.rollup(compiled, prices)
+    return totals[compiled.roots[0]]
+
+
+@pytest.fixture()
+def substituted_bom(app_ctx):
+    """BOM #41: fiyatsız hammadde kartına bağlı yaprak, fiyatlı eş karttan maliyetlenir."""
+    bare = Product(code="LAMA-40X10-FIYATSIZ", name="LAMA 40X10", type="hammadde",
+                   unit_type="kg", material="LAMA 40X10", unit_cost=0, is_active=True)
+    priced = Product(code="LAMA-40X10-ST37", name="LAMA 40X10 ST37", type="hammadde",
+                     unit_type="kg", material="LAMA 40X10", unit_cost=25.0, is_active=True)
+    root_product = Product.query.filter_by(code="165-TAMBURLU-ESKI").one()
+    db.session.add_all([bare, priced])
+    db.session.flush()
+    root_item = BomItem(code="41-KOK", name="İKAME DENEME", type="mamul", unit_type="adet",
+                        product_id=root_product.id)
+    leaf_item = BomItem(code=bare.code, name="LAMA 40X10", type="hammadde", unit_type="kg",
+                        product_id=bare.id)
+    db.session.add_all([root_item, leaf_item])
+    db.session.flush()
+    root = BomNode(bom_id=41, num="1.", level=0, item_id=root_item.id, display_name="İKAME DENEME",
+                   quantity=1, piece_count=1, unit_type="adet")
+    leaf = BomNode(bom_id=41, num="1.1.", level=1, item_id=leaf_item.id, display_name="LAMA 40X10",
+                   quantity=2, piece_count=1, unit_type="kg")
+    db.session.add_all([root, leaf])
+    db.session.flush()
+    db.session.add_all([
+        BomEdge(bom_id=41, parent_node_id=None, child_node_id=root.id, quantity=1),
+        BomEdge(bom_id=41, parent_node_id=root.id, child_node_id=leaf.id, quantity=2),
+    ])
+    db.session.commit()
+    yield bare, priced, leaf
+    BomEdge.query.filter_by(bom_id=41).delete()
+    BomNode.query.filter_by(bom_id=41).delete()
+    db.session.delete(root_item)
+    db.session.delete(leaf_item)
+    db.session.delete(bare)
+    db.session.delete(priced)
+    db.session.commit()
+
+
+def test_what_if_matches_full_rollup(app_ctx):
+    pik, bicak = (Product.query.filter_by(code=c).one() for c in ("135-PIK-GG25", "165-BICAK-TUTUCU"))
+    new_prices = {pik.id: 800.0, bicak.id: 160.0}
+    deltas = {row["bom_id"]: row for row in cost_index.what_if(new_prices)}
+    assert set(deltas) == {5, 8, 9}
+    for bom_id, row in deltas.items():
+        assert row["after"] == pytest.approx(_full_total(bom_id, new_prices))
+        assert row["delta"] == pytest.approx(row["after"] - row["before"])
+    assert deltas[5]["delta"] == pytest.approx(420.0)
+    # Fiyatı değişmeyen senaryo hiçbir BOM döndürmez
+    assert cost_index.what_if({pik.id: float(pik.unit_cost)}) == []
+
+
+def test_price_write_updates_index_without_recompiling(app_ctx, monkeypatch):
+    cost_index.shared_cost_index()
+    pik = Product.query.filter_by(code="135-PIK-GG25").one()
+    old_price = pik.unit_cost
+    compiles = []
+    original = bom_engine.compile_bom
+    monkeypatch.setattr(bom_engine, "compile_bom", lambda *a: compiles.append(a) or original(*a))
+    pik.unit_cost = 900.0
+    db.session.commit()
+    try:
+        index = cost_index.shared_cost_index()
+        assert compiles == []
+        assert index.entries[5].total == pytest.approx(_full_total(5, {}))
+        assert index.entries[5].total == pytest.approx(900.0 * 3 * 2)
+    finally:
+        pik.unit_cost = old_price
+        db.session.commit()
+    assert cost_index.shared_cost_index().entries[5].total == pytest.approx(4380.0)
+
+
+def test_substituted_node_is_indexed(substituted_bom):
+    bare, priced, leaf = substituted_bom
+    index = cost_index.shared_cost_index()
+    entry = index.entries[41]
+    assert entry.total == pytest.approx(50.0)
+    assert [n["via"] for n in index.nodes_for_product(priced.id) if n["bom_id"] == 41] == ["substitute"]
+    assert [n["via"] for n in index.nodes_for_product(bare.id)] == ["linked"]
+
+    # İkame kartının fiyatı değişince BOM toplamı değişir
+    row = next(r for r in cost_index.what_if({priced.id: 30.0}) if r["bom_id"] == 41)
+    assert row["after"] == pytest.approx(60.0)
+    # Bağlı kart fiyat kazanırsa maliyet ona döner
+    row = next(r for r in cost_index.what_if({bare.id: 40.0}) if r["bom_id"] == 41)
+    assert row["after"] == pytest.approx(80.0)
+
+
+def test_what_if_endpoint(admin_client):
+    resp = admin_client.post("/production/api/what-if",
+                             json={"changes": [{"code": "135-PIK-GG25", "percent": 10}]})
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["success"] and data["product_count"] == 1
+    assert [b["bom_id"] for b in data["boms"]] == [5]
+    assert data["boms"][0]["delta"] == pytest.approx(438.0)
+
+    assert admin_client.post("/production/api/what-if", json={"changes": []}).status_code == 400
+    assert admin_client.post("/production/api/what-if",
+                             json={"changes": [{"code": "135-PIK-GG25"}]}).status_code == 400
+
+
+def test_price_sync_reports_bom_impact(app_ctx, monkeypatch):
+    monkeypatch.delenv("API_KEY", raising=False)
+    pik = Product.query.filter_by(code="135-PIK-GG25").one()
+    old_price, old_currency = pik.unit_cost, pik.currency
+    client = current_app.test_client()
+    try:
+        resp = client.post("/api/v1/products/price-sync", json={
+            "impact": True, "items": [{"code": "135-PIK-GG25", "cost": 800.0, "currency": "TRY"}]})
+        assert resp.status_code == 200
+        impact = resp.get_json()["bom_impact"]
+        assert [(b["bom_id"], b["before"], b["after"]) for b in impact] == [(5, 4380.0, 4800.0)]
+        assert cost_index.shared_cost_index().entries[5].total == pytest.approx(4800.0)
+    finally:
+        pik = Product.query.filter_by(code="135-PIK-GG25").one()
+        pik.unit_cost, pik.currency = old_price, old_currency
+        db.session.commit()
@@ -0,0 +1,144 @@
+"""
+Dashboard istatistik servisi (dashboard_stats) testleri.
+
+Artımlı günlük toplamlardan hesaplanan değerler defterden doğrudan
+hesaplananla aynı olmalı; mutabakat artımlı sonucu değiştirmemeli. Toplu
+yazmalar yalnızca etkiledikleri günlerden itibaren yeniden hesaplatmalı ve
+okuma yolundaki mutabakat istek oturumunu commit etmemeli.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert
+
+from app import db
+from app.models import MovementDailyTotal, Product, StockMovement
+from app.utils import dashboard_stats, versioning
+from app.utils.dashboard_stats import get_dashboard_stats, rebuild_daily_totals
+
+
+def _ledger_stats():
+    now = datetime.utcnow()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_ago = now - timedelta(days=7)
+
+    def week_sum(movement_type):
+        return db.session.query(func.sum(StockMovement.quantity)).filter(
+            StockMovement.date >= week_ago, StockMovement.movement_type == movement_type).scalar() or 0
+
+    return {
+        'today_movements': StockMovement.query.filter(
+            StockMovement.date >= today_start, StockMovement.date < today_start + timedelta(days=1)).count(),
+        'week_in': week_sum('giris'),
+        'week_out': week_sum('cikis'),
+    }
+
+
+def _served(stats):
+    return {k: stats[k] for k in ('today_movements', 'week_in', 'week_out')}
+
+
+def _totals():
+    db.session.expire_all()
+    return {(r.day, r.movement_type): (r.movement_count, round(r.total_quantity, 6))
+            for r in MovementDailyTotal.query if r.movement_count}
+
+
+def test_counters_follow_ledger(app_ctx):
+    pid = Product.query.filter_by(code="165-BICAK-TUTUCU").one().id
+    now = datetime.utcnow()
+    note = "dashboard-test"
+    rows = [
+        StockMovement(product_id=pid, movement_type="giris", quantity=5, note=note),
+        StockMovement(product_id=pid, movement_type="cikis", quantity=2, note=note, date=now - timedelta(days=3)),
+        # Pencere sınırının iki yanında (kısmi gün)
+        StockMovement(product_id=pid, movement_type="cikis", quantity=7, note=note,
+                      date=now - timedelta(days=7) + timedelta(minutes=5)),
+        StockMovement(product_id=pid, movement_type="cikis", quantity=11, note=note,
+                      date=now - timedelta(days=7) - timedelta(minutes=5)),
+        StockMovement(product_id=pid, movement_type="giris", quantity=3, note=note, date=now - timedelta(days=30)),
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    try:
+        assert _served(get_dashboard_stats()) == _ledger_stats()
+
+        # Değişiklik, silme ve toplu insert
+        rows[0].quantity = 9
+        rows[1].date = now
+        db.session.delete(rows[4])
+        db.session.commit()
+        db.session.execute(insert(StockMovement), [
+            {"product_id": pid, "movement_type": "giris", "quantity": 4, "note": note, "date": now},
+        ])
+        db.session.commit()
+        stats = get_dashboard_stats()
+        assert _served(stats) == _ledger_stats()
+        assert stats["week_in"] == 13
+
+        incremental = _totals()
+        rebuild_daily_totals(db.session.connection())
+        db.session.commit()
+        assert _totals() == incremental
+    finally:
+        StockMovement.query.filter_by(note=note).delete(synchronize_session=False)
+        db.session.commit()
+    assert _served(get_dashboard_stats()) == _ledger_stats()
+
+
+def test_product_counters_follow_catalog(app_ctx):
+    before = get_dashboard_stats()
+    alt = Product.query.filter_by(code="165-ALT-TAMBUR").one()
+    try:
+        alt.minimum_stock = 10
+        db.session.commit()
+        after = get_dashboard_stats()
+        assert after["critical_count"] == before["critical_count"] + 1
+        assert alt.id in after["critical_preview_ids"]
+    finally:
+        alt.minimum_stock = 0
+        db.session.commit()
+    assert get_dashboard_stats()["critical_count"] == before["critical_count"]
+
+
+def test_bulk_writes_rebuild_only_affected_days(app_ctx, monkeypatch):
+    pid = Product.query.filter_by(code="165-BICAK-TUTUCU").one().id
+    other = Product.query.filter_by(code="135-MONTAJ").one().id
+    note = "dashboard-bulk"
+    old = datetime.utcnow() - timedelta(days=3)
+    db.session.add_all([
+        StockMovement(product_id=pid, movement_type="giris", quantity=5, note=note, date=old),
+        StockMovement(product_id=pid, movement_type="cikis", quantity=1, note=note),
+    ])
+    db.session.commit()
+    calls = []
+    rebuild = dashboard_stats.rebuild_daily_totals
+    monkeypatch.setattr(dashboard_stats, "rebuild_daily_totals",
+                        lambda conn, since=None: calls.append(since) or rebuild(conn, since=since))
+    try:
+        # Ürün birleştirme gibi product_id taşıma toplamlara dokunmaz
+        StockMovement.query.filter_by(note=note).update({"product_id": other}, synchronize_session=False)
+        db.session.commit()
+        assert calls == []
+
+        StockMovement.query.filter_by(note=note, movement_type="giris").update(
+            {"quantity": 8}, synchronize_session=False)
+        db.session.commit()
+        assert calls == [old.date()]
+        assert _served(get_dashboard_stats()) == _ledger_stats()
+    finally:
+        StockMovement.query.filter_by(note=note).delete(synchronize_session=False)
+        db.session.commit()
+    assert calls[-1] == old.date()
+    assert _served(get_dashboard_stats()) == _ledger_stats()
+
+
+def test_reconcile_does_not_commit_request_session(app_ctx):
+    versioning.bump(db.session.connection(), (dashboard_stats.SCOPE_RECONCILED,), token="20000101000000")
+    db.session.commit()
+
+    alt = Product.query.filter_by(code="165-ALT-TAMBUR").one()
+    get_dashboard_stats()
+    # İstek oturumu commit edilseydi yüklü nesneler expire olurdu
+    assert "name" in alt.__dict__
+    db.session.rollback()
+    assert versioning.read_signature((dashboard_stats.SCOPE_RECONCILED,))[0] != "20000101000000"
@@ -0,0 +1,58 @@
+"""
+Salt yazma (write_only) Excel dışa aktarım testleri.
+
+BOM ağacı, ürün ve hareket dökümleri adlandırılmış stillerle yazılmalı,
+yerleşim (başlık, birleştirmeler, alt bilgi) korunmalı ve hareket dökümünde
+satır sınırı olmamalı.
+"""
+import csv
+import io
+
+from openpyxl import load_workbook
+
+from app import db
+from app.models import Product, StockMovement
+from app.utils.bom_utils import get_bom_tree
+from app.utils.excel_utils import create_bom_tree_excel, export_products_to_excel
+
+
+def test_bom_tree_excel_layout(app_ctx):
+    wb = load_workbook(create_bom_tree_excel(get_bom_tree(5, db), 5))
+    ws = wb["BOM #5"]
+    assert ws["A1"].value == "BOM #5 - Ürün Ağacı"
+    assert {str(r) for r in ws.merged_cells.ranges} == {"A1:N1", "A2:N2", "A10:N10"}
+    assert ws["A4"].value == "No" and ws["A4"].style == "bom_header"
+    assert [ws.cell(row, 1).value for row in (5, 6, 7)] == ["1.", "1.1.", "1.1.1."]
+    assert ws["B6"].value.startswith("  ") and ws["B6"].fill.fgColor.rgb.endswith("dbeafe")
+    assert ws["F7"].value == 3.0 and ws["F7"].number_format == "0.####"
+    assert ws["A10"].value.startswith("©")
+    assert wb["Özet"]["B5"].value == 1
+
+
+def test_products_excel_streams_query(app_ctx):
+    products = Product.query.order_by(Product.name).yield_per(2)
+    ws = load_workbook(export_products_to_excel(products))["Ürünler"]
+    assert ws.max_row == Product.query.count() + 1
+    statuses = {ws.cell(row, 2).value: ws.cell(row, 8) for row in range(2, ws.max_row + 1)}
+    assert statuses["165-BICAK-TUTUCU"].value == "NORMAL"
+    assert statuses["135-PIK-GG25"].value == "BOŞ" and statuses["135-PIK-GG25"].style == "durum_bos"
+
+
+def test_movement_export_has_no_row_cap(admin_client):
+    product = Product.query.filter_by(code="165-BICAK-TUTUCU").one()
+    db.session.add_all([StockMovement(product_id=product.id, movement_type="giris", quantity=i % 7 + 1,
+                                      note=f"toplu {i}") for i in range(1500)])
+    db.session.commit()
+    total = StockMovement.query.count()
+    try:
+        body = admin_client.get("/reports/export/movements").get_data(as_text=True)
+        rows = list(csv.reader(io.StringIO(body)))
+        assert len(rows) == total + 1
+
+        resp = admin_client.get("/reports/export/movements?format=xlsx")
+        ws = load_workbook(io.BytesIO(resp.data))["Stok Hareketleri"]
+        assert ws.max_row == total + 1
+        assert ws["C2"].value == "165-BICAK-TUTUCU" and ws["A1"].style == "hareket_baslik"
+    finally:
+        StockMovement.query.filter(StockMovement.note.like("toplu %")).delete(synchronize_session=False)
+        db.session.commit()
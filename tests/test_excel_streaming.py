@@ -0,0 +1,88 @@
+"""
+Salt okunur (read_only) Excel okuma testleri.
+
+BOM ve fiyat listesi ayrıştırıcıları çalışma kitabını satır akışıyla okumalı;
+sonuç tam modda yüklenen kitapla birebir aynı olmalı (sarı montaj dolgusu
+dahil) ve dosyadaki yanlış boyut (dimension) bilgisi satır kaybettirmemeli.
+"""
+import re
+import zipfile
+from io import BytesIO
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import PatternFill
+
+from app.utils import excel_utils
+from app.utils.bom_utils import parse_bom_excel_v2
+from app.utils.excel_utils import parse_price_list_excel
+
+
+def _format_c_workbook() -> BytesIO:
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["165 DENEME MAKİNESİ"])
+    ws.append([])
+    ws.append(["Ad", "Malzeme Cinsi", "Parça Kodu", "Malzeme Özelliği", "Fireli Metre",
+               "Firesiz Metre", "Fireli Ağırlık", "Firesiz Ağırlık", "Adet"])
+    ws.append(["ŞASİ"])
+    ws["A4"].fill = PatternFill(fill_type="solid", start_color="FFFFC000", end_color="FFFFC000")
+    ws.append(["Boru", "Sanayi Borusu", "P-1", "Ø76x5", 2, 1.9, 10, 9.5, 1])
+    ws.append(["Cıvata", "", "C-1", "M10", None, None, None, None, 4])
+    buf = BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+def _with_dimension(buf: BytesIO, ref: str) -> BytesIO:
+    """Sayfa XML'indeki boyut bilgisini değiştirir (bazı ERP çıktıları "A1" yazar)."""
+    out = BytesIO()
+    with zipfile.ZipFile(buf) as src, zipfile.ZipFile(out, "w") as dst:
+        for info in src.infolist():
+            data = src.read(info.filename)
+            if info.filename == "xl/worksheets/sheet1.xml":
+                data = re.sub(rb'<dimension ref="[^"]*"', f'<dimension ref="{ref}"'.encode(), data)
+            dst.writestr(info, data)
+    out.seek(0)
+    return out
+
+
+def test_streaming_matches_full_load(monkeypatch):
+    streamed = parse_bom_excel_v2(_format_c_workbook())
+    wb = excel_utils.load_workbook_streaming(_format_c_workbook())
+    assert wb.read_only
+    wb.close()
+
+    monkeypatch.setattr(excel_utils, "load_workbook_streaming",
+                        lambda stream: load_workbook(stream, data_only=True))
+    assert parse_bom_excel_v2(_format_c_workbook()) == streamed
+
+    rows, errors = streamed
+    assert errors == []
+    assert [(r["num"], r["name"]) for r in rows if r["level"] == 1] == [("1.", "ŞASİ")]
+    assert {r["name"] for r in rows if r["parent_num"] == "1."} == {"Boru", "Cıvata"}
+
+
+def test_wrong_dimension_keeps_all_rows():
+    rows, errors = parse_bom_excel_v2(_with_dimension(_format_c_workbook(), "A1"))
+    assert errors == []
+    assert {r["name"] for r in rows} >= {"ŞASİ", "Boru", "Cıvata"}
+
+
+def test_price_list_streaming():
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["FİYAT LİSTESİ"])
+    ws.append(["KODU", "Malzeme Adı", "Birim Fiyat"])
+    ws.append(["HM-001", "Sac 2 mm", 48.5])
+    ws.append([])
+    ws.append(["HM-002", "Boru", "12,75"])
+    ws.append(["HM-001", "Sac 2 mm", 50])
+    buf = BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+
+    rows, errors = parse_price_list_excel(_with_dimension(buf, "A1:C2"))
+    assert [(r["code"], r["price"], r["excel_row"]) for r in rows] == [
+        ("HM-001", 48.5, 3), ("HM-002", 12.75, 5), ("HM-001", 50.0, 6)]
+    assert len(errors) == 1 and "HM-001" in errors[0]["error"]
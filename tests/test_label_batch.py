@@ -0,0 +1,80 @@
+"""
+Toplu QR etiket üretimi testleri.
+
+Şablonlu çizim eski etiketle aynı olmalı, önbellekteki etiket yeniden
+çizilmemeli, süreç havuzu tüm işleri döndürmeli ve toplu indirme ZIP'i
+akış olarak (ZIP_STORED) beklenen dosyaları içermeli.
+"""
+import io
+import zipfile
+
+from flask import current_app
+from PIL import Image
+
+from app.models import Product
+from app.utils import label_batch, qr_generator
+from app.utils.label_batch import LabelJob
+
+
+def _jobs(n, size="small"):
+    return [LabelJob(f"e{i}.png", f"http://x/products/{i}", f"P-{i}", f"PARÇA {i}", size)
+            for i in range(n)]
+
+
+def test_template_render_is_stable():
+    first = qr_generator.render_label_png("http://x/products/1", "165-ALT-TAMBUR", "ALT TAMBUR", "large")
+    second = qr_generator.render_label_png("http://x/products/2", "135-PIK-GG25", "PİK", "large")
+    again = qr_generator.generate_celmak_label_with_size("http://x/products/1", "165-ALT-TAMBUR",
+                                                         "ALT TAMBUR", "large").getvalue()
+    assert first == again and first != second
+    assert Image.open(io.BytesIO(first)).size == (qr_generator.LABEL_SIZES["large"]["width"],
+                                                 qr_generator.LABEL_SIZES["large"]["height"])
+
+
+def test_cache_hit_skips_render(tmp_path, monkeypatch):
+    jobs = _jobs(3)
+    rendered = dict(label_batch.render_labels(jobs, str(tmp_path)))
+    assert set(rendered) == set(jobs)
+
+    monkeypatch.setattr(label_batch, "_render", lambda job, cache_dir=None: 1 / 0)
+    assert dict(label_batch.render_labels(jobs, str(tmp_path), workers=2)) == rendered
+    assert label_batch.render_one(jobs[0], str(tmp_path)) == rendered[jobs[0]]
+
+
+def test_pool_yields_every_job(tmp_path):
+    jobs = _jobs(5)
+    pooled = dict(label_batch.render_labels(jobs, str(tmp_path), workers=2))
+    assert set(pooled) == set(jobs)
+    assert pooled[jobs[3]] == label_batch.render_one(jobs[3])
+
+
+def test_pool_outlives_the_request(tmp_path):
+    list(label_batch.render_labels(_jobs(3), str(tmp_path / "a"), workers=2))
+    pool = label_batch.render_pool(2)
+    list(label_batch.render_labels(_jobs(3), str(tmp_path / "b"), workers=2))
+    assert label_batch.render_pool(2) is pool
+    assert pool._mp_context.get_start_method() != "fork"
+
+
+def test_bulk_download_zip(admin_client, tmp_path, monkeypatch):
+    monkeypatch.setitem(current_app.config, "LABEL_CACHE_DIR", str(tmp_path))
+    monkeypatch.setitem(current_app.config, "LABEL_RENDER_WORKERS", 1)
+    ids = [Product.query.filter_by(code=c).one().id for c in ("165-ALT-TAMBUR", "135-PIK-GG25")]
+
+    resp = admin_client.post("/products/qr/bulk-download",
+                             data={"product_ids[]": [str(i) for i in ids] + ["abc"]})
+    assert resp.status_code == 200 and resp.mimetype == "application/zip" and resp.is_streamed
+    assert resp.headers["X-Label-Count"] == "2" and "Content-Length" not in resp.headers
+    with zipfile.ZipFile(io.BytesIO(resp.data)) as zf:
+        assert sorted(zf.namelist()) == ["etiket_135-PIK-GG25.png", "etiket_165-ALT-TAMBUR.png"]
+        assert {i.compress_type for i in zf.infolist()} == {zipfile.ZIP_STORED}
+    assert len(list(tmp_path.rglob("*.png"))) == 2
+
+
+def test_stream_zip_yields_chunks():
+    entries = [(f"e{i}.png", bytes([i]) * 40_000) for i in range(5)]
+    chunks = list(label_batch.stream_zip(iter(entries), chunk_size=50_000))
+    assert len(chunks) >= 3 and max(map(len, chunks)) < 50_000 + 40_000 + 200
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert zf.testzip() is None
+        assert [(n, zf.read(n)) for n in zf.namelist()] == entries
@@ -0,0 +1,62 @@
+"""
+PDF etiket sayfası testleri.
+
+Etiketler stoğa göre sayfalara dizilmeli, logolar etiket sayısından bağımsız
+olarak bir kez gömülmeli, xref tablosu geçerli olmalı ve toplu QR formu
+format=pdf ile PDF döndürmeli.
+"""
+import re
+import zlib
+
+
+from app.models import Product
+from app.utils.label_batch import LabelJob
+from app.utils.label_pdf import render_label_pdf
+
+
+def _jobs(n):
+    return [LabelJob(f"e{i}.png", f"http://x/products/{i}", f"P-{i}", f"ŞAFT İĞNE {i}") for i in range(n)]
+
+
+def _streams(pdf):
+    return [zlib.decompress(m) for m in re.findall(rb"stream\n(.*?)\nendstream", pdf, re.S)]
+
+
+def test_sheet_layout_and_shared_logo():
+    pdf = render_label_pdf(_jobs(25), "a4_12").getvalue()
+    assert pdf.startswith(b"%PDF-1.4") and pdf.rstrip().endswith(b"%%EOF")
+    assert len(re.findall(rb"/Type /Page\b", pdf)) == 3
+    assert b"/Count 3" in pdf
+
+    contents = b"".join(_streams(pdf))
+    assert contents.count(b"/Tpl Do") == 25
+    assert "ŞAFT İĞNE 24".encode("cp1254") in contents
+
+    images = len(re.findall(rb"/Subtype /Image", pdf))
+    assert images == len(re.findall(rb"/Subtype /Image", render_label_pdf(_jobs(1), "rulo_60").getvalue()))
+
+
+def test_xref_offsets_point_to_objects():
+    pdf = render_label_pdf(_jobs(3), "unknown-sheet").getvalue()
+    start = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+    lines = pdf[start:].split(b"\n")
+    count = int(lines[1].split()[1])
+    for obj_id, line in enumerate(lines[3:2 + count], 1):
+        offset = int(line.split()[0])
+        assert pdf[offset:].startswith(b"%d 0 obj" % obj_id)
+
+
+def test_generate_bulk_qr_pdf(admin_client):
+    ids = [str(Product.query.filter_by(code=c).one().id) for c in ("165-ALT-TAMBUR", "135-PIK-GG25")]
+    assert b"PDF sayfa" in admin_client.get("/products/bulk-qr").data
+
+    resp = admin_client.post("/products/generate-bulk-qr",
+                             data={"product_ids[]": ids, "format": "pdf", "sheet": "a4_24"})
+    assert resp.status_code == 200 and resp.mimetype == "application/pdf"
+    assert resp.data.startswith(b"%PDF") and b"/Count 1" in resp.data
+    assert b"".join(_streams(resp.data)).count(b"/Tpl Do") == 2
+    assert "qr_etiketleri_a4_24_" in resp.headers["Content-Disposition"]
+
+    resp = admin_client.post("/products/generate-bulk-qr",
+                             data={"product_ids[]": ids, "format": "pdf", "sheet": "../a4_24\r\nX"})
+    assert resp.status_code == 302 and resp.location.endswith("/products/bulk-qr")
@@ -0,0 +1,53 @@
+"""
+Hammadde malzeme imza indeksi (material_index) testleri.
+
+İndeks yalnızca aday daraltır; seçilen kart tam taramayla aynı olmalı ve
+Product yazmalarından sonra paylaşılan indeks güncellenmeli.
+"""
+from app import db
+from app.models import Product
+from app.utils.bom_utils import _find_costing_raw_material, _material_match_score, _source_material_profile
+from app.utils.material_index import shared_material_index
+
+
+def _row(name):
+    return {"name": name, "material": name, "unit_type": "kg", "weight_per_unit": 0, "is_auto_hammadde": True}
+
+
+def test_new_card_is_visible_after_write(app_ctx):
+    before = len(shared_material_index())
+    sac = Product(code="SAC-2MM-ST37", name="2 MM SAC ST37", type="hammadde", unit_type="kg",
+                  unit_cost=30.0, is_active=True)
+    db.session.add(sac)
+    db.session.commit()
+    try:
+        assert len(shared_material_index()) == before + 1
+        assert _find_costing_raw_material(_row("SAC 2 MM ST37")) is sac
+        # Farklı kalınlık (imza uyuşmazlığı) asla eşleşmemeli
+        assert _find_costing_raw_material(_row("SAC 3 MM ST37")) is None
+    finally:
+        db.session.delete(sac)
+        db.session.commit()
+    assert len(shared_material_index()) == before
+
+
+def test_lookup_matches_full_scan(app_ctx):
+    cards = [
+        Product(code=f"LAMA-{w}", name=f"LAMA {w}X10", type="hammadde", unit_type="kg",
+                unit_cost=20.0 + w, is_active=True)
+        for w in (30, 40, 50)
+    ]
+    db.session.add_all(cards)
+    db.session.commit()
+    try:
+        source = "LAMA 40X10"
+        index = shared_material_index()
+        narrowed = {e.id for e in index.lookup(_source_material_profile(source), require_name_match=False)}
+        scanned = {p.id for p in Product.query.filter_by(type="hammadde", is_active=True)
+                   if _material_match_score(source, p, require_name_match=False) > 0}
+        assert scanned <= narrowed
+        assert _find_costing_raw_material(_row(source)).code == "LAMA-40"
+    finally:
+        for card in cards:
+            db.session.delete(card)
+        db.session.commit()
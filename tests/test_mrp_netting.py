@@ -0,0 +1,164 @@
+"""
+Çok seviyeli MRP netleştirme (app/utils/mrp.py) testleri.
+
+135 tamburlu ağacı: kök → montaj(qty 2) → pik(qty 3). Rafta hazır montaj grubu
+varsa önce o kullanılmalı; pik ihtiyacı yalnızca eksik montaj kadar doğmalı.
+Montaj aynı ağaçta ayrıca yaprak olarak da geçiyorsa yaprak ihtiyacı ancak
+stoktan karşılanabilir; eksiği üretimi durdurmalı. Üretim ekranı düşülecek
+listeyi POST ile aynı netleştirmeden göstermeli.
+"""
+import pytest
+
+from app import db
+from app.models import BomEdge, BomItem, BomNode, Location, LocationStock, Product
+from app.utils import bom_engine, mrp
+from app.utils.bom_utils import explode_bom_materials
+
+
+def _demand(bom_id, quantity):
+    root = BomNode.query.filter_by(bom_id=bom_id, level=0).one()
+    return {"bom_id": bom_id, "node_id": root.id, "quantity": quantity}
+
+
+def _by_code(result, key="requirements"):
+    return {r["product"].code: r for r in result[key]}
+
+
+@pytest.fixture()
+def montaj(app_ctx):
+    product = Product.query.filter_by(code="135-MONTAJ").one()
+    yield product
+    product.current_stock = 0
+    db.session.commit()
+
+
+def test_without_subassembly_stock_matches_explosion(app_ctx):
+    demands = [_demand(5, 10), _demand(8, 10), _demand(9, 5)]
+    result = mrp.net_requirements(demands)
+    reqs = _by_code(result)
+    exploded = {}
+    for demand in demands:
+        for m in explode_bom_materials(demand["bom_id"], demand["node_id"], demand["quantity"], db)["materials"]:
+            exploded[m["product"].code] = exploded.get(m["product"].code, 0.0) + m["quantity"]
+    for code, gross in exploded.items():
+        assert reqs[code]["gross"] == gross
+    assert reqs["135-MONTAJ"]["kind"] == mrp.KIND_PRODUCTION
+    orders = _by_code(result, "planned_orders")
+    assert orders["135-MONTAJ"]["quantity"] == 20.0
+    assert orders["135-PIK-GG25"]["quantity"] == 60.0
+    assert orders["165-ALT-TAMBUR"]["quantity"] == 15.0
+    # Bıçak tutucu stoktan karşılanır → planlı emir yok
+    assert "165-BICAK-TUTUCU" not in orders
+    assert reqs["165-BICAK-TUTUCU"]["from_stock"] == 15.0
+
+
+def test_subassembly_stock_is_netted_before_leaves(montaj):
+    montaj.current_stock = 5
+    db.session.commit()
+    reqs = _by_code(mrp.net_requirements([_demand(5, 10)]))
+    assert reqs["135-MONTAJ"]["from_stock"] == 5.0
+    assert reqs["135-MONTAJ"]["net"] == 15.0
+    assert reqs["135-PIK-GG25"]["gross"] == 45.0
+    assert reqs["135-PIK-GG25"]["level"] > reqs["135-MONTAJ"]["level"]
+
+
+def test_location_stock_is_used_when_requested(montaj):
+    montaj.current_stock = 50
+    depo = Location(name="MRP Depo")
+    db.session.add(depo)
+    db.session.flush()
+    db.session.add(LocationStock(location_id=depo.id, product_id=montaj.id, quantity=8))
+    db.session.commit()
+    try:
+        reqs = _by_code(mrp.net_requirements([_demand(5, 10)], location_id=depo.id))
+        assert reqs["135-MONTAJ"]["from_stock"] == 8.0
+        assert reqs["135-PIK-GG25"]["gross"] == 36.0
+    finally:
+        LocationStock.query.filter_by(location_id=depo.id).delete()
+        db.session.delete(depo)
+        db.session.commit()
+
+
+def test_subtree_requirements_are_memoized(app_ctx):
+    demand = _demand(5, 1)
+    mrp._requirement_memo.clear()
+    mrp.net_requirements([demand])
+    compiled = bom_engine.get_compiled_bom(5)
+    root = compiled.index_of(demand["node_id"])
+    memo = mrp.subtree_requirements(compiled, root)
+    mrp.net_requirements([demand])
+    assert mrp.subtree_requirements(compiled, root) is memo
+    pik = Product.query.filter_by(code="135-PIK-GG25").one()
+    assert memo[0][pik.id] == 6.0
+
+
+def test_explosion_reuses_subtree_memo(app_ctx, monkeypatch):
+    demand = _demand(5, 2)
+    mrp._requirement_memo.clear()
+    first = explode_bom_materials(5, demand["node_id"], 2, db)
+    walked = []
+    monkeypatch.setattr(mrp._requirement_memo, "put", lambda *args: walked.append(args))
+    second = explode_bom_materials(5, demand["node_id"], 2, db)
+    # İkinci patlatma alt ağacı yeniden gezmez; kayıt paylaşılır
+    assert walked == []
+    assert [(m["product"].code, m["quantity"]) for m in second["materials"]] == [("135-PIK-GG25", 12.0)]
+    assert second["breakdown"] == first["breakdown"]
+    assert second["breakdown"][0]["mult"] == 4.0
+
+
+def test_unknown_node_is_rejected(app_ctx):
+    with pytest.raises(ValueError):
+        mrp.net_requirements([{"bom_id": 5, "node_id": -1, "quantity": 1}])
+
+
+@pytest.fixture()
+def montaj_leaf(montaj):
+    """Kökün altına montaj kartını ayrıca yaprak olarak (qty 1) ekler."""
+    root = BomNode.query.filter_by(bom_id=5, level=0).one()
+    item = BomItem(code=montaj.code, name=montaj.name, type=montaj.type, unit_type="adet", product_id=montaj.id)
+    db.session.add(item)
+    db.session.flush()
+    node = BomNode(bom_id=5, num="1.2.", level=1, item_id=item.id, display_name=montaj.name,
+                   quantity=1.0, piece_count=1, unit_type="adet")
+    db.session.add(node)
+    db.session.flush()
+    edge = BomEdge(bom_id=5, parent_node_id=root.id, child_node_id=node.id, quantity=1.0)
+    db.session.add(edge)
+    db.session.commit()
+    yield root
+    db.session.delete(edge)
+    db.session.delete(node)
+    db.session.delete(item)
+    db.session.commit()
+
+
+def test_leaf_demand_of_assembly_card_needs_stock(montaj, montaj_leaf):
+    reqs = _by_code(mrp.net_requirements([_demand(5, 10)]))
+    assert reqs["135-MONTAJ"]["kind"] == mrp.KIND_PRODUCTION
+    assert reqs["135-MONTAJ"]["gross"] == 30.0
+    assert reqs["135-MONTAJ"]["shortfall"] == 10.0
+    assert reqs["135-PIK-GG25"]["shortfall"] == 60.0
+
+    # Stok önce yaprak ihtiyacına gider; kalan montaj örneklerinden düşülür
+    montaj.current_stock = 12
+    db.session.commit()
+    reqs = _by_code(mrp.net_requirements([_demand(5, 10)]))
+    assert reqs["135-MONTAJ"]["shortfall"] == 0.0
+    assert reqs["135-MONTAJ"]["from_stock"] == 12.0
+    assert reqs["135-PIK-GG25"]["gross"] == 54.0
+
+
+def test_produce_preview_matches_netting(montaj, admin_client):
+    montaj.current_stock = 5
+    db.session.commit()
+    root = BomNode.query.filter_by(bom_id=5, level=0).one()
+
+    page = admin_client.get(f"/production/bom/5/produce/{root.id}?quantity=10").get_data(as_text=True)
+    # Montaj: 20 gerekir, 5 stoktan; pik: yalnızca eksik 15 montaj için 45
+    assert "135 Tambur Montaj Grubu" in page and "45.00" in page and "60.00" not in page
+    assert "yetersiz stok var" in page
+
+    resp = admin_client.post(f"/production/bom/5/produce/{root.id}", data={"quantity": "10"})
+    assert resp.status_code == 302
+    db.session.expire_all()
+    assert Product.query.filter_by(code="135-MONTAJ").one().current_stock == 5
@@ -0,0 +1,68 @@
+"""
+Okutma arama tablosu testleri.
+
+Etiket (CELMAK-<id> ve etiket adresi), ürün kodu ve barkod çözülmeli; tablo
+katalog sürümü ilerleyince yalnızca değişen kartları yeniden yüklemeli, silinen
+kartı düşürmeli ve toplu okutma ucu tüm kodları tek çağrıda çözmeli.
+"""
+
+from app import db
+from app.models import Product
+from app.utils import product_lookup, versioning
+
+
+def test_resolve_label_code_and_barcode(app_ctx):
+    product = Product.query.filter_by(code="165-ALT-TAMBUR").one()
+    product.barcode = "8690000000017"
+    db.session.commit()
+    try:
+        assert product_lookup.resolve_many([
+            f"CELMAK-{product.id}|165-ALT-TAMBUR",
+            f"http://stok.local/products/{product.id}",
+            " 165-ALT-TAMBUR\n",
+            "8690000000017",
+            "CELMAK-abc",
+            "YOK-BOYLE-KOD",
+            "",
+        ]) == [product.id] * 4 + [None, None, None]
+        assert product_lookup.shared_lookup().version == versioning.catalog_version()
+    finally:
+        product.barcode = None
+        db.session.commit()
+
+
+def test_refresh_follows_catalog_writes(app_ctx):
+    lookup = product_lookup.shared_lookup()
+    product = Product(code="SCAN-1", name="Okutma Deneme", barcode="111")
+    db.session.add(product)
+    db.session.commit()
+    try:
+        assert product_lookup.resolve("SCAN-1") == product.id
+        assert product_lookup.shared_lookup() is lookup
+
+        product.code, product.barcode = "SCAN-2", "222"
+        db.session.commit()
+        assert product_lookup.resolve_many(["SCAN-1", "111", "SCAN-2", "222"]) == [None, None, product.id, product.id]
+    finally:
+        db.session.delete(product)
+        db.session.commit()
+    assert product_lookup.resolve("SCAN-2") is None
+    assert len(product_lookup.shared_lookup()) == Product.query.count()
+
+
+def test_scan_endpoints(admin_client):
+    product = Product.query.filter_by(code="135-PIK-GG25").one()
+
+    single = admin_client.get(f"/api/products/by-qr/CELMAK-{product.id}|135-PIK-GG25").get_json()
+    assert single["code"] == "135-PIK-GG25"
+    assert admin_client.get("/api/products/by-qr/YOK-BOYLE-KOD").status_code == 404
+
+    resp = admin_client.post("/api/products/scan-batch",
+                             json={"codes": ["135-PIK-GG25", "YOK", f"CELMAK-{product.id}", "135-PIK-GG25"]})
+    data = resp.get_json()
+    assert resp.status_code == 200 and data["found"] == 3 and data["missing"] == 1
+    assert [r["product"]["id"] if r["found"] else None for r in data["results"]] == \
+        [product.id, None, product.id, product.id]
+
+    assert admin_client.post("/api/products/scan-batch", json={"codes": "x"}).status_code == 400
+    assert admin_client.post("/api/products/scan-batch", json={"codes": ["x"] * 501}).status_code == 400
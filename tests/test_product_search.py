@@ -0,0 +1,121 @@
+"""
+Ürün arama indeksi testleri.
+
+search_text ürün yazmalarında (tekil, toplu, kategori adı değişikliği) güncel
+kalmalı, toplu yazmalarda yalnızca etkilenen satırlar yeniden hesaplanmalı; SQLite'ta FTS5 trigram indeksi kullanılmalı, Türkçe çekimli ve
+katlanmış sorgular eşleşmeli ve arama uçları tek sıralı sorgu döndürmeli.
+"""
+from sqlalchemy import event, insert, text
+
+from app import db
+from app.models import Category, Product
+from app.utils import product_search
+from app.routes.reports import _product_search_query
+
+
+def _search_text(code):
+    return db.session.execute(text("SELECT search_text FROM products WHERE code = :c"), {"c": code}).scalar()
+
+
+def test_search_text_maintained_on_writes(app_ctx):
+    assert _search_text("165-BICAK-TUTUCU") == "165-bicak-tutucu 165 tamburlu bicak tutucu tamburlu"
+
+    cat = Category(name="Döküm Parçaları", code="DKM", unit="adet")
+    product = Product(code="SRC-1", name="Şaft Göbeği", material="GG25", category=cat)
+    db.session.add_all([cat, product])
+    db.session.commit()
+    try:
+        assert _search_text("SRC-1") == "src-1 saft gobegi gg25 dokum parcalari"
+
+        cat.name = "Işlenmiş Döküm"
+        db.session.commit()
+        assert _search_text("SRC-1").endswith("gg25 islenmis dokum")
+
+        Product.query.filter_by(code="SRC-1").update({"notes": "Özel Sipariş"})
+        db.session.commit()
+        assert "ozel siparis" in _search_text("SRC-1")
+    finally:
+        db.session.delete(product)
+        db.session.delete(cat)
+        db.session.commit()
+
+
+
+def test_bulk_writes_refresh_only_affected_rows(app_ctx, monkeypatch):
+    calls = []
+    original = product_search.refresh_search_text
+
+    def recording(connection, **kwargs):
+        calls.append(kwargs)
+        return original(connection, **kwargs)
+
+    monkeypatch.setattr(product_search, "refresh_search_text", recording)
+    cat = Category(name="Döküm Parçaları", code="DKM", unit="adet")
+    product = Product(code="SRC-2", name="Şaft Göbeği", category=cat)
+    db.session.add_all([cat, product])
+    db.session.commit()
+    try:
+        # Aranan alan yazılmıyor: yeniden hesaplama yok
+        Product.query.filter_by(id=product.id).update({"is_active": False})
+        db.session.commit()
+        assert calls == []
+
+        Product.query.filter_by(id=product.id).update({"notes": "Yedek"})
+        db.session.commit()
+        assert calls == [{"category_ids": set(), "product_ids": {product.id}}]
+        assert _search_text("SRC-2").endswith("yedek dokum parcalari")
+
+        calls.clear()
+        Category.query.filter_by(id=cat.id).update({"name": "Pik Döküm"})
+        db.session.commit()
+        assert calls == [{"category_ids": {cat.id}, "product_ids": set()}]
+        assert _search_text("SRC-2").endswith("pik dokum")
+
+        calls.clear()
+        db.session.execute(insert(Product), [
+            {"code": "SRC-3", "name": "Kendi Metni", "search_text": "src-3 kendi metni"},
+            {"code": "SRC-4", "name": "Boş Metin"},
+        ])
+        db.session.commit()
+        assert calls == [{"missing_only": True}]
+        assert _search_text("SRC-4") == "src-4 bos metin"
+    finally:
+        Product.query.filter(Product.code.in_(["SRC-2", "SRC-3", "SRC-4"])).delete(synchronize_session=False)
+        db.session.delete(cat)
+        db.session.commit()
+
+
+def test_fts_index_and_ranking(app_ctx):
+    assert product_search.backend() == "fts5"
+    indexed = db.session.execute(text("SELECT count(*) FROM products_search_fts WHERE products_search_fts MATCH 'tambur'")).scalar()
+    assert indexed == Product.query.filter(Product.search_text.like("%tambur%")).count()
+
+    assert product_search.term_variants("Tamburunun") == ("tambur",)
+    query, terms = _product_search_query("tamburunun bıçak tutucusu")
+    assert terms == ["tamburunun", "bıçak", "tutucusu"]
+    assert [p.code for p in query.all()] == ["165-BICAK-TUTUCU"]
+
+    # Hiçbir üründe ikisi birden yoksa herhangi biri; çok kelime eşleşen önce
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        query, _ = _product_search_query("montaj bicak")
+        assert {p.code for p in query.all()} == {"135-MONTAJ", "165-BICAK-TUTUCU"}
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert len(statements) == 1
+
+    ranked = product_search.apply_search(Product.query, ["165", "alt", "tambur"], require_all=False)
+    assert ranked.order_by(Product.name).first().code == "165-ALT-TAMBUR"
+
+
+def test_search_endpoints_use_index(admin_client):
+    assert [p["code"] for p in admin_client.get("/api/products/search?q=tutucu bıçak").get_json()] == ["165-BICAK-TUTUCU"]
+
+    # Eskiden yalnızca ad üzerinde arıyordu; kod ve katlanmış yazım da eşleşmeli
+    stock = admin_client.get("/stock/api/search-products?q=pik-gg").get_json()
+    assert [p["code"] for p in stock] == ["135-PIK-GG25"] and stock[0]["category"] == "Tamburlu"
+
+    page = admin_client.get("/products/?search=CAYIR eski").get_data(as_text=True)
+    assert "165-TAMBURLU-ESKI" in page and "165-TAMBURLU-CAYIR-B" not in page
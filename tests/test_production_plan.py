@@ -0,0 +1,88 @@
+"""
+Toplu üretim planı patlatması (explode_production_plan) testleri.
+
+Plan, üretim ekranıyla aynı netleştirmeden (mrp.net_requirements) geçmeli:
+rafta bekleyen yarı mamul alt bileşen ihtiyacını düşürmeli. BOM sayısından
+bağımsız olarak sabit sayıda sorgu atılmalı.
+"""
+from sqlalchemy import event
+
+from app import db
+from app.models import BomNode, Product
+from app.utils import mrp
+from app.utils.bom_utils import explode_production_plan
+
+PLAN = [
+    {"bom_id": 5, "quantity": 10},
+    {"bom_id": 8, "quantity": 10},
+    {"bom_id": 9, "quantity": 5},
+]
+
+
+def test_plan_nets_against_stock(app_ctx):
+    result = explode_production_plan(PLAN, db)
+    mats = {m["product"].code: m for m in result["materials"]}
+    assert mats["135-PIK-GG25"]["gross"] == 60.0
+    assert mats["135-PIK-GG25"]["net"] == 60.0
+    assert mats["165-ALT-TAMBUR"]["gross"] == 20.0
+    assert mats["165-ALT-TAMBUR"]["net"] == 15.0
+    # Bıçak tutucu iki BOM'dan gelir: 10 + 5, stok 100 → eksik yok
+    assert mats["165-BICAK-TUTUCU"]["gross"] == 15.0
+    assert mats["165-BICAK-TUTUCU"]["net"] == 0.0
+    assert mats["165-BICAK-TUTUCU"]["boms"] == [8, 9]
+    # Ara montaj grubu üretilecek kart olarak listelenir
+    assert mats["135-MONTAJ"]["kind"] == mrp.KIND_PRODUCTION
+    assert mats["135-MONTAJ"]["net"] == 20.0
+
+
+def test_plan_matches_produce_netting(app_ctx):
+    montaj = Product.query.filter_by(code="135-MONTAJ").one()
+    montaj.current_stock = 5
+    db.session.commit()
+    try:
+        demands = []
+        for line in PLAN:
+            root = BomNode.query.filter_by(bom_id=line["bom_id"], level=0).one()
+            demands.append({"bom_id": line["bom_id"], "node_id": root.id, "quantity": line["quantity"]})
+        expected = {r["product_id"]: (r["gross"], r["net"]) for r in mrp.net_requirements(demands)["requirements"]}
+        mats = explode_production_plan(PLAN, db)["materials"]
+        assert {m["product"].id: (m["gross"], m["net"]) for m in mats} == expected
+        # Raftaki 5 montaj düşüldü: 15 montaj × 3 pik
+        assert next(m for m in mats if m["product"].code == "135-PIK-GG25")["gross"] == 45.0
+    finally:
+        montaj.current_stock = 0
+        db.session.commit()
+
+
+def test_plan_query_count_is_constant(app_ctx):
+    def count(plan):
+        statements = []
+
+        def listener(*args):
+            statements.append(args[2])
+
+        engine = db.session.get_bind()
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            explode_production_plan(plan, db)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        return len(statements)
+
+    explode_production_plan(PLAN, db)     # derlenmiş BOM'lar önbelleğe
+    db.session.expire_all()
+    # Sorgu sayısı satır sayısıyla değil, plandaki farklı BOM sayısıyla büyür
+    assert count(PLAN * 10) == count(PLAN) <= len(PLAN) * 2 + 1
+
+
+def test_invalid_line_is_reported(app_ctx):
+    other_root = BomNode.query.filter_by(bom_id=8, level=0).one()
+    result = explode_production_plan([
+        {"bom_id": 5, "quantity": 1},
+        {"bom_id": 999, "quantity": 1},
+        {"bom_id": 5, "node_id": other_root.id, "quantity": 1},
+    ], db)
+    errors = [line.get("error") for line in result["lines"]]
+    assert errors[0] is None
+    assert errors[1] and errors[2]
+    assert {m["product"].code for m in result["materials"]} == {"135-MONTAJ", "135-PIK-GG25"}
@@ -0,0 +1,124 @@
+"""
+/api/v1/products/full testleri — NDJSON akışı, keyset sayfalama, ETag ve
+changed_since delta modu.
+"""
+import json
+
+import pytest
+
+from app import db
+from app.models import Category, Product, StockMovement
+from app.utils import versioning
+
+
+@pytest.fixture()
+def client(app_ctx, monkeypatch):
+    monkeypatch.delenv("API_KEY", raising=False)
+    return app_ctx.test_client()
+
+
+def test_ndjson_matches_json(client):
+    full = client.get("/api/v1/products/full").get_json()["data"]
+    resp = client.get("/api/v1/products/full?format=ndjson")
+    assert resp.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert rows == full
+
+
+def test_keyset_pages_cover_catalog(client):
+    codes = [p["code"] for p in client.get("/api/v1/products/full").get_json()["data"]]
+    seen, after = [], ""
+    while True:
+        page = client.get(f"/api/v1/products/full?limit=3&after_code={after}").get_json()
+        seen += [p["code"] for p in page["data"]]
+        after = page["next_after_code"]
+        if after is None:
+            break
+    assert seen == codes
+
+    tail = client.get(f"/api/v1/products/full?format=ndjson&after_code={codes[2]}&limit=2")
+    assert [json.loads(line)["code"] for line in tail.get_data(as_text=True).splitlines()] == codes[3:5]
+
+
+def test_invalid_limit(client):
+    assert client.get("/api/v1/products/full?limit=0").status_code == 400
+
+
+def _etag_and_version(client, url="/api/v1/products/full"):
+    resp = client.get(url)
+    assert resp.status_code == 200
+    return resp.headers["ETag"], int(resp.headers["X-Catalog-Version"])
+
+
+def test_etag_not_modified_until_catalog_write(client):
+    etag, version = _etag_and_version(client)
+    assert client.get("/api/v1/products/full", headers={"If-None-Match": etag}).status_code == 304
+
+    bicak = Product.query.filter_by(code="165-BICAK-TUTUCU").one()
+    movement = StockMovement(product_id=bicak.id, movement_type="giris", quantity=1)
+    db.session.add(movement)
+    db.session.commit()
+    try:
+        resp = client.get("/api/v1/products/full", headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert int(resp.headers["X-Catalog-Version"]) > version
+    finally:
+        db.session.delete(movement)
+        db.session.commit()
+
+
+def test_changed_since_returns_only_modified_products(client):
+    _, version = _etag_and_version(client)
+    bicak = Product.query.filter_by(code="165-BICAK-TUTUCU").one()
+    try:
+        bicak.current_stock = 99
+        db.session.commit()
+        delta = client.get(f"/api/v1/products/full?changed_since={version}").get_json()
+        assert [p["code"] for p in delta["data"]] == ["165-BICAK-TUTUCU"]
+        assert delta["data"][0]["current_stock"] == 99.0
+
+        # Toplu güncelleme ve pasife alma da delta'da görünmeli
+        Product.query.filter_by(code="165-ALT-TAMBUR").update({"is_active": False}, synchronize_session=False)
+        db.session.commit()
+        delta = client.get(f"/api/v1/products/full?changed_since={delta['catalog_version']}").get_json()
+        assert [(p["code"], p["is_active"]) for p in delta["data"]] == [("165-ALT-TAMBUR", False)]
+    finally:
+        bicak.current_stock = 100
+        Product.query.filter_by(code="165-ALT-TAMBUR").update({"is_active": True}, synchronize_session=False)
+        db.session.commit()
+
+
+def test_invalid_changed_since(client):
+    assert client.get("/api/v1/products/full?changed_since=abc").status_code == 400
+
+
+def test_catalog_version_taken_at_commit(client):
+    version = versioning.catalog_version()
+    bicak = Product.query.filter_by(code="165-BICAK-TUTUCU").one()
+    try:
+        bicak.current_stock = 77
+        db.session.flush()
+        # Flush sayacı ilerletmez; satır geçici (negatif) işaretle damgalanır
+        assert versioning.catalog_version() == version
+        assert db.session.query(Product.catalog_version).filter_by(id=bicak.id).scalar() < 0
+        db.session.commit()
+        assert versioning.catalog_version() == version + 1
+        assert db.session.query(Product.catalog_version).filter_by(id=bicak.id).scalar() == version + 1
+    finally:
+        bicak.current_stock = 100
+        db.session.commit()
+
+
+def test_bulk_category_rename_stamps_products(client):
+    _, version = _etag_and_version(client)
+    category = Category.query.filter_by(name="Tamburlu").one()
+    codes = sorted(p.code for p in Product.query.filter_by(category_id=category.id))
+    try:
+        Category.query.filter_by(id=category.id).update({"name": "Tamburlu Grup"}, synchronize_session=False)
+        db.session.commit()
+        delta = client.get(f"/api/v1/products/full?changed_since={version}").get_json()
+        assert [p["code"] for p in delta["data"]] == codes
+        assert {p["category_name"] for p in delta["data"]} == {"Tamburlu Grup"}
+    finally:
+        Category.query.filter_by(id=category.id).update({"name": "Tamburlu"}, synchronize_session=False)
+        db.session.commit()
@@ -0,0 +1,117 @@
+"""
+Satın alma API'leri (/api/v1/purchasing/...) testleri.
+
+Tüketim toplamları ve lokasyonlar tek gruplu sorgularla hesaplanır; sorgu
+sayısı ürün sayısından bağımsız olmalı ve değerler ürün bazlı toplamla aynı
+kalmalı.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models import Location, LocationStock, Product, StockMovement
+
+
+@pytest.fixture()
+def ledger(app_ctx, monkeypatch):
+    monkeypatch.delenv("API_KEY", raising=False)
+    now = datetime.utcnow()
+    bicak = Product.query.filter_by(code="165-BICAK-TUTUCU").one()
+    alt = Product.query.filter_by(code="165-ALT-TAMBUR").one()
+    depo = Location(name="Test Depo")
+    db.session.add(depo)
+    db.session.flush()
+    rows = [
+        LocationStock(location_id=depo.id, product_id=bicak.id, quantity=7),
+        LocationStock(location_id=depo.id, product_id=alt.id, quantity=0),
+        StockMovement(product_id=bicak.id, movement_type="cikis", quantity=3, date=now - timedelta(days=2)),
+        StockMovement(product_id=bicak.id, movement_type="cikis", quantity=10, date=now - timedelta(days=20)),
+        StockMovement(product_id=bicak.id, movement_type="cikis", quantity=100, date=now - timedelta(days=40)),
+        StockMovement(product_id=bicak.id, movement_type="giris", quantity=50, date=now - timedelta(days=1)),
+        StockMovement(product_id=alt.id, movement_type="cikis", quantity=4, date=now - timedelta(days=5)),
+    ]
+    db.session.add_all(rows)
+    alt.minimum_stock = 10
+    db.session.commit()
+    yield app_ctx.test_client(), bicak.id, alt.id
+    for row in rows:
+        db.session.delete(row)
+    db.session.delete(depo)
+    alt.minimum_stock = 0
+    db.session.commit()
+
+
+def _count_queries(fn):
+    statements = []
+
+    def listener(*args):
+        statements.append(args[2])
+
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        return fn(), statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+
+def test_critical_stock_consumption_and_locations(ledger):
+    client, bicak_id, alt_id = ledger
+    resp, statements = _count_queries(lambda: client.get("/api/v1/purchasing/critical-stock"))
+    data = {row["product_id"]: row for row in resp.get_json()["data"]}
+
+    assert data[bicak_id]["weekly_consumption"] == 3.0
+    assert data[bicak_id]["locations"][0]["location_name"] == "Test Depo"
+    assert data[bicak_id]["locations"][0]["quantity"] == 7.0
+    assert data[bicak_id]["category_name"] == "Tamburlu"
+    assert data[alt_id]["locations"] == []
+    assert data[alt_id]["days_remaining"] == 8  # 5 / (4 / 7)
+    assert len(statements) <= 6  # + katalog sürümü ve ETag pencere sorgusu
+
+
+def test_products_and_reorder_monthly_consumption(ledger):
+    client, bicak_id, alt_id = ledger
+    products = {row["id"]: row for row in client.get("/api/v1/purchasing/products").get_json()["products"]}
+    assert products[bicak_id]["monthly_consumption"] == 13.0
+    assert products[alt_id]["suggested_order"] == 9.0  # eksik 5 + tüketim 4
+
+    suggestions = client.get("/api/v1/purchasing/reorder-suggestions").get_json()["data"]
+    assert [row["product_id"] for row in suggestions] == [alt_id]
+    assert suggestions[0]["monthly_consumption"] == 4.0
+    assert suggestions[0]["economic_order_quantity"] == 10.0
+
+
+def test_purchasing_etag(ledger):
+    client, bicak_id, _ = ledger
+    first = client.get("/api/v1/purchasing/products")
+    etag = first.headers["ETag"]
+    assert client.get("/api/v1/purchasing/products", headers={"If-None-Match": etag}).status_code == 304
+
+    movement = StockMovement(product_id=bicak_id, movement_type="cikis", quantity=1)
+    db.session.add(movement)
+    db.session.commit()
+    try:
+        again = client.get("/api/v1/purchasing/products", headers={"If-None-Match": etag})
+        assert again.status_code == 200
+        row = next(p for p in again.get_json()["products"] if p["id"] == bicak_id)
+        assert row["monthly_consumption"] == 14.0
+    finally:
+        db.session.delete(movement)
+        db.session.commit()
+
+
+def test_purchasing_etag_is_weak_and_follows_location_rename(ledger):
+    client, bicak_id, _ = ledger
+    first = client.get("/api/v1/purchasing/critical-stock")
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert client.get("/api/v1/purchasing/critical-stock", headers={"If-None-Match": etag}).status_code == 304
+
+    depo = Location.query.filter_by(name="Test Depo").one()
+    depo.name = "Yeni Depo"
+    db.session.commit()
+    again = client.get("/api/v1/purchasing/critical-stock", headers={"If-None-Match": etag})
+    assert again.status_code == 200
+    row = next(r for r in again.get_json()["data"] if r["product_id"] == bicak_id)
+    assert row["locations"][0]["location_name"] == "Yeni Depo"
@@ -0,0 +1,134 @@
+"""
+Kategori / lokasyon stok özet tabloları (stock_summary) testleri.
+
+Artımlı güncellenen özetler her yazma türünden sonra tablolardan baştan
+hesaplanan değerle aynı olmalı.
+"""
+import pytest
+
+from app import db
+from app.models import Category, Location, LocationStock, Product, StockCategorySummary, StockLocationSummary
+from app.utils.stock_summary import category_stats, location_stats, rebuild_stock_summaries
+
+
+def _snapshot():
+    db.session.expire_all()
+    cats = {r.category_id: (r.total_items, r.critical_items, r.empty_items,
+                            round(r.total_stock, 6), round(r.total_value, 6))
+            for r in StockCategorySummary.query if r.total_items}
+    locs = {r.location_id: (r.total_products, r.product_count,
+                            round(r.total_quantity, 6), round(r.positive_quantity, 6))
+            for r in StockLocationSummary.query if r.total_products}
+    return cats, locs
+
+
+def _assert_matches_rebuild():
+    incremental = _snapshot()
+    rebuild_stock_summaries(db.session.connection())
+    assert _snapshot() == incremental
+    db.session.rollback()
+
+
+@pytest.fixture()
+def fixtures(app_ctx):
+    cat = Category(name="Özet Test", code="OZT")
+    depo = Location(name="Özet Depo")
+    db.session.add_all([cat, depo])
+    db.session.commit()
+    yield cat, depo
+    LocationStock.query.filter_by(location_id=depo.id).delete()
+    Product.query.filter(Product.code.like("OZT-%")).delete(synchronize_session=False)
+    db.session.delete(cat)
+    db.session.delete(depo)
+    db.session.commit()
+
+
+def test_incremental_updates_match_rebuild(fixtures):
+    cat, depo = fixtures
+    a = Product(code="OZT-A", name="A", category_id=cat.id, current_stock=10, minimum_stock=5, unit_cost=2)
+    b = Product(code="OZT-B", name="B", category_id=cat.id, current_stock=0, minimum_stock=3, unit_cost=4)
+    db.session.add_all([a, b])
+    db.session.commit()
+    _assert_matches_rebuild()
+    stat = next(s for s in category_stats() if s["category"].id == cat.id)
+    assert (stat["total_items"], stat["critical_items"], stat["empty_items"], stat["total_value"]) == (2, 1, 1, 20)
+
+    # Yüklenmemiş alana doğrudan atama (commit sonrası expire) ve çıkış
+    a.current_stock = 3
+    b.current_stock += 7
+    db.session.commit()
+    _assert_matches_rebuild()
+
+    # Pasife alma, kategori değişimi, fiyat değişimi
+    b.is_active = False
+    a.unit_cost = 9
+    db.session.commit()
+    _assert_matches_rebuild()
+    a.category_id = None
+    db.session.commit()
+    _assert_matches_rebuild()
+    a.category_id = cat.id
+    db.session.commit()
+
+    # Lokasyon satırları: ekleme, güncelleme, silme
+    la = LocationStock(location_id=depo.id, product_id=a.id, quantity=4)
+    lb = LocationStock(location_id=depo.id, product_id=b.id, quantity=0)
+    db.session.add_all([la, lb])
+    db.session.commit()
+    _assert_matches_rebuild()
+    la.quantity = -1
+    lb.quantity = 6
+    db.session.commit()
+    _assert_matches_rebuild()
+    stat = next(s for s in location_stats() if s["location"].id == depo.id)
+    assert (stat["total_products"], stat["product_count"], stat["total_quantity"], stat["positive_quantity"]) == (2, 1, 5, 6)
+    db.session.delete(la)
+    db.session.commit()
+    _assert_matches_rebuild()
+
+
+def test_bulk_update_rebuilds_on_commit(fixtures):
+    cat, depo = fixtures
+    p = Product(code="OZT-C", name="C", category_id=cat.id, current_stock=2, minimum_stock=0, unit_cost=1)
+    db.session.add(p)
+    db.session.commit()
+    Product.query.filter_by(code="OZT-C").update({"current_stock": 0}, synchronize_session=False)
+    db.session.commit()
+    stat = next(s for s in category_stats() if s["category"].id == cat.id)
+    assert (stat["total_items"], stat["empty_items"]) == (1, 1)
+    _assert_matches_rebuild()
+
+
+def test_bulk_writes_rebuild_only_touched_categories(fixtures, monkeypatch):
+    from sqlalchemy import insert
+    from app.utils import stock_summary
+
+    cat, depo = fixtures
+    other = Category.query.filter(Category.id != cat.id).first()
+    db.session.add(Product(code="OZT-D", name="D", category_id=cat.id, current_stock=5, unit_cost=1))
+    db.session.commit()
+    rebuilt = []
+    original = stock_summary.rebuild_category_summaries
+    monkeypatch.setattr(stock_summary, "rebuild_category_summaries",
+                        lambda connection, ids=None: rebuilt.append(ids) or original(connection, ids))
+
+    # Stok senkronizasyonundaki gibi kategorisiz toplu ekleme özeti bayatlatmaz
+    db.session.execute(insert(Product), [{"code": "OZT-E", "name": "E", "current_stock": 0}])
+    db.session.commit()
+    assert rebuilt == []
+
+    Product.query.filter_by(code="OZT-D").update({"current_stock": 0}, synchronize_session=False)
+    db.session.commit()
+    assert rebuilt == [{cat.id}]
+
+    Product.query.filter_by(code="OZT-D").update({"category_id": other.id}, synchronize_session=False)
+    db.session.commit()
+    assert rebuilt[-1] == {cat.id, other.id}
+    _assert_matches_rebuild()
+
+
+def test_warehouse_pages_render(fixtures, admin_client):
+    for url in ("/warehouse/", "/warehouse/locations", "/reports/warehouse"):
+        resp = admin_client.get(url)
+        assert resp.status_code == 200, url
+        assert "Özet" in resp.get_data(as_text=True)
@@ -0,0 +1,82 @@
+"""
+/api/v1/stock/sync testleri — küme bazlı işleme, parçalı commit ve kalem
+bazlı sonuçlar.
+"""
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models import Product, StockMovement
+from app.routes import api as api_module
+
+
+@pytest.fixture()
+def client(app_ctx, monkeypatch):
+    monkeypatch.delenv("API_KEY", raising=False)
+    return app_ctx.test_client()
+
+
+def _cleanup(codes, movement_note):
+    StockMovement.query.filter_by(note=movement_note).delete(synchronize_session=False)
+    Product.query.filter(Product.code.in_(codes)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def test_sync_results_and_sequential_semantics(client, monkeypatch):
+    monkeypatch.setattr(api_module, "STOCK_SYNC_CHUNK_SIZE", 3)
+    bicak = Product.query.filter_by(code="165-BICAK-TUTUCU").one()
+    note = "sync-test"
+    items = [
+        {"product_code": "165-BICAK-TUTUCU", "stock_quantity": 120, "note": note},
+        {"product_code": "SYNC-NEW-1", "stock_quantity": 5, "name": "Yeni Sac", "note": note},
+        {"product_code": "SYNC-YOK", "stock_quantity": 1, "note": note},
+        {"product_code": "165-BICAK-TUTUCU", "stock_quantity": 120, "note": note},
+        {"product_code": "165-BICAK-TUTUCU", "stock_quantity": 90, "note": note},
+        {"stock_quantity": 3},
+        {"product_code": "SYNC-NEW-1", "stock_quantity": "x", "note": note},
+    ]
+    try:
+        body = client.post("/api/v1/stock/sync", json={"items": items}).get_json()
+        statuses = [(r["code"], r["status"]) for r in body["results"]]
+        assert statuses == [
+            ("165-BICAK-TUTUCU", "success"),
+            ("SYNC-NEW-1", "success"),
+            ("SYNC-YOK", "error"),
+            ("165-BICAK-TUTUCU", "skipped"),
+            ("165-BICAK-TUTUCU", "success"),
+            (None, "error"),
+            ("SYNC-NEW-1", "error"),
+        ]
+        assert body["results"][4]["old_stock"] == 120.0
+        db.session.expire_all()
+        assert bicak.current_stock == 90
+        new = Product.query.filter_by(code="SYNC-NEW-1").one()
+        assert (new.current_stock, new.unit_type, new.material) == (5, "kg", "Yeni Sac")
+        assert new.search_text == "sync-new-1 yeni sac yeni sac"
+        moves = StockMovement.query.filter_by(note=note).order_by(StockMovement.id).all()
+        assert [(m.movement_type, m.quantity) for m in moves] == [("giris", 20), ("giris", 5), ("cikis", 30)]
+    finally:
+        bicak.current_stock = 100
+        _cleanup(["SYNC-NEW-1"], note)
+
+
+def test_sync_queries_do_not_scale_with_items(client):
+    note = "sync-bulk-test"
+    items = [{"product_code": f"SYNC-BULK-{i}", "stock_quantity": i + 1, "name": f"Bulk {i}", "note": note}
+             for i in range(300)]
+    statements = []
+
+    def listener(*args):
+        statements.append(args[2])
+
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        body = client.post("/api/v1/stock/sync", json={"items": items}).get_json()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    try:
+        assert all(r["status"] == "success" for r in body["results"])
+        assert StockMovement.query.filter_by(note=note).count() == 300
+        assert len(statements) < 30
+    finally:
+        _cleanup([i["product_code"] for i in items], note)
@@ -0,0 +1,89 @@
+"""
+Alt ağaç özeti (subtree hash) ile BOM'lar arası paylaşılan hesap testleri.
+
+Aynı alt montaj iki farklı BOM'da geçtiğinde aynı özeti almalı, düğüm
+kararları bir kez hesaplanmalı ve maliyet/ihtiyaç sonuçları değişmemeli.
+"""
+import pytest
+
+from app import db
+from app.models import BomEdge, BomItem, BomNode, Product
+from app.utils import bom_engine, mrp
+from app.utils.bom_utils import get_bom_tree
+
+
+@pytest.fixture()
+def twin_boms(app_ctx):
+    """BOM #31 ve #32: farklı kökler altında aynı montaj → pik alt ağacı."""
+    montaj = BomItem.query.filter_by(code="135-MONTAJ").first()
+    pik = BomItem.query.filter_by(code="135-PIK-GG25").first()
+    root_item = BomItem.query.filter_by(code="165-TAMBURLU-ESKI").first()
+    if root_item is None:
+        product = Product.query.filter_by(code="165-TAMBURLU-ESKI").one()
+        root_item = BomItem(code=product.code, name=product.name, type=product.type,
+                            unit_type=product.unit_type, product_id=product.id)
+        db.session.add(root_item)
+        db.session.flush()
+    created = []
+    for bom_id, root_name, num in ((31, "İKİZ A", "1.1."), (32, "İKİZ B", "1.3.")):
+        root = BomNode(bom_id=bom_id, num="1.", level=0, item_id=root_item.id,
+                       display_name=root_name, quantity=1, piece_count=1, unit_type="adet")
+        sub = BomNode(bom_id=bom_id, num=num, level=1, item_id=montaj.id,
+                      display_name=montaj.name, quantity=2, piece_count=1, unit_type="adet")
+        leaf = BomNode(bom_id=bom_id, num=num + "1.", level=2, item_id=pik.id,
+                       display_name=pik.name, quantity=3, piece_count=1, unit_type="adet")
+        db.session.add_all([root, sub, leaf])
+        db.session.flush()
+        db.session.add_all([
+            BomEdge(bom_id=bom_id, parent_node_id=None, child_node_id=root.id, quantity=1),
+            BomEdge(bom_id=bom_id, parent_node_id=root.id, child_node_id=sub.id, quantity=2),
+            BomEdge(bom_id=bom_id, parent_node_id=sub.id, child_node_id=leaf.id, quantity=3),
+        ])
+        created.append((root, sub))
+    db.session.commit()
+    yield created
+    for bom_id in (31, 32):
+        BomEdge.query.filter_by(bom_id=bom_id).delete()
+        BomNode.query.filter_by(bom_id=bom_id).delete()
+    db.session.commit()
+
+
+def test_shared_subassembly_has_same_hash(twin_boms):
+    (_, sub_a), (_, sub_b) = twin_boms
+    a, b = bom_engine.get_compiled_bom(31), bom_engine.get_compiled_bom(32)
+    assert a.subtree_hashes[a.index_of(sub_a.id)] == b.subtree_hashes[b.index_of(sub_b.id)]
+    # Kök adları farklı → kök özetleri farklı
+    assert a.subtree_hashes[0] != b.subtree_hashes[0]
+
+
+def test_shared_subassembly_is_compiled_once(twin_boms, monkeypatch):
+    bom_engine.invalidate()
+    calls = []
+    original = bom_engine._compile_node
+
+    def counting(n, *args):
+        calls.append(n.bom_id)
+        return original(n, *args)
+
+    monkeypatch.setattr(bom_engine, "_compile_node", counting)
+    bom_engine.get_compiled_bom(31)
+    assert calls == [31, 31, 31]
+    calls.clear()
+    b = bom_engine.get_compiled_bom(32)
+    # Yalnızca kök yeniden hesaplanır; montaj ve pik #31'den gelir
+    assert calls == [32]
+    (_, _), (_, sub_b) = twin_boms
+    assert b.rows[b.index_of(sub_b.id)]["id"] == sub_b.id
+    assert b.rows[b.index_of(sub_b.id)]["num"] == "1.3."
+
+
+def test_memoized_results_match(twin_boms):
+    totals = {bom_id: get_bom_tree(bom_id, db)["roots"][0]["total_cost"] for bom_id in (5, 31, 32)}
+    assert totals[31] == totals[32] == totals[5] == 4380.0
+    (root_a, _), (root_b, _) = twin_boms
+    reqs = mrp.net_requirements([
+        {"bom_id": 31, "node_id": root_a.id, "quantity": 1},
+        {"bom_id": 32, "node_id": root_b.id, "quantity": 2},
+    ])
+    pik = next(r for r in reqs["requirements"] if r["product"].code == "135-PIK-GG25")
+    assert pik["gross"] == 18.0
@@ -0,0 +1,101 @@
+"""
+Nerede kullanılıyor (where-used) indeksi testleri.
+
+İndeks seed BOM'larıyla birebir uyuşmalı, yeni/silinen BOM'larda yalnızca o
+BOM'u yeniden yüklemeli; silme analizi ve kök tespiti indeksten beslenmeli.
+"""
+from sqlalchemy import event
+
+from app import db
+from app.models import BomEdge, BomItem, BomNode, Product, StockMovement
+from app.utils import where_used
+from app.utils.bom_utils import analyze_bom_delete
+
+
+def _product(code):
+    return Product.query.filter_by(code=code).one()
+
+
+def test_index_matches_seed(app_ctx):
+    bicak = _product("165-BICAK-TUTUCU")
+    usages = where_used.where_used(bicak.id)
+    assert [(u["bom_id"], u["level"], u["quantity"]) for u in usages] == [(8, 1, 1.0), (9, 1, 1.0)]
+    assert usages[0]["bom_name"] == "165 TAMBURLU ÇAYIR BİÇME MAKİNESİ ÜRÜN AĞACI"
+
+    roots = where_used.bom_roots()
+    assert roots[_product("135-TAMBURLU-CAYI").id]["bom_id"] == 5
+    assert roots[_product("135-TAMBURLU-CAYI").id]["node_count"] == 3
+    assert bicak.id not in roots
+
+
+def test_new_and_deleted_bom_reload_only_that_bom(app_ctx, monkeypatch):
+    where_used.shared_index()
+    loads = []
+    original = where_used._load
+    monkeypatch.setattr(where_used, "_load", lambda bom_ids=None: loads.append(bom_ids) or original(bom_ids))
+
+    pik = _product("135-PIK-GG25")
+    item = BomItem.query.filter_by(code="135-PIK-GG25").first()
+    root = BomNode(bom_id=71, num="1.", level=0, item_id=item.id, display_name="PIK KOK",
+                   quantity=4, piece_count=1, unit_type="adet")
+    db.session.add(root)
+    db.session.flush()
+    db.session.add(BomEdge(bom_id=71, parent_node_id=None, child_node_id=root.id, quantity=1))
+    db.session.commit()
+
+    assert [(u["bom_id"], u["level"], u["quantity"]) for u in where_used.where_used(pik.id)] == [
+        (5, 2, 3.0), (71, 0, 4.0)]
+    assert where_used.bom_roots()[pik.id]["root_name"] == "PIK KOK"
+    assert loads == [[71]]
+
+    db.session.delete(root)
+    db.session.commit()
+    assert [u["bom_id"] for u in where_used.where_used(pik.id)] == [5]
+    assert pik.id not in where_used.bom_roots()
+
+
+def test_current_index_reads_only_the_signature(app_ctx):
+    where_used.shared_index()
+    statements = []
+
+    def listener(*args):
+        statements.append(args[2])
+
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        where_used.shared_index()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert len(statements) == 1 and "cache_versions" in statements[0]
+    assert "bom_nodes" not in statements[0]
+
+
+def test_delete_analysis_uses_index(app_ctx):
+    bicak = _product("165-BICAK-TUTUCU")
+    root = _product("165-TAMBURLU-CAYIR-B")
+    db.session.add(StockMovement(product_id=root.id, movement_type="giris", quantity=1))
+    db.session.commit()
+
+    analysis = analyze_bom_delete(9, db)
+    keep = {e["id"]: e["reasons"] for e in analysis["keep"]}
+    assert keep[bicak.id] == ["Başka bir BOM ağacında da kullanılıyor"]
+    assert keep[root.id] == ["Stok hareketi geçmişi var"]
+    assert analysis["stats"] == {"deactivate": 0, "keep": 2, "total": 2}
+
+    assert {e["id"] for e in analyze_bom_delete(8, db)["deactivate"]} == {
+        _product("165-TAMBURLU-CAYI-01").id, _product("165-ALT-TAMBUR").id}
+
+    StockMovement.query.filter_by(product_id=root.id).delete()
+    db.session.commit()
+
+
+def test_where_used_endpoint(admin_client):
+    bicak = _product("165-BICAK-TUTUCU")
+    body = admin_client.get(f"/production/api/where-used/{bicak.id}").get_json()
+    assert body["success"] and body["bom_ids"] == [8, 9] and body["root_of"] == []
+    assert {u["node_id"] for u in body["usages"]} == {
+        n.id for n in BomNode.query.join(BomItem).filter(BomItem.product_id == bicak.id)}
+
+    root = _product("165-TAMBURLU-CAYI-01")
+    assert admin_client.get(f"/production/api/where-used/{root.id}").get_json()["root_of"] == [8]
+    assert admin_client.get("/production/api/where-used/999999").status_code == 404